@@ -0,0 +1,151 @@
+#! /usr/bin/env python
+
+"""This module contains code for reading an ascii source catalog in
+chunks of rows. Rather than parsing the entire catalog into a single
+table, the rows are parsed a block at a time, so that the caller can
+filter each block and keep only the rows it needs. The peak memory use
+is then set by the size of the chunks and the number of rows kept,
+rather than by the size of the catalog.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.catalogs import chunked_reader
+        for chunk in chunked_reader.iter_catalog_chunks('my_catalog.cat', 100000):
+            ...
+"""
+
+from astropy.io import ascii
+import numpy as np
+
+
+def parse_rows(lines, colnames):
+    """Parse a list of catalog data rows into a table
+
+    Parameters
+    ----------
+    lines : list
+        List of data rows (str)
+
+    colnames : list
+        Names of the catalog columns
+
+    Returns
+    -------
+    table : astropy.table.Table
+        Table containing the rows
+    """
+    if ',' in lines[0]:
+        return ascii.read(lines, format='no_header', names=colnames, delimiter=',', guess=False)
+    return ascii.read(lines, format='no_header', names=colnames, guess=False)
+
+
+def iter_catalog_chunks(catalog_file, chunk_size):
+    """Generator returning the rows of an ascii catalog in chunks. The
+    header and the first chunk are read using ``astropy.io.ascii`` with
+    format guessing, exactly as when reading the entire catalog. The
+    column names found there are used to parse the remaining chunks. If
+    the column names are in a comment line, the first chunk contains one
+    extra row.
+
+    If the catalog does not have an ``index`` column, one is added
+    containing the row numbers (starting at 1) of the sources in the
+    full catalog.
+
+    Parameters
+    ----------
+    catalog_file : str
+        Name of the catalog file
+
+    chunk_size : int
+        Number of rows in each chunk
+
+    Yields
+    ------
+    chunk : astropy.table.Table
+        Table containing the next rows of the catalog. The comments in
+        the catalog header are in ``chunk.meta['comments']``.
+    """
+    if chunk_size < 1:
+        raise ValueError(("Catalog chunk size must be at least 1. "
+                          "Value given was {}.".format(chunk_size)))
+
+    with open(catalog_file) as file_obj:
+        # Collect the header along with the first chunk of rows. One extra
+        # row is read, in case the column names are in the first
+        # non-comment line.
+        first_lines = []
+        num_rows = 0
+        for line in file_obj:
+            first_lines.append(line)
+            stripped = line.strip()
+            if len(stripped) > 0 and not stripped.startswith('#'):
+                num_rows += 1
+                if num_rows > chunk_size:
+                    break
+
+        chunk = ascii.read(first_lines)
+        colnames = chunk.colnames
+        dtypes = [chunk[colname].dtype for colname in colnames]
+        comments = chunk.meta.get('comments', [])
+        add_index = 'index' not in colnames
+        rows_read = len(chunk)
+        if add_index:
+            chunk.add_column(np.arange(1, rows_read + 1), name='index', index=0)
+        yield chunk
+
+        lines = []
+        for line in file_obj:
+            stripped = line.strip()
+            if len(stripped) == 0 or stripped.startswith('#'):
+                continue
+            lines.append(stripped)
+            if len(lines) == chunk_size:
+                yield make_chunk(lines, colnames, dtypes, comments, rows_read, add_index)
+                rows_read += len(lines)
+                lines = []
+        if len(lines) > 0:
+            yield make_chunk(lines, colnames, dtypes, comments, rows_read, add_index)
+
+
+def make_chunk(lines, colnames, dtypes, comments, rows_read, add_index):
+    """Create the table for a chunk of catalog rows, matching the column
+    types and comments of the first chunk
+
+    Parameters
+    ----------
+    lines : list
+        List of data rows (str)
+
+    colnames : list
+        Names of the catalog columns
+
+    dtypes : list
+        Data types of the columns in the first chunk
+
+    comments : list
+        Comments from the catalog header
+
+    rows_read : int
+        Number of rows in the catalog preceding this chunk
+
+    add_index : bool
+        If True, add an ``index`` column containing the row numbers
+
+    Returns
+    -------
+    chunk : astropy.table.Table
+        Table containing the rows
+    """
+    chunk = parse_rows(lines, colnames)
+    for colname, dtype in zip(colnames, dtypes):
+        if dtype.kind == 'f' and chunk[colname].dtype.kind in 'biu':
+            chunk[colname] = np.asarray(chunk[colname]).astype(dtype)
+    chunk.meta['comments'] = list(comments)
+    if add_index:
+        chunk.add_column(np.arange(rows_read + 1, rows_read + len(chunk) + 1), name='index', index=0)
+    return chunk
@@ -0,0 +1,332 @@
+#! /usr/bin/env python
+
+"""This module contains code for creating and using a spatial index of
+an ascii source catalog. The index holds the unit vectors of the source
+positions along with the byte offset of each source's row in the file.
+It is saved next to the catalog, and re-used until the catalog file
+changes. Querying the index for the sources near a pointing, and reading
+only those rows from the catalog, is much faster than reading and
+filtering a large catalog for every exposure.
+
+The index is rebuilt when the size of the catalog changes, or when its
+modification time changes and the SHA-1 hash of its contents no longer
+matches.
+
+Only catalogs with source positions in RA, Dec can be indexed.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.catalogs import spatial_index
+        catalog = spatial_index.read_catalog_near('my_catalog.cat', 53.1, -27.8, 0.1)
+"""
+
+import hashlib
+import os
+
+from astropy.coordinates import SkyCoord
+from astropy.io import ascii
+import astropy.units as u
+import numpy as np
+from scipy.spatial import cKDTree
+
+INDEX_SUFFIX = '.spatial_index.npz'
+
+# Indexes loaded so far in this process, keyed by catalog filename. Each
+# entry holds the modification time and size of the catalog along with
+# the index
+LOADED_INDEXES = {}
+
+
+def index_filename(catalog_file):
+    """Name of the file containing the spatial index of a catalog
+
+    Parameters
+    ----------
+    catalog_file : str
+        Name of the catalog file
+
+    Returns
+    -------
+    filename : str
+        Name of the index file
+    """
+    return catalog_file + INDEX_SUFFIX
+
+
+def file_hash(filename, block_size=2**20):
+    """Calculate the SHA-1 hash of the contents of a file
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file
+
+    block_size : int
+        Number of bytes to read at a time
+
+    Returns
+    -------
+    hash : str
+        Hexadecimal SHA-1 hash
+    """
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def row_offsets(catalog_file, num_rows):
+    """Find the byte offsets of the data rows in an ascii catalog
+
+    Parameters
+    ----------
+    catalog_file : str
+        Name of the catalog file
+
+    num_rows : int
+        Number of rows in the catalog, as read by ``astropy.io.ascii``
+
+    Returns
+    -------
+    offsets : numpy.ndarray
+        Byte offset of the start of each data row. None if the rows could
+        not be matched to the table read by ``astropy.io.ascii``.
+    """
+    offsets = []
+    position = 0
+    with open(catalog_file, 'rb') as file_obj:
+        for line in file_obj:
+            stripped = line.strip()
+            if len(stripped) > 0 and not stripped.startswith(b'#'):
+                offsets.append(position)
+            position += len(line)
+
+    if len(offsets) == num_rows:
+        # Column names are in a comment line
+        pass
+    elif len(offsets) == num_rows + 1:
+        # Column names are in the first non-comment line
+        offsets = offsets[1:]
+    else:
+        return None
+    return np.array(offsets, dtype=np.int64)
+
+
+def source_unit_vectors(ra, dec):
+    """Convert source positions to unit vectors
+
+    Parameters
+    ----------
+    ra : numpy.ndarray
+        RA values in degrees
+
+    dec : numpy.ndarray
+        Dec values in degrees
+
+    Returns
+    -------
+    vectors : numpy.ndarray
+        (N, 3) array of unit vectors
+    """
+    ra = np.radians(ra)
+    dec = np.radians(dec)
+    return np.column_stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+
+
+def build_index(catalog_file):
+    """Read in a catalog and create its spatial index. The index is saved
+    next to the catalog if possible.
+
+    Parameters
+    ----------
+    catalog_file : str
+        Name of the catalog file
+
+    Returns
+    -------
+    index : dict
+        Spatial index. None if the catalog cannot be indexed (e.g. source
+        positions are given in pixels)
+    """
+    print('Creating spatial index for {}'.format(catalog_file))
+    catalog = ascii.read(catalog_file)
+
+    comments = catalog.meta.get('comments', [])[0:4]
+    if 'position_pixels' in comments or 'x_or_RA' not in catalog.colnames:
+        return None
+
+    offsets = row_offsets(catalog_file, len(catalog))
+    if offsets is None or len(offsets) == 0:
+        print('Unable to match rows in {} to byte offsets. Not creating spatial index.'.format(catalog_file))
+        return None
+
+    # RA values that cannot be converted to floats are assumed to be in
+    # units of hours, as in Catalog_seed.remove_outside_fov_sources
+    try:
+        ra = np.asarray(catalog['x_or_RA']).astype(np.float64)
+        dec = np.asarray(catalog['y_or_Dec']).astype(np.float64)
+    except ValueError:
+        coords = SkyCoord(ra=catalog['x_or_RA'], dec=catalog['y_or_Dec'], unit=('hour', u.deg))
+        ra = coords.ra.deg
+        dec = coords.dec.deg
+
+    # Range of index numbers in the full catalog, used to number sources
+    # as when reading the full catalog
+    if 'index' in catalog.colnames:
+        index_range = np.array([np.min(catalog['index']), np.max(catalog['index'])], dtype=np.int64)
+    else:
+        index_range = np.array([1, len(catalog)], dtype=np.int64)
+
+    stat = os.stat(catalog_file)
+    index = {'vectors': source_unit_vectors(ra, dec), 'offsets': offsets,
+             'colnames': np.array(catalog.colnames),
+             'dtypes': np.array([catalog[colname].dtype.str for colname in catalog.colnames]),
+             'comments': np.array(catalog.meta.get('comments', []), dtype=str),
+             'has_index_column': 'index' in catalog.colnames, 'index_range': index_range,
+             'mtime': stat.st_mtime,
+             'size': stat.st_size, 'sha1': file_hash(catalog_file)}
+
+    try:
+        np.savez(index_filename(catalog_file), **index)
+    except OSError:
+        print('Unable to save spatial index for {}. Keeping it in memory only.'.format(catalog_file))
+    return index
+
+
+def load_index(catalog_file):
+    """Load the saved spatial index of a catalog, if it is up to date
+
+    Parameters
+    ----------
+    catalog_file : str
+        Name of the catalog file
+
+    Returns
+    -------
+    index : dict
+        Spatial index. None if there is no index or it is out of date
+    """
+    filename = index_filename(catalog_file)
+    if not os.path.isfile(filename):
+        return None
+
+    with np.load(filename) as saved:
+        index = {key: saved[key] for key in saved.files}
+
+    # Indexes saved by earlier versions lack some entries
+    if 'index_range' not in index:
+        return None
+    for key in ['has_index_column', 'mtime', 'size', 'sha1']:
+        index[key] = index[key].item()
+
+    stat = os.stat(catalog_file)
+    if stat.st_size != index['size']:
+        return None
+    if stat.st_mtime != index['mtime']:
+        # The file may have been touched without being changed
+        if file_hash(catalog_file) != index['sha1']:
+            return None
+    return index
+
+
+def get_index(catalog_file):
+    """Return the spatial index of a catalog, loading it or creating it as
+    necessary
+
+    Parameters
+    ----------
+    catalog_file : str
+        Name of the catalog file
+
+    Returns
+    -------
+    index : dict
+        Spatial index, including the k-d tree of the source positions.
+        None if the catalog cannot be indexed.
+    """
+    catalog_file = os.path.abspath(catalog_file)
+    stat = os.stat(catalog_file)
+    if catalog_file in LOADED_INDEXES:
+        mtime, size, index = LOADED_INDEXES[catalog_file]
+        if mtime == stat.st_mtime and size == stat.st_size:
+            return index
+
+    index = load_index(catalog_file)
+    if index is None:
+        index = build_index(catalog_file)
+    if index is not None:
+        index['tree'] = cKDTree(index['vectors'])
+    LOADED_INDEXES[catalog_file] = (stat.st_mtime, stat.st_size, index)
+    return index
+
+
+def read_catalog_near(catalog_file, ra, dec, radius):
+    """Read in only the rows of a catalog containing sources within a
+    given distance of a location. If the catalog does not have an
+    ``index`` column, one is added containing the row numbers (starting
+    at 1) of the sources in the full catalog. The range of index numbers
+    in the full catalog is saved in ``catalog.meta['index_range']``.
+
+    Parameters
+    ----------
+    catalog_file : str
+        Name of the catalog file
+
+    ra : float
+        RA of the center of the search area, in degrees
+
+    dec : float
+        Dec of the center of the search area, in degrees
+
+    radius : float
+        Radius of the search area, in degrees
+
+    Returns
+    -------
+    catalog : astropy.table.Table
+        Table containing the selected rows. None if the catalog cannot be
+        indexed, in which case the full catalog should be read instead.
+    """
+    index = get_index(catalog_file)
+    if index is None:
+        return None
+
+    center = source_unit_vectors(np.array([ra]), np.array([dec]))[0]
+    chord = 2. * np.sin(np.radians(min(radius, 180.)) / 2.)
+    rows = np.sort(np.array(index['tree'].query_ball_point(center, chord), dtype=np.int64))
+
+    # Always read at least one row, so that the table has the same
+    # columns as the full catalog
+    read_rows = rows if len(rows) > 0 else np.arange(1)
+    with open(catalog_file, 'rb') as file_obj:
+        contents = []
+        for offset in index['offsets'][read_rows]:
+            file_obj.seek(offset)
+            contents.append(file_obj.readline().rstrip(b'\r\n'))
+
+    colnames = list(index['colnames'])
+    lines = [line.decode() for line in contents]
+    if ',' in lines[0]:
+        catalog = ascii.read(lines, format='no_header', names=colnames, delimiter=',', guess=False)
+    else:
+        catalog = ascii.read(lines, format='no_header', names=colnames, guess=False)
+    catalog = catalog[0:len(rows)]
+
+    # Match the column types and comments of the full catalog
+    for colname, dtype in zip(colnames, index['dtypes']):
+        if np.dtype(dtype).kind in 'biuf':
+            catalog[colname] = np.asarray(catalog[colname]).astype(dtype)
+    catalog.meta['comments'] = list(index['comments'])
+
+    if not index['has_index_column']:
+        catalog.add_column(rows + 1, name='index', index=0)
+    catalog.meta['index_range'] = tuple(int(value) for value in index['index_range'])
+    print('Read {} of {} sources from {} using its spatial index'.format(len(rows), len(index['offsets']),
+                                                                       catalog_file))
+    return catalog
@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+
+"""This module contains a renderer that evaluates a gridded PSF library
+for many sources at once. Evaluating a ``griddedPSFModel`` one source at
+a time repeats the search for the neighbouring library PSFs, the bilinear
+interpolation of the oversampled PSFs, and the construction of the
+interpolating spline for every source. Since the spline interpolation is
+linear in the data, the interpolated PSF for a source is equal to the
+weighted sum of the splines of the four neighbouring library PSFs. This
+renderer therefore builds the spline for each library PSF only once,
+computes the neighbours and weights for all sources in a single step,
+and evaluates the stamps for a chunk of sources in stacked array
+operations.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.psf.psf_renderer import BatchedPSFRenderer
+        renderer = BatchedPSFRenderer(library, chunk_size=1000)
+        for stamp in renderer.iter_stamps(x_locations, y_locations, (51, 51)):
+            ...
+"""
+
+import numpy as np
+from scipy.interpolate import RectBivariateSpline
+
+
+class BatchedPSFRenderer():
+    def __init__(self, library, chunk_size=1000):
+        """Instantiate the renderer
+
+        Parameters
+        ----------
+        library : photutils.griddedPSFModel
+            Gridded PSF library
+
+        chunk_size : int
+            Maximum number of sources whose stamps are evaluated at the
+            same time. This limits the memory used by the renderer.
+        """
+        if chunk_size < 1:
+            raise ValueError(("PSF renderer chunk size must be at least 1. "
+                              "Value given was {}.".format(chunk_size)))
+        self.chunk_size = int(chunk_size)
+        self.data = np.asarray(library.data, dtype=np.float64)
+        self.grid_xypos = np.array(library.grid_xypos, dtype=np.float64)
+        self.grid_x = np.unique(self.grid_xypos[:, 0])
+        self.grid_y = np.unique(self.grid_xypos[:, 1])
+
+        # Oversampling factors in (y, x)
+        oversampling = np.atleast_1d(library.oversampling)
+        if len(oversampling) == 1:
+            oversampling = np.repeat(oversampling, 2)
+        self.oversampling = oversampling.astype(np.float64)
+
+        # Index of the library PSF at each (x, y) grid location
+        self.grid_index = np.zeros((len(self.grid_x), len(self.grid_y)), dtype=int)
+        x_idx = np.searchsorted(self.grid_x, self.grid_xypos[:, 0])
+        y_idx = np.searchsorted(self.grid_y, self.grid_xypos[:, 1])
+        self.grid_index[x_idx, y_idx] = np.arange(len(self.grid_xypos))
+
+        # Splines are created as they are needed
+        self.splines = {}
+
+    def interpolation_weights(self, x_locations, y_locations):
+        """Find the library PSFs surrounding each source, along with the
+        bilinear interpolation weights to apply to them. Sources outside
+        the library grid use the closest library PSF.
+
+        Parameters
+        ----------
+        x_locations : numpy.ndarray
+            1D array of source x-coordinates, in the coordinate system of
+            the library
+
+        y_locations : numpy.ndarray
+            1D array of source y-coordinates, in the coordinate system of
+            the library
+
+        Returns
+        -------
+        indices : numpy.ndarray
+            (N, 4) array of the indices of the library PSFs to combine
+
+        weights : numpy.ndarray
+            (N, 4) array of the weights of the library PSFs
+        """
+        x_locations = np.asarray(x_locations, dtype=np.float64)
+        y_locations = np.asarray(y_locations, dtype=np.float64)
+        num_sources = len(x_locations)
+        indices = np.zeros((num_sources, 4), dtype=int)
+        weights = np.zeros((num_sources, 4))
+
+        inside = ((x_locations >= self.grid_x[0]) & (x_locations <= self.grid_x[-1]) &
+                  (y_locations >= self.grid_y[0]) & (y_locations <= self.grid_y[-1]) &
+                  (len(self.grid_x) > 1) & (len(self.grid_y) > 1))
+
+        if np.any(inside):
+            x_in = x_locations[inside]
+            y_in = y_locations[inside]
+            x0 = np.clip(np.searchsorted(self.grid_x, x_in) - 1, 0, len(self.grid_x) - 2)
+            y0 = np.clip(np.searchsorted(self.grid_y, y_in) - 1, 0, len(self.grid_y) - 2)
+            x_frac = (x_in - self.grid_x[x0]) / (self.grid_x[x0 + 1] - self.grid_x[x0])
+            y_frac = (y_in - self.grid_y[y0]) / (self.grid_y[y0 + 1] - self.grid_y[y0])
+            indices[inside] = np.column_stack([self.grid_index[x0, y0], self.grid_index[x0, y0 + 1],
+                                               self.grid_index[x0 + 1, y0], self.grid_index[x0 + 1, y0 + 1]])
+            weights[inside] = np.column_stack([(1. - x_frac) * (1. - y_frac), (1. - x_frac) * y_frac,
+                                               x_frac * (1. - y_frac), x_frac * y_frac])
+
+        outside = ~inside
+        if np.any(outside):
+            distances = np.hypot(x_locations[outside, np.newaxis] - self.grid_xypos[:, 0],
+                                 y_locations[outside, np.newaxis] - self.grid_xypos[:, 1])
+            indices[outside] = np.argmin(distances, axis=1)[:, np.newaxis]
+            weights[outside, 0] = 1.
+
+        return indices, weights
+
+    def get_spline(self, index):
+        """Return the interpolating spline for a single library PSF
+
+        Parameters
+        ----------
+        index : int
+            Index of the PSF within the library
+
+        Returns
+        -------
+        spline : scipy.interpolate.RectBivariateSpline
+            Bicubic spline interpolating the oversampled PSF
+        """
+        if index not in self.splines:
+            ny, nx = self.data.shape[-2:]
+            self.splines[index] = RectBivariateSpline(np.arange(nx, dtype=np.float64),
+                                                      np.arange(ny, dtype=np.float64),
+                                                      self.data[index].T, kx=3, ky=3, s=0)
+        return self.splines[index]
+
+    def build_splines(self):
+        """Create the interpolating splines for all of the PSFs in the
+        library. This is useful before forking worker processes, so that
+        the splines are shared by the workers rather than being
+        re-created in each.
+        """
+        for index in range(len(self.data)):
+            self.get_spline(index)
+
+    def render(self, x_locations, y_locations, stamp_dims):
+        """Evaluate the PSF stamps for a group of sources. Each stamp is
+        evaluated on the pixel grid centered on the integer part of the
+        source location, i.e. pixel ``stamp_dims // 2`` of the stamp
+        contains the source.
+
+        Parameters
+        ----------
+        x_locations : numpy.ndarray
+            1D array of source x-coordinates, in the coordinate system of
+            the library
+
+        y_locations : numpy.ndarray
+            1D array of source y-coordinates, in the coordinate system of
+            the library
+
+        stamp_dims : tuple
+            (y, x) dimensions of the PSF stamps
+
+        Returns
+        -------
+        stamps : numpy.ndarray
+            3D array (source, y, x) of PSF stamps, each normalized as in
+            the library
+        """
+        x_locations = np.atleast_1d(np.asarray(x_locations, dtype=np.float64))
+        y_locations = np.atleast_1d(np.asarray(y_locations, dtype=np.float64))
+        y_dim, x_dim = stamp_dims
+        lib_ny, lib_nx = self.data.shape[-2:]
+        indices, weights = self.interpolation_weights(x_locations, y_locations)
+
+        # Coordinates of the stamp pixels in the oversampled frame of the
+        # library PSFs
+        x_start = np.floor(x_locations) - x_dim // 2
+        y_start = np.floor(y_locations) - y_dim // 2
+        x_lib = (self.oversampling[1] * (x_start[:, np.newaxis] + np.arange(x_dim) - x_locations[:, np.newaxis])
+                 + (lib_nx - 1) / 2.)
+        y_lib = (self.oversampling[0] * (y_start[:, np.newaxis] + np.arange(y_dim) - y_locations[:, np.newaxis])
+                 + (lib_ny - 1) / 2.)
+
+        stamps = np.zeros((len(x_locations), y_dim, x_dim))
+        for index in np.unique(indices):
+            source_weights = np.sum(np.where(indices == index, weights, 0.), axis=1)
+            use = source_weights != 0.
+            if not np.any(use):
+                continue
+            num_use = np.sum(use)
+            x_points = np.broadcast_to(x_lib[use, np.newaxis, :], (num_use, y_dim, x_dim))
+            y_points = np.broadcast_to(y_lib[use, :, np.newaxis], (num_use, y_dim, x_dim))
+            values = self.get_spline(index).ev(x_points.ravel(), y_points.ravel())
+            stamps[use] += source_weights[use, np.newaxis, np.newaxis] * values.reshape(num_use, y_dim, x_dim)
+
+        # Pixels beyond the edges of the library PSFs are set to zero
+        x_invalid = (x_lib < 0) | (x_lib > lib_nx - 1)
+        y_invalid = (y_lib < 0) | (y_lib > lib_ny - 1)
+        stamps[y_invalid[:, :, np.newaxis] | x_invalid[:, np.newaxis, :]] = 0.
+        return stamps
+
+    def iter_stamps(self, x_locations, y_locations, stamp_dims):
+        """Generator returning the PSF stamp for each source in turn. Stamps
+        are evaluated in chunks of ``chunk_size`` sources.
+
+        Parameters
+        ----------
+        x_locations : numpy.ndarray
+            1D array of source x-coordinates, in the coordinate system of
+            the library
+
+        y_locations : numpy.ndarray
+            1D array of source y-coordinates, in the coordinate system of
+            the library
+
+        stamp_dims : tuple
+            (y, x) dimensions of the PSF stamps
+
+        Yields
+        ------
+        stamp : numpy.ndarray
+            2D PSF stamp for a single source
+        """
+        x_locations = np.atleast_1d(np.asarray(x_locations, dtype=np.float64))
+        y_locations = np.atleast_1d(np.asarray(y_locations, dtype=np.float64))
+        for start in range(0, len(x_locations), self.chunk_size):
+            stamps = self.render(x_locations[start:start + self.chunk_size],
+                                 y_locations[start:start + self.chunk_size], stamp_dims)
+            for stamp in stamps:
+                yield stamp
@@ -0,0 +1,200 @@
+#! /usr/bin/env python
+
+"""This module contains a cache of evaluated PSF stamps. Sources that
+fall within the same cell of a gridded PSF library and that share the
+same (quantized) sub-pixel phase produce nearly identical PSF stamps,
+so in crowded fields the stamp can be evaluated once and re-used,
+rather than evaluating the ``griddedPSFModel`` for every source.
+
+Each stamp is evaluated at a reference pixel within its grid cell, plus
+the quantized sub-pixel phase, so that it depends only on the cache key
+and not on which source was the first to use it. Since a stamp is stored
+relative to the pixel containing the source, it can then be placed on
+the pixel grid of any source sharing the key.
+
+Stamps are kept in a least-recently-used cache whose total size is
+limited to a given amount of memory.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.psf.stamp_cache import PSFStampCache
+        cache = PSFStampCache(subpixel_step=0.1, max_memory_mb=512.)
+        stamp = cache.get_stamp(library, 1023.4, 998.7, (51, 51))
+        print(cache.summary())
+"""
+
+from collections import OrderedDict
+import math
+
+import numpy as np
+
+
+class PSFStampCache():
+    def __init__(self, subpixel_step=0.1, max_memory_mb=512.):
+        """Instantiate the PSF stamp cache
+
+        Parameters
+        ----------
+        subpixel_step : float
+            Step size, in pixels, used to quantize the sub-pixel phase
+            of the sources. Must be between 0 and 1.
+
+        max_memory_mb : float
+            Maximum amount of memory, in MB, used to store PSF stamps.
+            When this is exceeded, the least recently used stamps are
+            removed from the cache.
+        """
+        if subpixel_step <= 0. or subpixel_step > 1.:
+            raise ValueError(("PSF stamp cache subpixel step must be between 0 and 1. "
+                              "Value given was {}.".format(subpixel_step)))
+        self.subpixel_step = subpixel_step
+        self.max_bytes = max_memory_mb * 1024. * 1024.
+        self.stamps = OrderedDict()
+        self.grids = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def grid_cell(self, library, x_location, y_location):
+        """Find the cell of the PSF library grid in which the given
+        location falls
+
+        Parameters
+        ----------
+        library : photutils.griddedPSFModel
+            Gridded PSF library
+
+        x_location : float
+            X-coordinate of the source, in the full frame coordinate system
+            used by the library
+
+        y_location : float
+            Y-coordinate of the source, in the full frame coordinate system
+            used by the library
+
+        Returns
+        -------
+        cell : tuple
+            (x, y) index of the grid cell containing the location
+        """
+        library_id = id(library)
+        if library_id not in self.grids:
+            grid_xypos = np.array(library.grid_xypos)
+            self.grids[library_id] = (np.unique(grid_xypos[:, 0]), np.unique(grid_xypos[:, 1]))
+        grid_x, grid_y = self.grids[library_id]
+        return (int(np.searchsorted(grid_x, x_location)), int(np.searchsorted(grid_y, y_location)))
+
+    def reference_pixel(self, library, cell):
+        """Find the pixel at which the stamps of a grid cell are evaluated.
+        This is the pixel containing the center of the cell, or the outermost
+        library grid point for cells beyond the edges of the grid.
+
+        Parameters
+        ----------
+        library : photutils.griddedPSFModel
+            Gridded PSF library
+
+        cell : tuple
+            (x, y) index of the grid cell, from ``grid_cell``
+
+        Returns
+        -------
+        pixel : tuple
+            (x, y) integer coordinates of the reference pixel
+        """
+        pixel = []
+        for grid, index in zip(self.grids[id(library)], cell):
+            if index == 0:
+                pixel.append(math.floor(grid[0]))
+            elif index == len(grid):
+                pixel.append(math.floor(grid[-1]))
+            else:
+                pixel.append(math.floor((grid[index - 1] + grid[index]) / 2.))
+        return tuple(pixel)
+
+    def get_stamp(self, library, x_location, y_location, stamp_dims):
+        """Return the PSF stamp for a source at the given location. The stamp
+        covers the grid of pixels centered on the integer part of the
+        location, with the sub-pixel phase quantized to ``subpixel_step``.
+        It is evaluated at the reference pixel of the library grid cell
+        containing the location, so that it is the same for all sources
+        sharing the cell and quantized phase.
+
+        Parameters
+        ----------
+        library : photutils.griddedPSFModel
+            Gridded PSF library
+
+        x_location : float
+            X-coordinate of the source, in the full frame coordinate system
+            used by the library
+
+        y_location : float
+            Y-coordinate of the source, in the full frame coordinate system
+            used by the library
+
+        stamp_dims : tuple
+            (y, x) dimensions of the PSF stamp
+
+        Returns
+        -------
+        stamp : numpy.ndarray
+            2D array containing the PSF stamp. This is the cached array,
+            so it should not be modified by the caller.
+        """
+        x_floor = math.floor(x_location)
+        y_floor = math.floor(y_location)
+
+        # Quantize the sub-pixel phase. A phase that rounds up to 1.0 is
+        # kept as a separate entry, since the stamp is placed on the
+        # pixel grid of the original integer location
+        x_phase = int(round((x_location - x_floor) / self.subpixel_step))
+        y_phase = int(round((y_location - y_floor) / self.subpixel_step))
+
+        cell = self.grid_cell(library, x_location, y_location)
+        key = (id(library), cell, x_phase, y_phase, tuple(stamp_dims))
+
+        if key in self.stamps:
+            self.hits += 1
+            self.stamps.move_to_end(key)
+            return self.stamps[key]
+
+        self.misses += 1
+        x_reference, y_reference = self.reference_pixel(library, cell)
+        y_dim, x_dim = stamp_dims
+        x_points = x_reference - x_dim // 2 + np.arange(x_dim)
+        y_points = y_reference - y_dim // 2 + np.arange(y_dim)
+        x_grid, y_grid = np.meshgrid(x_points, y_points)
+        stamp = library.evaluate(x=x_grid, y=y_grid, flux=1.,
+                                 x_0=x_reference + x_phase * self.subpixel_step,
+                                 y_0=y_reference + y_phase * self.subpixel_step)
+        stamp.setflags(write=False)
+
+        self.stamps[key] = stamp
+        self.nbytes += stamp.nbytes
+
+        # Remove the least recently used stamps if the cache is too large
+        while self.nbytes > self.max_bytes and len(self.stamps) > 1:
+            removed_key, removed_stamp = self.stamps.popitem(last=False)
+            self.nbytes -= removed_stamp.nbytes
+            self.evictions += 1
+        return stamp
+
+    def summary(self):
+        """Create a summary of the cache usage
+
+        Returns
+        -------
+        summary : str
+            Description of the number of cache hits, misses and evictions
+        """
+        total = self.hits + self.misses
+        hit_rate = 100. * self.hits / total if total > 0 else 0.
+        return ("PSF stamp cache: {} hits, {} misses ({:.1f}% hit rate), {} evictions. "
+                "{} stamps cached, using {:.1f} MB.".format(self.hits, self.misses, hit_rate,
+                                                             self.evictions, len(self.stamps),
+                                                             self.nbytes / 1024. / 1024.))
@@ -0,0 +1,195 @@
+#! /usr/bin/env python
+
+"""This module contains a process-wide cache of the cosmic ray library.
+
+The library consists of 10 fits files for each combination of library
+(e.g. SUNMIN) and suffix (e.g. IPC_NIRCam_B5). The first time a file is
+used, its stamps are converted to a ``.npy`` file, which is then memory
+mapped read-only. Later exposures, in the same process or in other
+processes, map the converted file rather than reading the fits file, so
+startup is nearly instant. Since the mapped pages are shared through the
+operating system's page cache, several worker processes simulating
+exposures in parallel share a single copy of the library in memory.
+
+Converted files are written next to the library files, unless another
+directory is given. A converted file is recreated if its fits file is
+newer. If the converted file cannot be written (e.g. the library is in a
+read-only directory), the fits file is read into memory instead.
+
+Within a process, the mapped libraries are kept in a cache, keyed by the
+library path, suffix and directory of the converted files.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.ramp_generator.cosmic_ray_library import LIBRARY_CACHE
+        images, headers = LIBRARY_CACHE.get('/path/to/CRs_MCD1.7_SUNMIN', 'IPC_NIRCam_B5')
+        print(LIBRARY_CACHE.summary())
+"""
+
+from collections import OrderedDict
+import os
+
+from astropy.io import fits
+import numpy as np
+
+
+# Number of files in each cosmic ray library
+NUMBER_OF_FILES = 10
+
+
+class CosmicRayLibraryCache():
+    def __init__(self):
+        """Instantiate the cache"""
+        self.libraries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.conversions = 0
+
+    def library_files(self, crfile, suffix):
+        """Create the names of the fits files making up a library
+
+        Parameters
+        ----------
+        crfile : str
+            Path and base name of the library files
+            (e.g. '/path/to/CRs_MCD1.7_SUNMIN')
+
+        suffix : str
+            Suffix of the library file names (e.g. 'IPC_NIRCam_B5')
+
+        Returns
+        -------
+        filenames : list
+            Names of the fits files
+        """
+        return ['{}_{:02d}_{}.fits'.format(crfile, i, suffix) for i in range(NUMBER_OF_FILES)]
+
+    def memmap_filename(self, filename, memmap_dir=None):
+        """Create the name of the converted version of a library file
+
+        Parameters
+        ----------
+        filename : str
+            Name of the fits file
+
+        memmap_dir : str
+            Directory of the converted file. If None, the directory of
+            the fits file is used.
+
+        Returns
+        -------
+        memmap_file : str
+            Name of the ``.npy`` file
+        """
+        if memmap_dir is None:
+            memmap_dir = os.path.dirname(filename)
+        basename = os.path.splitext(os.path.basename(filename))[0]
+        return os.path.join(memmap_dir, basename + '.npy')
+
+    def get(self, crfile, suffix, memmap_dir=None):
+        """Return the stamps and headers of a library, loading the library
+        if it is not in the cache
+
+        Parameters
+        ----------
+        crfile : str
+            Path and base name of the library files
+            (e.g. '/path/to/CRs_MCD1.7_SUNMIN')
+
+        suffix : str
+            Suffix of the library file names (e.g. 'IPC_NIRCam_B5')
+
+        memmap_dir : str
+            Directory of the converted files. If None, they are placed
+            next to the library files.
+
+        Returns
+        -------
+        images : list
+            List of 10 read-only 3D arrays, each containing the cosmic
+            ray stamps of one library file
+
+        headers : list
+            List of the primary headers of the library files
+        """
+        key = (os.path.abspath(crfile), suffix, memmap_dir)
+        if key in self.libraries:
+            self.hits += 1
+            self.libraries.move_to_end(key)
+            return self.libraries[key]
+
+        self.misses += 1
+        images = []
+        headers = []
+        for filename in self.library_files(crfile, suffix):
+            images.append(self.load(filename, memmap_dir))
+            headers.append(fits.getheader(filename, 0))
+        self.libraries[key] = (images, headers)
+        return images, headers
+
+    def load(self, filename, memmap_dir=None):
+        """Memory map the stamps of one library file, converting the fits
+        file if necessary
+
+        Parameters
+        ----------
+        filename : str
+            Name of the fits file
+
+        memmap_dir : str
+            Directory of the converted file. If None, the directory of
+            the fits file is used.
+
+        Returns
+        -------
+        image : numpy.ndarray
+            Read-only 3D array of cosmic ray stamps
+        """
+        memmap_file = self.memmap_filename(filename, memmap_dir)
+        if os.path.isfile(memmap_file) and os.path.getmtime(memmap_file) >= os.path.getmtime(filename):
+            return np.load(memmap_file, mmap_mode='r')
+
+        with fits.open(filename) as hdulist:
+            image = hdulist[1].data
+            image = image.astype(image.dtype.newbyteorder('='))
+
+        # Write to a temporary file first, so that other processes never
+        # map a partially written file
+        temporary_file = '{}.{}.tmp'.format(memmap_file, os.getpid())
+        try:
+            if memmap_dir is not None:
+                os.makedirs(memmap_dir, exist_ok=True)
+            with open(temporary_file, 'wb') as memmap_output:
+                np.save(memmap_output, image)
+            os.replace(temporary_file, memmap_file)
+        except OSError as error:
+            print(("WARNING: unable to write memory mapped cosmic ray library file {} ({}). "
+                   "Using the fits file instead.".format(memmap_file, error)))
+            if os.path.isfile(temporary_file):
+                os.remove(temporary_file)
+            image.flags.writeable = False
+            return image
+        self.conversions += 1
+        return np.load(memmap_file, mmap_mode='r')
+
+    def summary(self):
+        """Create a summary of the cache usage
+
+        Returns
+        -------
+        summary : str
+            Description of the number of cache hits, misses and converted
+            library files
+        """
+        return ("Cosmic ray library cache: {} hits, {} misses, {} library files converted."
+                .format(self.hits, self.misses, self.conversions))
+
+
+# Cache shared by all simulations in this process. Worker processes
+# created by forking inherit the mapped libraries.
+LIBRARY_CACHE = CosmicRayLibraryCache()
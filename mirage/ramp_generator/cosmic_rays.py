@@ -0,0 +1,211 @@
+#! /usr/bin/env python
+
+"""This module contains the function used to add cosmic rays from the
+cosmic ray library to a frame.
+
+The hits in a frame are handled in batches of a fixed size. The positions
+of the hits in each batch, and the library file and stamp used for each,
+are drawn as arrays from a ``numpy.random.Generator`` seeded with the
+given seed, so the cosmic rays added to a frame are reproducible, and do
+not depend on the batch size. The stamps are gathered from the
+library, one library file at a time, and added to a strided view of all
+stamp-sized windows of the frame. Overlapping stamps must accumulate, so
+the hits are split into a few rounds, within which no two stamps overlap,
+and each round is added to the frame at once. Parts of stamps falling
+outside the frame are discarded.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.ramp_generator.cosmic_rays import add_cosmic_rays
+        frame, hits = add_cosmic_rays(frame, cosmic_ray_library, gain_image, 25, seed=66233)
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+# Number of stamps drawn from in each file of the cosmic ray library
+STAMPS_PER_FILE = 1000
+
+# Number of hits handled at once, which bounds the memory used by the
+# gathered stamps
+BATCH_SIZE = 10000
+
+
+def add_cosmic_rays(image, library, gain, ncr, seed, batch_size=BATCH_SIZE):
+    """Add cosmic rays to a frame, in place
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        2D frame, in ADU, to add cosmic rays to
+
+    library : list
+        List of 3D arrays, one per file of the cosmic ray library, each
+        containing square cosmic ray stamps in electrons
+
+    gain : float or numpy.ndarray
+        Gain, in e-/ADU. Either a single value or a 2D image matching
+        ``image``. Each stamp is divided by the gain at the pixels it lands on.
+
+    ncr : int
+        Number of cosmic rays to add to the frame
+
+    seed : int
+        Seed to use for random number generator
+
+    batch_size : int
+        Number of hits handled at once
+
+    Returns
+    -------
+    image : numpy.ndarray
+        Input image with cosmic rays added
+
+    hits : dict
+        Summary of the hits, with keys 'x' and 'y' (center of the part of
+        each stamp within the frame), 'file' and 'stamp' (library file and
+        stamp indexes) and 'max_signal' (maximum signal, in electrons,
+        of the part of each stamp within the frame). Each value is a
+        1D array with one entry per hit.
+    """
+    nray = int(ncr)
+    gain = np.broadcast_to(np.asarray(gain, dtype=np.float64), image.shape)
+
+    # Draw the position of each hit, and the library stamp used. Drawing
+    # the hits of each batch in turn from the same generator gives the
+    # same values as drawing all hits at once.
+    generator = np.random.default_rng(seed)
+    batch_sizes = [min(batch_size, nray - start) for start in range(0, nray, batch_size)] or [0]
+    batch_hits = []
+    for size in batch_sizes:
+        draws = generator.random((size, 4))
+        batch_hits.append(add_cosmic_ray_batch(image, library, gain, draws))
+    hits = {key: np.concatenate([batch[key] for batch in batch_hits]) for key in batch_hits[0]}
+    return image, hits
+
+
+def add_cosmic_ray_batch(image, library, gain, draws):
+    """Add a batch of cosmic rays to a frame, in place
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        2D frame, in ADU, to add cosmic rays to
+
+    library : list
+        List of 3D arrays, one per file of the cosmic ray library, each
+        containing square cosmic ray stamps in electrons
+
+    gain : numpy.ndarray
+        2D gain image, in e-/ADU, matching ``image``
+
+    draws : numpy.ndarray
+        2D array of uniform random values in [0, 1), with one row per hit.
+        The columns give the y and x positions of the hit, and the library
+        file and stamp used.
+
+    Returns
+    -------
+    hits : dict
+        Summary of the hits, as returned by ``add_cosmic_rays``
+    """
+    nray = len(draws)
+    ydim, xdim = image.shape
+    y_hit = (draws[:, 0] * ydim).astype(int)
+    x_hit = (draws[:, 1] * xdim).astype(int)
+    file_index = (draws[:, 2] * len(library)).astype(int)
+    stamp_index = (draws[:, 3] * STAMPS_PER_FILE).astype(int)
+
+    # Gather the stamps
+    stamp_size = library[0].shape[-1]
+    half = stamp_size // 2
+    stamps = np.zeros((nray, stamp_size, stamp_size))
+    for index in np.unique(file_index):
+        match = file_index == index
+        stamps[match] = library[index][stamp_index[match]]
+
+    # Each stamp is added to a window of the frame. Stamps overlapping the
+    # edges of the frame are shifted into a window within the frame, with
+    # the pixels falling outside the frame set to zero.
+    window_y = min(stamp_size, ydim)
+    window_x = min(stamp_size, xdim)
+    y_window = np.clip(y_hit - half, 0, ydim - window_y)
+    x_window = np.clip(x_hit - half, 0, xdim - window_x)
+    y_shift = y_window - (y_hit - half)
+    x_shift = x_window - (x_hit - half)
+    max_signal = np.max(stamps, axis=(1, 2), initial=-np.inf)
+    edge = np.where((y_shift != 0) | (x_shift != 0) | (window_y < stamp_size) | (window_x < stamp_size))[0]
+    if len(edge) > 0:
+        stamp_rows = np.arange(window_y)[None, :] + y_shift[edge, None]
+        stamp_cols = np.arange(window_x)[None, :] + x_shift[edge, None]
+        valid = (((stamp_rows >= 0) & (stamp_rows < stamp_size))[:, :, None]
+                 & ((stamp_cols >= 0) & (stamp_cols < stamp_size))[:, None, :])
+        shifted = stamps[edge[:, None, None], np.clip(stamp_rows, 0, stamp_size - 1)[:, :, None],
+                         np.clip(stamp_cols, 0, stamp_size - 1)[:, None, :]]
+        max_signal[edge] = np.max(np.where(valid, shifted, -np.inf), axis=(1, 2))
+        stamps = stamps[:, :window_y, :window_x]
+        stamps[edge] = np.where(valid, shifted, 0.)
+
+    # Insert cosmic rays (divided by gain to put into ADU). The windows are
+    # added in rounds in which no two windows overlap, so that no signal is
+    # lost when windows are updated together. Windows whose positions fall
+    # in non-adjacent cells of a grid of window-sized cells cannot overlap.
+    frame_windows = frame_window_view(image, window_y, window_x)
+    gain_windows = frame_window_view(gain, window_y, window_x)
+    y_cell = y_window // window_y
+    x_cell = x_window // window_x
+    cell = y_cell * (xdim // window_x + 1) + x_cell
+    order = np.argsort(cell, kind='stable')
+    sorted_cell = cell[order]
+    cell_start = np.searchsorted(sorted_cell, sorted_cell)
+    rank = np.empty(nray, dtype=int)
+    rank[order] = np.arange(nray) - cell_start
+    insert_round = rank * 4 + (y_cell % 2) * 2 + x_cell % 2
+    for value in np.unique(insert_round):
+        match = np.where(insert_round == value)[0]
+        ys = y_window[match]
+        xs = x_window[match]
+        frame_windows[ys, xs] += stamps[match] / gain_windows[ys, xs]
+
+    y_low = np.maximum(y_hit - half, 0)
+    y_high = np.minimum(y_hit + half + 1, ydim)
+    x_low = np.maximum(x_hit - half, 0)
+    x_high = np.minimum(x_hit + half + 1, xdim)
+    hits = {'x': (x_high - x_low) / 2 + x_low,
+            'y': (y_high - y_low) / 2 + y_low,
+            'file': file_index,
+            'stamp': stamp_index,
+            'max_signal': max_signal}
+    return hits
+
+
+def frame_window_view(image, window_y, window_x):
+    """Create a view of all windows of a given size within a frame,
+    without copying the frame. Updating the view updates the frame.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        2D frame
+
+    window_y : int
+        Number of rows in each window
+
+    window_x : int
+        Number of columns in each window
+
+    Returns
+    -------
+    windows : numpy.ndarray
+        4D view, where ``windows[y, x]`` is the window whose lower left
+        corner is at (x, y) in the frame
+    """
+    ydim, xdim = image.shape
+    return as_strided(image, shape=(ydim - window_y + 1, xdim - window_x + 1, window_y, window_x),
+                      strides=image.strides * 2)
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+
+"""This module contains the engine used to add interpixel capacitance
+(IPC) effects to an exposure, by convolving each group with the IPC
+kernel.
+
+Rather than convolving one group at a time, the groups of each integration
+are convolved in chunks, whose size is chosen to keep the memory used by
+temporary arrays below a given limit.
+
+For a 2D kernel, each chunk is convolved with a single call to
+``scipy.ndimage.correlate``, using a (1, ky, kx) kernel so that groups
+are not mixed. For a 4D kernel, which gives a separate (ky, kx) kernel
+for each pixel, the product of each kernel element with the shifted
+groups is accumulated in place, using a single scratch array for the
+whole chunk. As in the JWST calibration pipeline, the central kernel
+element is added last, and pixels beyond the edges of the data are
+treated as zero.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.ramp_generator.ipc import IPCConvolver
+        convolver = IPCConvolver(kernel, max_memory_mb=256.)
+        convolver.convolve(exposure[:, :, 4:2044, 4:2044])
+"""
+
+import numpy as np
+from scipy import ndimage
+
+
+class IPCConvolver():
+    def __init__(self, kernel, max_memory_mb=256.):
+        """Instantiate the IPC engine
+
+        Parameters
+        ----------
+        kernel : numpy.ndarray
+            2D (ky, kx) IPC kernel, or 4D (ky, kx, ny, nx) kernel giving a
+            separate kernel for each pixel of the data to be convolved
+
+        max_memory_mb : float
+            Approximate maximum amount of memory, in MB, used for the
+            temporary arrays of each chunk of groups. At least one group
+            is convolved at a time.
+        """
+        if kernel.ndim not in [2, 4]:
+            raise ValueError("IPC kernel must be 2D or 4D, but has {} dimensions.".format(kernel.ndim))
+        self.kernel = kernel
+        self.max_bytes = max_memory_mb * 1024. * 1024.
+
+    def chunk_size(self, frame_shape):
+        """Find the number of groups convolved at once
+
+        Parameters
+        ----------
+        frame_shape : tuple
+            (y, x) shape of each group
+
+        Returns
+        -------
+        ngroups : int
+            Number of groups in each chunk
+        """
+        ky, kx = self.kernel.shape[0:2]
+        # Each chunk needs an output array, plus a zero-padded copy of the
+        # groups and a scratch array for 4D kernels
+        if self.kernel.ndim == 2:
+            group_bytes = 8. * frame_shape[0] * frame_shape[1]
+        else:
+            group_bytes = 8. * (2 * frame_shape[0] * frame_shape[1]
+                                + (frame_shape[0] + ky - 1) * (frame_shape[1] + kx - 1))
+        return max(int(self.max_bytes // group_bytes), 1)
+
+    def convolve(self, data):
+        """Convolve each group of an exposure with the IPC kernel, in place
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            4D (integration, group, y, x) array. This may be a view of a
+            portion of a larger array (e.g. excluding reference pixels),
+            in which case only that portion is changed.
+        """
+        if self.kernel.ndim == 4 and self.kernel.shape[2:] != data.shape[2:]:
+            raise ValueError(("4D IPC kernel covers {} pixels, but the data contain {} pixels."
+                              .format(self.kernel.shape[2:], data.shape[2:])))
+        ngroups = self.chunk_size(data.shape[2:])
+        for integration in range(data.shape[0]):
+            for start in range(0, data.shape[1], ngroups):
+                chunk = data[integration, start:start + ngroups]
+                if self.kernel.ndim == 2:
+                    chunk[...] = self.convolve_2d(chunk)
+                else:
+                    chunk[...] = self.convolve_4d(chunk)
+
+    def convolve_2d(self, chunk):
+        """Convolve a chunk of groups with a 2D kernel
+
+        Parameters
+        ----------
+        chunk : numpy.ndarray
+            3D (group, y, x) array
+
+        Returns
+        -------
+        convolved : numpy.ndarray
+            3D array of convolved groups
+        """
+        # Convolution is correlation with the flipped kernel. Correlating
+        # with an odd or even sized kernel centered on pixel (ky // 2, kx // 2)
+        # matches the pipeline's convolution.
+        weights = self.kernel[::-1, ::-1][np.newaxis, :, :].astype(np.float64)
+        return ndimage.correlate(chunk, weights, mode='constant', cval=0.)
+
+    def convolve_4d(self, chunk):
+        """Convolve a chunk of groups with a 4D kernel
+
+        Parameters
+        ----------
+        chunk : numpy.ndarray
+            3D (group, y, x) array
+
+        Returns
+        -------
+        convolved : numpy.ndarray
+            3D array of convolved groups
+        """
+        ky, kx = self.kernel.shape[0:2]
+        ngroup, ny, nx = chunk.shape
+
+        # Zero-padded copy of the groups, so that the convolution can be
+        # done without checking for out of bounds
+        b_b = ky // 2
+        l_b = kx // 2
+        padded = np.zeros((ngroup, ny + ky - 1, nx + kx - 1), dtype=chunk.dtype)
+        padded[:, b_b:b_b + ny, l_b:l_b + nx] = chunk
+
+        convolved = np.zeros(chunk.shape, dtype=np.result_type(self.kernel, chunk))
+        scratch = np.empty(chunk.shape, dtype=convolved.dtype)
+        middle_j = ky // 2
+        middle_i = kx // 2
+        elements = [(j, i) for j in range(ky) for i in range(kx) if (j, i) != (middle_j, middle_i)]
+
+        # The middle pixel of the IPC kernel is expected to be the largest,
+        # so add that last
+        for j, i in elements + [(middle_j, middle_i)]:
+            jstart = ky - j - 1
+            istart = kx - i - 1
+            np.multiply(self.kernel[j, i], padded[:, jstart:jstart + ny, istart:istart + nx], out=scratch)
+            convolved += scratch
+        return convolved
@@ -29,7 +29,6 @@ Use:
 
 import sys
 import os
-import random
 import copy
 from math import radians
 import datetime
@@ -45,10 +44,15 @@ from astropy.time import Time, TimeDelta
 import pysiaf
 
 from mirage.ramp_generator import unlinearize
+from mirage.ramp_generator.cosmic_ray_library import LIBRARY_CACHE
+from mirage.ramp_generator.cosmic_rays import add_cosmic_rays
+from mirage.ramp_generator.ipc import IPCConvolver
+from mirage.ramp_generator.poisson_noise import PoissonNoiseEngine
 from mirage.reference_files import crds_tools
 from mirage.utils import read_fits, utils, siaf_interface
 from mirage.utils import set_telescope_pointing_separated as stp
 from mirage.utils.constants import EXPTYPES
+from mirage.utils.profiling import StageProfiler, profiling_requested
 from mirage import version
 
 MIRAGE_VERSION = version.__version__
@@ -95,6 +99,13 @@ class Observation():
         # Check that CRDS-related environment variables are set correctly
         self.crds_datadir = crds_tools.env_variables()
 
+        # Stage timing and memory profiler. Enabled in create if
+        # requested in the input yaml file
+        self.profiler = StageProfiler(enabled=False)
+
+        # Engine used to add Poisson noise. Created in add_crs_and_noise
+        self.poisson_engine = None
+
     def add_crosstalk(self, exposure):
         """Add crosstalk effects to the input exposure
 
@@ -168,18 +179,24 @@ class Observation():
         sim_exposure = np.zeros((nint, ngroups, yd, xd))
         sim_zero = np.zeros((nint, yd, xd))
 
+        self.poisson_engine = PoissonNoiseEngine(self.params['simSignals']['poissonseed'], gain=self.gainim,
+                                                 workers=self.params['simSignals']['poisson_workers'])
         for integ in range(nint):
             print("Integration {}:".format(integ))
+            self.poisson_engine.start_integration(integ)
             if seeddim == 2:
                 inseed = seed
             elif seeddim == 4:
                 inseed = seed[integ, :, :, :]
-            if self.runStep['cosmicray']:
+            if self.params['simSignals']['group_noise_synthesis']:
+                ramp, rampzero = self.synthesize_groups(inseed)
+            elif self.runStep['cosmicray']:
                 ramp, rampzero = self.frame_to_ramp(inseed)
             else:
                 ramp, rampzero = self.frame_to_ramp_no_cr(inseed)
             sim_exposure[integ, :, :, :] = ramp
             sim_zero[integ, :, :] = rampzero
+        self.poisson_engine.close()
         return sim_exposure, sim_zero
 
     def add_detector_effects(self, ramp):
@@ -228,9 +245,10 @@ class Observation():
         """
         Add interpixel capacitance effects to the data. This is done by
         convolving the data with a kernel. The kernel is read in from the
-        file specified by self.params['Reffiles']['ipc']. The core of this
-        function was copied from the IPC correction step in the JWST
-        calibration pipeline.
+        file specified by self.params['Reffiles']['ipc']. The convolution
+        is done by mirage.ramp_generator.ipc.IPCConvolver, whose core was
+        adapted from the IPC correction step in the JWST calibration
+        pipeline.
 
         Parameters
         ----------
@@ -269,8 +287,9 @@ class Observation():
         # Get IPC kernel data
         try:
             # If add_ipc has already been called, then the correct
-            # IPC kernel already exists, in self.kernel
-            kernel = np.copy(self.kernel)
+            # IPC kernel already exists, in self.kernel. The kernel
+            # is not modified below, so it does not need to be copied.
+            kernel = self.kernel
         except:
             # If add_ipc has not been called yet, then read in the
             # kernel from the specified file.
@@ -287,91 +306,18 @@ class Observation():
         # These axes lengths exclude reference pixels, if there are any.
         ny = shape[-2] - (bottom_rows + top_rows)
         nx = shape[-1] - (left_columns + right_columns)
-
-        # The temporary array temp is larger than the science part of
-        # output_data by a border (set to zero) that's about half of the
-        # kernel size, so the convolution can be done without checking for
-        # out of bounds.
-        # b_b, t_b, l_b, and r_b are the widths of the borders on the
-        # bottom, top, left, and right, respectively.
-        b_b = kshape[0] // 2
-        t_b = kshape[0] - b_b - 1
-        l_b = kshape[1] // 2
-        r_b = kshape[1] - l_b - 1
-        tny = ny + b_b + t_b
         yoff = bottom_rows           # offset in output_data
-        tnx = nx + l_b + r_b
         xoff = left_columns          # offset in output_data
 
-        # Loop over integrations and groups
-        for integration in range(shape[0]):
-            for group in range(shape[1]):
-
-                # Copy the science portion (not the reference pixels) of
-                # output_data to this temporary array, then make
-                # subsequent changes in-place to output_data.
-                temp = np.zeros((tny, tnx), dtype=output_data.dtype)
-                temp[b_b:b_b + ny, l_b:l_b + nx] = \
-                    output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx].copy()
-
-                # After setting this slice to zero, we'll incrementally add
-                # to it.
-                output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] = 0.
-
-                if len(kshape) == 2:
-                    # 2-D IPC kernel.  Loop over pixels of the deconvolution
-                    # kernel. In this section, `part` has the same shape
-                    # as `temp`.
-                    middle_j = kshape[0] // 2
-                    middle_i = kshape[1] // 2
-                    for j in range(kshape[0]):
-                        jstart = kshape[0] - j - 1
-                        for i in range(kshape[1]):
-                            if i == middle_i and j == middle_j:
-                                continue  # the middle pixel is done last
-                            part = kernel[j, i] * temp
-                            istart = kshape[1] - i - 1
-                            output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] += \
-                                part[jstart:jstart + ny, istart:istart + nx]
-                    # The middle pixel of the IPC kernel is expected to be
-                    # the largest, so add that last.
-                    part = kernel[middle_j, middle_i] * temp
-                    output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] += \
-                        part[middle_j:middle_j + ny, middle_i:middle_i + nx]
+        # A 4-D kernel is cropped to the science data (i.e. possibly a
+        # subarray, and certainly excluding reference pixels)
+        if len(kshape) == 4:
+            kernel = kernel[:, :, yoff:yoff + ny, xoff:xoff + nx]
 
-                else:
-                    # 4-D IPC kernel.  Extract a subset of the kernel:
-                    # all of the first two axes, but only the portion
-                    # of the last two axes corresponding to the science
-                    # data (i.e. possibly a subarray,
-                    # and certainly excluding reference pixels).
-                    k_temp = np.zeros((kshape[0], kshape[1], tny, tnx),
-                                      dtype=kernel.dtype)
-                    k_temp[:, :, b_b:b_b + ny, l_b:l_b + nx] = \
-                        kernel[:, :, yoff:yoff + ny, xoff:xoff + nx]
-
-                    # In this section, `part` has shape (ny, nx), which is
-                    # smaller than `temp`.
-                    middle_j = kshape[0] // 2
-                    middle_i = kshape[1] // 2
-                    for j in range(kshape[0]):
-                        jstart = kshape[0] - j - 1
-                        for i in range(kshape[1]):
-                            if i == middle_i and j == middle_j:
-                                continue   # the middle pixel is done last
-                            istart = kshape[1] - i - 1
-                            # The slice of k_temp includes different pixels
-                            # for the first or second axes within each loop,
-                            # but the same slice for the last two axes.
-                            # The slice of temp (a copy of the science data)
-                            # includes a different offset for each loop.
-                            part = k_temp[j, i, b_b:b_b + ny, l_b:l_b + nx] * \
-                                temp[jstart:jstart + ny, istart:istart + nx]
-                            output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] += part
-                    # Add the product for the middle pixel last.
-                    part = k_temp[middle_j, middle_i, b_b:b_b + ny, l_b:l_b + nx] * \
-                        temp[middle_j:middle_j + ny, middle_i:middle_i + nx]
-                    output_data[integration, group, yoff:yoff + ny, xoff:xoff + nx] += part
+        # Convolve the science portion (not the reference pixels) of
+        # output_data in place, in chunks of groups
+        convolver = IPCConvolver(kernel)
+        convolver.convolve(output_data[:, :, yoff:yoff + ny, xoff:xoff + nx])
         return output_data
 
     def add_mirage_info(self):
@@ -778,7 +724,21 @@ class Observation():
                    "Using the default value of {}."
                    .format(self.params['simSignals']['poissonseed'])))
 
+        # Number of threads used to add Poisson noise
+        self.params['simSignals'].setdefault('poisson_workers', 1)
+
+        # Draw noisy groups directly, rather than creating every frame
+        self.params['simSignals'].setdefault('group_noise_synthesis', False)
+
         # COSMIC RAYS:
+        # Directory of the memory mapped copy of the cosmic ray library
+        self.params['cosmicRay'].setdefault('memmap_dir', None)
+        if isinstance(self.params['cosmicRay']['memmap_dir'], str):
+            if self.params['cosmicRay']['memmap_dir'].lower() == 'none':
+                self.params['cosmicRay']['memmap_dir'] = None
+            else:
+                self.params['cosmicRay']['memmap_dir'] = os.path.expandvars(self.params['cosmicRay']['memmap_dir'])
+
         # Generate the name of the actual CR file to use
         if self.params['cosmicRay']['path'] is None:
             self.crfile = None
@@ -961,232 +921,249 @@ class Observation():
 
         # Read in the parameter file
         self.read_parameter_file()
+        self.profiler = StageProfiler(enabled=profiling_requested(self.params))
+        try:
+            with self.profiler.stage('read_inputs'):
+                # Create dictionary to use when looking in CRDS for reference files
+                self.crds_dict = crds_tools.dict_from_yaml(self.params)
+
+                # Expand param entries to full paths where appropriate
+                self.params = utils.full_paths(self.params, self.modpath, self.crds_dict, offline=self.offline)
+
+                self.file_check()
+
+                # Get the input dark if a filename is supplied
+                if self.linDark is None:
+                    self.linDark = self.params['Reffiles']['linearized_darkfile']
+                    print('Reading in dark file: {}'.format(self.linDark))
+                if isinstance(self.linDark, str):
+                    print('Reading in dark file: {}'.format(self.linDark))
+                    self.linDark = self.read_dark_file(self.linDark)
+
+                # Finally, collect information about the detector,
+                # which will be needed for astrometry later
+                self.detector = self.linDark.header['DETECTOR']
+                self.instrument = self.linDark.header['INSTRUME']
+                self.fastaxis = self.linDark.header['FASTAXIS']
+                self.slowaxis = self.linDark.header['SLOWAXIS']
+
+                # Get the input seed image if a filename is supplied
+                if isinstance(self.seed, str):
+                    self.seed, self.segmap, self.seedheader = self.read_seed(self.seed)
+
+                # Some basic checks on the inputs to make sure
+                # the script won't have to abort due to bad inputs
+                # self.check_params()
+                self.subdict = utils.read_subarray_definition_file(self.params['Reffiles']['subarray_defs'])
+                self.params = utils.get_subarray_info(self.params, self.subdict)
+
+                self.check_params()
+
+                # Read in cosmic ray library files if
+                # CRs are to be added to the data later
+                if self.runStep['cosmicray']:
+                    with self.profiler.stage('read_cosmic_ray_library'):
+                        self.read_cr_files()
+
+                # Read in gain map to be used for adding Poisson noise
+                # and to scale CRs to be in ADU
+                self.read_gain_map()
+
+                # If seed image is in units of electrons/sec then divide
+                # by the gain to put in ADU/sec
+                if 'units' in self.seedheader.keys():
+                    if self.seedheader['units'] in ["e-/sec", "e-"]:
+                        print(("Seed image is in units of {}. Dividing by gain."
+                               .format(self.seedheader['units'])))
+                        self.seed /= self.gainim
+                else:
+                    raise ValueError(("'units' keyword not present in header of "
+                                      "seed image. Unable to determine whether the "
+                                      "seed image is in units of ADU or electrons."))
+
+                # Calculate the exposure time of a single frame, based on
+                # the size of the subarray
+                tmpy, tmpx = self.seed.shape[-2:]
+                self.frametime = utils.calc_frame_time(self.instrument, self.params['Readout']['array_name'],
+                                                       tmpx, tmpy, self.params['Readout']['namp'])
+                print("Frametime is {}".format(self.frametime))
+
+                # Calculate the rate of cosmic ray hits expected per frame
+                self.get_cr_rate()
+
+                # Read in saturation file
+                if self.params['Reffiles']['saturation'] is not None:
+                    self.read_saturation_file()
+                else:
+                    print('CAUTION: no saturation map provided. Using')
+                    print('{} for all pixels.'.format(self.params['nonlin']['limit']))
+                    dy, dx = self.dark.data.shape[2:]
+                    self.satmap = np.zeros((dy, dx)) + self.params['nonlin']['limit']
+
+            # Translate to ramp if necessary,
+            # Add poisson noise and cosmic rays
+            # Rearrange into requested read pattern
+            # All done in one function to save memory
+            with self.profiler.stage('frame_to_ramp'):
+                simexp, simzero = self.add_crs_and_noise(self.seed)
+
+            # Multiply flat fields
+            with self.profiler.stage('flat_field'):
+                simexp = self.add_flatfield_effects(simexp)
+                simzero = self.add_flatfield_effects(np.expand_dims(simzero, axis=1))[:, 0, :, :]
+
+            # Mask any reference pixels
+            if self.params['Output']['grism_source_image'] is False:
+                simexp, simzero = self.mask_refpix(simexp, simzero)
+
+            # Add IPC effects
+            # (Dark current ramp already has IPC in it)
+            if self.runStep['ipc']:
+                with self.profiler.stage('ipc'):
+                    simexp = self.add_ipc(simexp)
+                    simzero = self.add_ipc(np.expand_dims(simzero, axis=1))[:, 0, :, :]
+
+            # Add the simulated source ramp to the dark ramp
+            with self.profiler.stage('add_to_dark'):
+                lin_outramp, lin_zeroframe, lin_sbAndRefpix = self.add_synthetic_to_dark(simexp,
+                                                                                         self.linDark,
+                                                                                         syn_zeroframe=simzero)
+
+            # Add other detector effects (Crosstalk/PAM)
+            with self.profiler.stage('crosstalk'):
+                lin_outramp = self.add_detector_effects(lin_outramp)
+                lin_zeroframe = self.add_detector_effects(np.expand_dims(lin_zeroframe, axis=1))[:, 0, :, :]
+
+            # Read in non-linearity correction coefficients. We need these
+            # regardless of whether we are saving the linearized data or going
+            # on to make raw data
+            nonlincoeffs = self.get_nonlinearity_coeffs()
+
+            # We need to first subtract superbias and refpix signals from the
+            # original saturation limits, and then linearize them
+            # Refpix signals will vary from group to group, but only by a few
+            # ADU. So let's cheat and just use the refpix signals from group 0
+
+            # Create a linearized saturation map
+            limits = np.zeros_like(self.satmap) + 1.e6
 
-        # Create dictionary to use when looking in CRDS for reference files
-        self.crds_dict = crds_tools.dict_from_yaml(self.params)
-
-        # Expand param entries to full paths where appropriate
-        self.params = utils.full_paths(self.params, self.modpath, self.crds_dict, offline=self.offline)
-
-        self.file_check()
-
-        # Get the input dark if a filename is supplied
-        if self.linDark is None:
-            self.linDark = self.params['Reffiles']['linearized_darkfile']
-            print('Reading in dark file: {}'.format(self.linDark))
-        if isinstance(self.linDark, str):
-            print('Reading in dark file: {}'.format(self.linDark))
-            self.linDark = self.read_dark_file(self.linDark)
-
-        # Finally, collect information about the detector,
-        # which will be needed for astrometry later
-        self.detector = self.linDark.header['DETECTOR']
-        self.instrument = self.linDark.header['INSTRUME']
-        self.fastaxis = self.linDark.header['FASTAXIS']
-        self.slowaxis = self.linDark.header['SLOWAXIS']
-
-        # Get the input seed image if a filename is supplied
-        if isinstance(self.seed, str):
-            self.seed, self.segmap, self.seedheader = self.read_seed(self.seed)
-
-        # Some basic checks on the inputs to make sure
-        # the script won't have to abort due to bad inputs
-        # self.check_params()
-        self.subdict = utils.read_subarray_definition_file(self.params['Reffiles']['subarray_defs'])
-        self.params = utils.get_subarray_info(self.params, self.subdict)
-
-        self.check_params()
-
-        # Read in cosmic ray library files if
-        # CRs are to be added to the data later
-        if self.runStep['cosmicray']:
-            self.read_cr_files()
-
-        # Read in gain map to be used for adding Poisson noise
-        # and to scale CRs to be in ADU
-        self.read_gain_map()
-
-        # If seed image is in units of electrons/sec then divide
-        # by the gain to put in ADU/sec
-        if 'units' in self.seedheader.keys():
-            if self.seedheader['units'] in ["e-/sec", "e-"]:
-                print(("Seed image is in units of {}. Dividing by gain."
-                       .format(self.seedheader['units'])))
-                self.seed /= self.gainim
-        else:
-            raise ValueError(("'units' keyword not present in header of "
-                              "seed image. Unable to determine whether the "
-                              "seed image is in units of ADU or electrons."))
-
-        # Calculate the exposure time of a single frame, based on
-        # the size of the subarray
-        tmpy, tmpx = self.seed.shape[-2:]
-        self.frametime = utils.calc_frame_time(self.instrument, self.params['Readout']['array_name'],
-                                               tmpx, tmpy, self.params['Readout']['namp'])
-        print("Frametime is {}".format(self.frametime))
-
-        # Calculate the rate of cosmic ray hits expected per frame
-        self.get_cr_rate()
-
-        # Read in saturation file
-        if self.params['Reffiles']['saturation'] is not None:
-            self.read_saturation_file()
-        else:
-            print('CAUTION: no saturation map provided. Using')
-            print('{} for all pixels.'.format(self.params['nonlin']['limit']))
-            dy, dx = self.dark.data.shape[2:]
-            self.satmap = np.zeros((dy, dx)) + self.params['nonlin']['limit']
-
-        # Translate to ramp if necessary,
-        # Add poisson noise and cosmic rays
-        # Rearrange into requested read pattern
-        # All done in one function to save memory
-        simexp, simzero = self.add_crs_and_noise(self.seed)
-
-        # Multiply flat fields
-        simexp = self.add_flatfield_effects(simexp)
-        simzero = self.add_flatfield_effects(np.expand_dims(simzero, axis=1))[:, 0, :, :]
-
-        # Mask any reference pixels
-        if self.params['Output']['grism_source_image'] is False:
-            simexp, simzero = self.mask_refpix(simexp, simzero)
-
-        # Add IPC effects
-        # (Dark current ramp already has IPC in it)
-        if self.runStep['ipc']:
-            simexp = self.add_ipc(simexp)
-            simzero = self.add_ipc(np.expand_dims(simzero, axis=1))[:, 0, :, :]
-
-        # Add the simulated source ramp to the dark ramp
-        lin_outramp, lin_zeroframe, lin_sbAndRefpix = self.add_synthetic_to_dark(simexp,
-                                                                                 self.linDark,
-                                                                                 syn_zeroframe=simzero)
-
-        # Add other detector effects (Crosstalk/PAM)
-        lin_outramp = self.add_detector_effects(lin_outramp)
-        lin_zeroframe = self.add_detector_effects(np.expand_dims(lin_zeroframe, axis=1))[:, 0, :, :]
-
-        # Read in non-linearity correction coefficients. We need these
-        # regardless of whether we are saving the linearized data or going
-        # on to make raw data
-        nonlincoeffs = self.get_nonlinearity_coeffs()
-
-        # We need to first subtract superbias and refpix signals from the
-        # original saturation limits, and then linearize them
-        # Refpix signals will vary from group to group, but only by a few
-        # ADU. So let's cheat and just use the refpix signals from group 0
-
-        # Create a linearized saturation map
-        limits = np.zeros_like(self.satmap) + 1.e6
-
-        if self.linDark.sbAndRefpix is not None:
-            lin_satmap = unlinearize.nonLinFunc(self.satmap - self.linDark.sbAndRefpix[0, 0, :, :],
-                                                nonlincoeffs, limits)
-        elif ((self.linDark.sbAndRefpix is None) & (self.runStep['superbias'])):
-            # If the superbias and reference pixel signal is not available
-            # but the superbias reference file is, then just use that.
-            self.read_superbias_file()
-            lin_satmap = unlinearize.nonLinFunc(self.satmap - self.superbias,
-                                                nonlincoeffs, limits)
-
-        elif ((self.linDark.sbAndRefpix is None) & (self.runStep['superbias'] is False)):
-            # If superbias and refpix signal is not available and
-            # the superbias reffile is also not available, fall back to
-            # a superbias value that is roughly correct. Error in this value
-            # will cause errors in saturation flagging for the highest signal
-            # pixels.
-            manual_sb = np.zeros_like(self.satmap) + 12000.
-            lin_satmap = unlinearize.nonLinFunc(self.satmap - manual_sb,
-                                                nonlincoeffs, limits)
-
-        # Save the ramp if requested. This is the linear ramp,
-        # ready to go into the Jump step of the pipeline
-        self.linear_output = None
-        if 'linear' in self.params['Output']['datatype'].lower():
-            # Output filename: append 'linear'
-            if 'uncal' in self.params['Output']['file']:
-                linearrampfile = self.params['Output']['file'].replace('uncal', 'linear')
-            else:
-                linearrampfile = self.params['Output']['file'].replace('.fits', '_linear.fits')
-
-            # Full path of output file
-            linearrampfile = linearrampfile.split('/')[-1]
-            linearrampfile = os.path.join(self.params['Output']['directory'], linearrampfile)
-
-            # Saturation flagging - to create the pixeldq extension
-            # and make data ready for ramp fitting
-            # Since we subtracted the superbias and refpix signal from the
-            # saturation map prior to linearizing, we can now compare that map
-            # to lin_outramp, which also does not include superbias nor refpix
-            # signal, and is linear.
-            groupdq = self.flag_saturation(lin_outramp, lin_satmap)
-
-            # Create the error and groupdq extensions
-            err, pixeldq = self.create_other_extensions(copy.deepcopy(lin_outramp))
-
-            if self.params['Inst']['use_JWST_pipeline']:
-                self.save_DMS(lin_outramp, lin_zeroframe, linearrampfile, mod='ramp',
-                             err_ext=err, group_dq=groupdq, pixel_dq=pixeldq)
-            else:
-                self.save_fits(lin_outramp, lin_zeroframe, linearrampfile, mod='ramp',
-                              err_ext=err, group_dq=groupdq, pixel_dq=pixeldq)
-
-            stp.add_wcs(linearrampfile, roll=self.params['Telescope']['rotation'])
-            print("Final linearized exposure saved to:")
-            print("{}".format(linearrampfile))
-            self.linear_output = linearrampfile
-
-        # If the raw version is requested, we need to unlinearize
-        # the ramp
-        self.raw_output = None
-        if 'raw' in self.params['Output']['datatype'].lower():
             if self.linDark.sbAndRefpix is not None:
-                if self.params['Output']['save_intermediates']:
-                    base_name = self.params['Output']['file'].split('/')[-1]
-                    ofile = os.path.join(self.params['Output']['directory'],
-                                         base_name[0:-5] + '_doNonLin_accuracy.fits')
-                    savefile = True
+                lin_satmap = unlinearize.nonLinFunc(self.satmap - self.linDark.sbAndRefpix[0, 0, :, :],
+                                                    nonlincoeffs, limits)
+            elif ((self.linDark.sbAndRefpix is None) & (self.runStep['superbias'])):
+                # If the superbias and reference pixel signal is not available
+                # but the superbias reference file is, then just use that.
+                self.read_superbias_file()
+                lin_satmap = unlinearize.nonLinFunc(self.satmap - self.superbias,
+                                                    nonlincoeffs, limits)
+
+            elif ((self.linDark.sbAndRefpix is None) & (self.runStep['superbias'] is False)):
+                # If superbias and refpix signal is not available and
+                # the superbias reffile is also not available, fall back to
+                # a superbias value that is roughly correct. Error in this value
+                # will cause errors in saturation flagging for the highest signal
+                # pixels.
+                manual_sb = np.zeros_like(self.satmap) + 12000.
+                lin_satmap = unlinearize.nonLinFunc(self.satmap - manual_sb,
+                                                    nonlincoeffs, limits)
+
+            # Save the ramp if requested. This is the linear ramp,
+            # ready to go into the Jump step of the pipeline
+            self.linear_output = None
+            if 'linear' in self.params['Output']['datatype'].lower():
+                # Output filename: append 'linear'
+                if 'uncal' in self.params['Output']['file']:
+                    linearrampfile = self.params['Output']['file'].replace('uncal', 'linear')
                 else:
-                    ofile = None
-                    savefile = False
-
-                raw_outramp = unlinearize.unlinearize(lin_outramp, nonlincoeffs, self.satmap,
-                                                      lin_satmap,
-                                                      maxiter=self.params['nonlin']['maxiter'],
-                                                      accuracy=self.params['nonlin']['accuracy'],
-                                                      save_accuracy_map=savefile,
-                                                      accuracy_file=ofile)
-                raw_zeroframe = unlinearize.unlinearize(lin_zeroframe, nonlincoeffs, self.satmap,
-                                                        lin_satmap,
-                                                        maxiter=self.params['nonlin']['maxiter'],
-                                                        accuracy=self.params['nonlin']['accuracy'],
-                                                        save_accuracy_map=False)
-
-                # Add the superbias and reference pixel signal back in
-                raw_outramp = self.add_superbias_and_refpix(raw_outramp, lin_sbAndRefpix)
-                raw_zeroframe = self.add_superbias_and_refpix(raw_zeroframe, self.linDark.zero_sbAndRefpix)
-
-                # Make sure all signals are < 65535
-                raw_outramp[raw_outramp > 65535] = 65535
-                raw_zeroframe[raw_zeroframe > 65535] = 65535
-
-                # Save the raw ramp
-                base_name = self.params['Output']['file'].split('/')[-1]
-                rawrampfile = os.path.join(self.params['Output']['directory'], base_name)
-                if self.params['Inst']['use_JWST_pipeline']:
-                    self.save_DMS(raw_outramp, raw_zeroframe, rawrampfile, mod='1b')
+                    linearrampfile = self.params['Output']['file'].replace('.fits', '_linear.fits')
+
+                # Full path of output file
+                linearrampfile = linearrampfile.split('/')[-1]
+                linearrampfile = os.path.join(self.params['Output']['directory'], linearrampfile)
+
+                # Saturation flagging - to create the pixeldq extension
+                # and make data ready for ramp fitting
+                # Since we subtracted the superbias and refpix signal from the
+                # saturation map prior to linearizing, we can now compare that map
+                # to lin_outramp, which also does not include superbias nor refpix
+                # signal, and is linear.
+                groupdq = self.flag_saturation(lin_outramp, lin_satmap)
+
+                # Create the error and groupdq extensions
+                err, pixeldq = self.create_other_extensions(copy.deepcopy(lin_outramp))
+
+                with self.profiler.stage('file_writes'):
+                    if self.params['Inst']['use_JWST_pipeline']:
+                        self.save_DMS(lin_outramp, lin_zeroframe, linearrampfile, mod='ramp',
+                                     err_ext=err, group_dq=groupdq, pixel_dq=pixeldq)
+                    else:
+                        self.save_fits(lin_outramp, lin_zeroframe, linearrampfile, mod='ramp',
+                                      err_ext=err, group_dq=groupdq, pixel_dq=pixeldq)
+
+                    stp.add_wcs(linearrampfile, roll=self.params['Telescope']['rotation'])
+                print("Final linearized exposure saved to:")
+                print("{}".format(linearrampfile))
+                self.linear_output = linearrampfile
+
+            # If the raw version is requested, we need to unlinearize
+            # the ramp
+            self.raw_output = None
+            if 'raw' in self.params['Output']['datatype'].lower():
+                if self.linDark.sbAndRefpix is not None:
+                    if self.params['Output']['save_intermediates']:
+                        base_name = self.params['Output']['file'].split('/')[-1]
+                        ofile = os.path.join(self.params['Output']['directory'],
+                                             base_name[0:-5] + '_doNonLin_accuracy.fits')
+                        savefile = True
+                    else:
+                        ofile = None
+                        savefile = False
+
+                    with self.profiler.stage('unlinearize'):
+                        raw_outramp = unlinearize.unlinearize(lin_outramp, nonlincoeffs, self.satmap,
+                                                              lin_satmap,
+                                                              maxiter=self.params['nonlin']['maxiter'],
+                                                              accuracy=self.params['nonlin']['accuracy'],
+                                                              save_accuracy_map=savefile,
+                                                              accuracy_file=ofile)
+                        raw_zeroframe = unlinearize.unlinearize(lin_zeroframe, nonlincoeffs, self.satmap,
+                                                                lin_satmap,
+                                                                maxiter=self.params['nonlin']['maxiter'],
+                                                                accuracy=self.params['nonlin']['accuracy'],
+                                                                save_accuracy_map=False)
+
+                    # Add the superbias and reference pixel signal back in
+                    raw_outramp = self.add_superbias_and_refpix(raw_outramp, lin_sbAndRefpix)
+                    raw_zeroframe = self.add_superbias_and_refpix(raw_zeroframe, self.linDark.zero_sbAndRefpix)
+
+                    # Make sure all signals are < 65535
+                    raw_outramp[raw_outramp > 65535] = 65535
+                    raw_zeroframe[raw_zeroframe > 65535] = 65535
+
+                    # Save the raw ramp
+                    base_name = self.params['Output']['file'].split('/')[-1]
+                    rawrampfile = os.path.join(self.params['Output']['directory'], base_name)
+                    with self.profiler.stage('file_writes'):
+                        if self.params['Inst']['use_JWST_pipeline']:
+                            self.save_DMS(raw_outramp, raw_zeroframe, rawrampfile, mod='1b')
+                        else:
+                            self.save_fits(raw_outramp, raw_zeroframe, rawrampfile, mod='1b')
+                        stp.add_wcs(rawrampfile, roll=self.params['Telescope']['rotation'])
+                    print("Final raw exposure saved to")
+                    print("{}".format(rawrampfile))
+                    self.raw_output = rawrampfile
                 else:
-                    self.save_fits(raw_outramp, raw_zeroframe, rawrampfile, mod='1b')
-                stp.add_wcs(rawrampfile, roll=self.params['Telescope']['rotation'])
-                print("Final raw exposure saved to")
-                print("{}".format(rawrampfile))
-                self.raw_output = rawrampfile
-            else:
-                raise ValueError(("WARNING: raw output ramp requested, but the signal associated "
-                                  "with the superbias and reference pixels is not present in "
-                                  "the dark current data object. Quitting."))
+                    raise ValueError(("WARNING: raw output ramp requested, but the signal associated "
+                                      "with the superbias and reference pixels is not present in "
+                                      "the dark current data object. Quitting."))
 
-        print("Observation generation complete.")
+            base_name = self.params['Output']['file'].split('/')[-1]
+            self.profiler.write_report(os.path.join(self.params['Output']['directory'],
+                                                    base_name[0:-5] + '_obs_profile.json'),
+                                       entry_point='Observation.create', yaml_file=self.paramfile)
+            print("Observation generation complete.")
+        finally:
+            self.profiler.stop_tracing()
 
     def create_group_entry(self, integration, groupnum, endday, endmilli, endsubmilli, endgroup,
                            xd, yd, gap, comp_code, comp_text, barycentric, heliocentric):
@@ -1432,40 +1409,37 @@ class Observation():
         image : numpy.ndarray
             Input image with cosmic rays added
         """
-        # Change the seed each time this is run, or else simulated
+        # The seed is changed each time this is run, or else simulated
         # exposures that have more than 1 integration will have the
         # same cosmic rays in each integration
-        self.generator1 = random.Random()
-        self.generator1.seed(seedval)
-
-        # Add cosmic rays to a frame
-        nray = int(ncr)
-
-        i = 0
-        dims = image.shape
-        while i < nray:
-            i = i+1
-            j = int(self.generator1.random()*dims[0])
-            k = int(self.generator1.random()*dims[1])
-            n = int(self.generator1.random()*10.0)
-            m = int(self.generator1.random()*1000.0)
-            crimage = np.copy(self.cosmicrays[n][m, :, :])
-            i1 = max(j-10, 0)
-            i2 = min(j+11, dims[0])
-            j1 = max(k-10, 0)
-            j2 = min(k+11, dims[1])
-            k1 = 10-(j-i1)
-            k2 = 10+(i2-j)
-            l1 = 10-(k-j1)
-            l2 = 10+(j2-k)
-
-            # Insert cosmic ray (divided by gain to put into ADU)
-            image[i1:i2, j1:j2] = image[i1:i2, j1:j2] + crimage[k1:k2, l1:l2] / self.gainim[k1:k2, l1:l2]
-
-            self.cosmicraylist.write("{} {} {} {} {} {} {}\n".format((j2-j1)/2+j1, (i2-i1)/2+i1, ngroup,
-                                     iframe, n, m, np.max(crimage[k1:k2, l1:l2])))
+        image, hits = add_cosmic_rays(image, self.cosmicrays, self.gainim, ncr, seedval)
+
+        hit_columns = [hits[key].tolist() for key in ['x', 'y', 'file', 'stamp', 'max_signal']]
+        self.cosmicraylist.write(''.join(["{} {} {} {} {} {} {}\n".format(x, y, ngroup, iframe, n, m, maxsignal)
+                                          for x, y, n, m, maxsignal in zip(*hit_columns)]))
         return image
 
+    def add_poisson_noise(self, signalimage):
+        """Add poisson noise to an input image using the Poisson noise
+        engine. Successive calls within an integration draw successive
+        values from the random number streams of the integration, so each
+        frame has different noise.
+
+        Parameters
+        ----------
+        signalimage : numpy.ndarray
+            2D array of signals in ADU
+
+        Returns
+        -------
+        newimage : numpy.ndarray
+            signalimage with Poisson noise added
+        """
+        if self.poisson_engine is None:
+            self.poisson_engine = PoissonNoiseEngine(self.params['simSignals']['poissonseed'], gain=self.gainim,
+                                                     workers=self.params['simSignals'].get('poisson_workers', 1))
+        return self.poisson_engine.add_noise(signalimage)
+
     def do_poisson(self, signalimage, seedval):
         """Add poisson noise to an input image. Input is assumed
         to be in units of ADU, meaning it must be multiplied by
@@ -1585,10 +1559,12 @@ class Observation():
 
         Parameters
         ----------
-        data : numpy.ndarray
+        data : numpy.ndarray or mirage.seed_image.lazy_ramp.LazyIntegration
             Seed image. Should be a 2d frame or 3d integration.
             If the original seed image is a 4d exposure, call frame_to_ramp
-            with one integration at a time.
+            with one integration at a time. Frames of 3d integrations are
+            read one at a time, so lazy integrations are never created in
+            full.
 
         Returns
         -------
@@ -1609,13 +1585,13 @@ class Observation():
         elif ndim == 2:
             yd, xd = data.shape
 
-        # If a ramp is given, create a -1st frame that is all zeros
-        # so that we can create deltaframes for all frames later
+        # If a ramp is given, the signal before the first frame is
+        # zero, so that we can create deltaframes for all frames later.
         # This should be the case only for data containing
         # moving targets.
         if ndim == 3:
             print('Moving target data shape', data.shape, yd, xd)
-            data = np.vstack((np.zeros((1, yd, xd)), data))
+            previousinput = np.zeros((yd, xd))
 
         outramp = np.zeros((self.params['Readout']['ngroup'], yd, xd), dtype=np.float)
 
@@ -1633,13 +1609,6 @@ class Observation():
             crlistout = os.path.join(self.params['Output']['directory'], base_name[0:-5] + '_cosmicrays.list')
             self.open_cr_list_file(crlistout, crhits)
 
-        # Difference between the latest outimage frame and the
-        # latest newsignalimage frame. This is important when nframe>1
-        if ndim == 2:
-            totalsignalimage = data
-        elif ndim == 3:
-            totalsignalimage = data[1, :, :]
-
         # Define signal in the previous frame
         # Needed in loop below
         previoussignal = np.zeros((yd, xd))
@@ -1669,16 +1638,15 @@ class Observation():
 
                 # Signal only since previous frame
                 if ndim == 3:
-                    deltaframe = data[frameindex+1] - data[frameindex]
+                    currentinput = data[frameindex]
+                    deltaframe = currentinput - previousinput
+                    previousinput = currentinput
                 elif ndim == 2:
                     deltaframe = data * self.frametime
 
                 # Add poisson noise
-                poissonsignal = self.do_poisson(deltaframe, self.params['simSignals']['poissonseed'])
-
-                # Increment poisson seed value so that the next frame doesn't have identical
-                # noise
-                self.params['simSignals']['poissonseed'] += 1
+                with self.profiler.stage('poisson'):
+                    poissonsignal = self.add_poisson_noise(deltaframe)
 
                 # Create the frame by adding the delta signal
                 # and poisson noise associated with the delta signal
@@ -1687,9 +1655,11 @@ class Observation():
 
                 # Add cosmic rays
                 if self.runStep['cosmicray']:
-                    framesignal = self.do_cosmic_rays(framesignal, i, j,
-                                                    crs_perframe[frameindex],
-                                                    self.params['cosmicRay']['seed'])
+                    with self.profiler.stage('cosmic_rays'):
+                        framesignal = self.do_cosmic_rays(framesignal, i, j,
+                                                        crs_perframe[frameindex],
+                                                        self.params['cosmicRay']['seed'])
+                    self.profiler.count('cosmic_rays', int(crs_perframe[frameindex]))
                     # Increment the seed, so that every frame doesn't have identical
                     # cosmic rays
                     self.params['cosmicRay']['seed'] += 1
@@ -1751,11 +1721,6 @@ class Observation():
         # Define output ramp
         outramp = np.zeros((self.params['Readout']['ngroup'], yd, xd))
 
-        # If a ramp is given, create a -1st frame that is all zeros
-        # so that we can create deltaframes for all frames later
-        if ndim == 3:
-            data = np.vstack(np.zeros((1, yd, xd)), data)
-
         # Container for zeroth frame
         zeroframe = None
 
@@ -1776,16 +1741,11 @@ class Observation():
                 frameindex = (i * framesPerGroup) + j
 
                 # Add poisson noise
-                if ndim == 3:
-                    framesignal = self.do_poisson(data[frameindex+1],
-                                                 self.params['simSignals']['poissonseed'])
-                elif ndim == 2:
-                    framesignal = self.do_poisson(data*frameindex,
-                                                 self.params['simSignals']['poissonseed'])
-
-                # Increment poisson seed value so that the next frame doesn't have identical
-                # noise
-                self.params['simSignals']['poissonseed'] += 1
+                with self.profiler.stage('poisson'):
+                    if ndim == 3:
+                        framesignal = self.add_poisson_noise(data[frameindex])
+                    elif ndim == 2:
+                        framesignal = self.add_poisson_noise(data*frameindex)
 
                 if ((i == 0) & (j == 0)):
                     zeroframe = copy.deepcopy(framesignal)
@@ -1803,6 +1763,134 @@ class Observation():
             outramp[i, :, :] = accumimage
         return outramp, zeroframe
 
+    def synthesize_groups(self, data):
+        """Convert a seed image/ramp to a ramp that includes poisson
+        noise and cosmic rays, by drawing the noisy signal of each group
+        directly rather than creating each frame and averaging. The mean,
+        variance and covariances of the groups and the zeroth frame match
+        those of ``frame_to_ramp``, and the poisson noise calculation
+        scales with the number of groups rather than the number of frames.
+        See ``mirage.ramp_generator.poisson_noise`` for details.
+
+        Parameters
+        ----------
+        data : numpy.ndarray or mirage.seed_image.lazy_ramp.LazyIntegration
+            Seed image. Should be a 2d frame or 3d integration.
+            If the original seed image is a 4d exposure, call synthesize_groups
+            with one integration at a time. Only the averaged frames of a 3d
+            integration are read.
+
+        Returns
+        -------
+        outramp : numpy.ndarray
+            3d integration with cosmic rays and poisson noise
+
+        zeroframe : numpy.ndarray
+            2d zeroth frame
+        """
+        ndim = len(data.shape)
+        if ndim == 3:
+            ngroupin, yd, xd = data.shape
+        elif ndim == 2:
+            yd, xd = data.shape
+        else:
+            raise ValueError("Seed image must be 2D or 3D, but has {} dimensions.".format(ndim))
+
+        nframe = self.params['Readout']['nframe']
+        nskip = self.params['Readout']['nskip']
+        ngroup = self.params['Readout']['ngroup']
+        framesPerGroup = nframe + nskip
+
+        def expected_signal(frameindex):
+            # Noiseless cumulative signal in a frame
+            if frameindex < 0:
+                return np.zeros((yd, xd))
+            if ndim == 3:
+                return np.asarray(data[frameindex], dtype=np.float64)
+            return data * self.frametime * (frameindex + 1)
+
+        outramp = np.zeros((ngroup, yd, xd))
+
+        if self.runStep['cosmicray']:
+            npix = int(yd * xd + 0.02)
+
+            # Reinitialize the cosmic ray functions for each integration
+            crhits, crs_perframe = self.cr_funcs(npix, seed=self.params['cosmicRay']['seed'])
+
+            # open output file to contain the list of cosmic rays
+            base_name = self.params['Output']['file'].split('/')[-1]
+            crlistout = os.path.join(self.params['Output']['directory'], base_name[0:-5] + '_cosmicrays.list')
+            self.open_cr_list_file(crlistout, crhits)
+
+            # Cumulative cosmic ray signal
+            crsignal = np.zeros((yd, xd))
+
+        # Noisy signal in, and noiseless signal expected in, the last
+        # averaged frame of the previous group
+        previoussignal = np.zeros((yd, xd))
+        previousexpected = np.zeros((yd, xd))
+
+        zeroframe = None
+        for i in range(ngroup):
+            firstindex = i * framesPerGroup
+            print('    Synthesizing group {} from frames {} to {}'.format(i, firstindex, firstindex + nframe - 1))
+
+            # Noiseless signal in each averaged frame of the group
+            expected = [expected_signal(firstindex + m) for m in range(nframe)]
+            weighted_mean = np.zeros((yd, xd))
+            weighted_square_mean = np.zeros((yd, xd))
+            for m in range(1, nframe):
+                weight = (nframe - m) / nframe
+                weighted_mean += (expected[m] - expected[m - 1]) * weight
+                weighted_square_mean += (expected[m] - expected[m - 1]) * weight ** 2
+
+            with self.profiler.stage('poisson'):
+                if self.poisson_engine is None:
+                    self.poisson_engine = PoissonNoiseEngine(self.params['simSignals']['poissonseed'],
+                                                             gain=self.gainim,
+                                                             workers=self.params['simSignals']['poisson_workers'])
+                start, total, weighted = self.poisson_engine.add_group_noise(expected[0] - previousexpected,
+                                                                             expected[-1] - expected[0],
+                                                                             weighted_mean,
+                                                                             weighted_square_mean)
+            firstsignal = previoussignal + start
+            accumimage = firstsignal + weighted
+            previoussignal = firstsignal + total
+            previousexpected = expected[-1]
+
+            if i == 0:
+                zeroframe = np.copy(firstsignal)
+
+            # Add cosmic rays to every frame, including the skipped frames
+            # before the group, in the same order as frame_to_ramp
+            if self.runStep['cosmicray']:
+                groupcr = np.zeros((yd, xd))
+                rstart = 0
+                if i == 0:
+                    rstart = nskip
+                for j in range(rstart, framesPerGroup):
+                    frameindex = (i * framesPerGroup) + j - nskip
+                    with self.profiler.stage('cosmic_rays'):
+                        crsignal = self.do_cosmic_rays(crsignal, i, j, crs_perframe[frameindex],
+                                                       self.params['cosmicRay']['seed'])
+                    self.profiler.count('cosmic_rays', int(crs_perframe[frameindex]))
+                    # Increment the seed, so that every frame doesn't have identical
+                    # cosmic rays
+                    self.params['cosmicRay']['seed'] += 1
+                    if j >= nskip:
+                        groupcr += crsignal
+                    if frameindex == 0:
+                        zeroframe += crsignal
+                accumimage += groupcr / nframe
+
+            outramp[i, :, :] = accumimage
+
+        if self.runStep['cosmicray']:
+            # Close the cosmic ray list file
+            self.cosmicraylist.close()
+
+        return outramp, zeroframe
+
     def get_cr_rate(self):
         """Get the base cosmic ray impact probability.
 
@@ -2184,18 +2272,12 @@ class Observation():
         return image, header
 
     def read_cr_files(self):
-        """Read in the 10 files that comprise the cosmic ray library"""
-        self.cosmicrays = []
-        self.cosmicraysheader = []
-        for i in range(10):
-            idx = '_%2.2d_' % (i)
-            str1 = idx + self.params['cosmicRay']['suffix'] + '.fits'
-            name = self.crfile + str1
-            with fits.open(name) as h:
-                im = h[1].data
-                head = h[0].header
-            self.cosmicrays.append(im)
-            self.cosmicraysheader.append(head)
+        """Get the 10 files that comprise the cosmic ray library from the
+        process-wide library cache, which memory maps the library"""
+        self.cosmicrays, self.cosmicraysheader = LIBRARY_CACHE.get(self.crfile,
+                                                                   self.params['cosmicRay']['suffix'],
+                                                                   self.params['cosmicRay']['memmap_dir'])
+        print(LIBRARY_CACHE.summary())
 
     def read_crosstalk_file(self, file, detector):
         """Read in appropriate line from the xtalk coefficients
@@ -0,0 +1,287 @@
+#! /usr/bin/env python
+
+"""This module contains the engine used to add Poisson noise to the frames
+of an integration.
+
+Random numbers are drawn with ``numpy.random.Generator`` objects, rather
+than by re-seeding the global ``numpy.random`` state for every frame. Each
+frame is split into strips of rows. For every integration, an independent
+random number stream is created for each strip, by spawning child
+``numpy.random.SeedSequence`` objects from the Poisson seed. Each frame of
+the integration draws its noise for a strip from that strip's stream, in
+frame order.
+
+Strips can be processed in parallel by a pool of threads (the Poisson
+sampling in numpy releases the GIL). Since each stream is only ever used
+by the strip it belongs to, the noise does not depend on the number of
+threads used.
+
+For readout patterns that average several frames into each group, the
+engine can also draw the noisy group values directly, rather than
+drawing each frame (including skipped frames) and averaging. Consider a
+group whose averaged frames are read at frames 0 to nframe-1 (relative to
+the start of the group). The group signal is the cumulative signal at
+frame 0, plus a weighted sum of the counts arriving after each later
+frame, where the counts arriving after frame m appear in nframe-m of the
+nframe averaged frames. For each group, three values are drawn:
+
+- The counts arriving since the last frame of the previous group, up to
+  and including frame 0, as a single Poisson draw
+- The total counts arriving during the group, as a single Poisson draw
+- The weighted sum of those counts, given their total, from a normal
+  distribution
+
+The mean and variance of the weighted sum, and its covariance with the
+total counts, equal those of the frame-by-frame simulation. Since the
+total counts of each group are carried into the cumulative signal of all
+later groups, the covariances between groups and with the zeroth frame
+are also preserved. The time and number of random draws scale with the
+number of groups rather than the number of frames.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.ramp_generator.poisson_noise import PoissonNoiseEngine
+        engine = PoissonNoiseEngine(seed=815813492, gain=gain_image, workers=4)
+        engine.start_integration(0)
+        noisy_frame = engine.add_noise(delta_frame)
+        start, total, weighted = engine.add_group_noise(start_mean, total_mean, weighted_mean,
+                                                        weighted_square_mean)
+        engine.close()
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Number of rows in each strip. This is fixed, rather than being based on
+# the number of workers, so that the noise does not depend on the number
+# of workers.
+STRIP_ROWS = 128
+
+
+class PoissonNoiseEngine():
+    def __init__(self, seed, gain=1., strip_rows=STRIP_ROWS, workers=1):
+        """Instantiate the noise engine
+
+        Parameters
+        ----------
+        seed : int
+            Seed for the random number generators
+
+        gain : float or numpy.ndarray
+            Gain, in e-/ADU. Either a single value or a 2D image matching
+            the frames.
+
+        strip_rows : int
+            Number of rows in each strip
+
+        workers : int
+            Number of threads used to add noise to the strips of a frame
+        """
+        if strip_rows < 1:
+            raise ValueError(("Number of rows in Poisson noise strips must be at least 1. "
+                              "Value given was {}.".format(strip_rows)))
+        if workers < 1:
+            raise ValueError(("Number of Poisson noise workers must be at least 1. "
+                              "Value given was {}.".format(workers)))
+        self.seed = seed
+        self.gain = np.asarray(gain, dtype=np.float64)
+        self.strip_rows = strip_rows
+        self.workers = workers
+        self.integration = None
+        self.generators = None
+        self.pool = None
+        if workers > 1:
+            self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def start_integration(self, integration):
+        """Create the random number streams for an integration. Noise added
+        after this call is drawn from streams that depend only on the seed,
+        the integration number and the strip.
+
+        Parameters
+        ----------
+        integration : int
+            Integration number
+        """
+        self.integration = integration
+        self.generators = None
+
+    def strip_generators(self, nstrips):
+        """Return the random number generator of each strip in the current
+        integration, creating them if necessary
+
+        Parameters
+        ----------
+        nstrips : int
+            Number of strips in each frame
+
+        Returns
+        -------
+        generators : list
+            List of ``numpy.random.Generator`` objects, one per strip
+        """
+        if self.integration is None:
+            self.start_integration(0)
+        if self.generators is None:
+            integration_sequence = np.random.SeedSequence(self.seed, spawn_key=(self.integration,))
+            self.generators = [np.random.default_rng(sequence)
+                               for sequence in integration_sequence.spawn(nstrips)]
+        elif len(self.generators) != nstrips:
+            raise ValueError(("Frames with {} strips cannot be added to an integration whose frames "
+                              "have {} strips.".format(nstrips, len(self.generators))))
+        return self.generators
+
+    def add_noise(self, signal):
+        """Add Poisson noise to a frame. The input is in units of ADU, so
+        it is multiplied by the gain before calculating the noise, and the
+        result is divided by the gain. Pixels with negative signal have no
+        noise added.
+
+        Parameters
+        ----------
+        signal : numpy.ndarray
+            2D array of signals in ADU
+
+        Returns
+        -------
+        noisy : numpy.ndarray
+            ``signal`` with Poisson noise added
+        """
+        signal = np.asarray(signal, dtype=np.float64)
+        gain = np.broadcast_to(self.gain, signal.shape)
+        noisy = np.empty(signal.shape)
+
+        def noise_strip(rows, generator):
+            noisy[rows] = self.poisson(generator, signal[rows] * gain[rows]) / gain[rows]
+
+        self.run_strips(noise_strip, signal.shape[0])
+        return noisy
+
+    def add_group_noise(self, start_mean, total_mean, weighted_mean, weighted_square_mean):
+        """Draw the noisy signals making up one group of a readout pattern
+        that averages several frames into each group. All inputs are
+        noiseless signals in ADU.
+
+        Parameters
+        ----------
+        start_mean : numpy.ndarray
+            2D array of the signal arriving between the last frame of the
+            previous group and the first averaged frame of this group
+
+        total_mean : numpy.ndarray
+            2D array of the signal arriving between the first and last
+            averaged frames of the group
+
+        weighted_mean : numpy.ndarray
+            2D array of the sum of the signal arriving after each averaged
+            frame, multiplied by the fraction of the averaged frames that
+            it appears in
+
+        weighted_square_mean : numpy.ndarray
+            As ``weighted_mean``, but using the squares of the fractions
+
+        Returns
+        -------
+        start : numpy.ndarray
+            Noisy version of ``start_mean``
+
+        total : numpy.ndarray
+            Noisy version of ``total_mean``
+
+        weighted : numpy.ndarray
+            Noisy version of ``weighted_mean``, consistent with ``total``.
+            The group signal is the cumulative signal at the first averaged
+            frame plus ``weighted``.
+        """
+        start_mean = np.asarray(start_mean, dtype=np.float64)
+        gain = np.broadcast_to(self.gain, start_mean.shape)
+        start = np.empty(start_mean.shape)
+        total = np.empty(start_mean.shape)
+        weighted = np.empty(start_mean.shape)
+
+        def noise_strip(rows, generator):
+            strip_gain = gain[rows]
+            start[rows] = self.poisson(generator, start_mean[rows] * strip_gain) / strip_gain
+
+            total_counts = np.asarray(total_mean[rows] * strip_gain)
+            weighted_counts = np.asarray(weighted_mean[rows] * strip_gain)
+            counts = self.poisson(generator, total_counts)
+
+            # Mean and variance of the weight of a single count, given
+            # the total number of counts
+            positive = total_counts > 0.
+            safe_total = np.where(positive, total_counts, 1.)
+            mean_weight = np.where(positive, weighted_counts / safe_total, 0.)
+            variance_weight = np.where(positive, weighted_square_mean[rows] * strip_gain / safe_total
+                                       - mean_weight ** 2, 0.)
+            variance = np.clip(np.where(positive, counts, 0.) * variance_weight, 0., None)
+            strip_weighted = counts * mean_weight + np.sqrt(variance) * generator.standard_normal(counts.shape)
+
+            # Pixels with negative signal have no noise added
+            strip_weighted[~positive] = weighted_counts[~positive]
+            total[rows] = counts / strip_gain
+            weighted[rows] = strip_weighted / strip_gain
+
+        self.run_strips(noise_strip, start_mean.shape[0])
+        return start, total, weighted
+
+    def poisson(self, generator, mean):
+        """Draw Poisson-distributed values. Pixels with negative means are
+        returned unchanged, with no noise added.
+
+        Parameters
+        ----------
+        generator : numpy.random.Generator
+            Random number generator
+
+        mean : numpy.ndarray
+            Mean of each pixel
+
+        Returns
+        -------
+        values : numpy.ndarray
+            Drawn values
+        """
+        # Can't add Poisson noise to pixels with negative values.
+        # Set those to zero when adding noise, then replace with
+        # the original value
+        negative = mean < 0.
+        values = generator.poisson(np.where(negative, 0., mean)).astype(np.float64)
+        values[negative] = mean[negative]
+        return values
+
+    def run_strips(self, function, ydim):
+        """Call a function for each strip of rows of a frame, using the pool
+        of threads if there is one
+
+        Parameters
+        ----------
+        function : func
+            Function called as ``function(rows, generator)``, where
+            ``rows`` is the slice of rows in the strip and ``generator``
+            is the random number generator of the strip
+
+        ydim : int
+            Number of rows in the frame
+        """
+        starts = list(range(0, ydim, self.strip_rows))
+        generators = self.strip_generators(len(starts))
+        strips = [(slice(start, start + self.strip_rows), generator)
+                  for start, generator in zip(starts, generators)]
+        if self.pool is None:
+            for rows, generator in strips:
+                function(rows, generator)
+        else:
+            list(self.pool.map(lambda strip: function(*strip), strips))
+
+    def close(self):
+        """Shut down the pool of threads"""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -13,6 +13,7 @@ import sys
 import glob
 import os
 import copy
+import itertools
 import re
 import shutil
 from yaml.scanner import ScannerError
@@ -23,24 +24,33 @@ import time
 import pkg_resources
 import asdf
 import scipy.signal as s1
+from scipy.special import gammaincinv
 from scipy.ndimage import rotate
 import numpy as np
-from photutils import detect_sources
 from astropy.coordinates import SkyCoord
 from astropy.io import fits, ascii
-from astropy.table import Table, Column
+from astropy.table import Table, Column, vstack
 from astropy.modeling.models import Shift, Sersic2D, Polynomial2D, Mapping
 import astropy.units as u
 import pysiaf
 
 from . import moving_targets
+from . import parallel_rendering
 from . import segmentation_map as segmap
+from ..catalogs import chunked_reader, spatial_index
 from ..reference_files import crds_tools
 from ..utils import rotations, polynomial, read_siaf_table, utils
 from ..utils import set_telescope_pointing_separated as set_telescope_pointing
 from ..utils import siaf_interface
+from ..utils.profiling import StageProfiler, profiling_requested
 from ..utils.constants import CRDS_FILE_TYPES
 from ..psf.psf_selection import get_gridded_psf_library, get_psf_wings
+from ..psf.psf_renderer import BatchedPSFRenderer
+from ..psf.stamp_cache import PSFStampCache
+from .sersic_stamp_cache import SersicStampCache
+from .fft_convolution import StampConvolver
+from .extended_stamp_store import ExtendedStampStore
+from .lazy_ramp import LazyRamp
 from ..psf.segment_psfs import (get_gridded_segment_psf_library_list,
                                 get_segment_offset, get_segment_library_list)
 from ..utils.constants import grism_factor
@@ -108,186 +118,241 @@ class Catalog_seed():
         # with multiple sources having the same index numbers
         self.maxindex = 0
 
+        # Optional cache of evaluated PSF stamps. Created in make_seed
+        # if requested in the input yaml file
+        self.psf_stamp_cache = None
+
+        # Optional cache of normalized Sersic profile stamps. Created in
+        # make_seed if requested in the input yaml file
+        self.sersic_stamp_cache = None
+
+        # Engine for convolving galaxy and extended source stamps with
+        # their PSFs in batches. Created in make_seed unless turned off
+        # in the input yaml file
+        self.stamp_convolver = None
+
+        # Store of extended source stamp images, shared by all sources
+        # using the same file
+        self.extended_stamp_store = ExtendedStampStore()
+
+        # Batched PSF renderers, keyed by the id of the PSF library
+        self.psf_renderers = {}
+
+        # Stage timing and memory profiler. Enabled in make_seed if
+        # requested in the input yaml file
+        self.profiler = StageProfiler(enabled=False)
+
     def make_seed(self):
         """MAIN FUNCTION"""
         # Read in input parameters and quality check
         self.readParameterFile()
-
-        # Create dictionary to use when looking in CRDS for reference files
-        self.crds_dict = crds_tools.dict_from_yaml(self.params)
-
-        # Expand param entries to full paths where appropriate
-        self.params = utils.full_paths(self.params, self.modpath, self.crds_dict, offline=self.offline)
-        self.filecheck()
-        self.basename = os.path.join(self.params['Output']['directory'],
-                                     self.params['Output']['file'][0:-5].split('/')[-1])
-        self.params['Output']['file'] = self.basename + self.params['Output']['file'][-5:]
-        self.subdict = utils.read_subarray_definition_file(self.params['Reffiles']['subarray_defs'])
-        self.check_params()
-        self.params = utils.get_subarray_info(self.params, self.subdict)
-        self.coord_transform = self.read_distortion_reffile()
-        self.grism_direct_factor = grism_factor(self.params['Inst']['instrument'].lower())
-        self.expand_catalog_for_segments = bool(self.params['simSignals']['expand_catalog_for_segments'])
-        self.add_psf_wings = self.params['simSignals']['add_psf_wings']
-
-        # If the output is a direct image to be dispersed, expand the size
-        # of the nominal FOV so the disperser can account for sources just
-        # outside whose traces will fall into the FOV
-        if (self.params['Output']['grism_source_image']) or (self.params['Inst']['mode'] in ["pom"]):
-            self.calcCoordAdjust()
-
-        # Image dimensions
-        self.nominal_dims = np.array([self.subarray_bounds[3] - self.subarray_bounds[1] + 1,
-                                      self.subarray_bounds[2] - self.subarray_bounds[0] + 1])
-        self.output_dims = (self.nominal_dims * np.array([self.coord_adjust['y'],
-                                                          self.coord_adjust['x']])).astype(np.int)
-
-        print('XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
-        print('output dimensions are: {}'.format(self.output_dims))
-        print('XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
-
-        # calculate the exposure time of a single frame, based on the size of the subarray
-        self.frametime = utils.calc_frame_time(self.params['Inst']['instrument'],
-                                               self.params['Readout']['array_name'],
-                                               self.nominal_dims[0], self.nominal_dims[1],
-                                               self.params['Readout']['namp'])
-        print("Frametime is {}".format(self.frametime))
-
-        # Read in the pixel area map, which will be needed for certain
-        # sources in the seed image
-        self.prepare_PAM()
-
-        # Read in the PSF library file corresponding to the detector and filter
-        # For WFSS simulations, use the PSF libraries with the appropriate CLEAR element
-        self.psf_pupil = self.params['Readout']['pupil']
-        self.psf_filter = self.params['Readout']['filter']
-        if self.params['Readout']['pupil'].lower() in ['grismr', 'grismc']:
-            self.psf_pupil = 'CLEAR'
-        if self.params['Readout']['filter'].lower() in ['gr150r', 'gr150c']:
-            self.psf_filter = 'CLEAR'
-
-        # If reading in a normal PSF, use get_gridded_psf_library to get a
-        # single photutils.griddedPSFModel object
-        if not self.expand_catalog_for_segments:
-            self.psf_library = get_gridded_psf_library(
-                self.params['Inst']['instrument'], self.detector, self.psf_filter, self.psf_pupil,
-                self.params['simSignals']['psfwfe'],
-                self.params['simSignals']['psfwfegroup'],
-                self.params['simSignals']['psfpath'])
-            self.psf_library_core_y_dim, self.psf_library_core_x_dim = self.psf_library.data.shape[-2:]
-            self.psf_library_oversamp = self.psf_library.oversampling
-
-        # If reading in segment PSFs, use get_gridded_segment_psf_library_list
-        # to get a list of photutils.griddedPSFModel objects
-        else:
-            self.psf_library = get_gridded_segment_psf_library_list(
-                self.params['Inst']['instrument'], self.detector, self.psf_filter,
-                self.params['simSignals']['psfpath'], pupilname=self.psf_pupil)
-            self.psf_library_core_y_dim, self.psf_library_core_x_dim = self.psf_library[0].data.shape[-2:]
-            self.psf_library_oversamp = 1
-
-        # Set the psf core dimensions to actually be 2 rows and columns
-        # less than the dimensions in the library file. This is because
-        # we will later evaluate the library using these core dimensions.
-        # If we were to evaluate a library that is 51x51 pixels using a
-        # 51x51 pixel grid, then if the source is centered close to the
-        # edge of the central pixel, you can end up with an zeroed out
-        # edge row or column in the evaluated array. So we do this to be
-        # sure that we are evaluating the library with a slightly smaller
-        # array than the array in the library.
-        self.psf_library_core_x_dim = np.int(self.psf_library_core_x_dim / self.psf_library_oversamp) - \
-            self.params['simSignals']['gridded_psf_library_row_padding']
-        self.psf_library_core_y_dim = np.int(self.psf_library_core_y_dim / self.psf_library_oversamp) - \
-            self.params['simSignals']['gridded_psf_library_row_padding']
-
-        if self.add_psf_wings is True:
-            self.psf_wings = get_psf_wings(self.params['Inst']['instrument'], self.detector,
-                                           self.psf_filter, self.psf_pupil,
-                                           self.params['simSignals']['psfwfe'],
-                                           self.params['simSignals']['psfwfegroup'],
-                                           os.path.join(self.params['simSignals']['psfpath'], 'psf_wings'))
-
-            # Read in the file that defines PSF array sizes based on magnitude
-            self.psf_wing_sizes = ascii.read(self.params['simSignals']['psf_wing_threshold_file'])
-            max_wing_size = self.psf_wings.shape[0]
-            too_large = np.where(np.array(self.psf_wing_sizes['number_of_pixels']) > max_wing_size)[0]
-            if len(too_large) > 0:
-                print(('Some PSF sizes in {} are larger than the PSF library file dimensions. '
-                       'Resetting these values in the table to be equal to the PSF dimensions'
-                       .format(os.path.basename(self.params['simSignals']['psf_wing_threshold_file']))))
-                self.psf_wing_sizes['number_of_pixels'][too_large] = max_wing_size
-
-        # For imaging mode, generate the countrate image using the catalogs
-        if self.params['Telescope']['tracking'].lower() != 'non-sidereal':
-            print('Creating signal rate image of synthetic inputs.')
-            self.seedimage, self.seed_segmap = self.create_sidereal_image()
-            outapp = ''
-
-        # If we are tracking a non-sidereal target, then
-        # everything in the catalogs needs to be streaked across
-        # the detector
-        if self.params['Telescope']['tracking'].lower() == 'non-sidereal':
-            print('Creating signal ramp of synthetic inputs')
-            self.seedimage, self.seed_segmap = self.non_sidereal_seed()
-            outapp = '_nonsidereal_target'
-
-        # If non-sidereal targets are requested (KBOs, asteroids, etc,
-        # create a RAPID integration which includes those targets
-        mov_targs_ramps = []
-        if (self.runStep['movingTargets'] | self.runStep['movingTargetsSersic']
-                | self.runStep['movingTargetsExtended']):
-            print(("Creating signal ramp of sources that are moving with "
-                   "respect to telescope tracking."))
-            trailed_ramp, trailed_segmap = self.make_trailed_ramp()
-            outapp += '_trailed_sources'
-
-            # Now we need to expand frameimage into a ramp
-            # so we can add the trailed objects
-            print('Combining trailed object ramp with that containing tracked targets')
+        self.profiler = StageProfiler(enabled=profiling_requested(self.params))
+        try:
+            with self.profiler.stage('read_inputs'):
+                # Create dictionary to use when looking in CRDS for reference files
+                self.crds_dict = crds_tools.dict_from_yaml(self.params)
+
+                # Expand param entries to full paths where appropriate
+                self.params = utils.full_paths(self.params, self.modpath, self.crds_dict, offline=self.offline)
+                self.filecheck()
+                self.basename = os.path.join(self.params['Output']['directory'],
+                                             self.params['Output']['file'][0:-5].split('/')[-1])
+                self.params['Output']['file'] = self.basename + self.params['Output']['file'][-5:]
+                self.subdict = utils.read_subarray_definition_file(self.params['Reffiles']['subarray_defs'])
+                self.check_params()
+                self.params = utils.get_subarray_info(self.params, self.subdict)
+                self.coord_transform = self.read_distortion_reffile()
+                self.grism_direct_factor = grism_factor(self.params['Inst']['instrument'].lower())
+                self.expand_catalog_for_segments = bool(self.params['simSignals']['expand_catalog_for_segments'])
+                self.add_psf_wings = self.params['simSignals']['add_psf_wings']
+
+                # If the output is a direct image to be dispersed, expand the size
+                # of the nominal FOV so the disperser can account for sources just
+                # outside whose traces will fall into the FOV
+                if (self.params['Output']['grism_source_image']) or (self.params['Inst']['mode'] in ["pom"]):
+                    self.calcCoordAdjust()
+
+                # Image dimensions
+                self.nominal_dims = np.array([self.subarray_bounds[3] - self.subarray_bounds[1] + 1,
+                                              self.subarray_bounds[2] - self.subarray_bounds[0] + 1])
+                self.output_dims = (self.nominal_dims * np.array([self.coord_adjust['y'],
+                                                                  self.coord_adjust['x']])).astype(np.int)
+
+                print('XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
+                print('output dimensions are: {}'.format(self.output_dims))
+                print('XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
+
+                # calculate the exposure time of a single frame, based on the size of the subarray
+                self.frametime = utils.calc_frame_time(self.params['Inst']['instrument'],
+                                                       self.params['Readout']['array_name'],
+                                                       self.nominal_dims[0], self.nominal_dims[1],
+                                                       self.params['Readout']['namp'])
+                print("Frametime is {}".format(self.frametime))
+
+                # Read in the pixel area map, which will be needed for certain
+                # sources in the seed image
+                self.prepare_PAM()
+            with self.profiler.stage('read_psf_library'):
+                # Read in the PSF library file corresponding to the detector and filter
+                # For WFSS simulations, use the PSF libraries with the appropriate CLEAR element
+                self.psf_pupil = self.params['Readout']['pupil']
+                self.psf_filter = self.params['Readout']['filter']
+                if self.params['Readout']['pupil'].lower() in ['grismr', 'grismc']:
+                    self.psf_pupil = 'CLEAR'
+                if self.params['Readout']['filter'].lower() in ['gr150r', 'gr150c']:
+                    self.psf_filter = 'CLEAR'
+
+                # If reading in a normal PSF, use get_gridded_psf_library to get a
+                # single photutils.griddedPSFModel object
+                if not self.expand_catalog_for_segments:
+                    self.psf_library = get_gridded_psf_library(
+                        self.params['Inst']['instrument'], self.detector, self.psf_filter, self.psf_pupil,
+                        self.params['simSignals']['psfwfe'],
+                        self.params['simSignals']['psfwfegroup'],
+                        self.params['simSignals']['psfpath'])
+                    self.psf_library_core_y_dim, self.psf_library_core_x_dim = self.psf_library.data.shape[-2:]
+                    self.psf_library_oversamp = self.psf_library.oversampling
+
+                # If reading in segment PSFs, use get_gridded_segment_psf_library_list
+                # to get a list of photutils.griddedPSFModel objects
+                else:
+                    self.psf_library = get_gridded_segment_psf_library_list(
+                        self.params['Inst']['instrument'], self.detector, self.psf_filter,
+                        self.params['simSignals']['psfpath'], pupilname=self.psf_pupil)
+                    self.psf_library_core_y_dim, self.psf_library_core_x_dim = self.psf_library[0].data.shape[-2:]
+                    self.psf_library_oversamp = 1
+
+                # Set the psf core dimensions to actually be 2 rows and columns
+                # less than the dimensions in the library file. This is because
+                # we will later evaluate the library using these core dimensions.
+                # If we were to evaluate a library that is 51x51 pixels using a
+                # 51x51 pixel grid, then if the source is centered close to the
+                # edge of the central pixel, you can end up with an zeroed out
+                # edge row or column in the evaluated array. So we do this to be
+                # sure that we are evaluating the library with a slightly smaller
+                # array than the array in the library.
+                self.psf_library_core_x_dim = np.int(self.psf_library_core_x_dim / self.psf_library_oversamp) - \
+                    self.params['simSignals']['gridded_psf_library_row_padding']
+                self.psf_library_core_y_dim = np.int(self.psf_library_core_y_dim / self.psf_library_oversamp) - \
+                    self.params['simSignals']['gridded_psf_library_row_padding']
+
+                # Set up the cache of evaluated PSF stamps if requested
+                if self.params['simSignals']['psf_stamp_cache']:
+                    self.psf_stamp_cache = PSFStampCache(
+                        subpixel_step=self.params['simSignals']['psf_stamp_cache_subpixel_step'],
+                        max_memory_mb=self.params['simSignals']['psf_stamp_cache_max_mb'])
+
+                # Set up the cache of galaxy Sersic profile stamps if requested
+                if self.params['simSignals']['sersic_stamp_cache']:
+                    self.sersic_stamp_cache = SersicStampCache(
+                        tolerance=self.params['simSignals']['sersic_stamp_cache_tolerance'],
+                        max_memory_mb=self.params['simSignals']['sersic_stamp_cache_max_mb'])
+
+                # Set up the batched convolution of galaxy and extended source stamps
+                if self.params['simSignals']['convolution_batch_size']:
+                    self.stamp_convolver = StampConvolver(
+                        batch_size=self.params['simSignals']['convolution_batch_size'],
+                        workers=self.params['simSignals']['fft_workers'])
+
+                if self.add_psf_wings is True:
+                    self.psf_wings = get_psf_wings(self.params['Inst']['instrument'], self.detector,
+                                                   self.psf_filter, self.psf_pupil,
+                                                   self.params['simSignals']['psfwfe'],
+                                                   self.params['simSignals']['psfwfegroup'],
+                                                   os.path.join(self.params['simSignals']['psfpath'], 'psf_wings'))
+
+                    # Read in the file that defines PSF array sizes based on magnitude
+                    self.psf_wing_sizes = ascii.read(self.params['simSignals']['psf_wing_threshold_file'])
+                    max_wing_size = self.psf_wings.shape[0]
+                    too_large = np.where(np.array(self.psf_wing_sizes['number_of_pixels']) > max_wing_size)[0]
+                    if len(too_large) > 0:
+                        print(('Some PSF sizes in {} are larger than the PSF library file dimensions. '
+                               'Resetting these values in the table to be equal to the PSF dimensions'
+                               .format(os.path.basename(self.params['simSignals']['psf_wing_threshold_file']))))
+                        self.psf_wing_sizes['number_of_pixels'][too_large] = max_wing_size
+
+            # For imaging mode, generate the countrate image using the catalogs
             if self.params['Telescope']['tracking'].lower() != 'non-sidereal':
-                self.seedimage = self.combineSimulatedDataSources('countrate', self.seedimage, trailed_ramp)
-            else:
-                self.seedimage = self.combineSimulatedDataSources('ramp', self.seedimage, trailed_ramp)
-            self.seed_segmap += trailed_segmap
-
-        # For seed images to be dispersed in WFSS mode,
-        # embed the seed image in a full frame array. The disperser
-        # tool does not work on subarrays
-        aperture_suffix = self.params['Readout']['array_name'].split('_')[-1]
-        if ((self.params['Inst']['mode'] in ['wfss', 'ts_wfss']) & \
-           (aperture_suffix not in ['FULL', 'CEN'])):
-            self.seedimage, self.seed_segmap = self.pad_wfss_subarray(self.seedimage, self.seed_segmap)
-
-        # For NIRISS POM data, extract the central 2048x2048
-        if self.params['Inst']['mode'] in ["pom"]:
-            self.seedimage, self.seed_segmap = self.extract_full_from_pom(self.seedimage, self.seed_segmap)
-
-        # MASK IMAGE
-        # Create a mask so that we don't add signal to masked pixels
-        # Initially this includes only the reference pixels
-        # Keep the mask image equal to the true subarray size, since this
-        # won't be used to make a requested grism source image
-        if self.params['Inst']['mode'] not in ['wfss']:
-            maskimage = np.zeros((self.ffsize, self.ffsize), dtype=np.int)
-            maskimage[4:self.ffsize-4, 4:self.ffsize-4] = 1.
-
-            # crop the mask to match the requested output array
-            ap_suffix = self.params['Readout']['array_name'].split('_')[1]
-            if ap_suffix not in ['FULL', 'CEN']:
-                maskimage = maskimage[self.subarray_bounds[1]:self.subarray_bounds[3] + 1,
-                                      self.subarray_bounds[0]:self.subarray_bounds[2] + 1]
-
-            # Multiply the mask by the seed image and segmentation map in
-            # order to reflect the fact that reference pixels have no signal
-            # from external sources
-            self.seedimage *= maskimage
-            self.seed_segmap *= maskimage
-
-        # Save the combined static + moving targets ramp
-        self.saveSeedImage()
-
-        # Return info in a tuple
-        # return (self.seedimage, self.seed_segmap, self.seedinfo)
+                print('Creating signal rate image of synthetic inputs.')
+                with self.profiler.stage('sidereal_image'):
+                    self.seedimage, self.seed_segmap = self.create_sidereal_image()
+                outapp = ''
+
+            # If we are tracking a non-sidereal target, then
+            # everything in the catalogs needs to be streaked across
+            # the detector
+            if self.params['Telescope']['tracking'].lower() == 'non-sidereal':
+                print('Creating signal ramp of synthetic inputs')
+                with self.profiler.stage('non_sidereal_seed'):
+                    self.seedimage, self.seed_segmap = self.non_sidereal_seed()
+                outapp = '_nonsidereal_target'
+
+            # If non-sidereal targets are requested (KBOs, asteroids, etc,
+            # create a RAPID integration which includes those targets
+            mov_targs_ramps = []
+            if (self.runStep['movingTargets'] | self.runStep['movingTargetsSersic']
+                    | self.runStep['movingTargetsExtended']):
+                print(("Creating signal ramp of sources that are moving with "
+                       "respect to telescope tracking."))
+                with self.profiler.stage('moving_targets'):
+                    trailed_ramp, trailed_segmap = self.make_trailed_ramp()
+                outapp += '_trailed_sources'
+
+                # Now we need to expand frameimage into a ramp
+                # so we can add the trailed objects
+                print('Combining trailed object ramp with that containing tracked targets')
+                if self.params['Telescope']['tracking'].lower() != 'non-sidereal':
+                    self.seedimage = self.combineSimulatedDataSources('countrate', self.seedimage, trailed_ramp)
+                else:
+                    self.seedimage = self.combineSimulatedDataSources('ramp', self.seedimage, trailed_ramp)
+                self.seed_segmap += trailed_segmap
+
+            # For seed images to be dispersed in WFSS mode,
+            # embed the seed image in a full frame array. The disperser
+            # tool does not work on subarrays
+            aperture_suffix = self.params['Readout']['array_name'].split('_')[-1]
+            if ((self.params['Inst']['mode'] in ['wfss', 'ts_wfss']) & \
+               (aperture_suffix not in ['FULL', 'CEN'])):
+                self.seedimage, self.seed_segmap = self.pad_wfss_subarray(self.seedimage, self.seed_segmap)
+
+            # For NIRISS POM data, extract the central 2048x2048
+            if self.params['Inst']['mode'] in ["pom"]:
+                self.seedimage, self.seed_segmap = self.extract_full_from_pom(self.seedimage, self.seed_segmap)
+
+            # MASK IMAGE
+            # Create a mask so that we don't add signal to masked pixels
+            # Initially this includes only the reference pixels
+            # Keep the mask image equal to the true subarray size, since this
+            # won't be used to make a requested grism source image
+            if self.params['Inst']['mode'] not in ['wfss']:
+                maskimage = np.zeros((self.ffsize, self.ffsize), dtype=np.int)
+                maskimage[4:self.ffsize-4, 4:self.ffsize-4] = 1.
+
+                # crop the mask to match the requested output array
+                ap_suffix = self.params['Readout']['array_name'].split('_')[1]
+                if ap_suffix not in ['FULL', 'CEN']:
+                    maskimage = maskimage[self.subarray_bounds[1]:self.subarray_bounds[3] + 1,
+                                          self.subarray_bounds[0]:self.subarray_bounds[2] + 1]
+
+                # Multiply the mask by the seed image and segmentation map in
+                # order to reflect the fact that reference pixels have no signal
+                # from external sources
+                self.seedimage *= maskimage
+                self.seed_segmap *= maskimage
+
+            # Save the combined static + moving targets ramp
+            with self.profiler.stage('file_writes'):
+                self.saveSeedImage()
+
+            self.profiler.write_report(self.basename + '_seed_profile.json', entry_point='Catalog_seed.make_seed',
+                                       yaml_file=self.paramfile)
+
+            # Return info in a tuple
+            # return (self.seedimage, self.seed_segmap, self.seedinfo)
+        finally:
+            # Close the extended source stamp files
+            self.extended_stamp_store.close()
+            self.profiler.stop_tracing()
 
     def extract_full_from_pom(self, seedimage, seed_segmap):
         """ Given the seed image and segmentation images for the NIRISS POM field of view,
@@ -358,7 +423,7 @@ class Catalog_seed():
         """
         data, header = fits.getdata(filename, header=True)
         if len(data.shape) != 2:
-            data, header = fits.getdata(filename, 1)
+            data, header = fits.getdata(filename, 1, header=True)
         return data, header
 
     def prepare_PAM(self):
@@ -452,12 +517,12 @@ class Catalog_seed():
         if len(seeddim) == 2:
             padded_seed = np.zeros((nx, nx))
             padded_seed[exbounds[1]:exbounds[3] + 1, exbounds[0]:exbounds[2] + 1] = seed
-            padded_seg = np.zeros((nx, nx), dtype=np.int)
+            padded_seg = np.zeros((nx, nx), dtype=segmap.LABEL_DTYPE)
             padded_seg[exbounds[1]:exbounds[3] + 1, exbounds[0]:exbounds[2] + 1] = seg
         elif len(seeddim) == 4:
             padded_seed = np.zeros((seeddim[0], seeddim[1], nx, nx))
             padded_seed[:, :, exbounds[1]:exbounds[3] + 1, exbounds[0]:exbounds[2] + 1] = seed
-            padded_seg = np.zeros((seeddim[0], seeddim[1], nx, nx), dtype=np.int)
+            padded_seg = np.zeros((seeddim[0], seeddim[1], nx, nx), dtype=segmap.LABEL_DTYPE)
             padded_seg[:, :, exbounds[1]:exbounds[3] + 1, exbounds[0]:exbounds[2] + 1] = seg
         else:
             raise ValueError("Seed image is not 2D or 4D. It should be.")
@@ -586,7 +651,9 @@ class Catalog_seed():
 
     def make_trailed_ramp(self):
         # Create a ramp for objects that are trailing through
-        # the field of view during the integration
+        # the field of view during the integration. When tracking a
+        # non-sidereal target, the ramp is a LazyRamp, to be added to
+        # the lazy seed exposure
         mov_targs_ramps = []
         mov_targs_segmap = None
 
@@ -607,7 +674,8 @@ class Catalog_seed():
                                                                        'pointSource',
                                                                        MT_tracking=tracking,
                                                                        tracking_ra_vel=ra_vel,
-                                                                       tracking_dec_vel=dec_vel)
+                                                                       tracking_dec_vel=dec_vel,
+                                                                       lazy=tracking)
             # Multiply by pixel area map since these sources are trailed across detector
             mov_targs_ptsrc *= self.pam
             mov_targs_ramps.append(mov_targs_ptsrc)
@@ -620,7 +688,8 @@ class Catalog_seed():
                                                                          'galaxies',
                                                                          MT_tracking=tracking,
                                                                          tracking_ra_vel=ra_vel,
-                                                                         tracking_dec_vel=dec_vel)
+                                                                         tracking_dec_vel=dec_vel,
+                                                                         lazy=tracking)
             # Multiply by pixel area map
             mov_targs_sersic *= self.pam
             mov_targs_ramps.append(mov_targs_sersic)
@@ -636,7 +705,8 @@ class Catalog_seed():
                                                                    'extended',
                                                                    MT_tracking=tracking,
                                                                    tracking_ra_vel=ra_vel,
-                                                                   tracking_dec_vel=dec_vel)
+                                                                   tracking_dec_vel=dec_vel,
+                                                                   lazy=tracking)
             # Multiply by pixel area map
             mov_targs_ext *= self.pam
             mov_targs_ramps.append(mov_targs_ext)
@@ -677,7 +747,9 @@ class Catalog_seed():
     def non_sidereal_seed(self):
         """
         Create a seed EXPOSURE in the case where the instrument is tracking
-        a non-sidereal target
+        a non-sidereal target. The exposure is returned as a ``LazyRamp``,
+        containing the signal rate of the tracked target(s) and the trails
+        of the other sources, from which frames are created as needed.
         """
 
         # Create a count rate image containing only the non-sidereal target(s)
@@ -693,11 +765,7 @@ class Catalog_seed():
         ns_nskip = self.params['Readout']['nskip']
         totframes = ns_group * (ns_nframe + ns_nskip)
         tmptimes = self.frametime * np.arange(1, totframes + 1)
-
-        non_sidereal_ramp = np.zeros((ns_int, totframes, ns_yd, ns_xd))
-        for i in range(totframes):
-            for integ in range(ns_int):
-                non_sidereal_ramp[integ, i, :, :] = nonsidereal_countrate * tmptimes[i]
+        non_sidereal_ramp = LazyRamp(nonsidereal_countrate, tmptimes, nint=ns_int)
 
         # Now we need to collect all the other sources (point sources,
         # galaxies, extended) in the other input files, and treat them
@@ -715,7 +783,8 @@ class Catalog_seed():
                                                                   MT_tracking=True,
                                                                   tracking_ra_vel=self.ra_vel,
                                                                   tracking_dec_vel=self.dec_vel,
-                                                                  trackingPixVelFlag=vel_flag)
+                                                                  trackingPixVelFlag=vel_flag,
+                                                                  lazy=True)
             # Multiply by pixel area map since these sources are trailed
             # across detector
             mtt_ptsrc *= self.pam
@@ -734,7 +803,8 @@ class Catalog_seed():
                                                                         MT_tracking=True,
                                                                         tracking_ra_vel=self.ra_vel,
                                                                         tracking_dec_vel=self.dec_vel,
-                                                                        trackingPixVelFlag=vel_flag)
+                                                                        trackingPixVelFlag=vel_flag,
+                                                                        lazy=True)
             # Multiply by pixel area map
             mtt_galaxies *= self.pam
             mtt_data_list.append(mtt_galaxies)
@@ -753,7 +823,8 @@ class Catalog_seed():
                                                               MT_tracking=True,
                                                               tracking_ra_vel=self.ra_vel,
                                                               tracking_dec_vel=self.dec_vel,
-                                                              trackingPixVelFlag=vel_flag)
+                                                              trackingPixVelFlag=vel_flag,
+                                                              lazy=True)
             # Multiply by pixel area map
             mtt_ext *= self.pam
             mtt_data_list.append(mtt_ext)
@@ -880,20 +951,35 @@ class Catalog_seed():
             indexes = catalog_table['index']
         else:
             indexes = np.arange(1, len(catalog_table['x_or_RA']) + 1)
+
+        # Catalogs read using the spatial index or in chunks contain only
+        # the sources near the aperture, and record the range of index
+        # numbers in the full catalog, so that the same offsets are applied
+        # as when reading the full catalog
+        if 'index_range' in catalog_table.meta:
+            min_index, max_index = catalog_table.meta['index_range']
+        elif len(indexes) > 0:
+            min_index, max_index = np.min(indexes), np.max(indexes)
+        else:
+            return indexes
+
         # Make sure there is no 0th object
-        if np.min(indexes) == 0:
+        if min_index == 0:
             indexes += 1
+            min_index += 1
+            max_index += 1
         # Make sure the index numbers don't overlap with any
         # sources already present. Increment the maxindex
         # value.
-        if np.min(indexes) <= self.maxindex:
+        if min_index <= self.maxindex:
             indexes += self.maxindex
-        self.maxindex = np.max(indexes)
+            max_index += self.maxindex
+        self.maxindex = max_index
         return indexes
 
     def movingTargetInputs(self, filename, input_type, MT_tracking=False,
                            tracking_ra_vel=None, tracking_dec_vel=None,
-                           trackingPixVelFlag=False):
+                           trackingPixVelFlag=False, lazy=False):
         """Read in listfile of moving targets and perform needed
         calculations to get inputs for moving_targets.py
 
@@ -922,10 +1008,14 @@ class Catalog_seed():
             velocities are in the detector x and y directions, respectively.
             If False, velocity untis are arcsec/hour and directions are RA, and Dec.
 
+        lazy : bool
+            If True, the seed image is returned as a ``LazyRamp``, which keeps
+            only the area of each frame crossed by each source
+
         Returns
         -------
 
-        mt_integration : numpy.ndarray
+        mt_integration : numpy.ndarray or mirage.seed_image.lazy_ramp.LazyRamp
             4D array containing moving target seed image
 
         moving_segmap.segmap : numpy.ndarray
@@ -990,7 +1080,11 @@ class Catalog_seed():
 
         # Set up seed integration
         #mt_integration = np.zeros((numints, total_frames, newdimsy, newdimsx))
-        mt_integration = np.zeros((numints, frames_per_integration, newdimsy, newdimsx))
+        if lazy:
+            mt_integration = LazyRamp(np.zeros((newdimsy, newdimsx)),
+                                      self.frametime * np.arange(1, frames_per_integration + 1), nint=numints)
+        else:
+            mt_integration = np.zeros((numints, frames_per_integration, newdimsy, newdimsx))
 
         # Corresponding (2D) segmentation map
         moving_segmap = segmap.SegMap()
@@ -1006,192 +1100,404 @@ class Catalog_seed():
         # Determine the name of the column to use for source magnitudes
         mag_column = self.select_magnitude_column(mtlist, filename)
 
+        # Get countrate and PSF size info for all sources. Sources
+        # with no magnitude are given a countrate of 1.0
+        rates = np.ones(len(mtlist))
+        magnitudes = np.array([np.nan if mag is None else mag for mag in mtlist[mag_column]],
+                              dtype=np.float64)
+        has_magnitude = np.isfinite(magnitudes)
+        if np.any(has_magnitude):
+            rates[has_magnitude] = utils.magnitude_to_countrate(self.params['Inst']['mode'], magsys,
+                                                                magnitudes[has_magnitude],
+                                                                photfnu=self.photfnu,
+                                                                photflam=self.photflam,
+                                                                vegamag_zeropoint=self.vegazeropoint)
+        psf_x_dims = self.find_psf_size(rates)
+
+        # Calculate x,y and RA,Dec of the initial position of all sources
+        pixelxs, pixelys, ras, decs, ra_strs, dec_strs = self.get_positions_array(mtlist['x_or_RA'],
+                                                                                  mtlist['y_or_Dec'],
+                                                                                  pixelFlag, 4096)
+
+        frame_info = {'frame_times': frameexptimes, 'numints': numints,
+                      'frames_per_integration': frames_per_integration,
+                      'output_dims': (newdimsy, newdimsx), 'pixel_flag': pixelFlag,
+                      'pixel_velocity_flag': pixvelflag}
+
+        # Calculate the x,y positions of all sources in all frames
+        all_x_frames, all_y_frames = self.frame_positions(pixelxs, pixelys, ras, decs,
+                                                          mtlist['x_or_RA_velocity'],
+                                                          mtlist['y_or_Dec_velocity'],
+                                                          frameexptimes, pixvelflag)
+
+        # Render moving galaxies using a pool of worker processes if requested
+        nproc = self.params['simSignals']['nproc']
+        if input_type == 'galaxies' and nproc > 1 and len(mtlist) > 1:
+            if parallel_rendering.fork_available():
+                sources = {'index': indexes, 'entry': mtlist, 'rate': rates, 'psf_x_dim': psf_x_dims,
+                           'pixelx': pixelxs, 'pixely': pixelys, 'ra': ras, 'dec': decs,
+                           'x_frames': all_x_frames, 'y_frames': all_y_frames}
+                contributions = parallel_rendering.render_moving_targets(self, input_type, sources,
+                                                                         frame_info, nproc)
+                for index, integ, y_start, x_start, mt_source in contributions:
+                    self.add_moving_target(mt_integration, moving_segmap, input_type, index, integ,
+                                           mt_source, y_start=y_start, x_start=x_start)
+                return mt_integration, moving_segmap.segmap
+            else:
+                print(('WARNING: Parallel rendering of galaxies requires the fork start method. '
+                       'Adding moving galaxies serially.'))
+
+        # Evaluate the PSF library at the initial positions in batches
+        core_stamps = self.psf_core_stamps(pixelxs, pixelys)
+
         times = []
         obj_counter = 0
         time_reported = False
-        for index, entry in zip(indexes, mtlist):
+        for index, entry, rate, psf_x_dim, pixelx, pixely, ra, dec, core_stamp, x_frames, y_frames in zip(
+                indexes, mtlist, rates, psf_x_dims, pixelxs, pixelys, ras, decs, core_stamps,
+                all_x_frames, all_y_frames):
             start_time = time.time()
-            # For each object, calculate x,y or RA,Dec of initial position
-            pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions(
-                entry['x_or_RA'], entry['y_or_Dec'], pixelFlag, 4096)
-
-            # Now generate a list of x,y position in each frame
-            if pixvelflag is False:
-                # Calculate the RA,Dec in each frame
-                # input velocities are arcsec/hour. ra/dec are in units of degrees,
-                # so divide velocities by 3600^2.
-                ra_frames = ra + (entry['x_or_RA_velocity'] / 3600. / 3600.) * frameexptimes
-                dec_frames = dec + (entry['y_or_Dec_velocity'] / 3600. / 3600.) * frameexptimes
-
-                x_frames = []
-                y_frames = []
-                for in_ra, in_dec in zip(ra_frames, dec_frames):
-                    # Calculate the x,y position at each frame
-                    px, py, pra, pdec, pra_str, pdec_str = self.get_positions(in_ra, in_dec, False, 4096)
-                    x_frames.append(px)
-                    y_frames.append(py)
-                x_frames = np.array(x_frames)
-                y_frames = np.array(y_frames)
 
-            else:
-                # If input velocities are pixels/hour, then generate the list of
-                # x,y in each frame directly
-                x_frames = pixelx + (entry['x_or_RA_velocity'] / 3600.) * frameexptimes
-                y_frames = pixely + (entry['y_or_Dec_velocity'] / 3600.) * frameexptimes
-
-            # Get countrate and PSF size info
-            if entry[mag_column] is not None:
-                rate = utils.magnitude_to_countrate(self.params['Inst']['mode'],
-                                                    magsys, entry[mag_column],
-                                                    photfnu=self.photfnu,
-                                                    photflam=self.photflam)
-            else:
-                rate = 1.0
+            integrations = self.create_moving_target(input_type, entry, rate, psf_x_dim, pixelx, pixely,
+                                                     ra, dec, frame_info, core_stamp=core_stamp,
+                                                     x_frames=x_frames, y_frames=y_frames)
+            if integrations is None:
+                continue
 
-            psf_x_dim = self.find_psf_size(rate)
-            psf_dimensions = (psf_x_dim, psf_x_dim)
-            #psf_dimensions = (self.psf_library_x_dim, self.psf_library_y_dim)
+            for integ, mt_source, y_start, x_start in integrations:
+                self.add_moving_target(mt_integration, moving_segmap, input_type, index, integ, mt_source,
+                                       y_start=y_start, x_start=x_start)
 
-            # If we have a point source, we can easily determine whether
-            # it completely misses the detector, since we know the size
-            # of the stamp already. For galaxies and extended sources,
-            # we have to get the stamp image first to see if any part of
-            # the stamp lands on the detector.
-            status = 'on'
-            if input_type == 'pointSource':
+            # Check the elapsed time for creating each object
+            elapsed_time = time.time() - start_time
+            times.append(elapsed_time)
+            if obj_counter > 3 and not time_reported:
+                avg_time = np.mean(times)
+                total_time = len(indexes) * avg_time
+                print(("Expected time to process {} sources: {:.2f} seconds "
+                       "({:.2f} minutes)".format(len(indexes), total_time, total_time/60)))
+                time_reported = True
+            obj_counter += 1
+        return mt_integration, moving_segmap.segmap
 
-                status = self.on_detector(x_frames, y_frames, psf_dimensions,
-                                          (newdimsx, newdimsy))
-            if status == 'off':
-                continue
+    def create_moving_target(self, input_type, entry, rate, psf_x_dim, pixelx, pixely, ra, dec,
+                             frame_info, core_stamp=None, x_frames=None, y_frames=None):
+        """Create the signal of a single moving target in each frame of
+        each integration
 
-            # Create the PSF
-            eval_psf, minx, miny, wings_added = self.create_psf_stamp(pixelx, pixely, psf_x_dim, psf_x_dim,
-                                                                      ignore_detector=True)
+        Parameters
+        ----------
+        input_type : str
+            Specifies type of source. Can be 'pointSource','galaxies', or 'extended'
 
-            # Skip sources that fall completely off the detector
-            if eval_psf is None:
-                continue
+        entry : astropy.table.Row
+            Row of the moving target catalog
 
-            if input_type == 'pointSource':
-                stamp = eval_psf
-                stamp *= rate
+        rate : float
+            Countrate of the source in e-/sec
 
-            elif input_type == 'extended':
-                stamp, header = self.basic_get_image(entry['filename'])
-                print('Extended source rotations turned off while evaluating rotate bug')
-                #stamp = self.rotate_extended_image(stamp, entry['pos_angle'], ra, dec)
+        psf_x_dim : int
+            Size of the PSF stamp for the source
 
-                # If no magnitude is given, use the extended image as-is
-                if rate != 1.0:
-                    stamp /= np.sum(stamp)
-                    stamp *= rate
+        pixelx : float
+            Initial x-coordinate of the source, in the coordinate system
+            of the aperture
 
-                # Convolve with instrument PSF if requested
-                if self.params['simSignals']['PSFConvolveExtended']:
-                    stamp_dims = stamp.shape
-                    # If the stamp image is smaller than the PSF in either
-                    # dimension, embed the stamp in an array that matches
-                    # the psf size. This is so the upcoming convolution will
-                    # produce an output that includes the wings of the PSF
-                    psf_shape = eval_psf.shape
-                    if ((stamp_dims[0] < psf_shape[0]) or (stamp_dims[1] < psf_shape[1])):
-                        stamp = self.enlarge_stamp(stamp, psf_shape)
-                        stamp_dims = stamp.shape
+        pixely : float
+            Initial y-coordinate of the source, in the coordinate system
+            of the aperture
 
-                    # Convolve stamp with PSF
-                    stamp = s1.fftconvolve(stamp, eval_psf, mode='same')
+        ra : float
+            Initial RA of the source, in degrees
 
-            elif input_type == 'galaxies':
-                pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions(entry['x_or_RA'],
-                                                                              entry['y_or_Dec'],
-                                                                              pixelFlag, 4096)
+        dec : float
+            Initial Dec of the source, in degrees
 
-                pixelv2, pixelv3 = pysiaf.utils.rotations.getv2v3(self.attitude_matrix, ra, dec)
+        frame_info : dict
+            Dictionary containing the times of all frames
+            (``frame_times``), the number of integrations (``numints``),
+            the number of frames per integration
+            (``frames_per_integration``), the (y, x) dimensions of the
+            output (``output_dims``), and the flags stating whether source
+            positions (``pixel_flag``) and velocities
+            (``pixel_velocity_flag``) are in units of pixels
 
-                xposang = self.calc_x_position_angle(pixelv2, pixelv3, entry['pos_angle'])
+        core_stamp : numpy.ndarray
+            Optional 2D array containing the previously evaluated PSF core
+            for the source at its initial position
 
-                # First create the galaxy
-                stamp = self.create_galaxy(entry['radius'], entry['ellipticity'], entry['sersic_index'],
-                                           xposang*np.pi/180., rate)
+        x_frames : numpy.ndarray
+            Optional x-coordinates of the source in each frame, as
+            calculated by ``frame_positions``. If None, they are
+            calculated here.
 
+        y_frames : numpy.ndarray
+            Optional y-coordinates of the source in each frame
+
+        Returns
+        -------
+        integrations : list
+            List of (integration number, 3D array, y_start, x_start)
+            tuples, giving the signal of the source in each frame of the
+            integrations that it overlaps. Each 3D array covers only the
+            area of the aperture crossed by the source, and (y_start,
+            x_start) is the location of its lower left corner. None if the
+            source never lands on the aperture.
+        """
+        frameexptimes = frame_info['frame_times']
+        frames_per_integration = frame_info['frames_per_integration']
+        newdimsy, newdimsx = frame_info['output_dims']
+
+        # Now generate a list of x,y position in each frame
+        if x_frames is None or y_frames is None:
+            x_frames, y_frames = self.frame_positions([pixelx], [pixely], [ra], [dec],
+                                                      [entry['x_or_RA_velocity']],
+                                                      [entry['y_or_Dec_velocity']], frameexptimes,
+                                                      frame_info['pixel_velocity_flag'])
+            x_frames = x_frames[0]
+            y_frames = y_frames[0]
+
+        psf_dimensions = (psf_x_dim, psf_x_dim)
+        #psf_dimensions = (self.psf_library_x_dim, self.psf_library_y_dim)
+
+        # If we have a point source, we can easily determine whether
+        # it completely misses the detector, since we know the size
+        # of the stamp already. For galaxies and extended sources,
+        # we have to get the stamp image first to see if any part of
+        # the stamp lands on the detector.
+        status = 'on'
+        if input_type == 'pointSource':
+
+            status = self.on_detector(x_frames, y_frames, psf_dimensions,
+                                      (newdimsx, newdimsy))
+        if status == 'off':
+            return None
+
+        # Create the PSF
+        eval_psf, minx, miny, wings_added = self.create_psf_stamp(pixelx, pixely, psf_x_dim, psf_x_dim,
+                                                                  ignore_detector=True, core_stamp=core_stamp)
+
+        # Skip sources that fall completely off the detector
+        if eval_psf is None:
+            return None
+
+        if input_type == 'pointSource':
+            stamp = eval_psf
+            stamp *= rate
+
+        elif input_type == 'extended':
+            print('Extended source rotations turned off while evaluating rotate bug')
+            #stamp = self.rotate_extended_image(stamp, entry['pos_angle'], ra, dec)
+
+            # If no magnitude is given, use the extended image as-is. Stamps
+            # from the store are shared by all sources using the same file,
+            # and must not be modified.
+            if rate != 1.0:
+                stamp, total_signal = self.extended_stamp_store.get_normalized(entry['filename'])
+                stamp = stamp * rate
+            else:
+                stamp, header = self.extended_stamp_store.get_image(entry['filename'])
+
+            # Convolve with instrument PSF if requested
+            if self.params['simSignals']['PSFConvolveExtended']:
+                stamp_dims = stamp.shape
                 # If the stamp image is smaller than the PSF in either
                 # dimension, embed the stamp in an array that matches
                 # the psf size. This is so the upcoming convolution will
                 # produce an output that includes the wings of the PSF
-                galdims = stamp.shape
                 psf_shape = eval_psf.shape
-                if ((galdims[0] < psf_shape[0]) or (galdims[1] < psf_shape[1])):
+                if ((stamp_dims[0] < psf_shape[0]) or (stamp_dims[1] < psf_shape[1])):
                     stamp = self.enlarge_stamp(stamp, psf_shape)
-                    galdims = stamp.shape
+                    stamp_dims = stamp.shape
 
-                # Convolve the galaxy with the instrument PSF
+                # Convolve stamp with PSF
                 stamp = s1.fftconvolve(stamp, eval_psf, mode='same')
 
-            # Now that we have stamp images for galaxies and extended
-            # sources, check to see if they overlap the detector or not.
-            # NOTE: this will only catch sources that never overlap the
-            # detector for any of their positions.
-            if input_type != 'pointSource':
-                status = self.on_detector(x_frames, y_frames, stamp.shape,
-                                          (newdimsx, newdimsy))
+        elif input_type == 'galaxies':
+            pixelv2, pixelv3 = pysiaf.utils.rotations.getv2v3(self.attitude_matrix, ra, dec)
+
+            xposang = self.calc_x_position_angle(pixelv2, pixelv3, entry['pos_angle'])
+
+            # First create the galaxy
+            stamp = self.create_galaxy(entry['radius'], entry['ellipticity'], entry['sersic_index'],
+                                       xposang*np.pi/180., rate)
+
+            # If the stamp image is smaller than the PSF in either
+            # dimension, embed the stamp in an array that matches
+            # the psf size. This is so the upcoming convolution will
+            # produce an output that includes the wings of the PSF
+            galdims = stamp.shape
+            psf_shape = eval_psf.shape
+            if ((galdims[0] < psf_shape[0]) or (galdims[1] < psf_shape[1])):
+                stamp = self.enlarge_stamp(stamp, psf_shape)
+                galdims = stamp.shape
+
+            # Convolve the galaxy with the instrument PSF
+            stamp = s1.fftconvolve(stamp, eval_psf, mode='same')
+
+        # Now that we have stamp images for galaxies and extended
+        # sources, check to see if they overlap the detector or not.
+        # NOTE: this will only catch sources that never overlap the
+        # detector for any of their positions.
+        if input_type != 'pointSource':
+            status = self.on_detector(x_frames, y_frames, stamp.shape,
+                                      (newdimsx, newdimsy))
+        if status == 'off':
+            return None
+
+        # Each entry will have stamp image as array, ra_init, dec_init,
+        # ra_velocity, dec_velocity, frametime, numframes, subsample_factor,
+        # outputarrayxsize, outputarrayysize
+        # (maybe without the values that will be the same to each entry.
+
+        # Need to feed info into moving_targets one integration at a time.
+        # No need to feed in the reset frames, but they are necessary
+        # before this point in order to get the timing and positions
+        # correct.
+        integrations = []
+        for integ in range(frame_info['numints']):
+            framestart = integ * frames_per_integration + integ
+            frameend = framestart + frames_per_integration + 1
+
+            # Now check to see if the stamp image overlaps the output
+            # aperture for this integration only. Above we removed sources
+            # that never overlap the aperture. Here we want to get rid
+            # of sources that overlap the detector in some integrations,
+            # but not this particular integration
+            status = 'on'
+            status = self.on_detector(x_frames[framestart:frameend],
+                                      y_frames[framestart:frameend],
+                                      stamp.shape, (newdimsx, newdimsy))
             if status == 'off':
                 continue
 
-            # Each entry will have stamp image as array, ra_init, dec_init,
-            # ra_velocity, dec_velocity, frametime, numframes, subsample_factor,
-            # outputarrayxsize, outputarrayysize
-            # (maybe without the values that will be the same to each entry.
-
-            # Need to feed info into moving_targets one integration at a time.
-            # No need to feed in the reset frames, but they are necessary
-            # before this point in order to get the timing and positions
-            # correct.
-            for integ in range(numints):
-                framestart = integ * frames_per_integration + integ
-                frameend = framestart + frames_per_integration + 1
-
-                # Now check to see if the stamp image overlaps the output
-                # aperture for this integration only. Above we removed sources
-                # that never overlap the aperture. Here we want to get rid
-                # of sources that overlap the detector in some integrations,
-                # but not this particular integration
-                status = 'on'
-                status = self.on_detector(x_frames[framestart:frameend],
-                                          y_frames[framestart:frameend],
-                                          stamp.shape, (newdimsx, newdimsy))
-                if status == 'off':
-                    continue
+            mt = moving_targets.MovingTarget()
+            mt.subsampx = 3
+            mt.subsampy = 3
+            mt_source, y_start, x_start = mt.create_subarray(stamp, x_frames[framestart:frameend],
+                                                             y_frames[framestart:frameend],
+                                                             self.frametime, newdimsx, newdimsy)
+            integrations.append((integ, mt_source, y_start, x_start))
+        return integrations
+
+    def frame_positions(self, pixelx, pixely, ra, dec, x_velocity, y_velocity, frame_times,
+                        pixel_velocity_flag):
+        """Calculate the x,y position of moving sources in every frame. When
+        velocities are in units of arcsec/hour, the RA, Dec of all sources
+        in all frames are translated to x,y in a single call to the
+        coordinate transforms. Velocities of sources seen while tracking a
+        non-sidereal target have already been adjusted for the tracking
+        velocity, and are handled in the same way.
 
-                mt = moving_targets.MovingTarget()
-                mt.subsampx = 3
-                mt.subsampy = 3
-                mt_source = mt.create(stamp, x_frames[framestart:frameend],
-                                      y_frames[framestart:frameend],
-                                      self.frametime, newdimsx, newdimsy)
-                mt_integration[integ, :, :, :] += mt_source
+        Parameters
+        ----------
+        pixelx : list or numpy.ndarray
+            Initial x-coordinates of the sources
 
-                noiseval = self.single_ron / 100. + self.params['simSignals']['bkgdrate']
-                if self.params['Inst']['mode'].lower() in ['wfss', 'ts_wfss']:
-                    noiseval += self.grism_background
+        pixely : list or numpy.ndarray
+            Initial y-coordinates of the sources
 
-                if input_type in ['pointSource', 'galaxies']:
-                    moving_segmap.add_object_noise(mt_source[-1, :, :], 0, 0, index, noiseval)
-                else:
-                    indseg = self.seg_from_photutils(mt_source[-1, :, :], np.int(index), noiseval)
-                    moving_segmap.segmap += indseg
+        ra : list or numpy.ndarray
+            Initial RA of the sources, in degrees
 
-            # Check the elapsed time for creating each object
-            elapsed_time = time.time() - start_time
-            times.append(elapsed_time)
-            if obj_counter > 3 and not time_reported:
-                avg_time = np.mean(times)
-                total_time = len(indexes) * avg_time
-                print(("Expected time to process {} sources: {:.2f} seconds "
-                       "({:.2f} minutes)".format(len(indexes), total_time, total_time/60)))
-                time_reported = True
-            obj_counter += 1
-        return mt_integration, moving_segmap.segmap
+        dec : list or numpy.ndarray
+            Initial Dec of the sources, in degrees
+
+        x_velocity : list or numpy.ndarray
+            Velocity of the sources in the x or RA direction, in units of
+            pixels/hour or arcsec/hour
+
+        y_velocity : list or numpy.ndarray
+            Velocity of the sources in the y or Dec direction, in units of
+            pixels/hour or arcsec/hour
+
+        frame_times : numpy.ndarray
+            Times of all frames, in seconds
+
+        pixel_velocity_flag : bool
+            True if velocities are in units of pixels/hour. False if they
+            are in units of arcsec/hour.
+
+        Returns
+        -------
+        x_frames : numpy.ndarray
+            2D array of the x-coordinates of each source (rows) in each
+            frame (columns)
+
+        y_frames : numpy.ndarray
+            2D array of the y-coordinates of each source in each frame
+        """
+        x_velocity = np.asarray(x_velocity, dtype=np.float64)[:, np.newaxis]
+        y_velocity = np.asarray(y_velocity, dtype=np.float64)[:, np.newaxis]
+        frame_times = np.asarray(frame_times, dtype=np.float64)[np.newaxis, :]
+
+        if pixel_velocity_flag is False:
+            # Calculate the RA,Dec in each frame
+            # input velocities are arcsec/hour. ra/dec are in units of degrees,
+            # so divide velocities by 3600^2.
+            ra_frames = np.asarray(ra, dtype=np.float64)[:, np.newaxis] + (x_velocity / 3600. / 3600.) * frame_times
+            dec_frames = np.asarray(dec, dtype=np.float64)[:, np.newaxis] + (y_velocity / 3600. / 3600.) * frame_times
+            x_frames, y_frames = self.RADecToXY_astrometric(ra_frames.ravel(), dec_frames.ravel())
+            x_frames = np.reshape(x_frames, ra_frames.shape)
+            y_frames = np.reshape(y_frames, dec_frames.shape)
+        else:
+            # If input velocities are pixels/hour, then generate the list of
+            # x,y in each frame directly
+            x_frames = np.asarray(pixelx, dtype=np.float64)[:, np.newaxis] + (x_velocity / 3600.) * frame_times
+            y_frames = np.asarray(pixely, dtype=np.float64)[:, np.newaxis] + (y_velocity / 3600.) * frame_times
+        return x_frames, y_frames
+
+    def add_moving_target(self, mt_integration, moving_segmap, input_type, index, integ, mt_source,
+                          y_start=0, x_start=0):
+        """Add the signal of a moving target in one integration to the
+        moving target seed image and segmentation map
+
+        Parameters
+        ----------
+        mt_integration : numpy.ndarray or mirage.seed_image.lazy_ramp.LazyRamp
+            4D moving target seed image, modified in place
+
+        moving_segmap : mirage.seed_image.segmentation_map.SegMap
+            Segmentation map, modified in place
+
+        input_type : str
+            Specifies type of source. Can be 'pointSource','galaxies', or 'extended'
+
+        index : int
+            Index number of the source
+
+        integ : int
+            Integration number
+
+        mt_source : numpy.ndarray
+            3D array containing the signal of the source in each frame of
+            the integration, covering the area of the seed image crossed
+            by the source, as returned by ``create_moving_target``
+
+        y_start : int
+            y-coordinate of the lower left corner of ``mt_source`` in the
+            seed image
+
+        x_start : int
+            x-coordinate of the lower left corner of ``mt_source`` in the
+            seed image
+        """
+        if isinstance(mt_integration, LazyRamp):
+            mt_integration.add_subarray(integ, y_start, x_start, mt_source)
+        else:
+            y_end = y_start + mt_source.shape[1]
+            x_end = x_start + mt_source.shape[2]
+            mt_integration[integ, :, y_start:y_end, x_start:x_end] += mt_source
+
+        noiseval = self.single_ron / 100. + self.params['simSignals']['bkgdrate']
+        if self.params['Inst']['mode'].lower() in ['wfss', 'ts_wfss']:
+            noiseval += self.grism_background
+
+        if input_type in ['pointSource', 'galaxies']:
+            moving_segmap.add_object_noise(mt_source[-1, :, :], y_start, x_start, index, noiseval)
+        else:
+            moving_segmap.add_object_threshold(mt_source[-1, :, :], y_start, x_start, int(index),
+                                               noiseval * 3.)
 
     def on_detector(self, xloc, yloc, stampdim, finaldim):
         """Given a set of x, y locations, stamp image dimensions,
@@ -1280,19 +1586,97 @@ class Catalog_seed():
         dec_string : str
             String representation of Dec
         """
+        pixel_x, pixel_y, ra_number, dec_number, ra_string, dec_string = self.get_positions_array(
+            [input_x], [input_y], pixel_flag, max_source_distance)
+        return pixel_x[0], pixel_y[0], ra_number[0], dec_number[0], ra_string[0], dec_string[0]
+
+    def get_positions_array(self, input_x, input_y, pixel_flag, max_source_distance):
+        """Vectorized version of ``get_positions``. Given arrays of input positions
+        ( (x,y) or (RA,Dec) ), calculate the corresponding detector (x,y), RA, Dec,
+        and RA and Dec strings for all sources in a single pass through the
+        coordinate transforms.
+
+        Parameters
+        ----------
+
+        input_x : list, numpy.ndarray or astropy.table.Column
+            Detector x coordinates or RAs of the sources. RAs can be in decimal
+            degrees or (e.g 10:23:34.2 or 10h23m34.2s)
+
+        input_y : list, numpy.ndarray or astropy.table.Column
+            Detector y coordinates or Decs of the sources. Decs can be in decimal
+            degrees or (e.g. 10d:23m:34.2s)
+
+        pixel_flag : bool
+            True if input_x and input_y are in units of pixels. False if they are
+            in the RA, Dec coordinate system.
+
+        max_source_distance : float
+            Maximum number of pixels from the aperture's reference location to keep
+            a source. Sources very far off the detector will cause the calculation of
+            RA, Dec to hang.
+
+        Returns
+        -------
+
+        pixelx : numpy.ndarray
+            Detector x coordinates of the sources
+
+        pixely : numpy.ndarray
+            Detector y coordinates of the sources
+
+        ra : numpy.ndarray
+            RA of the sources (degrees)
+
+        dec : numpy.ndarray
+            Dec of the sources (degrees)
+
+        ra_string : numpy.ndarray
+            String representations of RA
+
+        dec_string : numpy.ndarray
+            String representations of Dec
+        """
+        input_x = np.asarray(input_x)
+        input_y = np.asarray(input_y)
+
         try:
-            entry0 = float(input_x)
-            entry1 = float(input_y)
+            entry0 = input_x.astype(np.float64)
+            entry1 = input_y.astype(np.float64)
+            float_inputs = True
+        except ValueError:
+            float_inputs = False
+
+        if float_inputs:
             if not pixel_flag:
-                ra_string, dec_string = self.makePos(entry0, entry1)
                 ra_number = entry0
                 dec_number = entry1
-        except:
+                ra_string, dec_string = self.makePos(ra_number, dec_number)
+        else:
             # if inputs can't be converted to floats, then
             # assume we have RA/Dec strings. Convert to floats.
-            ra_string = input_x
-            dec_string = input_y
-            ra_number, dec_number = utils.parse_RA_Dec(ra_string, dec_string)
+            # Entries that are decimal degrees within a string column
+            # are converted directly, as in the scalar case.
+            ra_number = np.zeros(len(input_x))
+            dec_number = np.zeros(len(input_y))
+            ra_string = [str(value) for value in input_x]
+            dec_string = [str(value) for value in input_y]
+            decimal = np.zeros(len(input_x), dtype=bool)
+            for i, (ra_entry, dec_entry) in enumerate(zip(ra_string, dec_string)):
+                try:
+                    ra_number[i] = float(ra_entry)
+                    dec_number[i] = float(dec_entry)
+                    decimal[i] = True
+                except ValueError:
+                    ra_number[i], dec_number[i] = utils.parse_RA_Dec(ra_entry, dec_entry)
+
+            ra_string = np.array(ra_string, dtype=object)
+            dec_string = np.array(dec_string, dtype=object)
+            if np.any(decimal):
+                ra_string[decimal], dec_string[decimal] = self.makePos(ra_number[decimal],
+                                                                       dec_number[decimal])
+            ra_string = ra_string.astype(str)
+            dec_string = dec_string.astype(str)
 
         # Case where point source list entries are given with RA and Dec
         if not pixel_flag:
@@ -1308,7 +1692,8 @@ class Catalog_seed():
             pixel_x = entry0
             pixel_y = entry1
             ra_number, dec_number, ra_string, dec_string = self.XYToRADec(pixel_x, pixel_y)
-        return pixel_x, pixel_y, ra_number, dec_number, ra_string, dec_string
+        return (np.atleast_1d(pixel_x), np.atleast_1d(pixel_y), np.atleast_1d(ra_number),
+                np.atleast_1d(dec_number), np.atleast_1d(ra_string), np.atleast_1d(dec_string))
 
     def nonsidereal_CRImage(self, file):
         """
@@ -1447,12 +1832,12 @@ class Catalog_seed():
         # Generate a signal rate image from input sources
         if (self.params['Output']['grism_source_image'] == False) and (not self.params['Inst']['mode'] in ["pom", "wfss"]):
             signalimage = np.zeros(self.nominal_dims)
-            segmentation_map = np.zeros(self.nominal_dims)
+            segmentation_map = np.zeros(self.nominal_dims, dtype=segmap.LABEL_DTYPE)
         else:
             xd = np.int(self.nominal_dims[1] * self.coord_adjust['x'])
             yd = np.int(self.nominal_dims[0] * self.coord_adjust['y'])
             signalimage = np.zeros((yd, xd), dtype=np.float)
-            segmentation_map = np.zeros((yd, xd))
+            segmentation_map = np.zeros((yd, xd), dtype=segmap.LABEL_DTYPE)
 
         # yd, xd = signalimage.shape
         arrayshape = signalimage.shape
@@ -1466,8 +1851,10 @@ class Catalog_seed():
 
                 # Translate the point source list into an image
                 print('Calculating point source lists')
-                pslist = self.get_point_source_list(self.params['simSignals']['pointsource'])
-                psfimage, ptsrc_segmap = self.make_point_source_image(pslist)
+                with self.profiler.stage('point_source_catalog'):
+                    pslist = self.get_point_source_list(self.params['simSignals']['pointsource'])
+                with self.profiler.stage('point_source_psfs'):
+                    psfimage, ptsrc_segmap = self.make_point_source_image(pslist)
 
             elif self.expand_catalog_for_segments:
                 # Expand the point source list for each mirror segment, and add together
@@ -1484,30 +1871,43 @@ class Catalog_seed():
                     self.params['Inst']['instrument'].lower(), self.detector, self.psf_filter,
                     self.params['simSignals']['psfpath'], pupil=self.psf_pupil
                 )
-                for i_segment in np.arange(1, 19):
-                    print('\nCalculating point source lists for segment {}'.format(i_segment))
-                    # Get the RA/Dec offset that matches the given segment
-                    offset_vector = get_segment_offset(i_segment, self.detector, library_list)
-
-                    # need to add a new offset option to get_point_source_list:
-                    pslist = self.get_point_source_list(self.params['simSignals']['pointsource'],
-                                                        segment_offset=offset_vector)
 
-                    # Create a point source image, using the specific point
-                    # source list and PSF for the given segment
-                    seg_psfimage, ptsrc_segmap = self.make_point_source_image(pslist, segment_number=i_segment,
-                                                                           ptsrc_segmap=ptsrc_segmap)
+                # Get the RA/Dec offsets that match the segments
+                segment_offsets = np.array([get_segment_offset(i_segment, self.detector, library_list)
+                                            for i_segment in np.arange(1, 19)])
+
+                # Read and filter the catalog once, for all segments
+                print('\nCalculating point source lists for all segments')
+                with self.profiler.stage('point_source_catalog'):
+                    pslist = self.get_segment_point_source_list(self.params['simSignals']['pointsource'],
+                                                                segment_offsets)
+
+                if self.params['Output']['save_intermediates'] is True:
+                    # Create a point source image for each segment separately,
+                    # using the specific point source list and PSF for the
+                    # given segment, so that they can be saved
+                    for i_segment in np.arange(1, 19):
+                        seg_pslist = pslist[pslist['segment'] == i_segment]
+                        with self.profiler.stage('point_source_psfs'):
+                            seg_psfimage, ptsrc_segmap = self.make_point_source_image(seg_pslist,
+                                                                                      segment_number=i_segment,
+                                                                                      ptsrc_segmap=ptsrc_segmap)
 
-                    if self.params['Output']['save_intermediates'] is True:
                         seg_psfImageName = self.basename + '_pointSourceRateImage_seg{:02d}.fits'.format(i_segment)
                         h0 = fits.PrimaryHDU(seg_psfimage)
                         h0.writeto(seg_psfImageName, overwrite=True)
                         print("    Segment {} point source image and segmap saved as {}".format(i_segment,
                                                                                                 seg_psfImageName))
 
-                    psfimage += seg_psfimage
+                        psfimage += seg_psfimage
+                else:
+                    # Add the sources from all segments into a single image,
+                    # each using the PSF library of its segment
+                    with self.profiler.stage('point_source_psfs'):
+                        psfimage, ptsrc_segmap = self.make_point_source_image(pslist, ptsrc_segmap=ptsrc_segmap)
 
             ptsrc_segmap = ptsrc_segmap.segmap
+            self.profiler.count('point_sources', len(pslist))
 
             # save the point source image for examination by user
             if self.params['Output']['save_intermediates'] is True:
@@ -1526,7 +1926,8 @@ class Catalog_seed():
         # Read in the list of galaxy positions/magnitudes to simulate
         # and create a countrate image of those galaxies.
         if self.runStep['galaxies'] is True:
-            galaxyCRImage, galaxy_segmap = self.make_galaxy_image(self.params['simSignals']['galaxyListFile'])
+            with self.profiler.stage('galaxies'):
+                galaxyCRImage, galaxy_segmap = self.make_galaxy_image(self.params['simSignals']['galaxyListFile'])
 
             # Multiply by the pixel area map
             galaxyCRImage *= self.pam
@@ -1549,10 +1950,13 @@ class Catalog_seed():
 
         # read in extended signal image and add the image to the overall image
         if self.runStep['extendedsource'] is True:
-            extlist, extstamps = self.getExtendedSourceList(self.params['simSignals']['extended'])
+            with self.profiler.stage('extended_source_catalog'):
+                extlist, extstamps = self.getExtendedSourceList(self.params['simSignals']['extended'])
+            self.profiler.count('extended_sources', len(extlist))
 
             # translate the extended source list into an image
-            extimage, ext_segmap = self.make_extended_source_image(extlist, extstamps)
+            with self.profiler.stage('extended_sources'):
+                extimage, ext_segmap = self.make_extended_source_image(extlist, extstamps)
 
             # Multiply by the pixel area map
             extimage *= self.pam
@@ -1653,18 +2057,126 @@ class Catalog_seed():
     def get_point_source_list(self, filename, segment_offset=None):
         # read in the list of point sources to add, and adjust the
         # provided positions for astrometric distortion
+        lines, pixelflag, magsys, indexes = self.read_point_source_catalog(filename)
+
+        # File to save adjusted point source locations
+        psfile = self.params['Output']['file'][0:-5] + '_pointsources.list'
+
+        # If creating a segment-wise simulation, shift all of the RAs/Decs in
+        # the list by the given offset. The shifted positions are RA, Dec.
+        if segment_offset is not None:
+            lines = self.shift_sources_by_offset(lines, segment_offset, pixelflag)
+            pixelflag = False
+
+        source_columns, lines = self.select_point_sources(lines, indexes, pixelflag, magsys, filename)
+        pointSourceList = self.create_source_list_table(source_columns)
+
+        # Write out positions, distances, and counts to the output file
+        self.write_source_list_file(psfile, source_columns)
+
+        self.n_pointsources = len(pointSourceList)
+        print("Number of point sources found within or close to the requested aperture: {}".format(self.n_pointsources))
+
+        # If no good point sources were found in the requested array, alert the user
+        if len(pointSourceList) < 1:
+            print("INFO: no point sources within the requested array.")
+            # print("The point source image option is being turned off")
+            # self.runStep['pointsource']=False
+            # if self.runStep['extendedsource'] == False and self.runStep['cosmicray'] == False:
+            #    print("Error: no input point sources, extended image, nor cosmic rays specified")
+            #    print("Exiting...")
+            #    sys.exit()
+
+        return pointSourceList
+
+    def get_segment_point_source_list(self, filename, segment_offsets):
+        """Create the point source list for a segment-wise simulation, where
+        each source in the catalog is repeated for each mirror segment and
+        shifted by the segment's offset. The catalog is read and filtered
+        only once, for all segments together.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the point source catalog
+
+        segment_offsets : numpy.ndarray
+            (number of segments, 2) array of the (x, y) offsets, in arcsec,
+            of the segments, as returned by ``get_segment_offset``
+
+        Returns
+        -------
+        pointSourceList : astropy.table.Table
+            Table of the point sources that fall on or near the aperture.
+            Sources are sorted by segment, and the ``segment`` column gives
+            the segment number (starting at 1) of each.
+        """
+        lines, pixelflag, magsys, indexes = self.read_point_source_catalog(filename)
+        num_segments = len(segment_offsets)
+        num_sources = len(lines)
+
+        # File to save adjusted point source locations
+        psfile = self.params['Output']['file'][0:-5] + '_pointsources.list'
+
+        # Shift the source positions for all segments at once
+        segment_ra, segment_dec = self.segment_shifted_positions(lines, segment_offsets, pixelflag)
+
+        # Repeat the catalog for each segment, with the shifted positions
+        expanded = Table()
+        for colname in lines.colnames:
+            if colname == 'x_or_RA':
+                expanded[colname] = segment_ra.ravel()
+            elif colname == 'y_or_Dec':
+                expanded[colname] = segment_dec.ravel()
+            else:
+                expanded[colname] = np.tile(np.asarray(lines[colname]), num_segments)
+        expanded['segment'] = np.repeat(np.arange(1, num_segments + 1), num_sources)
+        expanded_indexes = np.tile(np.asarray(indexes), num_segments)
+
+        source_columns, expanded = self.select_point_sources(expanded, expanded_indexes, False, magsys, filename)
+        pointSourceList = self.create_source_list_table(source_columns)
+        pointSourceList['segment'] = np.asarray(expanded['segment']).astype(int)
+
+        # Write out positions, distances, and counts to the output file
+        self.write_source_list_file(psfile, source_columns)
+
+        self.n_pointsources = len(pointSourceList)
+        print(("Number of point sources (summed over {} segments) found within or close to the requested "
+               "aperture: {}".format(num_segments, self.n_pointsources)))
+        if len(pointSourceList) < 1:
+            print("INFO: no point sources within the requested array.")
+
+        return pointSourceList
 
+    def read_point_source_catalog(self, filename):
+        """Read in the point source catalog and get the index numbers of
+        the sources
 
+        Parameters
+        ----------
+        filename : str
+            Name of the point source catalog
+
+        Returns
+        -------
+        lines : astropy.table.Table
+            Point source catalog
+
+        pixelflag : bool
+            True if the source positions are in units of pixels, False for
+            RA, Dec
+
+        magsys : str
+            Magnitude system of the source brightnesses
+
+        indexes : numpy.ndarray
+            Index numbers of the sources
+        """
         # Make sure that a valid PSF path has been provided
         if not os.path.isdir(self.params['simSignals']['psfpath']):
             raise ValueError('Invalid PSF path provided in YAML:',
                              self.params['simSignals']['psfpath'])
 
-        pointSourceList = Table(names=('index', 'pixelx', 'pixely', 'RA', 'Dec', 'RA_degrees',
-                                       'Dec_degrees', 'magnitude', 'countrate_e/s',
-                                       'counts_per_frame_e'),
-                                dtype=('i', 'f', 'f', 'S14', 'S14', 'f', 'f', 'f', 'f', 'f'))
-
         try:
             lines, pixelflag, magsys = self.read_point_source_file(filename)
             if pixelflag:
@@ -1678,20 +2190,43 @@ class Catalog_seed():
         if self.add_psf_wings is True:
             self.translate_psf_table(magsys)
 
-        # File to save adjusted point source locations
-        psfile = self.params['Output']['file'][0:-5] + '_pointsources.list'
-        pslist = open(psfile, 'w')
-
         # If the input catalog has an index column
         # use that, otherwise add one
         indexes = self.get_index_numbers(lines)
+        return lines, pixelflag, magsys, indexes
 
-        dtor = math.radians(1.)
-        nx = (self.subarray_bounds[2] - self.subarray_bounds[0]) + 1
-        ny = (self.subarray_bounds[3] - self.subarray_bounds[1]) + 1
-        xc = (self.subarray_bounds[2] + self.subarray_bounds[0]) / 2.
-        yc = (self.subarray_bounds[3] + self.subarray_bounds[1]) / 2.
+    def select_point_sources(self, lines, indexes, pixelflag, magsys, filename):
+        """Calculate the positions and countrates of the sources in a point
+        source catalog, and keep only those that fall on or close to the
+        aperture
+
+        Parameters
+        ----------
+        lines : astropy.table.Table
+            Point source catalog
+
+        indexes : numpy.ndarray
+            Index numbers of the sources
+
+        pixelflag : bool
+            True if the source positions are in units of pixels, False for
+            RA, Dec
+
+        magsys : str
+            Magnitude system of the source brightnesses
+
+        filename : str
+            Name of the point source catalog
+
+        Returns
+        -------
+        source_columns : dict
+            Dictionary of arrays describing the kept sources, as used by
+            ``create_source_list_table``
 
+        lines : astropy.table.Table
+            Rows of the input catalog corresponding to the kept sources
+        """
         # Define the min and max source locations (in pixels) that fall onto the subarray
         # Include the effects of a requested grism_direct image, and also keep sources that
         # will only partially fall on the subarray
@@ -1712,20 +2247,6 @@ class Catalog_seed():
             minx -= extrapixx
             maxx += extrapixx
 
-        # Write out the RA and Dec of the field center to the output file
-        # Also write out column headers to prepare for source list
-        pslist.write(("# Field center (degrees): %13.8f %14.8f y axis rotation angle "
-                      "(degrees): %f  image size: %4.4d %4.4d\n" %
-                      (self.ra, self.dec, self.params['Telescope']['rotation'], nx, ny)))
-        pslist.write('#\n')
-        pslist.write(("#    Index   RA_(hh:mm:ss)   DEC_(dd:mm:ss)   RA_degrees      "
-                      "DEC_degrees     pixel_x   pixel_y    magnitude   counts/sec    counts/frame\n"))
-
-        # If creating a segment-wise simulation, shift all of the RAs/Decs in
-        # the list by the given offset
-        if segment_offset is not None:
-            lines = self.shift_sources_by_offset(lines, segment_offset, pixelflag)
-
         # Check the source list and remove any sources that are well outside the
         # field of view of the detector. These sources cause the coordinate
         # conversion to hang.
@@ -1735,71 +2256,100 @@ class Catalog_seed():
         mag_column = self.select_magnitude_column(lines, filename)
 
         print('Filtering point sources to keep only those on the detector')
-        start_time = time.time()
-        times = []
-        time_reported = False
-        # Loop over input lines in the source list
-        for index, values in zip(indexes, lines):
-            # Warn user of how long this calcuation might take...
-            if len(times) < 100:
-                elapsed_time = time.time() - start_time
-                times.append(elapsed_time)
-                start_time = time.time()
-            elif len(times) == 100 and time_reported is False:
-                avg_time = np.mean(times)
-                total_time = len(indexes) * avg_time
-                print(("Expected time to process {} sources: {:.2f} seconds "
-                       "({:.2f} minutes)".format(len(indexes), total_time, total_time/60)))
-                time_reported = True
 
-            pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions(values['x_or_RA'],
-                                                                          values['y_or_Dec'],
-                                                                          pixelflag, 4096)
+        # Calculate the detector positions and RA, Dec values for the
+        # entire catalog in a single call
+        all_pixelx, all_pixely, all_ra, all_dec, all_ra_str, all_dec_str = self.get_positions_array(
+            lines['x_or_RA'], lines['y_or_Dec'], pixelflag, 4096)
 
-            # Get the input magnitude and countrate of the point source
-            mag = float(values[mag_column])
-            countrate = utils.magnitude_to_countrate(self.params['Inst']['mode'], magsys, mag,
-                                                     photfnu=self.photfnu, photflam=self.photflam,
-                                                     vegamag_zeropoint=self.vegazeropoint)
+        # Get the input magnitudes and countrates of the point sources
+        magnitudes = np.array(lines[mag_column]).astype(np.float64)
+        countrates = utils.magnitude_to_countrate(self.params['Inst']['mode'], magsys, magnitudes,
+                                                  photfnu=self.photfnu, photflam=self.photflam,
+                                                  vegamag_zeropoint=self.vegazeropoint)
+        countrates = np.atleast_1d(countrates)
 
-            psf_len = self.find_psf_size(countrate)
-            edgex = np.int(psf_len // 2)
-            edgey = np.int(psf_len // 2)
+        psf_len = self.find_psf_size(countrates)
+        edges = psf_len // 2
 
-            if pixely > (miny-edgey) and pixely < (maxy+edgey) and pixelx > (minx-edgex) and pixelx < (maxx+edgex):
-                # set up an entry for the output table
-                entry = [index, pixelx, pixely, ra_str, dec_str, ra, dec, mag]
+        # Keep only the sources that fall on or close to the aperture
+        keep = ((all_pixely > (miny - edges)) & (all_pixely < (maxy + edges)) &
+                (all_pixelx > (minx - edges)) & (all_pixelx < (maxx + edges)))
 
-                # Calculate the countrate for the source
-                framecounts = countrate * self.frametime
+        # Calculate the counts per frame for the good sources, and collect
+        # the good sources, including location and counts, into the pointSourceList
+        # since they will be used in future calculations
+        source_columns = {'index': np.asarray(indexes)[keep], 'pixelx': all_pixelx[keep],
+                          'pixely': all_pixely[keep], 'RA': all_ra_str[keep], 'Dec': all_dec_str[keep],
+                          'RA_degrees': all_ra[keep], 'Dec_degrees': all_dec[keep],
+                          'magnitude': magnitudes[keep], 'countrate_e/s': countrates[keep],
+                          'counts_per_frame_e': countrates[keep] * self.frametime}
+        return source_columns, lines[keep]
 
-                # add the countrate and the counts per frame to pointSourceList
-                # since they will be used in future calculations
-                entry.append(countrate)
-                entry.append(framecounts)
+    def create_source_list_table(self, source_columns):
+        """Create the table of sources that fall on or near the aperture
+        from columns of values, in a single step.
 
-                # add the good point source, including location and counts, to the pointSourceList
-                pointSourceList.add_row(entry)
+        Parameters
+        ----------
+        source_columns : dict
+            Dictionary of arrays containing the 'index', 'pixelx', 'pixely',
+            'RA', 'Dec', 'RA_degrees', 'Dec_degrees', 'magnitude',
+            'countrate_e/s', and 'counts_per_frame_e' values of the sources
 
-                # write out positions, distances, and counts to the output file
-                pslist.write("%i %s %s %14.8f %14.8f %9.3f %9.3f  %9.3f  %13.6e   %13.6e\n" % (index, ra_str, dec_str, ra, dec, pixelx, pixely, mag, countrate, framecounts))
+        Returns
+        -------
+        source_table : astropy.table.Table
+            Table of sources
+        """
+        names = ('index', 'pixelx', 'pixely', 'RA', 'Dec', 'RA_degrees', 'Dec_degrees', 'magnitude',
+                 'countrate_e/s', 'counts_per_frame_e')
+        dtypes = ('i', 'f', 'f', 'S14', 'S14', 'f', 'f', 'f', 'f', 'f')
+        columns = [np.asarray(source_columns[name]).astype(dtype) for name, dtype in zip(names, dtypes)]
+        return Table(columns, names=names, dtype=dtypes)
 
-        self.n_pointsources = len(pointSourceList)
-        print("Number of point sources found within or close to the requested aperture: {}".format(self.n_pointsources))
-        # close the output file
-        pslist.close()
+    def write_source_list_file(self, filename, source_columns):
+        """Write out the list of sources that fall on or near the aperture,
+        along with the field center information. All source lines are
+        written in a single call.
 
-        # If no good point sources were found in the requested array, alert the user
-        if len(pointSourceList) < 1:
-            print("INFO: no point sources within the requested array.")
-            # print("The point source image option is being turned off")
-            # self.runStep['pointsource']=False
-            # if self.runStep['extendedsource'] == False and self.runStep['cosmicray'] == False:
-            #    print("Error: no input point sources, extended image, nor cosmic rays specified")
-            #    print("Exiting...")
-            #    sys.exit()
+        Parameters
+        ----------
+        filename : str
+            Name of the output file
+
+        source_columns : dict
+            Dictionary of arrays containing the 'index', 'pixelx', 'pixely',
+            'RA', 'Dec', 'RA_degrees', 'Dec_degrees', 'magnitude',
+            'countrate_e/s', and 'counts_per_frame_e' values of the sources.
+            Sources with a magnitude of NaN (e.g. extended sources with no
+            magnitude given) are written with a magnitude of 99.99999.
+        """
+        nx = (self.subarray_bounds[2] - self.subarray_bounds[0]) + 1
+        ny = (self.subarray_bounds[3] - self.subarray_bounds[1]) + 1
 
-        return pointSourceList
+        # Write out the RA and Dec of the field center to the output file
+        # Also write out column headers to prepare for source list
+        header = [("# Field center (degrees): %13.8f %14.8f y axis rotation angle "
+                   "(degrees): %f  image size: %4.4d %4.4d\n" %
+                   (self.ra, self.dec, self.params['Telescope']['rotation'], nx, ny)),
+                  '#\n',
+                  ("#    Index   RA_(hh:mm:ss)   DEC_(dd:mm:ss)   RA_degrees      "
+                   "DEC_degrees     pixel_x   pixel_y    magnitude   counts/sec    counts/frame\n")]
+
+        magnitudes = np.asarray(source_columns['magnitude'], dtype=np.float64)
+        magnitudes = np.where(np.isnan(magnitudes), 99.99999, magnitudes)
+        rows = zip(np.asarray(source_columns['index']).tolist(), source_columns['RA'],
+                   source_columns['Dec'], np.asarray(source_columns['RA_degrees']).tolist(),
+                   np.asarray(source_columns['Dec_degrees']).tolist(),
+                   np.asarray(source_columns['pixelx']).tolist(),
+                   np.asarray(source_columns['pixely']).tolist(), magnitudes.tolist(),
+                   np.asarray(source_columns['countrate_e/s']).tolist(),
+                   np.asarray(source_columns['counts_per_frame_e']).tolist())
+        lines = ["%i %s %s %14.8f %14.8f %9.3f %9.3f  %9.3f  %13.6e   %13.6e\n" % row for row in rows]
+
+        with open(filename, 'w') as source_file:
+            source_file.write(''.join(header + lines))
 
     def translate_psf_table(self, magnitude_system):
         """Given a magnitude system, translate the table of PSF sizes
@@ -1827,38 +2377,105 @@ class Catalog_seed():
 
     def find_psf_size(self, countrate):
         """Determine the dimentions of the PSF to use based on an object's
-        countrate.
+        countrate. ``countrate`` may be a single value or an array of
+        countrates, in which case all sizes are found with a single
+        ``np.searchsorted`` call on the countrate column created by
+        ``translate_psf_table``.
 
         Parameters
         ----------
-        countrate : float
-            Source countrate
+        countrate : float or numpy.ndarray
+            Source countrate(s)
 
         Returns
         -------
-        xdim : int
-            Size of PSF in pixels in the x direction
-
-        ydim : int
-            Size of PSF in pixels in the y direction
+        dimension : int or numpy.ndarray
+            Size of PSF in pixels in the x and y directions
         """
-        if self.add_psf_wings is False:
-            return self.psf_library_core_x_dim
+        scalar_input = np.isscalar(countrate)
+        countrate = np.atleast_1d(np.asarray(countrate, dtype=np.float64))
 
-        brighter = np.where(countrate >= self.psf_wing_sizes['countrate'])[0]
-        if len(brighter) == 0:
-            # Dimmest bin == size of pf library
-            dimension = self.psf_library_core_x_dim
-            #dim = np.max(self.psf_wing_sizes['number_of_pixels'])
+        if self.add_psf_wings is False:
+            dimension = np.repeat(self.psf_library_core_x_dim, len(countrate))
         else:
-            dimension = self.psf_wing_sizes['number_of_pixels'][brighter[0]]
+            # translate_psf_table sorts the table in order of ascending magnitude,
+            # so the countrates are in descending order. We want the first
+            # (i.e. largest) PSF size whose countrate the source is at least
+            # as bright as.
+            table_countrates = np.asarray(self.psf_wing_sizes['countrate'])[::-1]
+            table_sizes = np.asarray(self.psf_wing_sizes['number_of_pixels'])[::-1]
+            num_fainter = np.searchsorted(table_countrates, countrate, side='right')
+
+            # Sources fainter than the dimmest bin get the size of the psf library
+            dimension = np.repeat(self.psf_library_core_x_dim, len(countrate))
+            brighter = num_fainter > 0
+            dimension[brighter] = table_sizes[num_fainter[brighter] - 1]
+
+        if scalar_input:
+            return dimension[0]
         return dimension
 
     def shift_sources_by_offset(self, lines, segment_offset, pixelflag):
+        """Shift the positions of all sources in a catalog by the offset
+        of a mirror segment
+
+        Parameters
+        ----------
+        lines : astropy.table.Table
+            Source catalog
+
+        segment_offset : tuple
+            (x, y) offset of the segment in arcseconds, as returned by
+            ``get_segment_offset``
+
+        pixelflag : bool
+            True if the source positions are in units of pixels, False for
+            RA, Dec
+
+        Returns
+        -------
+        shifted_lines : astropy.table.Table
+            Copy of the catalog with the shifted positions, in units of
+            RA, Dec (degrees)
+        """
         print('    Shifting point source locations by arcsecond offset {}'.format(segment_offset))
+        ra, dec = self.segment_shifted_positions(lines, np.atleast_2d(segment_offset), pixelflag)
 
         shifted_lines = lines.copy()
-        shifted_lines.remove_rows(np.arange(0, len(shifted_lines)))
+        shifted_lines['x_or_RA'] = ra[0]
+        shifted_lines['y_or_Dec'] = dec[0]
+        return shifted_lines
+
+    def segment_shifted_positions(self, lines, segment_offsets, pixelflag):
+        """Calculate the positions of all sources in a catalog when shifted
+        by the offsets of a number of mirror segments. The source positions
+        are converted to V2, V3 once, and all offsets are applied in a
+        single array operation.
+
+        Parameters
+        ----------
+        lines : astropy.table.Table
+            Source catalog
+
+        segment_offsets : numpy.ndarray
+            (number of segments, 2) array of the (x, y) offsets of the
+            segments in arcseconds
+
+        pixelflag : bool
+            True if the source positions are in units of pixels, False for
+            RA, Dec
+
+        Returns
+        -------
+        ra : numpy.ndarray
+            (number of segments, number of sources) array of shifted RA
+            values in degrees
+
+        dec : numpy.ndarray
+            (number of segments, number of sources) array of shifted Dec
+            values in degrees
+        """
+        segment_offsets = np.atleast_2d(np.asarray(segment_offsets, dtype=np.float64))
 
         V2ref_arcsec = self.siaf.V2Ref
         V3ref_arcsec = self.siaf.V3Ref
@@ -1866,28 +2483,20 @@ class Catalog_seed():
         print('    Position angle = ', position_angle)
         attitude_ref = pysiaf.utils.rotations.attitude(V2ref_arcsec, V3ref_arcsec, self.ra, self.dec, position_angle)
 
-        # Shift every source by the appropriate offset
-        x_displacement_arcsec, y_displacement_arcsec = segment_offset
-        for line in lines:
-            x_or_RA, y_or_Dec = line['x_or_RA', 'y_or_Dec']
-            # Convert the input source locations to V2/V3
-            if not pixelflag:
-                # Convert RA/Dec (sky frame) to V2/V3 (telescope frame)
-                v2, v3 = pysiaf.utils.rotations.getv2v3(attitude_ref, x_or_RA, y_or_Dec)
-            else:
-                # Convert X/Y (detector frame) to V2/V3 (telescope frame)
-                v2, v3 = self.siaf.det_to_tel(x_or_RA, y_or_Dec)
-
-            # Add the arcsecond displacement to each V2/V3 source position
-            v2 -= x_displacement_arcsec
-            v3 += y_displacement_arcsec
+        # Convert the input source locations to RA, Dec and then to V2/V3
+        # (telescope frame)
+        pixelx, pixely, source_ra, source_dec, ra_str, dec_str = self.get_positions_array(
+            lines['x_or_RA'], lines['y_or_Dec'], pixelflag, 4096)
+        v2, v3 = pysiaf.utils.rotations.getv2v3(attitude_ref, source_ra, source_dec)
 
-            # Translate back to RA/Dec and save
-            ra, dec = pysiaf.utils.rotations.pointing(attitude_ref, v2, v3)
-            # TODO: need to be smarter about which magnitude to use here
-            shifted_lines.add_row([ra, dec, line['magnitude']])
+        # Add the arcsecond displacement of each segment to each V2/V3
+        # source position
+        v2 = v2[np.newaxis, :] - segment_offsets[:, 0:1]
+        v3 = v3[np.newaxis, :] + segment_offsets[:, 1:2]
 
-        return shifted_lines
+        # Translate back to RA/Dec
+        ra, dec = pysiaf.utils.rotations.pointing(attitude_ref, v2.ravel(), v3.ravel())
+        return np.reshape(ra, v2.shape), np.reshape(dec, v3.shape)
 
     def remove_outside_fov_sources(self, index, source, pixflag, delta_pixels):
         """Filter out entries in the source catalog that are located well outside the field of
@@ -1962,7 +2571,9 @@ class Catalog_seed():
         Parameters
         ----------
         pointSources : astropy.table.Table
-            Table of point sources
+            Table of point sources. If ``segment_number`` is None and the
+            table has a ``segment`` column, each source is created using the
+            PSF library of the mirror segment given in that column.
         segment_number : int, optional
             The number of the mirror segment to make an image for
         ptsrc_segmap : optional
@@ -1988,78 +2599,184 @@ class Catalog_seed():
             ptsrc_segmap.ydim, ptsrc_segmap.xdim = self.output_dims
             ptsrc_segmap.initialize_map()
 
+        # Find the PSF sizes to use based on the countrates
+        psf_x_dims = self.find_psf_size(np.asarray(pointSources['countrate_e/s']))
+
+        # Mirror segment to use for each source
+        if segment_number is None and 'segment' in pointSources.colnames:
+            segment_numbers = np.asarray(pointSources['segment']).astype(int)
+        elif segment_number is not None:
+            segment_numbers = np.repeat(segment_number, len(pointSources))
+        else:
+            segment_numbers = None
+
+        # Split the aperture into tiles and render the tiles in parallel
+        # if requested
+        nproc = self.params['simSignals']['nproc']
+        if nproc > 1 and len(pointSources) > 1:
+            if parallel_rendering.fork_available():
+                psfimage, ptsrc_segmap.segmap = parallel_rendering.render_point_sources(
+                    self, pointSources, psf_x_dims, ptsrc_segmap.segmap, nproc, segment_numbers=segment_numbers)
+                if self.psf_stamp_cache is not None:
+                    print(self.psf_stamp_cache.summary())
+                return psfimage, ptsrc_segmap
+            else:
+                print(('WARNING: Parallel rendering of point sources requires the fork start method. '
+                       'Adding point sources serially.'))
+
+        # Evaluate the PSF library for the sources in batches
+        core_stamps = self.psf_core_stamps(pointSources['pixelx'], pointSources['pixely'],
+                                           segment_number=segment_numbers)
+        if segment_numbers is None:
+            segment_numbers = itertools.repeat(None)
+
         # Loop over the entries in the point source list
-        for i, entry in enumerate(pointSources):
+        for i, (entry, psf_x_dim, core_stamp, source_segment) in enumerate(zip(pointSources, psf_x_dims,
+                                                                                core_stamps, segment_numbers)):
+            self.add_point_source(psfimage, ptsrc_segmap, entry, psf_x_dim, segment_number=source_segment,
+                                  core_stamp=core_stamp)
 
-            # Find the PSF size to use based on the countrate
-            psf_x_dim = self.find_psf_size(entry['countrate_e/s'])
+            if ((len(pointSources) > 100) and (np.mod(i, 100))) == 0:
+                print('{}: Working on source {}'.format(str(datetime.datetime.now()), i))
 
-            # Assume same PSF size in x and y
-            psf_y_dim = psf_x_dim
+        if self.psf_stamp_cache is not None:
+            print(self.psf_stamp_cache.summary())
 
-            scaled_psf, min_x, min_y, wings_added = self.create_psf_stamp(
-                entry['pixelx'], entry['pixely'], psf_x_dim, psf_y_dim,
-                segment_number=segment_number
-            )
+        return psfimage, ptsrc_segmap
 
-            # Skip sources that fall completely off the detector
-            if scaled_psf is None:
-                continue
+    def add_point_source(self, psfimage, ptsrc_segmap, entry, psf_x_dim, segment_number=None,
+                         core_stamp=None, tile=None):
+        """Create the PSF stamp for a single point source and add it to the
+        seed image and segmentation map
 
-            scaled_psf *= entry['countrate_e/s']
+        Parameters
+        ----------
+        psfimage : numpy.ndarray
+            2D seed image to which the source is added
 
-            # PSF may not be centered in array now if part of the array falls
-            # off of the aperture
-            stamp_x_loc = psf_x_dim // 2 - min_x
-            stamp_y_loc = psf_y_dim // 2 - min_y
-            updated_psf_dimensions = scaled_psf.shape
+        ptsrc_segmap : mirage.seed_image.segmentation_map.SegMap
+            Segmentation map to which the source is added
 
-            # If the source subpixel location is beyond 0.5 (i.e. the edge
-            # of the pixel), then we shift the wing->core offset by 1.
-            # We also need to shift the location of the wing array on the
-            # detector by 1
-            if wings_added:
-                x_delta = int(np.modf(entry['pixelx'])[0] > 0.5)
-                y_delta = int(np.modf(entry['pixely'])[0] > 0.5)
-            else:
-                x_delta = 0
-                y_delta = 0
+        entry : astropy.table.Row
+            Row of the point source list describing the source
 
-            # Get the coordinates that describe the overlap between the
-            # PSF image and the output aperture
-            xap, yap, xpts, ypts, (i1, i2), (j1, j2), (k1, k2), \
-                (l1, l2) = self.create_psf_stamp_coords(entry['pixelx']+x_delta, entry['pixely']+y_delta,
-                                                        updated_psf_dimensions,
-                                                        stamp_x_loc, stamp_y_loc,
-                                                        coord_sys='aperture')
+        psf_x_dim : int
+            Size of the PSF stamp to use for the source
 
-            # Skip sources that fall completely off the detector
-            if None in [i1, i2, j1, j2, k1, k2, l1, l2]:
-                continue
+        segment_number : int, optional
+            The number of the mirror segment to make an image for
 
-            try:
-                psfimage[j1:j2, i1:i2] += scaled_psf[l1:l2, k1:k2]
-
-                # Divide readnoise by 100 sec, which is a 10 group RAPID ramp?
-                noiseval = self.single_ron / 100. + self.params['simSignals']['bkgdrate']
-                if self.params['Inst']['mode'].lower() in ['wfss', 'ts_wfss']:
-                    noiseval += self.grism_background
-                ptsrc_segmap.add_object_noise(scaled_psf[l1:l2, k1:k2], j1, i1, entry['index'], noiseval)
-            except IndexError:
-                # In here we catch sources that are off the edge
-                # of the detector. These may not necessarily be caught in
-                # getpointsourcelist because if the PSF is not centered
-                # in the webbpsf stamp, then the area to be pulled from
-                # the stamp may shift off of the detector.
-                pass
+        core_stamp : numpy.ndarray, optional
+            Full PSF core for the source, as returned by ``psf_core_stamps``
 
-            if ((len(pointSources) > 100) and (np.mod(i, 100))) == 0:
-                print('{}: Working on source {}'.format(str(datetime.datetime.now()), i))
+        tile : tuple, optional
+            (y1, y2, x1, x2) bounds of the area of ``psfimage`` to update.
+            Any part of the source outside of this area is ignored. If None,
+            the entire image is updated.
+        """
+        # Assume same PSF size in x and y
+        psf_y_dim = psf_x_dim
+
+        scaled_psf, min_x, min_y, wings_added = self.create_psf_stamp(
+            entry['pixelx'], entry['pixely'], psf_x_dim, psf_y_dim,
+            segment_number=segment_number, core_stamp=core_stamp
+        )
+
+        # Skip sources that fall completely off the detector
+        if scaled_psf is None:
+            return
+
+        scaled_psf *= entry['countrate_e/s']
+
+        # PSF may not be centered in array now if part of the array falls
+        # off of the aperture
+        stamp_x_loc = psf_x_dim // 2 - min_x
+        stamp_y_loc = psf_y_dim // 2 - min_y
+        updated_psf_dimensions = scaled_psf.shape
+
+        # If the source subpixel location is beyond 0.5 (i.e. the edge
+        # of the pixel), then we shift the wing->core offset by 1.
+        # We also need to shift the location of the wing array on the
+        # detector by 1
+        if wings_added:
+            x_delta = int(np.modf(entry['pixelx'])[0] > 0.5)
+            y_delta = int(np.modf(entry['pixely'])[0] > 0.5)
+        else:
+            x_delta = 0
+            y_delta = 0
+
+        # Get the coordinates that describe the overlap between the
+        # PSF image and the output aperture
+        xap, yap, xpts, ypts, (i1, i2), (j1, j2), (k1, k2), \
+            (l1, l2) = self.create_psf_stamp_coords(entry['pixelx']+x_delta, entry['pixely']+y_delta,
+                                                    updated_psf_dimensions,
+                                                    stamp_x_loc, stamp_y_loc,
+                                                    coord_sys='aperture')
+
+        # Skip sources that fall completely off the detector
+        if None in [i1, i2, j1, j2, k1, k2, l1, l2]:
+            return
+
+        # Keep only the part of the source that falls within the tile
+        if tile is not None:
+            tile_y1, tile_y2, tile_x1, tile_x2 = tile
+            i1, i2, k1, k2 = self.clip_to_tile(i1, i2, k1, k2, tile_x1, tile_x2)
+            j1, j2, l1, l2 = self.clip_to_tile(j1, j2, l1, l2, tile_y1, tile_y2)
+            if i2 <= i1 or j2 <= j1:
+                return
 
-        return psfimage, ptsrc_segmap
+        try:
+            psfimage[j1:j2, i1:i2] += scaled_psf[l1:l2, k1:k2]
+
+            # Divide readnoise by 100 sec, which is a 10 group RAPID ramp?
+            noiseval = self.single_ron / 100. + self.params['simSignals']['bkgdrate']
+            if self.params['Inst']['mode'].lower() in ['wfss', 'ts_wfss']:
+                noiseval += self.grism_background
+            ptsrc_segmap.add_object_noise(scaled_psf[l1:l2, k1:k2], j1, i1, entry['index'], noiseval)
+        except IndexError:
+            # In here we catch sources that are off the edge
+            # of the detector. These may not necessarily be caught in
+            # getpointsourcelist because if the PSF is not centered
+            # in the webbpsf stamp, then the area to be pulled from
+            # the stamp may shift off of the detector.
+            pass
+
+    def clip_to_tile(self, start, end, stamp_start, stamp_end, tile_start, tile_end):
+        """Restrict the coordinates describing where a stamp falls on the
+        aperture to a tile of the aperture, along one axis
+
+        Parameters
+        ----------
+        start : int
+            Starting aperture coordinate of the stamp
+
+        end : int
+            Ending aperture coordinate of the stamp
+
+        stamp_start : int
+            Starting stamp coordinate corresponding to ``start``
+
+        stamp_end : int
+            Ending stamp coordinate corresponding to ``end``
+
+        tile_start : int
+            Starting aperture coordinate of the tile
+
+        tile_end : int
+            Ending aperture coordinate of the tile
+
+        Returns
+        -------
+        start, end, stamp_start, stamp_end : tup
+            Coordinates restricted to the tile. ``end`` will be less than
+            or equal to ``start`` if the stamp does not overlap the tile.
+        """
+        low_clip = max(tile_start - start, 0)
+        high_clip = max(end - tile_end, 0)
+        return start + low_clip, end - high_clip, stamp_start + low_clip, stamp_end - high_clip
 
     def create_psf_stamp(self, x_location, y_location, psf_dim_x, psf_dim_y,
-                         ignore_detector=False, segment_number=None):
+                         ignore_detector=False, segment_number=None, core_stamp=None):
         """From the gridded PSF model, location within the aperture, and
         dimensions of the stamp image (either the library PSF image, or
         the galaxy/extended stamp image with which the PSF will be
@@ -2088,6 +2805,14 @@ class Catalog_seed():
             larger than full frame). If False, coordinates are constrained
             to be on the detector.
 
+        segment_number : int
+            The number of the mirror segment whose PSF library is to be used
+
+        core_stamp : numpy.ndarray
+            Optional 2D array containing the full PSF core, previously
+            evaluated for this source by ``psf_core_stamps``. If None, the
+            PSF library is evaluated here.
+
         Returns
         -------
         full_psf : numpy.ndarray
@@ -2148,8 +2873,8 @@ class Catalog_seed():
                 return None, None, None, False
 
             # Step 4
-            full_psf = library.evaluate(x=xpts_core, y=ypts_core, flux=1.0,
-                                        x_0=xc_core, y_0=yc_core)
+            full_psf = self.evaluate_psf_library(library, xpts_core, ypts_core, xc_core, yc_core,
+                                                 (k1c, k2c, l1c, l2c), core_stamp=core_stamp)
             k1 = k1c
             l1 = l1c
 
@@ -2199,38 +2924,172 @@ class Catalog_seed():
                (l1 < (psf_wing_half_width_y + psf_core_half_width_y)) and
                (l2 > (psf_wing_half_width_y - psf_core_half_width_y))):
 
-                # Step 3
-                # Get coordinates decribing overlap between the evaluated psf
-                # core and the full frame of the detector. We really only need
-                # the xpts_core and ypts_core from this in order to know how
-                # to evaluate the library
-                # Note that we don't care about the pixel phase here.
-                psf_core_dims = (self.psf_library_core_y_dim, self.psf_library_core_x_dim)
-                xc_core, yc_core, xpts_core, ypts_core, (i1c, i2c), (j1c, j2c), (k1c, k2c), \
-                    (l1c, l2c) = self.create_psf_stamp_coords(x_location, y_location, psf_core_dims,
-                                                              psf_core_half_width_x, psf_core_half_width_y,
-                                                              coord_sys='full_frame', ignore_detector=ignore_detector)
+                # Step 3
+                # Get coordinates decribing overlap between the evaluated psf
+                # core and the full frame of the detector. We really only need
+                # the xpts_core and ypts_core from this in order to know how
+                # to evaluate the library
+                # Note that we don't care about the pixel phase here.
+                psf_core_dims = (self.psf_library_core_y_dim, self.psf_library_core_x_dim)
+                xc_core, yc_core, xpts_core, ypts_core, (i1c, i2c), (j1c, j2c), (k1c, k2c), \
+                    (l1c, l2c) = self.create_psf_stamp_coords(x_location, y_location, psf_core_dims,
+                                                              psf_core_half_width_x, psf_core_half_width_y,
+                                                              coord_sys='full_frame', ignore_detector=ignore_detector)
+
+                if None in [i1c, i2c, j1c, j2c, k1c, k2c, l1c, l2c]:
+                    return None, None, None, False
+
+                # Step 4
+                psf = self.evaluate_psf_library(self.psf_library, xpts_core, ypts_core, xc_core, yc_core,
+                                                (k1c, k2c, l1c, l2c), core_stamp=core_stamp)
+
+                # Step 5
+                wing_start_x = k1c + delta_core_to_wing_x
+                wing_end_x = k2c + delta_core_to_wing_x
+                wing_start_y = l1c + delta_core_to_wing_y
+                wing_end_y = l2c + delta_core_to_wing_y
+
+                full_psf[wing_start_y:wing_end_y, wing_start_x:wing_end_x] = psf
+
+            # Whether or not the core is on the detector, crop the PSF
+            # to the proper shape based on how much is on the detector
+            full_psf = full_psf[l1:l2, k1:k2]
+
+        return full_psf, k1, l1, add_wings
+
+    def evaluate_psf_library(self, library, x_points, y_points, x_center, y_center, stamp_coords,
+                             core_stamp=None):
+        """Evaluate the gridded PSF library for a source. If the full PSF
+        core has already been evaluated by ``psf_core_stamps``, it is cropped
+        to the requested area. Otherwise, if the PSF stamp cache is enabled,
+        the stamp is taken from the cache, which quantizes the sub-pixel
+        phase of the source.
+
+        Parameters
+        ----------
+        library : photutils.griddedPSFModel
+            Gridded PSF library to evaluate
+
+        x_points : numpy.ndarray
+            2D array of full frame x-coordinates at which to evaluate the library
+
+        y_points : numpy.ndarray
+            2D array of full frame y-coordinates at which to evaluate the library
+
+        x_center : float
+            Full frame x-coordinate of the source
+
+        y_center : float
+            Full frame y-coordinate of the source
+
+        stamp_coords : tuple
+            (k1, k2, l1, l2) coordinates within the full PSF core stamp that
+            correspond to ``x_points`` and ``y_points``, as returned by
+            ``create_psf_stamp_coords``
+
+        core_stamp : numpy.ndarray
+            Optional 2D array containing the full, previously evaluated
+            PSF core for the source
+
+        Returns
+        -------
+        psf : numpy.ndarray
+            2D array containing the evaluated PSF
+        """
+        k1, k2, l1, l2 = stamp_coords
+        if core_stamp is not None:
+            return core_stamp[l1:l2, k1:k2].copy()
+
+        if self.psf_stamp_cache is None:
+            return library.evaluate(x=x_points, y=y_points, flux=1., x_0=x_center, y_0=y_center)
+
+        stamp = self.psf_stamp_cache.get_stamp(library, x_center, y_center,
+                                               (self.psf_library_core_y_dim, self.psf_library_core_x_dim))
+        return stamp[l1:l2, k1:k2].copy()
+
+    def psf_renderer(self, segment_number=None):
+        """Return the batched PSF renderer for the PSF library, creating
+        it if necessary
+
+        Parameters
+        ----------
+        segment_number : int
+            The number of the mirror segment whose PSF library is to be used
+
+        Returns
+        -------
+        renderer : mirage.psf.psf_renderer.BatchedPSFRenderer
+            Renderer for the library. None if batched evaluation is turned
+            off, or the PSF stamp cache is being used.
+        """
+        batch_size = self.params['simSignals']['psf_batch_size']
+        if not batch_size or self.psf_stamp_cache is not None:
+            return None
 
-                if None in [i1c, i2c, j1c, j2c, k1c, k2c, l1c, l2c]:
-                    return None, None, None, False
+        if segment_number is not None:
+            library = self.psf_library[segment_number - 1]
+        else:
+            library = self.psf_library
 
-                # Step 4
-                psf = self.psf_library.evaluate(x=xpts_core, y=ypts_core, flux=1.,
-                                                x_0=xc_core, y_0=yc_core)
+        if id(library) not in self.psf_renderers:
+            self.psf_renderers[id(library)] = BatchedPSFRenderer(library, chunk_size=batch_size)
+        return self.psf_renderers[id(library)]
 
-                # Step 5
-                wing_start_x = k1c + delta_core_to_wing_x
-                wing_end_x = k2c + delta_core_to_wing_x
-                wing_start_y = l1c + delta_core_to_wing_y
-                wing_end_y = l2c + delta_core_to_wing_y
+    def psf_core_stamps(self, x_locations, y_locations, segment_number=None):
+        """Evaluate the PSF core for a list of sources using the batched
+        PSF renderer. Stamps are evaluated in chunks of
+        ``simSignals:psf_batch_size`` sources as they are requested, in
+        order to limit memory usage.
 
-                full_psf[wing_start_y:wing_end_y, wing_start_x:wing_end_x] = psf
+        Parameters
+        ----------
+        x_locations : numpy.ndarray
+            1D array of source x-coordinates in the coordinate system of the
+            aperture being simulated
 
-            # Whether or not the core is on the detector, crop the PSF
-            # to the proper shape based on how much is on the detector
-            full_psf = full_psf[l1:l2, k1:k2]
+        y_locations : numpy.ndarray
+            1D array of source y-coordinates in the coordinate system of the
+            aperture being simulated
 
-        return full_psf, k1, l1, add_wings
+        segment_number : int or numpy.ndarray
+            The number of the mirror segment whose PSF library is to be used,
+            or a 1D array giving the segment number of each source
+
+        Returns
+        -------
+        core_stamps : iterator
+            Iterator returning the full PSF core stamp for each source in turn.
+            If batched evaluation is turned off, or the PSF stamp cache is
+            being used, the iterator returns None for each source, and
+            ``create_psf_stamp`` evaluates the library itself.
+        """
+        if segment_number is not None and not np.isscalar(segment_number):
+            segment_number = np.asarray(segment_number)
+            if len(segment_number) == 0:
+                return iter([])
+            if self.psf_renderer(segment_number=int(segment_number[0])) is None:
+                return itertools.repeat(None)
+
+            # Evaluate each contiguous run of sources from the same segment
+            # in turn, using that segment's library
+            x_locations = np.asarray(x_locations)
+            y_locations = np.asarray(y_locations)
+            breaks = np.where(np.diff(segment_number) != 0)[0] + 1
+            starts = np.concatenate([[0], breaks])
+            ends = np.concatenate([breaks, [len(segment_number)]])
+            return itertools.chain.from_iterable(
+                self.psf_core_stamps(x_locations[start:end], y_locations[start:end],
+                                     segment_number=int(segment_number[start]))
+                for start, end in zip(starts, ends))
+
+        renderer = self.psf_renderer(segment_number=segment_number)
+        if renderer is None:
+            return itertools.repeat(None)
+
+        # Move to full frame coordinates, which are used by the library
+        x_full = np.asarray(x_locations, dtype=np.float64) + self.subarray_bounds[0]
+        y_full = np.asarray(y_locations, dtype=np.float64) + self.subarray_bounds[1]
+        return renderer.iter_stamps(x_full, y_full, (self.psf_library_core_y_dim, self.psf_library_core_x_dim))
 
     def create_psf_stamp_coords(self, aperture_x, aperture_y, stamp_dims, stamp_x, stamp_y,
                                 coord_sys='full_frame', ignore_detector=False):
@@ -2523,6 +3382,90 @@ class Catalog_seed():
 
         return psf[nyshift - ydist:nyshift + ydist + 1, nxshift - xdist:nxshift + xdist + 1]
 
+    def read_source_catalog(self, filename):
+        """Read in an ascii source catalog. If ``simSignals:catalog_spatial_index``
+        is True, a spatial index of the catalog, saved next to the catalog file,
+        is used to read only the rows containing sources near the aperture.
+        Otherwise, if ``simSignals:catalog_chunk_size`` is greater than zero,
+        the catalog is read in chunks of rows, keeping only the sources near
+        the aperture.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the catalog file
+
+        Returns
+        -------
+        catalog : astropy.table.Table
+            Source catalog
+        """
+        if self.params['simSignals']['catalog_spatial_index']:
+            # Use the same search radius as remove_outside_fov_sources
+            radius = 4096 * self.siaf.XSciScale / 3600.
+            catalog = spatial_index.read_catalog_near(filename, self.ra, self.dec, radius)
+            if catalog is not None:
+                return catalog
+        if self.params['simSignals']['catalog_chunk_size'] > 0:
+            return self.read_catalog_in_chunks(filename, self.params['simSignals']['catalog_chunk_size'])
+        return ascii.read(filename)
+
+    def read_catalog_in_chunks(self, filename, chunk_size):
+        """Read in an ascii source catalog in chunks of rows. Sources well
+        outside the field of view are removed from each chunk as it is read,
+        along with the magnitude columns that will not be used, so that only
+        the sources near the aperture are kept in memory. If the catalog does
+        not have an ``index`` column, one is added containing the row numbers
+        of the sources in the full catalog. The range of index numbers in the
+        full catalog is saved in ``catalog.meta['index_range']``.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the catalog file
+
+        chunk_size : int
+            Number of catalog rows to read at a time
+
+        Returns
+        -------
+        catalog : astropy.table.Table
+            Catalog of the sources near the aperture
+        """
+        kept = []
+        total_rows = 0
+        index_range = None
+        for chunk in chunked_reader.iter_catalog_chunks(filename, chunk_size):
+            if len(kept) == 0:
+                comments = chunk.meta.get('comments', [])
+                pixflag = 'position_pixels' in comments[0:4]
+
+                # Keep only the magnitude column for the current instrument
+                # and filter, if there is one
+                try:
+                    mag_column = self.select_magnitude_column(chunk, filename)
+                    unused_columns = [colname for colname in chunk.colnames
+                                      if colname.endswith('magnitude') and colname != mag_column]
+                except ValueError:
+                    unused_columns = []
+
+            total_rows += len(chunk)
+            chunk.remove_columns(unused_columns)
+            if len(chunk) > 0:
+                chunk_range = (int(np.min(chunk['index'])), int(np.max(chunk['index'])))
+                if index_range is not None:
+                    chunk_range = (min(chunk_range[0], index_range[0]), max(chunk_range[1], index_range[1]))
+                index_range = chunk_range
+                indexes, chunk = self.remove_outside_fov_sources(chunk['index'], chunk, pixflag, 4096)
+            kept.append(chunk)
+
+        catalog = vstack(kept, metadata_conflicts='silent')
+        catalog.meta['comments'] = comments
+        if index_range is not None:
+            catalog.meta['index_range'] = index_range
+        print('Kept {} of {} sources from {} near the aperture'.format(len(catalog), total_rows, filename))
+        return catalog
+
     def read_point_source_file(self, filename):
         """Read in the point source catalog file
 
@@ -2544,7 +3487,7 @@ class Catalog_seed():
             Magnitude system of the source brightnesses (e.g. 'abmag')
         """
         try:
-            gtab = ascii.read(filename)
+            gtab = self.read_source_catalog(filename)
             # Look at the header lines to see if inputs
             # are in units of pixels or RA, Dec
             pflag = False
@@ -2621,30 +3564,52 @@ class Catalog_seed():
                                       filter_name.upper())))
 
     def makePos(self, alpha1, delta1):
-        # given a numerical RA/Dec pair, convert to string
-        # values hh:mm:ss
-        if ((alpha1 < 0) or (alpha1 >= 360.)):
-            alpha1 = alpha1 % 360
-        if delta1 < 0.:
-            sign = "-"
-            d1 = abs(delta1)
-        else:
-            sign = "+"
-            d1 = delta1
-        decd = int(d1)
-        value = 60. * (d1 - float(decd))
-        decm = int(value)
+        """Given numerical RA/Dec values, convert to string values
+        hh:mm:ss and dd:mm:ss. Inputs may be scalars or arrays, in
+        which case arrays of strings are returned.
+
+        Parameters
+        ----------
+        alpha1 : float or numpy.ndarray
+            Right ascension value(s) in degrees
+
+        delta1 : float or numpy.ndarray
+            Declination value(s) in degrees
+
+        Returns
+        -------
+        alpha2 : str or numpy.ndarray
+            Right ascension string(s)
+
+        delta2 : str or numpy.ndarray
+            Declination string(s)
+        """
+        scalar_input = np.ndim(alpha1) == 0
+        alpha1 = np.atleast_1d(np.asarray(alpha1, dtype=np.float64))
+        delta1 = np.atleast_1d(np.asarray(delta1, dtype=np.float64))
+
+        alpha1 = np.mod(alpha1, 360.)
+        sign = np.where(delta1 < 0., '-', '+')
+        d1 = np.abs(delta1)
+        decd = d1.astype(np.int64)
+        value = 60. * (d1 - decd)
+        decm = value.astype(np.int64)
         decs = 60. * (value - decm)
         a1 = alpha1 / 15.0
-        radeg = int(a1)
+        radeg = a1.astype(np.int64)
         value = 60. * (a1 - radeg)
-        ramin = int(value)
+        ramin = value.astype(np.int64)
         rasec = 60. * (value - ramin)
-        alpha2 = "%2.2d:%2.2d:%7.4f" % (radeg, ramin, rasec)
-        delta2 = "%1s%2.2d:%2.2d:%7.4f" % (sign, decd, decm, decs)
-        alpha2 = alpha2.replace(" ", "0")
-        delta2 = delta2.replace(" ", "0")
 
+        alpha2 = ["%2.2d:%2.2d:%7.4f" % ra_parts for ra_parts in zip(radeg.tolist(), ramin.tolist(),
+                                                                      rasec.tolist())]
+        delta2 = ["%1s%2.2d:%2.2d:%7.4f" % dec_parts for dec_parts in zip(sign.tolist(), decd.tolist(),
+                                                                           decm.tolist(), decs.tolist())]
+        alpha2 = np.array([entry.replace(" ", "0") for entry in alpha2])
+        delta2 = np.array([entry.replace(" ", "0") for entry in delta2])
+
+        if scalar_input:
+            return alpha2[0], delta2[0]
         return alpha2, delta2
 
     def RADecToXY_astrometric(self, ra, dec):
@@ -2653,19 +3618,19 @@ class Catalog_seed():
 
         Parameters:
         -----------
-        ra : float
-            Right ascention value, in degrees, to be translated.
+        ra : float or numpy.ndarray
+            Right ascention value(s), in degrees, to be translated.
 
-        dec : float
-            Declination value, in degrees, to be translated.
+        dec : float or numpy.ndarray
+            Declination value(s), in degrees, to be translated.
 
         Returns:
         --------
-        pixelx : float
-            X coordinate value in the aperture corresponding to the input location
+        pixelx : float or numpy.ndarray
+            X coordinate value(s) in the aperture corresponding to the input location(s)
 
-        pixely : float
-            Y coordinate value in the aperture corresponding to the input location
+        pixely : float or numpy.ndarray
+            Y coordinate value(s) in the aperture corresponding to the input location(s)
         """
         loc_v2, loc_v3 = pysiaf.utils.rotations.getv2v3(self.attitude_matrix, ra, dec)
 
@@ -2718,30 +3683,31 @@ class Catalog_seed():
 
         Parameters:
         -----------
-        pixelx : float
-            X coordinate value in the aperture
+        pixelx : float or numpy.ndarray
+            X coordinate value(s) in the aperture
 
-        pixely : float
-            Y coordinate value in the aperture
+        pixely : float or numpy.ndarray
+            Y coordinate value(s) in the aperture
 
         Returns:
         --------
-        ra : float
-            Right ascention value in degrees
+        ra : float or numpy.ndarray
+            Right ascention value(s) in degrees
 
-        dec : float
-            Declination value in degrees
+        dec : float or numpy.ndarray
+            Declination value(s) in degrees
 
-        ra_str : str
-            Right ascention value in HH:MM:SS
+        ra_str : str or numpy.ndarray
+            Right ascention value(s) in HH:MM:SS
 
-        dec_str : str
-            Declination value in DD:MM:SS
+        dec_str : str or numpy.ndarray
+            Declination value(s) in DD:MM:SS
         """
         if self.coord_transform is not None:
-            pixelx += self.subarray_bounds[0]
-            pixely += self.subarray_bounds[1]
-            loc_v2, loc_v3 = self.coord_transform(pixelx, pixely)
+            # Do not update the inputs in place, as they may be arrays
+            # owned by the caller
+            loc_v2, loc_v3 = self.coord_transform(pixelx + self.subarray_bounds[0],
+                                                  pixely + self.subarray_bounds[1])
         else:
             # Use SIAF to do the calculations if the distortion reffile is
             # not present. In this case, add 1 to the input pixel values
@@ -2759,7 +3725,7 @@ class Catalog_seed():
         # Read in the galaxy source list
         try:
             # read table
-            gtab = ascii.read(filename)
+            gtab = self.read_source_catalog(filename)
 
             # Look at the header lines to see if inputs
             # are in units of pixels or RA, Dec
@@ -2792,14 +3758,6 @@ class Catalog_seed():
         # given a list of galaxies (location, size, orientation, magnitude)
         # keep only those which will fall fully or partially on the output array
 
-        filteredList = Table(names=('index', 'pixelx', 'pixely', 'RA', 'Dec',
-                                    'RA_degrees', 'Dec_degrees', 'V2', 'V3',
-                                    'radius', 'ellipticity', 'pos_angle',
-                                    'sersic_index', 'magnitude', 'countrate_e/s',
-                                    'counts_per_frame_e'),
-                             dtype=('i', 'f', 'f', 'S14', 'S14', 'f', 'f', 'f',
-                                    'f', 'f', 'f', 'f', 'f', 'f', 'f', 'f'))
-
         # Each entry in galaxylist is:
         # index x_or_RA  y_or_Dec  radius  ellipticity  pos_angle  sersic_index  magnitude
         # remember that x/y are interpreted as coordinates in the output subarray
@@ -2839,54 +3797,47 @@ class Catalog_seed():
         # Determine the name of the column to use for source magnitudes
         mag_column = self.select_magnitude_column(galaxylist, catfile)
 
-        # Loop over galaxy sources
-        for index, source in zip(indexes, galaxylist):
-
-            # If galaxy radii are given in units of arcseconds, translate to pixels
-            if radiusflag is False:
-                source['radius'] /= self.siaf.XSciScale
-
-            # how many pixels beyond the nominal subarray edges can a source be located and
-            # still have it fall partially on the subarray? Galaxy stamps are nominally set to
-            # have a length and width equal to 100 times the requested radius.
-            edgex = source['radius'] * 100 / 2 - 1
-            edgey = source['radius'] * 100 / 2 - 1
-
-            # reset the field of view limits for the size of the current stamp image
-            outminy = miny - edgey
-            outmaxy = maxy + edgey
-            outminx = minx - edgex
-            outmaxx = maxx + edgex
-
-            pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions(source['x_or_RA'],
-                                                                          source['y_or_Dec'],
-                                                                          pixelflag, 4096)
-
-            # only keep the source if the peak will fall within the subarray
-            if pixely > outminy and pixely < outmaxy and pixelx > outminx and pixelx < outmaxx:
-
-                pixelv2, pixelv3 = pysiaf.utils.rotations.getv2v3(self.attitude_matrix, ra, dec)
-                entry = [index, pixelx, pixely, ra_str, dec_str, ra, dec, pixelv2, pixelv3,
-                         source['radius'], source['ellipticity'], source['pos_angle'], source['sersic_index']]
-
-                # Now look at the input magnitude of the point source
-                # append the mag and pixel position to the list of ra, dec
-                mag = float(source[mag_column])
-                entry.append(mag)
-
-                # Convert magnitudes to countrate (ADU/sec) and counts per frame
-                rate = utils.magnitude_to_countrate(self.params['Inst']['mode'], magsystem, mag,
-                                                    photfnu=self.photfnu, photflam=self.photflam,
-                                                    vegamag_zeropoint=self.vegazeropoint)
-                framecounts = rate * self.frametime
-
-                # add the countrate and the counts per frame to pointSourceList
-                # since they will be used in future calculations
-                entry.append(rate)
-                entry.append(framecounts)
-
-                # add the good point source, including location and counts, to the pointSourceList
-                filteredList.add_row(entry)
+        # If galaxy radii are given in units of arcseconds, translate to pixels
+        if radiusflag is False:
+            galaxylist['radius'] = galaxylist['radius'] / self.siaf.XSciScale
+
+        # how many pixels beyond the nominal subarray edges can a source be located and
+        # still have it fall partially on the subarray? Galaxy stamps are nominally set to
+        # have a length and width equal to 100 times the requested radius.
+        edges = np.asarray(galaxylist['radius']) * 100 / 2 - 1
+
+        pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions_array(galaxylist['x_or_RA'],
+                                                                            galaxylist['y_or_Dec'],
+                                                                            pixelflag, 4096)
+
+        # only keep the sources if the peak will fall within the subarray
+        keep = ((pixely > (miny - edges)) & (pixely < (maxy + edges)) &
+                (pixelx > (minx - edges)) & (pixelx < (maxx + edges)))
+
+        pixelv2, pixelv3 = pysiaf.utils.rotations.getv2v3(self.attitude_matrix, ra[keep], dec[keep])
+
+        # Convert magnitudes to countrate (ADU/sec) and counts per frame
+        magnitudes = np.array(galaxylist[mag_column]).astype(np.float64)[keep]
+        rates = np.atleast_1d(utils.magnitude_to_countrate(self.params['Inst']['mode'], magsystem,
+                                                           magnitudes, photfnu=self.photfnu,
+                                                           photflam=self.photflam,
+                                                           vegamag_zeropoint=self.vegazeropoint))
+        framecounts = rates * self.frametime
+
+        # Collect the good galaxies, including location and counts
+        filteredList = Table([np.asarray(indexes)[keep], pixelx[keep], pixely[keep], ra_str[keep],
+                              dec_str[keep], ra[keep], dec[keep], np.atleast_1d(pixelv2),
+                              np.atleast_1d(pixelv3), np.asarray(galaxylist['radius'])[keep],
+                              np.asarray(galaxylist['ellipticity'])[keep],
+                              np.asarray(galaxylist['pos_angle'])[keep],
+                              np.asarray(galaxylist['sersic_index'])[keep], magnitudes, rates, framecounts],
+                             names=('index', 'pixelx', 'pixely', 'RA', 'Dec',
+                                    'RA_degrees', 'Dec_degrees', 'V2', 'V3',
+                                    'radius', 'ellipticity', 'pos_angle',
+                                    'sersic_index', 'magnitude', 'countrate_e/s',
+                                    'counts_per_frame_e'),
+                             dtype=('i', 'f', 'f', 'S14', 'S14', 'f', 'f', 'f',
+                                    'f', 'f', 'f', 'f', 'f', 'f', 'f', 'f'))
 
         # Write the results to a file
         self.n_galaxies = len(filteredList)
@@ -2906,7 +3857,9 @@ class Catalog_seed():
 
     def create_galaxy(self, radius, ellipticity, sersic, posang, totalcounts):
         """Create a model 2d sersic image with a given radius, eccentricity,
-        position angle, and total counts.
+        position angle, and total counts. If the Sersic stamp cache is in
+        use, the profile is taken from the cache, using the quantized
+        parameters.
 
         Parameters
         ----------
@@ -2930,77 +3883,120 @@ class Catalog_seed():
         img : numpy.ndarray
             2D array containing the 2D sersic profile
         """
+        if self.sersic_stamp_cache is not None:
+            img = self.sersic_stamp_cache.get_stamp(radius, ellipticity, sersic, posang, self.sersic_stamp)
+        else:
+            img = self.sersic_stamp(radius, ellipticity, sersic, posang)
+        return img * totalcounts
+
+    def sersic_stamp(self, radius, ellipticity, sersic, posang):
+        """Create a model 2d sersic image with a given radius, eccentricity
+        and position angle, normalized to a total signal of 1. The profile
+        is evaluated only over the square that contains 99.995% of the total
+        signal, as found by ``galaxy_truncation_radius``, and then cropped
+        to the smallest square containing 99.95% of the evaluated signal.
+
+        Parameters
+        ----------
+        radius : float
+            Half light radius of the sersic profile, in units of pixels
+
+        ellipticity : float
+            Ellipticity of sersic profile
+
+        sersic : float
+            Sersic index
 
-        # create the grid of pixels
-        meshmax = np.min([np.int(self.ffsize * self.coord_adjust['y']), np.int(radius * 100.)])
+        posang : float
+            Position angle in units of radians
 
-        # Make sure the grid has odd dimensions so that the galaxy will
-        # be centered
+        Returns
+        -------
+        img : numpy.ndarray
+            2D array containing the normalized 2D sersic profile
+        """
+        # create the grid of pixels. Make sure the grid has odd dimensions
+        # so that the galaxy will be centered
+        half_width = self.galaxy_truncation_radius(radius, ellipticity, sersic, posang, 0.99995)
+        meshmax = np.min([int(self.ffsize * self.coord_adjust['y']), int(radius * 100.),
+                          2 * half_width + 1])
         if meshmax % 2 == 0:
             meshmax += 1
 
-        y, x = np.meshgrid(np.arange(meshmax), np.arange(meshmax))
-
         # Center the galaxy in the array
         xc = (meshmax // 2)
         yc = (meshmax // 2)
 
-        # Create model
-        mod = Sersic2D(amplitude=1, r_eff=radius, n=sersic, x_0=xc, y_0=yc,
-                       ellip=ellipticity, theta=posang)
-
-        # Create instance of model
-        img = mod(x, y)
-
-        # Scale such that the total number of counts in the galaxy matches the input
+        # The profile is symmetric about its center, so evaluate only the
+        # first half of the rows (including the center) and mirror them.
+        # The model is evaluated directly, without the overhead of creating
+        # a Sersic2D instance.
+        y, x = np.meshgrid(np.arange(meshmax), np.arange(xc + 1))
+        img = np.zeros((meshmax, meshmax))
+        img[0:xc + 1, :] = Sersic2D.evaluate(x, y, 1., radius, sersic, xc, yc, ellipticity, posang)
+        if xc > 0:
+            img[xc + 1:, :] = img[xc - 1::-1, ::-1]
+
+        # Normalize the total signal in the galaxy
         summedcounts = np.sum(img)
         if summedcounts == 0:
-            print('Zero counts in image in create_galaxy: ', radius, ellipticity, sersic, posang, totalcounts)
-            factor = 0.
-        else:
-            factor = totalcounts / summedcounts
-        img = img * factor
-
-        # Crop image down such that it contains 99.95% of the total signal
-        img = self.crop_galaxy_stamp(img, 0.9995)
-        return img
-
-    def crop_galaxy_stamp(self, stamp, threshold):
-        """Crop an input stamp image containing a galaxy to a size that
-        contains only threshold times the total signal. This is an
-        attempt to speed up the simulator a bit, since the galaxy stamp
-        images are often very large. Note that galaxy stamp images being
-        fed into this function are currently always square.
+            print('Zero counts in image in create_galaxy: ', radius, ellipticity, sersic, posang)
+            return img
+        img = img / summedcounts
+
+        # The closed form above is for the continuous profile. Crop the
+        # sampled image to the smallest square containing 99.95% of its
+        # signal, using the cumulative signal in square annuli
+        offsets = np.abs(np.arange(meshmax) - xc)
+        annulus = np.maximum(offsets[:, np.newaxis], offsets[np.newaxis, :])
+        enclosed = np.cumsum(np.bincount(annulus.ravel(), weights=img.ravel()))
+        rad = min(np.searchsorted(enclosed, 0.9995 * enclosed[-1]), xc)
+        return img[xc - rad:xc + rad + 1, xc - rad:xc + rad + 1]
+
+    def galaxy_truncation_radius(self, radius, ellipticity, sersic, posang, threshold):
+        """Calculate the half-width of the square stamp needed to contain a
+        given fraction of the total signal of a 2D Sersic profile. The
+        fraction of the signal within the ellipse of semi-major axis ``a``
+        is ``P(2n, b_n (a / r_eff)^(1/n))``, where ``P`` is the regularized
+        lower incomplete gamma function and ``b_n`` is defined such that
+        half of the signal is within ``r_eff``. The returned half-width is
+        that of the box bounding the ellipse containing ``threshold`` of
+        the signal.
 
         Parameters
         ----------
-        stamp : numpy.ndarray
-            2D stamp image of galaxy
+        radius : float
+            Half light radius of the sersic profile, in units of pixels
+
+        ellipticity : float
+            Ellipticity of sersic profile
+
+        sersic : float
+            Sersic index
+
+        posang : float
+            Position angle in units of radians
 
         threshold : float
-            Fraction of total flux to keep in the cropped image
+            Fraction of total flux to keep in the stamp
             (e.g. 0.999 = 99.9%)
 
         Returns
         -------
-        stamp : numpy.ndarray
-            2D cropped image
+        half_width : int
+            Half-width of the square stamp, in pixels
         """
-        totsignal = np.sum(stamp)
-        # In the case of no signal, return the original stamp image.
-        # This can happen for some Sersic profile parameters when the galaxy
-        # is very small compared to the pixel size.
-        if totsignal == 0.:
-            return stamp
-        yd, xd = stamp.shape
-        mid = np.int(xd / 2)
-        for rad in range(mid):
-            signal = np.sum(stamp[mid - rad:mid + rad + 1, mid - rad:mid + rad + 1]) / totsignal
-            if signal >= threshold:
-                return stamp[mid - rad:mid + rad + 1, mid - rad:mid + rad + 1]
-        # If we make it all the way through the stamp without
-        # hitting the threshold, then return the full stamp image
-        return stamp
+        if radius <= 0. or sersic <= 0.:
+            return 0
+        b_n = gammaincinv(2. * sersic, 0.5)
+        semi_major = radius * (gammaincinv(2. * sersic, threshold) / b_n) ** sersic
+        semi_minor = (1. - ellipticity) * semi_major
+        x_width = np.hypot(semi_major * np.cos(posang), semi_minor * np.sin(posang))
+        y_width = np.hypot(semi_major * np.sin(posang), semi_minor * np.cos(posang))
+        half_width = max(x_width, y_width)
+        if not np.isfinite(half_width):
+            return 0
+        return int(np.ceil(half_width))
 
     def make_galaxy_image(self, file):
         """Using the entries in the ``simSignals:galaxyList`` file, create a countrate image
@@ -3020,20 +4016,22 @@ class Catalog_seed():
             Segmentation map corresponding to ``galimage``
         """
         # Read in the list of galaxies (positions and magnitides)
-        glist, pixflag, radflag, magsys = self.readGalaxyFile(file)
-        if pixflag:
-            print("Galaxy list input positions assumed to be in units of pixels.")
-        else:
-            print("Galaxy list input positions assumed to be in units of RA and Dec.")
+        with self.profiler.stage('galaxy_catalog'):
+            glist, pixflag, radflag, magsys = self.readGalaxyFile(file)
+            if pixflag:
+                print("Galaxy list input positions assumed to be in units of pixels.")
+            else:
+                print("Galaxy list input positions assumed to be in units of RA and Dec.")
 
-        if radflag:
-            print("Galaxy list input radii assumed to be in units of pixels.")
-        else:
-            print("Galaxy list input radii assumed to be in units of arcsec.")
+            if radflag:
+                print("Galaxy list input radii assumed to be in units of pixels.")
+            else:
+                print("Galaxy list input radii assumed to be in units of arcsec.")
 
-        # Extract and save only the entries which will land (fully or partially) on the
-        # aperture of the output
-        galaxylist = self.filterGalaxyList(glist, pixflag, radflag, magsys, file)
+            # Extract and save only the entries which will land (fully or partially) on the
+            # aperture of the output
+            galaxylist = self.filterGalaxyList(glist, pixflag, radflag, magsys, file)
+        self.profiler.count('galaxies', len(galaxylist))
 
         # galaxylist is a table with columns:
         # 'pixelx', 'pixely', 'RA', 'Dec', 'RA_degrees', 'Dec_degrees', 'radius', 'ellipticity',
@@ -3055,11 +4053,29 @@ class Catalog_seed():
         if self.add_psf_wings is True:
             self.translate_psf_table(magsys)
 
+        # Render the galaxies using a pool of worker processes if requested
+        nproc = self.params['simSignals']['nproc']
+        if nproc > 1 and len(galaxylist) > 1:
+            if parallel_rendering.fork_available():
+                placements = parallel_rendering.render_galaxies(self, galaxylist, nproc)
+                self.place_galaxy_stamps(placements, galimage, segmentation)
+                return galimage, segmentation.segmap
+            else:
+                print(('WARNING: Parallel rendering of galaxies requires the fork start method. '
+                       'Adding galaxies serially.'))
+
+        # Evaluate the PSF library for the galaxies in batches
+        core_stamps = self.psf_core_stamps(galaxylist['pixelx'], galaxylist['pixely'])
+
+        # Galaxies waiting to be convolved with their PSFs
+        pending = []
+        batch_size = self.stamp_convolver.batch_size if self.stamp_convolver is not None else 1
+
         # For each entry, create an image, and place it onto the final output image
         start_time = time.time()
         times = []
         time_reported = False
-        for entry in galaxylist:
+        for entry, core_stamp in zip(galaxylist, core_stamps):
             # Warn user of how long this calcuation might take...
             if len(times) < 30:
                 elapsed_time = time.time() - start_time
@@ -3072,90 +4088,192 @@ class Catalog_seed():
                        "({:.2f} minutes)".format(len(galaxylist), total_time, total_time / 60)))
                 time_reported = True
 
-            # Get position angle in the correct units. Inputs for each
-            # source are degrees east of north. So we need to find the
-            # angle between north and V3, and then the angle between
-            # V3 and the y-axis on the detector. The former can be found
-            # using rotations.posang(attitude_matrix, v2, v3). The latter
-            # is just V3SciYAngle in the SIAF (I think???)
-            # v3SciYAng is measured in degrees, from V3 towards the Y axis,
-            # measured from V3 towards V2.
-            xposang = self.calc_x_position_angle(entry['V2'], entry['V3'], entry['pos_angle'])
+            # The galaxy image is convolved with the PSF image and added
+            # to the main image once a batch of galaxies has been collected
+            galaxy = self.create_galaxy_stamp(entry, core_stamp)
+            if galaxy is not None:
+                pending.append(galaxy)
+                if len(pending) >= batch_size:
+                    self.place_galaxy_stamps(self.convolve_galaxy_stamps(pending), galimage, segmentation)
+                    pending = []
+
+        self.place_galaxy_stamps(self.convolve_galaxy_stamps(pending), galimage, segmentation)
+
+        if self.sersic_stamp_cache is not None:
+            print(self.sersic_stamp_cache.summary())
+        if self.stamp_convolver is not None:
+            print(self.stamp_convolver.summary())
+        return galimage, segmentation.segmap
 
-            # First create the galaxy
-            stamp = self.create_galaxy(entry['radius'], entry['ellipticity'], entry['sersic_index'],
-                                       xposang*np.pi/180., entry['countrate_e/s'])
+    def create_galaxy_stamp(self, entry, core_stamp=None):
+        """Create the unconvolved stamp image and the PSF for a single
+        galaxy, along with the coordinates describing where the stamp
+        lands on the aperture
 
-            # If the stamp image is smaller than the PSF in either
-            # dimension, embed the stamp in an array that matches
-            # the psf size. This is so the upcoming convolution will
-            # produce an output that includes the wings of the PSF
+        Parameters
+        ----------
+        entry : astropy.table.Row
+            Row of the galaxy list returned by ``filterGalaxyList``
+
+        core_stamp : numpy.ndarray
+            Optional 2D array containing the previously evaluated PSF core
+            for the galaxy
+
+        Returns
+        -------
+        galaxy : tuple
+            (stamp, psf, coords, index), where ``coords`` contains the
+            (i1, i2, j1, j2, k1, k2, l1, l2) overlap coordinates from
+            ``create_psf_stamp_coords`` and ``index`` is the index number
+            of the galaxy. None if the galaxy does not land on the
+            aperture.
+        """
+        # Get position angle in the correct units. Inputs for each
+        # source are degrees east of north. So we need to find the
+        # angle between north and V3, and then the angle between
+        # V3 and the y-axis on the detector. The former can be found
+        # using rotations.posang(attitude_matrix, v2, v3). The latter
+        # is just V3SciYAngle in the SIAF (I think???)
+        # v3SciYAng is measured in degrees, from V3 towards the Y axis,
+        # measured from V3 towards V2.
+        xposang = self.calc_x_position_angle(entry['V2'], entry['V3'], entry['pos_angle'])
+
+        # First create the galaxy
+        stamp = self.create_galaxy(entry['radius'], entry['ellipticity'], entry['sersic_index'],
+                                   xposang*np.pi/180., entry['countrate_e/s'])
+
+        # If the stamp image is smaller than the PSF in either
+        # dimension, embed the stamp in an array that matches
+        # the psf size. This is so the upcoming convolution will
+        # produce an output that includes the wings of the PSF
+        galdims = stamp.shape
+
+        # Using the PSF "core" normalized to 1 will keep more light near
+        # the core of the galaxy, compared to the more rigorous
+        # approach that uses the full convolution including the wings.
+        # Whether this is a problem or not will depend on the relative
+        # sizes of the photometry aperture versus the extended source.
+        psf_dimensions = np.array(self.psf_library.data.shape[-2:])
+        psf_shape = np.array((psf_dimensions / self.psf_library_oversamp) -
+                             self.params['simSignals']['gridded_psf_library_row_padding']).astype(np.int)
+
+        if ((galdims[0] < psf_shape[0]) or (galdims[1] < psf_shape[1])):
+            stamp = self.enlarge_stamp(stamp, psf_shape)
             galdims = stamp.shape
 
-            # Using the PSF "core" normalized to 1 will keep more light near
-            # the core of the galaxy, compared to the more rigorous
-            # approach that uses the full convolution including the wings.
-            # Whether this is a problem or not will depend on the relative
-            # sizes of the photometry aperture versus the extended source.
-            psf_dimensions = np.array(self.psf_library.data.shape[-2:])
-            psf_shape = np.array((psf_dimensions / self.psf_library_oversamp) -
-                                 self.params['simSignals']['gridded_psf_library_row_padding']).astype(np.int)
+        # Get the PSF which will be convolved with the galaxy profile
+        psf_image, min_x, min_y, wings_added = self.create_psf_stamp(entry['pixelx'], entry['pixely'],
+                                                                     psf_shape[1], psf_shape[0], ignore_detector=True,
+                                                                     core_stamp=core_stamp)
+
+        # Skip sources that fall completely off the detector
+        if psf_image is None:
+            return None
+
+        # Normalize the signal in the PSF stamp so that the final galaxy
+        # signal will match the requested value
+        psf_image = psf_image / np.sum(psf_image)
+
+        # If the source subpixel location is beyond 0.5 (i.e. the edge
+        # of the pixel), then we shift the wing->core offset by 1.
+        # We also need to shift the location of the wing array on the
+        # detector by 1
+        if wings_added:
+            x_delta = int(np.modf(entry['pixelx'])[0] > 0.5)
+            y_delta = int(np.modf(entry['pixely'])[0] > 0.5)
+        else:
+            x_delta = 0
+            y_delta = 0
 
-            if ((galdims[0] < psf_shape[0]) or (galdims[1] < psf_shape[1])):
-                stamp = self.enlarge_stamp(stamp, psf_shape)
-                galdims = stamp.shape
+        # Calculate the coordinates describing the overlap between
+        # the PSF image and the galaxy image
+        xap, yap, xpts, ypts, (i1, i2), (j1, j2), (k1, k2), \
+            (l1, l2) = self.create_psf_stamp_coords(entry['pixelx']+x_delta, entry['pixely']+y_delta,
+                                                    galdims, galdims[1] // 2, galdims[0] // 2,
+                                                    coord_sys='aperture')
 
-            # Get the PSF which will be convolved with the galaxy profile
-            psf_image, min_x, min_y, wings_added = self.create_psf_stamp(entry['pixelx'], entry['pixely'],
-                                                                         psf_shape[1], psf_shape[0], ignore_detector=True)
+        # Make sure the stamp is at least partially on the detector
+        if i1 is None or i2 is None or j1 is None or j2 is None:
+            return None
+        return stamp, psf_image, (i1, i2, j1, j2, k1, k2, l1, l2), entry['index']
 
-            # Skip sources that fall completely off the detector
-            if psf_image is None:
-                continue
+    def convolve_stamps(self, stamps, psfs):
+        """Convolve a list of stamp images with their PSFs, using the
+        batched convolution engine if it is available
 
-            # Normalize the signal in the PSF stamp so that the final galaxy
-            # signal will match the requested value
-            psf_image = psf_image / np.sum(psf_image)
+        Parameters
+        ----------
+        stamps : list
+            List of 2D stamp images
 
-            # If the source subpixel location is beyond 0.5 (i.e. the edge
-            # of the pixel), then we shift the wing->core offset by 1.
-            # We also need to shift the location of the wing array on the
-            # detector by 1
-            if wings_added:
-                x_delta = int(np.modf(entry['pixelx'])[0] > 0.5)
-                y_delta = int(np.modf(entry['pixely'])[0] > 0.5)
-            else:
-                x_delta = 0
-                y_delta = 0
+        psfs : list
+            List of 2D PSF images, one for each stamp
 
-            # Calculate the coordinates describing the overlap between
-            # the PSF image and the galaxy image
-            xap, yap, xpts, ypts, (i1, i2), (j1, j2), (k1, k2), \
-                (l1, l2) = self.create_psf_stamp_coords(entry['pixelx']+x_delta, entry['pixely']+y_delta,
-                                                        galdims, galdims[1] // 2, galdims[0] // 2,
-                                                        coord_sys='aperture')
+        Returns
+        -------
+        convolved : list
+            List of 2D convolved stamp images, each with the same shape as
+            the corresponding input stamp
+        """
+        if self.stamp_convolver is None:
+            return [s1.fftconvolve(stamp, psf, mode='same') for stamp, psf in zip(stamps, psfs)]
+        return self.stamp_convolver.convolve(stamps, psfs)
 
-            # Make sure the stamp is at least partially on the detector
-            if i1 is not None and i2 is not None and j1 is not None and j2 is not None:
-                # Convolve the galaxy image with the PSF image
-                stamp = s1.fftconvolve(stamp, psf_image, mode='same')
-
-                # Now add the stamp to the main image
-                if ((j2 > j1) and (i2 > i1) and (l2 > l1) and (k2 > k1) and (j1 < yd) and (i1 < xd)):
-                    galimage[j1:j2, i1:i2] += stamp[l1:l2, k1:k2]
-                    # Divide readnoise by 100 sec, which is a 10 group RAPID ramp
-                    noiseval = self.single_ron / 100. + self.params['simSignals']['bkgdrate']
-                    if self.params['Inst']['mode'].lower() in ['wfss', 'ts_wfss']:
-                        noiseval += self.grism_background
-                    segmentation.add_object_noise(stamp[l1:l2, k1:k2], j1, i1, entry['index'], noiseval)
+    def convolve_galaxy_stamps(self, pending):
+        """Convolve a batch of galaxy stamps with their PSFs, and crop them
+        to the area that lands on the aperture
 
-                else:
-                    pass
-                    # print("Source located entirely outside the field of view. Skipping.")
-            else:
-                pass
+        Parameters
+        ----------
+        pending : list
+            List of (stamp, psf, coords, index) tuples, as returned by
+            ``create_galaxy_stamp``
 
-        return galimage, segmentation.segmap
+        Returns
+        -------
+        placements : list
+            List of (j1, i1, stamp, index) tuples, giving the cropped
+            convolved stamp of each galaxy that lands on the aperture,
+            along with the aperture coordinates of its lower left corner
+            and the index number of the galaxy
+        """
+        if len(pending) == 0:
+            return []
+        yd, xd = self.output_dims
+
+        placements = []
+        stamps, psfs, coords, indexes = zip(*pending)
+        for stamp, (i1, i2, j1, j2, k1, k2, l1, l2), index in zip(self.convolve_stamps(stamps, psfs),
+                                                                    coords, indexes):
+            if ((j2 > j1) and (i2 > i1) and (l2 > l1) and (k2 > k1) and (j1 < yd) and (i1 < xd)):
+                placements.append((j1, i1, stamp[l1:l2, k1:k2], index))
+        return placements
+
+    def place_galaxy_stamps(self, placements, galimage, segmentation):
+        """Add convolved galaxy stamps to the galaxy image and segmentation
+        map, in the order given
+
+        Parameters
+        ----------
+        placements : iterable
+            (j1, i1, stamp, index) tuples, as returned by
+            ``convolve_galaxy_stamps``
+
+        galimage : numpy.ndarray
+            2D galaxy countrate image, modified in place
+
+        segmentation : mirage.seed_image.segmentation_map.SegMap
+            Segmentation map, modified in place
+        """
+        # Divide readnoise by 100 sec, which is a 10 group RAPID ramp
+        noiseval = self.single_ron / 100. + self.params['simSignals']['bkgdrate']
+        if self.params['Inst']['mode'].lower() in ['wfss', 'ts_wfss']:
+            noiseval += self.grism_background
+
+        for j1, i1, stamp, index in placements:
+            stamp_y, stamp_x = stamp.shape
+            galimage[j1:j1 + stamp_y, i1:i1 + stamp_x] += stamp
+            segmentation.add_object_noise(stamp, j1, i1, index, noiseval)
 
     def calc_x_position_angle(self, v2_value, v3_value, position_angle):
         """Calcuate the position angle of the source relative to the x
@@ -3187,12 +4305,6 @@ class Catalog_seed():
     def getExtendedSourceList(self, filename):
         # read in the list of point sources to add, and adjust the
         # provided positions for astrometric distortion
-
-        extSourceList = Table(names=('index', 'pixelx', 'pixely', 'RA', 'Dec',
-                                     'RA_degrees', 'Dec_degrees', 'magnitude',
-                                     'countrate_e/s', 'counts_per_frame_e'),
-                              dtype=('i', 'f', 'f', 'S14', 'S14', 'f', 'f', 'f', 'f', 'f'))
-
         try:
             lines, pixelflag, magsys = self.read_point_source_file(filename)
             if pixelflag:
@@ -3204,22 +4316,6 @@ class Catalog_seed():
 
         # File to save adjusted point source locations
         eoutcat = self.params['Output']['file'][0:-5] + '_extendedsources.list'
-        eslist = open(eoutcat, 'w')
-
-        dtor = math.radians(1.)
-        nx = (self.subarray_bounds[2] - self.subarray_bounds[0]) + 1
-        ny = (self.subarray_bounds[3] - self.subarray_bounds[1]) + 1
-        xc = (self.subarray_bounds[2] + self.subarray_bounds[0]) / 2.
-        yc = (self.subarray_bounds[3] + self.subarray_bounds[1]) / 2.
-
-        # Write out the RA and Dec of the field center to the output file
-        # Also write out column headers to prepare for source list
-        eslist.write(("# Field center (degrees): %13.8f %14.8f y axis rotation angle "
-                      "(degrees): %f  image size: %4.4d %4.4d\n" %
-                      (self.ra, self.dec, self.params['Telescope']['rotation'], nx, ny)))
-        eslist.write('# \n')
-        eslist.write(("#    Index   RA_(hh:mm:ss)   DEC_(dd:mm:ss)   RA_degrees      "
-                      "DEC_degrees     pixel_x   pixel_y    magnitude   counts/sec    counts/frame\n"))
 
         # Add an index column if not present
         indexes = self.get_index_numbers(lines)
@@ -3234,118 +4330,111 @@ class Catalog_seed():
         # Determine the name of the column to use for source magnitudes
         mag_column = self.select_magnitude_column(lines, filename)
 
-        # Loop over input lines in the source list
-        all_stamps = []
-        for indexnum, values in zip(indexes, lines):
-            if not os.path.isfile(values['filename']):
-                raise FileNotFoundError('{} from extended source catalog does not exist.'.format(values['filename']))
-            try:
-                pixelx, pixely, ra, dec, ra_str, dec_str = self.get_positions(values['x_or_RA'],
-                                                                              values['y_or_Dec'],
-                                                                              pixelflag, 4096)
-                # Get the input magnitude
+        # Calculate the detector positions and RA, Dec values for the
+        # entire catalog in a single call
+        all_pixelx, all_pixely, all_ra, all_dec, all_ra_str, all_dec_str = self.get_positions_array(
+            lines['x_or_RA'], lines['y_or_Dec'], pixelflag, 4096)
+
+        # Get the input magnitudes. Sources with no magnitude are
+        # given a value of NaN
+        try:
+            magnitudes = np.array(lines[mag_column]).astype(np.float64)
+        except (ValueError, TypeError):
+            magnitudes = np.zeros(len(lines)) * np.nan
+            for i, value in enumerate(lines[mag_column]):
                 try:
-                    mag = float(values[mag_column])
-                except ValueError:
-                    mag = None
+                    magnitudes[i] = float(value)
+                except (ValueError, TypeError):
+                    pass
+        magnitudes = np.atleast_1d(magnitudes)
+
+        # Define the min and max source locations (in pixels) that fall onto the subarray
+        # Inlude the effects of a requested grism_direct image, and also keep sources that
+        # will only partially fall on the subarray
+        # pixel coords here can still be negative and kept if the grism image is being made
+
+        # First, coord limits for just the subarray
+        miny = 0
+        maxy = self.subarray_bounds[3] - self.subarray_bounds[1]
+        minx = 0
+        maxx = self.subarray_bounds[2] - self.subarray_bounds[0]
+
+        # Expand the limits if a grism direct image is being made
+        if (self.params['Output']['grism_source_image'] == True) or (self.params['Inst']['mode'] in ["pom", "wfss"]):
+            extrapixy = np.int((maxy + 1)/2 * (self.coord_adjust['y'] - 1.))
+            miny -= extrapixy
+            maxy += extrapixy
+            extrapixx = np.int((maxx + 1)/2 * (self.coord_adjust['x'] - 1.))
+            minx -= extrapixx
+            maxx += extrapixx
 
-                # Now find out how large the extended source image is, so we
-                # know if all, part, or none of it will fall in the field of view
-                ext_stamp = fits.getdata(values['filename'])
-                if len(ext_stamp.shape) != 2:
-                    ext_stamp = fits.getdata(values['filename'], 1)
+        # Now find out how large the extended source images are, so we
+        # know if all, part, or none of each will fall in the field of view
+        print('Extended source rotations turned off while evaluating rotate bug')
+        edgex = np.zeros(len(lines))
+        edgey = np.zeros(len(lines))
+        usable = np.ones(len(lines), dtype=bool)
+        for i, stamp_file in enumerate(lines['filename']):
+            if not os.path.isfile(stamp_file):
+                raise FileNotFoundError('{} from extended source catalog does not exist.'.format(stamp_file))
+
+            # Files used by several sources are read only once
+            ext_stamp, header = self.extended_stamp_store.get_image(stamp_file)
+
+            # Rotate the stamp image if requested
+            #ext_stamp = self.rotate_extended_image(ext_stamp, values['pos_angle'], ra, dec)
+
+            if len(ext_stamp.shape) != 2:
+                print(("WARNING, extended source image {} is not 2D! "
+                       "This is not supported. Skipping.".format(stamp_file)))
+                usable[i] = False
+                continue
+            edgey[i], edgex[i] = np.array(ext_stamp.shape) / 2
 
-                # print('Extended source location, x, y, ra, dec:', pixelx, pixely, ra, dec)
-                # print('extended source size:', ext_stamp.shape)
+        # Keep only sources within the appropriate bounds, expanded to include
+        # sources that fall only partially on the subarray
+        keep = (usable & (all_pixely > (miny - edgey)) & (all_pixely < (maxy + edgey)) &
+                (all_pixelx > (minx - edgex)) & (all_pixelx < (maxx + edgex)))
 
-                # Rotate the stamp image if requested
-                print('Extended source rotations turned off while evaluating rotate bug')
-                #ext_stamp = self.rotate_extended_image(ext_stamp, values['pos_angle'], ra, dec)
+        # Save the stamp images after normalizing to a total signal of 1.
+        # Sources using the same file share a single read-only stamp.
+        all_stamps = []
+        norm_factors = np.zeros(np.sum(keep))
+        for i, good_index in enumerate(np.where(keep)[0]):
+            normalized, norm_factors[i] = self.extended_stamp_store.get_normalized(lines['filename'][good_index])
+            all_stamps.append(normalized)
+        print(self.extended_stamp_store.summary())
+
+        # If a magnitude is given then adjust the countrate to match it
+        # Convert magnitudes to countrate (ADU/sec) and counts per frame
+        kept_magnitudes = magnitudes[keep]
+        has_magnitude = np.isfinite(kept_magnitudes)
+        countrates = np.zeros(len(kept_magnitudes))
+        if np.any(has_magnitude):
+            countrates[has_magnitude] = utils.magnitude_to_countrate(
+                self.params['Inst']['mode'], magsys, kept_magnitudes[has_magnitude], photfnu=self.photfnu,
+                photflam=self.photflam, vegamag_zeropoint=self.vegazeropoint)
+
+        # In this case, no magnitude is given in the extended input list
+        # Assume the input stamp image is in units of e/sec then.
+        for stamp_file in np.array(lines['filename'])[keep][~has_magnitude]:
+            print("No magnitude given for extended source in {}.".format(stamp_file))
+            print("Assuming the original file is in units of counts per sec.")
+            print("Multiplying original file values by 'extendedscale'.")
+        countrates[~has_magnitude] = norm_factors[~has_magnitude] * self.params['simSignals']['extendedscale']
+
+        # Collect the good sources, including location and counts, into the extSourceList
+        source_columns = {'index': np.asarray(indexes)[keep], 'pixelx': all_pixelx[keep],
+                          'pixely': all_pixely[keep], 'RA': all_ra_str[keep], 'Dec': all_dec_str[keep],
+                          'RA_degrees': all_ra[keep], 'Dec_degrees': all_dec[keep],
+                          'magnitude': kept_magnitudes, 'countrate_e/s': countrates,
+                          'counts_per_frame_e': countrates * self.frametime}
+        extSourceList = self.create_source_list_table(source_columns)
+
+        # Write out positions, distances, and counts to the output file
+        self.write_source_list_file(eoutcat, source_columns)
 
-                eshape = np.array(ext_stamp.shape)
-                if len(eshape) == 2:
-                    edgey, edgex = eshape / 2
-                else:
-                    raise ValueError(("WARNING, extended source image {} is not 2D! "
-                                      "This is not supported.".format(values['filename'])))
-
-                # Define the min and max source locations (in pixels) that fall onto the subarray
-                # Inlude the effects of a requested grism_direct image, and also keep sources that
-                # will only partially fall on the subarray
-                # pixel coords here can still be negative and kept if the grism image is being made
-
-                # First, coord limits for just the subarray
-                miny = 0
-                maxy = self.subarray_bounds[3] - self.subarray_bounds[1]
-                minx = 0
-                maxx = self.subarray_bounds[2] - self.subarray_bounds[0]
-
-                # Expand the limits if a grism direct image is being made
-                if (self.params['Output']['grism_source_image'] == True) or (self.params['Inst']['mode'] in ["pom", "wfss"]):
-                    extrapixy = np.int((maxy + 1)/2 * (self.coord_adjust['y'] - 1.))
-                    miny -= extrapixy
-                    maxy += extrapixy
-                    extrapixx = np.int((maxx + 1)/2 * (self.coord_adjust['x'] - 1.))
-                    minx -= extrapixx
-                    maxx += extrapixx
-
-                # Now, expand the dimensions again to include point sources that fall only partially on the
-                # subarray
-                miny -= edgey
-                maxy += edgey
-                minx -= edgex
-                maxx += edgex
-
-                # Keep only sources within the appropriate bounds
-                if pixely > miny and pixely < maxy and pixelx > minx and pixelx < maxx:
-
-                    # Set up an entry for the output table
-                    entry = [indexnum, pixelx, pixely, ra_str, dec_str, ra, dec, mag]
-
-                    # save the stamp image after normalizing to a total signal of 1.
-                    norm_factor = np.sum(ext_stamp)
-                    ext_stamp /= norm_factor
-                    all_stamps.append(ext_stamp)
-
-                    # If a magnitude is given then adjust the countrate to match it
-                    if mag is not None:
-                        # Convert magnitudes to countrate (ADU/sec) and counts per frame
-                        countrate = utils.magnitude_to_countrate(self.params['Inst']['mode'], magsys, mag,
-                                                         photfnu=self.photfnu, photflam=self.photflam,
-                                                         vegamag_zeropoint=self.vegazeropoint)
-                        framecounts = countrate * self.frametime
-                        magwrite = mag
-
-                    else:
-                        # In this case, no magnitude is given in the extended input list
-                        # Assume the input stamp image is in units of e/sec then.
-                        print("No magnitude given for extended source in {}.".format(values['filename']))
-                        print("Assuming the original file is in units of counts per sec.")
-                        print("Multiplying original file values by 'extendedscale'.")
-                        countrate = norm_factor * self.params['simSignals']['extendedscale']
-                        framecounts = countrate * self.frametime
-                        magwrite = 99.99999
-
-                    # add the countrate and the counts per frame to pointSourceList
-                    # since they will be used in future calculations
-                    # entry.append(scale)
-                    entry.append(countrate)
-                    entry.append(framecounts)
-
-                    # add the good point source, including location and counts, to the pointSourceList
-                    # self.pointSourceList.append(entry)
-                    extSourceList.add_row(entry)
-
-                    # Write out positions, distances, and counts to the output file
-                    eslist.write(("%i %s %s %14.8f %14.8f %9.3f %9.3f  %9.3f  %13.6e   %13.6e\n" %
-                                 (indexnum, ra_str, dec_str, ra, dec, pixelx, pixely, magwrite, countrate,
-                                  framecounts)))
-            except:
-                # print("ERROR: bad point source line %s. Skipping." % (line))
-                pass
         print("Number of extended sources found within or close to the requested aperture: {}".format(len(extSourceList)))
-        # close the output file
-        eslist.close()
 
         # If no good point sources were found in the requested array, alert the user
         if len(extSourceList) < 1:
@@ -3402,11 +4491,24 @@ class Catalog_seed():
         segmentation.ydim = yd
         segmentation.initialize_map()
 
+        # Evaluate the PSF library for the sources in batches, if the
+        # stamps are to be convolved with the PSF
+        if self.params['simSignals']['PSFConvolveExtended']:
+            core_stamps = self.psf_core_stamps(extSources['pixelx'], extSources['pixely'])
+        else:
+            core_stamps = itertools.repeat(None)
+
+        # Sources waiting to be convolved with their PSFs
+        pending = []
+        batch_size = self.stamp_convolver.batch_size if self.stamp_convolver is not None else 1
+
         # Loop over the entries in the source list
-        for entry, stamp in zip(extSources, extStamps):
+        for entry, stamp, core_stamp in zip(extSources, extStamps, core_stamps):
             stamp_dims = stamp.shape
 
-            stamp *= entry['countrate_e/s']
+            # Stamps may be shared by several sources, so they are not
+            # scaled in place
+            stamp = stamp * entry['countrate_e/s']
 
             # If the stamp needs to be convolved with the NIRCam PSF,
             # create the correct PSF  here and read it in
@@ -3429,7 +4531,8 @@ class Catalog_seed():
                 # Whether this is a problem or not will depend on the relative
                 # sizes of the photometry aperture versus the extended source.
                 psf_image, min_x, min_y, wings_added = self.create_psf_stamp(entry['pixelx'], entry['pixely'],
-                                                                             psf_shape[1], psf_shape[0], ignore_detector=True)
+                                                                             psf_shape[1], psf_shape[0], ignore_detector=True,
+                                                                             core_stamp=core_stamp)
 
                 # Skip sources that fall completely off the detector
                 if psf_image is None:
@@ -3459,10 +4562,9 @@ class Catalog_seed():
 
                 if None in [i1, i2, j1, j2, k1, k2, l1, l2]:
                     continue
-
-                # Convolve the extended image with the stamp image
-                stamp = s1.fftconvolve(stamp, psf_image, mode='same')
             else:
+                psf_image = None
+
                 # If no PSF convolution is to be done, find the
                 # coordinates describing the overlap between the
                 # original stamp image and the aperture
@@ -3471,24 +4573,71 @@ class Catalog_seed():
                                                             stamp_dims, stamp_dims[1] // 2, stamp_dims[0] // 2,
                                                             coord_sys='aperture')
 
-            # Make sure the stamp is at least partially on the detector
+            # Make sure the stamp is at least partially on the detector.
+            # The stamp is convolved with the PSF image, if requested, and
+            # added to the main image once a batch of sources has been
+            # collected
             if i1 is not None and i2 is not None and j1 is not None and j2 is not None:
+                pending.append((stamp, psf_image, (i1, i2, j1, j2, k1, k2, l1, l2), entry['index'],
+                                entry['countrate_e/s']))
+                if len(pending) >= batch_size:
+                    self.add_extended_stamps(pending, extimage, segmentation)
+                    pending = []
 
-                # Now add the stamp to the main image
-                if ((j2 > j1) and (i2 > i1) and (l2 > l1) and (k2 > k1) and (j1 < yd) and (i1 < xd)):
-                    extimage[j1:j2, i1:i2] += stamp[l1:l2, k1:k2]
+        self.add_extended_stamps(pending, extimage, segmentation)
 
-                # Divide readnoise by 100 sec, which is a 10 group RAPID ramp?
-                noiseval = self.single_ron / 100. + self.params['simSignals']['bkgdrate']
-                if self.params['Inst']['mode'].lower() in ['wfss', 'ts_wfss']:
-                    noiseval += self.grism_background
-
-                # Make segmentation map
-                indseg = self.seg_from_photutils(stamp[l1:l2, k1:k2] * entry['countrate_e/s'],
-                                                 entry['index'], noiseval)
-                segmentation.segmap[j1:j2, i1:i2] += indseg
+        if self.stamp_convolver is not None and self.params['simSignals']['PSFConvolveExtended']:
+            print(self.stamp_convolver.summary())
         return extimage, segmentation.segmap
 
+    def add_extended_stamps(self, pending, extimage, segmentation):
+        """Convolve a batch of extended source stamps with their PSFs, if
+        requested, and add them to the extended source image and
+        segmentation map in order
+
+        Parameters
+        ----------
+        pending : list
+            List of (stamp, psf, coords, index, countrate) tuples, where
+            ``psf`` is None if the stamp is not to be convolved, ``coords``
+            contains the (i1, i2, j1, j2, k1, k2, l1, l2) overlap
+            coordinates from ``create_psf_stamp_coords``, ``index`` is the
+            index number of the source, and ``countrate`` is its countrate
+            in e-/sec
+
+        extimage : numpy.ndarray
+            2D extended source countrate image, modified in place
+
+        segmentation : mirage.seed_image.segmentation_map.SegMap
+            Segmentation map, modified in place
+        """
+        if len(pending) == 0:
+            return
+        yd, xd = self.output_dims
+
+        # Divide readnoise by 100 sec, which is a 10 group RAPID ramp?
+        noiseval = self.single_ron / 100. + self.params['simSignals']['bkgdrate']
+        if self.params['Inst']['mode'].lower() in ['wfss', 'ts_wfss']:
+            noiseval += self.grism_background
+
+        stamps = [item[0] for item in pending]
+        to_convolve = [i for i, item in enumerate(pending) if item[1] is not None]
+        if len(to_convolve) > 0:
+            convolved = self.convolve_stamps([pending[i][0] for i in to_convolve],
+                                             [pending[i][1] for i in to_convolve])
+            for i, stamp in zip(to_convolve, convolved):
+                stamps[i] = stamp
+
+        for stamp, (original_stamp, psf, coords, index, countrate) in zip(stamps, pending):
+            i1, i2, j1, j2, k1, k2, l1, l2 = coords
+
+            # Now add the stamp to the main image
+            if ((j2 > j1) and (i2 > i1) and (l2 > l1) and (k2 > k1) and (j1 < yd) and (i1 < xd)):
+                extimage[j1:j2, i1:i2] += stamp[l1:l2, k1:k2]
+
+            # Make segmentation map
+            segmentation.add_object_threshold(stamp[l1:l2, k1:k2] * countrate, j1, i1, index, noiseval * 3.)
+
     def enlarge_stamp(self, image, dims):
         """Place the given image within an enlarged array of zeros. If the
         requested dimension lengths are odd while ``image``'s dimension
@@ -3528,14 +4677,6 @@ class Catalog_seed():
         array[dy:dim_y-dy, dx:dim_x-dx] = image
         return array
 
-    def seg_from_photutils(self, image, number, noise):
-        # Create a segmentation map for the input image
-        # using photutils. In this case, the input noise
-        # represents the single frame noise for the appropriate
-        # observing mode
-        map = detect_sources(image, noise * 3., 8).data + number
-        return map
-
     def makeFilterTable(self):
         # Create the table that contains the possible filter list, quantum yields, and countrates for a
         # star with vega magnitude of 15 in each filter. Do this by reading in phot_file
@@ -3659,6 +4800,21 @@ class Catalog_seed():
         self.runStep['ipc'] = self.checkRunStep(self.params['Reffiles']['ipc'])
         self.runStep['crosstalk'] = self.checkRunStep(self.params['Reffiles']['crosstalk'])
         self.runStep['occult'] = self.checkRunStep(self.params['Reffiles']['occult'])
+        # Optional PSF stamp cache settings. Set defaults for parameter
+        # files created before these entries existed
+        self.params['simSignals'].setdefault('psf_stamp_cache', False)
+        self.params['simSignals'].setdefault('psf_stamp_cache_subpixel_step', 0.1)
+        self.params['simSignals'].setdefault('psf_stamp_cache_max_mb', 512.)
+        self.params['simSignals'].setdefault('sersic_stamp_cache', False)
+        self.params['simSignals'].setdefault('sersic_stamp_cache_tolerance', 0.02)
+        self.params['simSignals'].setdefault('sersic_stamp_cache_max_mb', 512.)
+        self.params['simSignals'].setdefault('convolution_batch_size', 16)
+        self.params['simSignals'].setdefault('fft_workers', 1)
+        self.params['simSignals'].setdefault('psf_batch_size', 1000)
+        self.params['simSignals'].setdefault('nproc', 1)
+        self.params['simSignals'].setdefault('catalog_spatial_index', False)
+        self.params['simSignals'].setdefault('catalog_chunk_size', 0)
+
         self.runStep['pointsource'] = self.checkRunStep(self.params['simSignals']['pointsource'])
         self.runStep['galaxies'] = self.checkRunStep(self.params['simSignals']['galaxyListFile'])
         self.runStep['extendedsource'] = self.checkRunStep(self.params['simSignals']['extended'])
@@ -4083,7 +5239,11 @@ class Catalog_seed():
     def saveSingleFits(self, image, name, key_dict=None, image2=None, image2type=None):
         # Save an array into the first extension of a fits file
         h0 = fits.PrimaryHDU()
-        h1 = fits.ImageHDU(image, name='DATA')
+        if isinstance(image, LazyRamp):
+            # Lazy exposures are written one frame at a time, below
+            h1 = fits.ImageHDU(name='DATA')
+        else:
+            h1 = fits.ImageHDU(image, name='DATA')
         if image2 is not None:
             h2 = fits.ImageHDU(image2)
             if image2type is not None:
@@ -4096,6 +5256,13 @@ class Catalog_seed():
                 h0.header[key] = key_dict[key]
                 h1.header[key] = key_dict[key]
 
+        if isinstance(image, LazyRamp):
+            fits.HDUList([h0]).writeto(name, overwrite=True)
+            image.write(name, header=key_dict)
+            if image2 is not None:
+                fits.append(name, h2.data, header=h2.header)
+            return
+
         if image2 is None:
             hdulist = fits.HDUList([h0, h1])
         else:
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+
+"""This module contains a store of the stamp images used for extended
+sources. Extended source catalogs often point many rows at the same few
+template files. The store opens each file only once, memory-maps its data
+rather than reading it into memory, and returns read-only views of the
+data, so that sources sharing a template share a single array.
+
+Normalized (total signal of 1) and rotated versions of each stamp are
+created once for each (file, angle) combination, and also returned as
+read-only arrays. Callers that need to modify a stamp must make a copy.
+
+To avoid running out of file descriptors when a catalog uses many
+different template files, at most a given number of files are kept open.
+When this is exceeded, the least recently used file is closed, and is
+opened again if it is needed later.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.seed_image.extended_stamp_store import ExtendedStampStore
+        store = ExtendedStampStore()
+        image, header = store.get_image('galaxy_template.fits')
+        normalized, total_signal = store.get_normalized('galaxy_template.fits', angle=30.)
+        print(store.summary())
+"""
+
+from collections import OrderedDict
+import os
+
+from astropy.io import fits
+import numpy as np
+from scipy.ndimage import rotate
+
+# Maximum number of template files kept open at once
+MAX_OPEN_FILES = 64
+
+
+class ExtendedStampStore():
+    def __init__(self, max_open_files=MAX_OPEN_FILES):
+        """Instantiate the extended source stamp store
+
+        Parameters
+        ----------
+        max_open_files : int
+            Maximum number of files kept open. When this is exceeded, the
+            least recently used file is closed.
+        """
+        # Open files, and the (data, header) of each, keyed by the
+        # absolute path of the file, in order of use
+        self.max_open_files = max(int(max_open_files), 1)
+        self.hdulists = OrderedDict()
+        self.images = OrderedDict()
+        self.files_opened = 0
+
+        # Normalized stamps and their total signal before normalization,
+        # keyed by (absolute path, angle)
+        self.normalized = {}
+
+        self.hits = 0
+
+    def get_image(self, filename):
+        """Return the stamp image in a fits file. The data are taken from
+        the primary extension, or from extension 1 if the primary
+        extension does not contain a 2D image.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the fits file
+
+        Returns
+        -------
+        data : numpy.ndarray
+            Read-only array containing the image. This may be a
+            memory-mapped view of the file.
+
+        header : astropy.io.fits.Header
+            Header of the extension containing the image
+        """
+        path = os.path.abspath(filename)
+        if path in self.images:
+            self.hits += 1
+            self.images.move_to_end(path)
+            self.hdulists.move_to_end(path)
+            return self.images[path]
+
+        # Close the least recently used file if too many are open
+        while len(self.hdulists) >= self.max_open_files:
+            old_path, old_hdulist = self.hdulists.popitem(last=False)
+            del self.images[old_path]
+            old_hdulist.close()
+
+        hdulist = fits.open(path, memmap=True)
+        data = hdulist[0].data
+        header = hdulist[0].header
+        if data is None or len(data.shape) != 2:
+            if len(hdulist) > 1:
+                data = hdulist[1].data
+                header = hdulist[1].header
+
+        # Data with scaling keywords cannot be memory-mapped and have
+        # already been read in. Keep the file open otherwise, so that the
+        # memory map remains valid.
+        if data is not None:
+            data = data.view()
+            data.setflags(write=False)
+        self.hdulists[path] = hdulist
+        self.images[path] = (data, header)
+        self.files_opened += 1
+        return data, header
+
+    def get_normalized(self, filename, angle=None):
+        """Return the stamp image in a fits file, normalized to a total
+        signal of 1 and optionally rotated
+
+        Parameters
+        ----------
+        filename : str
+            Name of the fits file
+
+        angle : float
+            Angle in degrees by which to rotate the image, using
+            ``scipy.ndimage.rotate``. If None, the image is not rotated.
+
+        Returns
+        -------
+        normalized : numpy.ndarray
+            Read-only array containing the normalized image
+
+        total_signal : float
+            Total signal in the (rotated) image before normalization
+        """
+        key = (os.path.abspath(filename), angle)
+        if key in self.normalized:
+            self.hits += 1
+            return self.normalized[key]
+
+        if key[0] in self.images:
+            data = self.images[key[0]][0]
+        else:
+            data, header = self.get_image(filename)
+        if angle is not None:
+            data = rotate(data, angle, mode='nearest')
+        total_signal = np.sum(data)
+        normalized = data / total_signal
+        normalized.setflags(write=False)
+        self.normalized[key] = (normalized, total_signal)
+        return normalized, total_signal
+
+    def close(self):
+        """Close all open files and empty the store"""
+        for hdulist in self.hdulists.values():
+            hdulist.close()
+        self.hdulists = OrderedDict()
+        self.images = OrderedDict()
+        self.normalized = {}
+
+    def summary(self):
+        """Create a summary of the store usage
+
+        Returns
+        -------
+        summary : str
+            Description of the number of files read and of the number of
+            times stored stamps were re-used
+        """
+        return ("Extended source stamp store: {} files opened, {} normalized stamps created, "
+                "{} stamps re-used.".format(self.files_opened, len(self.normalized), self.hits))
@@ -0,0 +1,240 @@
+#! /usr/bin/env python
+
+"""This module contains an engine for convolving many small stamp images
+(e.g. galaxies or extended sources) with their PSFs. Rather than calling
+``scipy.signal.fftconvolve`` once per stamp, stamps are grouped by the
+size of their zero-padded FFTs, and each group is transformed with a
+single stacked ``scipy.fft.rfft2`` call, optionally using several threads.
+
+The transforms of the PSFs are cached. PSF stamps for sources in the same
+PSF library grid cell and at the same sub-pixel location (e.g. those
+returned by the PSF stamp cache) are identical, so their transform is
+computed only once. Kernels are matched by their contents, so sharing a
+transform never changes the result.
+
+The output for each stamp matches that of
+``scipy.signal.fftconvolve(stamp, kernel, mode='same')`` to within
+floating point rounding.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.seed_image.fft_convolution import StampConvolver
+        convolver = StampConvolver(batch_size=16, workers=4)
+        convolved = convolver.convolve([stamp1, stamp2], [psf1, psf2])
+        print(convolver.summary())
+"""
+
+from collections import OrderedDict
+import hashlib
+
+import numpy as np
+from scipy import fft
+
+
+class StampConvolver():
+    def __init__(self, batch_size=16, workers=1, max_memory_mb=64.):
+        """Instantiate the convolution engine
+
+        Parameters
+        ----------
+        batch_size : int
+            Maximum number of stamps transformed in a single stacked FFT
+
+        workers : int
+            Number of threads used by ``scipy.fft``. -1 uses all available
+            CPUs.
+
+        max_memory_mb : float
+            Maximum amount of memory, in MB, used to store PSF transforms.
+            When this is exceeded, the least recently used transforms are
+            removed from the cache.
+        """
+        if batch_size < 1:
+            raise ValueError(("Convolution batch size must be at least 1. "
+                              "Value given was {}.".format(batch_size)))
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_bytes = max_memory_mb * 1024. * 1024.
+        self.kernel_transforms = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.batches = 0
+
+    def fft_shape(self, stamp_shape, kernel_shape):
+        """Find the shape of the zero-padded FFT needed to convolve a stamp
+        with a kernel without wrapping around
+
+        Parameters
+        ----------
+        stamp_shape : tuple
+            (y, x) shape of the stamp
+
+        kernel_shape : tuple
+            (y, x) shape of the kernel
+
+        Returns
+        -------
+        shape : tuple
+            (y, x) shape of the FFT
+        """
+        return tuple(fft.next_fast_len(stamp_dim + kernel_dim - 1, real=True)
+                     for stamp_dim, kernel_dim in zip(stamp_shape, kernel_shape))
+
+    def kernel_key(self, kernel, shape):
+        """Create the key identifying the transform of a kernel
+
+        Parameters
+        ----------
+        kernel : numpy.ndarray
+            2D kernel
+
+        shape : tuple
+            (y, x) shape of the FFT
+
+        Returns
+        -------
+        key : tuple
+            FFT shape, kernel shape and SHA-1 hash of the kernel values
+        """
+        kernel = np.ascontiguousarray(kernel, dtype=np.float64)
+        return (shape, kernel.shape, hashlib.sha1(kernel.view(np.uint8)).hexdigest())
+
+    def kernel_transforms_for(self, kernels, shape):
+        """Return the transforms of a list of kernels, computing those that
+        are not in the cache in a single stacked FFT
+
+        Parameters
+        ----------
+        kernels : list
+            List of 2D kernels
+
+        shape : tuple
+            (y, x) shape of the FFT
+
+        Returns
+        -------
+        transforms : list
+            List of 2D arrays containing the transform of each kernel
+        """
+        keys = [self.kernel_key(kernel, shape) for kernel in kernels]
+        new_keys = OrderedDict()
+        for key, kernel in zip(keys, kernels):
+            if key in self.kernel_transforms:
+                self.hits += 1
+                self.kernel_transforms.move_to_end(key)
+            elif key not in new_keys:
+                self.misses += 1
+                new_keys[key] = kernel
+            else:
+                self.hits += 1
+
+        transforms = {}
+        if len(new_keys) > 0:
+            stack = np.zeros((len(new_keys), shape[0], shape[1]))
+            for i, kernel in enumerate(new_keys.values()):
+                stack[i, 0:kernel.shape[0], 0:kernel.shape[1]] = kernel
+            new_transforms = fft.rfft2(stack, workers=self.workers)
+            for key, transform in zip(new_keys, new_transforms):
+                # Copy, so that cached transforms do not keep the whole
+                # stack in memory
+                transform = transform.copy()
+                transforms[key] = transform
+                self.add_to_cache(key, transform)
+
+        return [transforms[key] if key in transforms else self.kernel_transforms[key] for key in keys]
+
+    def add_to_cache(self, key, transform):
+        """Add a kernel transform to the cache, removing the least recently
+        used transforms if the cache is too large
+
+        Parameters
+        ----------
+        key : tuple
+            Key identifying the transform
+
+        transform : numpy.ndarray
+            2D transform of the kernel
+        """
+        if transform.nbytes > self.max_bytes:
+            return
+        self.kernel_transforms[key] = transform
+        self.nbytes += transform.nbytes
+        while self.nbytes > self.max_bytes:
+            removed_key, removed_transform = self.kernel_transforms.popitem(last=False)
+            self.nbytes -= removed_transform.nbytes
+            self.evictions += 1
+
+    def convolve(self, stamps, kernels):
+        """Convolve each stamp with its kernel. The output for each stamp
+        has the same shape as the stamp, and is centered in the same way
+        as ``scipy.signal.fftconvolve(stamp, kernel, mode='same')``.
+
+        Parameters
+        ----------
+        stamps : list
+            List of 2D stamp images
+
+        kernels : list
+            List of 2D kernels, one for each stamp
+
+        Returns
+        -------
+        convolved : list
+            List of 2D convolved stamp images, in the same order as
+            ``stamps``
+        """
+        if len(stamps) != len(kernels):
+            raise ValueError("The number of stamps ({}) and kernels ({}) must match.".format(len(stamps),
+                                                                                        len(kernels)))
+        # Group the stamps by the shape of their padded FFT
+        groups = OrderedDict()
+        for i, (stamp, kernel) in enumerate(zip(stamps, kernels)):
+            groups.setdefault(self.fft_shape(stamp.shape, kernel.shape), []).append(i)
+
+        convolved = [None] * len(stamps)
+        for shape, indexes in groups.items():
+            for start in range(0, len(indexes), self.batch_size):
+                batch = indexes[start:start + self.batch_size]
+                self.batches += 1
+
+                stack = np.zeros((len(batch), shape[0], shape[1]))
+                for i, index in enumerate(batch):
+                    stamp = stamps[index]
+                    stack[i, 0:stamp.shape[0], 0:stamp.shape[1]] = stamp
+
+                product = fft.rfft2(stack, workers=self.workers)
+                transforms = self.kernel_transforms_for([kernels[index] for index in batch], shape)
+                for i, transform in enumerate(transforms):
+                    product[i] *= transform
+                full = fft.irfft2(product, s=shape, workers=self.workers)
+
+                # Extract the region matching the 'same' mode of fftconvolve
+                for i, index in enumerate(batch):
+                    stamp_y, stamp_x = stamps[index].shape
+                    kernel_y, kernel_x = kernels[index].shape
+                    y_start = (kernel_y - 1) // 2
+                    x_start = (kernel_x - 1) // 2
+                    convolved[index] = full[i, y_start:y_start + stamp_y, x_start:x_start + stamp_x].copy()
+        return convolved
+
+    def summary(self):
+        """Create a summary of the PSF transform cache usage
+
+        Returns
+        -------
+        summary : str
+            Description of the number of batches, cache hits, misses and
+            evictions
+        """
+        total = self.hits + self.misses
+        hit_rate = 100. * self.hits / total if total > 0 else 0.
+        return ("Stamp convolution: {} batches. PSF transform cache: {} hits, {} misses "
+                "({:.1f}% hit rate), {} evictions.".format(self.batches, self.hits, self.misses,
+                                                           hit_rate, self.evictions))
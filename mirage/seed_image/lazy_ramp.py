@@ -0,0 +1,297 @@
+#! /usr/bin/env python
+
+"""This module contains a lazy representation of a seed exposure. When
+tracking a non-sidereal target, the tracked target is stationary on the
+detector, so its signal in each frame is simply its signal rate multiplied
+by the time of the frame. Sources moving across the field of view only
+cover a small area of each frame. Rather than filling a full
+(integrations, frames, y, x) array, the exposure is kept as a signal rate
+image plus a list of sub-cubes covering the trails of the moving sources,
+and individual frames are created only when they are requested.
+
+In-place multiplication and division by a scalar or a 2D image (e.g. a
+pixel area map or a gain map) are applied to the signal rate and to each
+sub-cube. Adding two lazy exposures combines their signal rates and
+sub-cubes. Full arrays (e.g. a trailed source ramp) can also be added,
+and are kept as they are.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.seed_image.lazy_ramp import LazyRamp
+        ramp = LazyRamp(rate_image, frame_times, nint=2)
+        ramp.add_subarray(0, 100, 250, trail_cube)
+        ramp *= pixel_area_map
+        frame = ramp.frame(0, 5)
+        integration = ramp[1]
+        frame = integration[5]
+"""
+
+import numpy as np
+from astropy.io import fits
+
+
+class LazyRamp():
+    # Make numpy defer to the methods below, rather than converting the
+    # exposure to a full array, in expressions such as array + LazyRamp
+    __array_ufunc__ = None
+
+    def __init__(self, rate, frame_times, nint=1):
+        """Instantiate the lazy exposure
+
+        Parameters
+        ----------
+        rate : numpy.ndarray
+            2D signal rate image of the sources that are stationary on the
+            detector
+
+        frame_times : numpy.ndarray
+            Time, in seconds, at which each frame of an integration is
+            read out
+
+        nint : int
+            Number of integrations. All integrations have the same
+            stationary signal.
+        """
+        self.rate = np.array(rate, dtype=np.float64)
+        self.frame_times = np.asarray(frame_times, dtype=np.float64)
+        self.nint = nint
+
+        # (integration, y_start, x_start, 3D sub-cube) tuples holding the
+        # signal of moving sources in each frame
+        self.subarrays = []
+
+        # Full 4D arrays added to the exposure
+        self.dense = []
+
+    @property
+    def shape(self):
+        return (self.nint, len(self.frame_times)) + self.rate.shape
+
+    @property
+    def ndim(self):
+        return 4
+
+    @property
+    def dtype(self):
+        return self.rate.dtype
+
+    def add_subarray(self, integration, y_start, x_start, cube):
+        """Add the signal of a moving source to one integration
+
+        Parameters
+        ----------
+        integration : int
+            Integration number
+
+        y_start : int
+            y-coordinate of the lower left corner of ``cube`` in the frames
+
+        x_start : int
+            x-coordinate of the lower left corner of ``cube`` in the frames
+
+        cube : numpy.ndarray
+            3D array containing the signal of the source in each frame of
+            the integration
+        """
+        if cube.shape[0] != len(self.frame_times):
+            raise ValueError(("Sub-cube has {} frames, but integrations contain {} frames."
+                              .format(cube.shape[0], len(self.frame_times))))
+        self.subarrays.append((integration, y_start, x_start, cube))
+
+    def frame(self, integration, index):
+        """Create a single frame of the exposure
+
+        Parameters
+        ----------
+        integration : int
+            Integration number
+
+        index : int
+            Frame number within the integration
+
+        Returns
+        -------
+        frame : numpy.ndarray
+            2D array containing the signal in the frame
+        """
+        frame = self.rate * self.frame_times[index]
+        for integ, y_start, x_start, cube in self.subarrays:
+            if integ == integration:
+                frame[y_start:y_start + cube.shape[1], x_start:x_start + cube.shape[2]] += cube[index]
+        for dense in self.dense:
+            frame += dense[integration, index]
+        return frame
+
+    def integration(self, integration):
+        """Create all frames of one integration
+
+        Parameters
+        ----------
+        integration : int
+            Integration number
+
+        Returns
+        -------
+        frames : numpy.ndarray
+            3D array containing the signal in each frame
+        """
+        frames = np.zeros(self.shape[1:])
+        for index in range(len(self.frame_times)):
+            frames[index] = self.frame(integration, index)
+        return frames
+
+    def __getitem__(self, key):
+        # Integrations are returned lazily. Other indexing creates the
+        # full exposure.
+        if isinstance(key, tuple) and len(key) > 0:
+            if all(isinstance(item, slice) and item == slice(None) for item in key[1:]):
+                key = key[0]
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += self.nint
+            if key < 0 or key >= self.nint:
+                raise IndexError("Integration {} is out of range.".format(key))
+            return LazyIntegration(self, key)
+        return np.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        exposure = np.zeros(self.shape)
+        for integ in range(self.nint):
+            exposure[integ] = self.integration(integ)
+        if dtype is not None:
+            exposure = exposure.astype(dtype)
+        return exposure
+
+    def scale(self, factor, operation):
+        """Multiply or divide the exposure in place by a scalar or by a 2D
+        image with the dimensions of the frames
+
+        Parameters
+        ----------
+        factor : float or numpy.ndarray
+            Scalar or 2D image
+
+        operation : func
+            ``numpy.multiply`` or ``numpy.true_divide``
+        """
+        factor = np.asarray(factor)
+        operation(self.rate, factor, out=self.rate)
+        for i, (integ, y_start, x_start, cube) in enumerate(self.subarrays):
+            if factor.ndim == 2:
+                cube_factor = factor[y_start:y_start + cube.shape[1], x_start:x_start + cube.shape[2]]
+            else:
+                cube_factor = factor
+            self.subarrays[i] = (integ, y_start, x_start, operation(cube, cube_factor))
+        self.dense = [operation(dense, factor) for dense in self.dense]
+
+    def __imul__(self, factor):
+        self.scale(factor, np.multiply)
+        return self
+
+    def __itruediv__(self, factor):
+        self.scale(factor, np.true_divide)
+        return self
+
+    def __iadd__(self, other):
+        if isinstance(other, LazyRamp):
+            if other.shape != self.shape or not np.array_equal(other.frame_times, self.frame_times):
+                raise ValueError("Lazy exposures must have the same shape and frame times to be added.")
+            self.rate += other.rate
+            self.subarrays.extend(other.subarrays)
+            self.dense.extend(other.dense)
+        else:
+            other = np.asarray(other, dtype=np.float64)
+            if other.shape != self.shape:
+                raise ValueError(("Array with shape {} cannot be added to an exposure with shape {}."
+                                  .format(other.shape, self.shape)))
+            self.dense.append(other)
+        return self
+
+    def __add__(self, other):
+        combined = LazyRamp(self.rate, self.frame_times, self.nint)
+        combined.subarrays = list(self.subarrays)
+        combined.dense = list(self.dense)
+        combined += other
+        return combined
+
+    __radd__ = __add__
+
+    def write(self, filename, header=None, name='DATA'):
+        """Append the exposure to a fits file as an image extension,
+        writing one frame at a time
+
+        Parameters
+        ----------
+        filename : str
+            Name of an existing fits file
+
+        header : astropy.io.fits.Header
+            Optional header keywords to add to the extension header
+
+        name : str
+            Name of the extension
+        """
+        hdu_header = fits.ImageHDU(data=np.zeros((1, 1, 1, 1)), name=name).header
+        for axis, length in enumerate(self.shape[::-1]):
+            hdu_header['NAXIS{}'.format(axis + 1)] = length
+        if header is not None:
+            for key in header:
+                hdu_header[key] = header[key]
+
+        stream = fits.StreamingHDU(filename, hdu_header)
+        for integ in range(self.nint):
+            for index in range(len(self.frame_times)):
+                stream.write(self.frame(integ, index))
+        stream.close()
+
+
+class LazyIntegration():
+    def __init__(self, ramp, integration):
+        """A single integration of a lazy exposure, whose frames are
+        created when they are requested
+
+        Parameters
+        ----------
+        ramp : mirage.seed_image.lazy_ramp.LazyRamp
+            Lazy exposure
+
+        integration : int
+            Integration number
+        """
+        self.ramp = ramp
+        self.integration = integration
+
+    @property
+    def shape(self):
+        return self.ramp.shape[1:]
+
+    @property
+    def ndim(self):
+        return 3
+
+    def __getitem__(self, key):
+        # Single frames are created on demand. Other indexing creates the
+        # full integration.
+        rest = ()
+        if isinstance(key, tuple) and len(key) > 0:
+            key, rest = key[0], key[1:]
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += self.shape[0]
+            if key < 0 or key >= self.shape[0]:
+                raise IndexError("Frame {} is out of range.".format(key))
+            frame = self.ramp.frame(self.integration, key)
+            return frame[rest] if len(rest) > 0 else frame
+        full = self.ramp.integration(self.integration)
+        return full[(key,) + rest] if len(rest) > 0 else full[key]
+
+    def __array__(self, dtype=None, copy=None):
+        frames = self.ramp.integration(self.integration)
+        if dtype is not None:
+            frames = frames.astype(dtype)
+        return frames
@@ -21,7 +21,9 @@ outy -- y-dimension size of the output aperture (2048 for
 Returns:
 --------
 3D array containing the signal of the source in each frame
-of the integration
+of the integration. create_subarray returns only the portion
+of the frames covering the trail of the source, along with
+its location in the output aperture.
 
 Author:
 -------
@@ -42,7 +44,9 @@ class MovingTarget():
 
     def create(self, stamp, xframes, yframes, frametime, outx, outy):
         """
-        MAIN FUNCTION
+        Create the full-aperture frames of an integration containing
+        the moving source. See create_subarray for a version that
+        returns only the area covered by the trail of the source.
 
         Arguments:
         ----------
@@ -63,6 +67,40 @@ class MovingTarget():
         3D array containing the signal of the source in each frame
         of the integration
         """
+        subframes, ystart, xstart = self.create_subarray(stamp, xframes, yframes, frametime, outx, outy)
+        numframes, suby, subx = subframes.shape
+        outfull = np.zeros((numframes, outy, outx))
+        outfull[:, ystart:ystart+suby, xstart:xstart+subx] = subframes
+        return outfull
+
+    def create_subarray(self, stamp, xframes, yframes, frametime, outx, outy):
+        """
+        MAIN FUNCTION
+
+        Arguments:
+        ----------
+        stamp -- 2D stamp image containing target
+        xframes -- list of x-coordinate pixel position of target
+                   in each frame
+        yframes -- list of y-coordinate pixel position of target
+                   in each frame
+        frametime -- exposure time in seconds corresponding to one
+                     detector readout (varies with subarray size)
+        outx -- x-dimension size of the output aperture (2048 for
+                full-frame)
+        outy -- y-dimension size of the output aperture (2048 for
+                full-frame)
+
+        Returns:
+        --------
+        3D array containing the signal of the source in each frame
+        of the integration, covering only the bounding box of the
+        trail of the source within the output aperture
+        y-coordinate of the bottom row of the 3D array in the output
+        aperture
+        x-coordinate of the left column of the 3D array in the output
+        aperture
+        """
 
         # Make sure subsampling factor is an integer
         self.subsampx = np.int(self.subsampx)
@@ -122,7 +160,6 @@ class MovingTarget():
                                  np.int(totxpoints*self.subsampx)))
         outputframe1 = np.zeros((np.int(totypoints*self.subsampy),\
                                  np.int(totxpoints*self.subsampx)))
-        outfull = np.zeros((numframes, outy, outx))
         outsubshape = outputframe0.shape
 
         # Translate the source location x and y values to the coordinates
@@ -134,6 +171,13 @@ class MovingTarget():
         xssub = np.round((xs-mnx) * self.subsampx) + deltacenterx
         yssub = np.round((ys-mny) * self.subsampy) + deltacentery
 
+        # Only the area of the output aperture covered by the trail
+        # is kept. Its size matches that of the resampled frames, cut
+        # at the edges of the output aperture.
+        suby = max(np.min([totypoints, outy - mny]), 0)
+        subx = max(np.min([totxpoints, outx - mnx]), 0)
+        outsub = np.zeros((numframes, suby, subx))
+
         for i in range(1,numframes+1):
             # Find the velocity of the source during this frame
             xvelocity = (xframes[i] - xframes[i-1]) / frametime
@@ -172,22 +216,8 @@ class MovingTarget():
 
             # Put the output frames back to the original resolution
             resampled = self.resample(outputframe1, self.subsampx, self.subsampy)
-            resampylen, resampxlen = resampled.shape
-            #outfull[i-1,mny:mxy+1,mnx:mxx+1] = resampled
-            maxfully = mny + resampylen
-            maxfullx = mnx + resampxlen
-            maxrey = resampylen
-            maxrex = resampxlen
-            if (mny + resampylen) > outy:
-                diffind = (mny + resampylen) - outy
-                maxfully = outy
-                maxrey -= diffind
-            if (mnx + resampxlen) > outx:
-                diffind = (mnx + resampxlen) - outx
-                maxfullx = outx
-                maxrex -= diffind
-            outfull[i-1, mny:maxfully, mnx:maxfullx] = resampled[0:maxrey, 0:maxrex]
-        return outfull
+            outsub[i-1, :, :] = resampled[0:suby, 0:subx]
+        return outsub, mny, mnx
 
     def resample(self, frame, sampx, sampy):
         """
@@ -205,13 +235,13 @@ class MovingTarget():
         resampled image
         """
         framey, framex = frame.shape
-        newframe = np.zeros((np.int(framey/sampy), np.int(framex/sampx)))
-        newframey, newframex = newframe.shape
+        newframey = int(framey/sampy)
+        newframex = int(framex/sampx)
 
-        for j in range(newframey):
-            for i in range(newframex):
-                newframe[j, i] = np.sum(frame[sampy*j:sampy*(j+1), sampx*i:sampx*(i+1)])
-        return newframe
+        # Sum each sampy x sampx block of subpixels. Partial blocks at the
+        # top and right edges are dropped.
+        blocks = frame[0:newframey*sampy, 0:newframex*sampx].reshape(newframey, sampy, newframex, sampx)
+        return blocks.sum(axis=(1, 3))
 
     def coordCheck(self, center, len_stamp, len_out):
         """
@@ -351,12 +381,8 @@ class MovingTarget():
         --------
         Subsampled image
         """
-        ydim, xdim = image.shape
-        substamp = np.zeros((ydim*factory, xdim*factorx))
-
-        for i in range(xdim):
-            for j in range(ydim):
-                substamp[factory*j:factory*(j+1), factorx*i:factorx*(i+1)] = image[j, i]
+        # Repeat each pixel factory times along y and factorx times along x
+        substamp = np.repeat(np.repeat(image.astype(np.float64), factory, axis=0), factorx, axis=1)
         return substamp
 
     def equidistantXY(self,xstart, ystart, xend, yend, dist):
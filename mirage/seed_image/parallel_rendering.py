@@ -0,0 +1,566 @@
+#! /usr/bin/env python
+
+"""This module renders sources into a seed image using a pool of worker
+processes.
+
+Point sources are rendered in tiles. The aperture is split into tiles,
+and each worker adds all of the sources that overlap a given tile,
+clipped to that tile. The seed image and segmentation map are held in
+shared memory (``multiprocessing.RawArray``) created before the workers
+are forked, so that the workers write directly into them and no full
+frames are pickled. Because each tile receives the contributions from its
+sources in the same order as in the source list, the result is identical
+to that from adding the sources serially.
+
+Galaxies, including moving galaxies, are rendered in chunks of
+consecutive catalog rows. Each worker creates and convolves the stamps of
+a chunk and returns them, cropped to the area where they land on the
+aperture. The parent process adds the stamps of each chunk in catalog
+order, so the result is again identical to that from adding the galaxies
+serially. The throughput of each worker is reported.
+
+The workers are forked from the parent process, so that they inherit the
+``Catalog_seed`` instance, including the PSF library, without pickling.
+
+Use
+---
+
+    This module is called by ``Catalog_seed.make_point_source_image``,
+    ``Catalog_seed.make_galaxy_image`` and
+    ``Catalog_seed.movingTargetInputs`` when ``simSignals:nproc`` is
+    larger than 1:
+    ::
+        from mirage.seed_image import parallel_rendering
+        image, segmap = parallel_rendering.render_point_sources(seed, sources, psf_x_dims,
+                                                                segmap, nproc)
+        placements = parallel_rendering.render_galaxies(seed, galaxies, nproc)
+"""
+
+import datetime
+import itertools
+import math
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import os
+import time
+
+import numpy as np
+
+from . import segmentation_map as segmap
+
+
+# Objects used by the worker processes. These are set in the parent
+# process immediately before the workers are forked.
+WORKER_STATE = {}
+
+
+def fork_available():
+    """Check whether worker processes can be forked on this system
+
+    Returns
+    -------
+    available : bool
+        True if the fork start method is available
+    """
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def shared_array(dims, dtype):
+    """Create a zero-filled array in shared memory. Worker processes
+    forked after the array is created write into the same memory as the
+    parent process.
+
+    Parameters
+    ----------
+    dims : tuple
+        Dimensions of the array
+
+    dtype : numpy.dtype
+        Data type of the array
+
+    Returns
+    -------
+    array : numpy.ndarray
+        Array backed by a ``multiprocessing.RawArray``
+    """
+    dtype = np.dtype(dtype)
+    raw = RawArray(np.ctypeslib.as_ctypes_type(dtype), int(np.prod(dims)))
+    return np.frombuffer(raw, dtype=dtype).reshape(dims)
+
+
+def define_tiles(dims, nproc):
+    """Split an image into a grid of tiles. About twice as many tiles as
+    processes are created, in order to help balance the load between
+    workers.
+
+    Parameters
+    ----------
+    dims : tuple
+        (y, x) dimensions of the image
+
+    nproc : int
+        Number of worker processes
+
+    Returns
+    -------
+    tiles : list
+        List of (y1, y2, x1, x2) tile bounds
+    """
+    tiles_per_side = int(math.ceil(math.sqrt(2 * nproc)))
+    y_edges = np.linspace(0, dims[0], min(tiles_per_side, dims[0]) + 1).astype(int)
+    x_edges = np.linspace(0, dims[1], min(tiles_per_side, dims[1]) + 1).astype(int)
+    tiles = []
+    for y1, y2 in zip(y_edges[:-1], y_edges[1:]):
+        for x1, x2 in zip(x_edges[:-1], x_edges[1:]):
+            tiles.append((y1, y2, x1, x2))
+    return tiles
+
+
+def sources_in_tiles(x_locations, y_locations, stamp_dims, tiles, margin=2):
+    """Find the sources whose stamps may overlap each tile. The stamp
+    extents are padded by ``margin`` pixels, so that sources are never
+    missed. Sources that are sent to a tile that they do not overlap
+    contribute nothing to it.
+
+    Parameters
+    ----------
+    x_locations : numpy.ndarray
+        1D array of source x-coordinates, in the coordinate system of the
+        seed image
+
+    y_locations : numpy.ndarray
+        1D array of source y-coordinates, in the coordinate system of the
+        seed image
+
+    stamp_dims : numpy.ndarray
+        1D array of stamp sizes (assumed square) for the sources
+
+    tiles : list
+        List of (y1, y2, x1, x2) tile bounds
+
+    margin : int
+        Number of pixels by which to pad the stamp extents
+
+    Returns
+    -------
+    source_indices : list
+        List containing a 1D array of the indices of the sources
+        overlapping each tile, in source list order
+    """
+    half_widths = np.asarray(stamp_dims) // 2 + margin
+    x_floor = np.floor(x_locations)
+    y_floor = np.floor(y_locations)
+    x_low = x_floor - half_widths
+    x_high = x_floor + half_widths + 1
+    y_low = y_floor - half_widths
+    y_high = y_floor + half_widths + 1
+
+    source_indices = []
+    for y1, y2, x1, x2 in tiles:
+        overlap = (x_high > x1) & (x_low < x2) & (y_high > y1) & (y_low < y2)
+        source_indices.append(np.where(overlap)[0])
+    return source_indices
+
+
+def render_tile(task):
+    """Add the sources overlapping a single tile into the shared seed image
+    and segmentation map. This is run in the worker processes.
+
+    Parameters
+    ----------
+    task : tuple
+        Tile bounds (y1, y2, x1, x2), and 1D array of the indices of the
+        sources to add
+
+    Returns
+    -------
+    num_sources : int
+        Number of sources processed
+
+    cache_counts : tuple
+        Number of PSF stamp cache hits, misses and evictions while
+        processing the tile
+    """
+    tile, source_indices = task
+    seed = WORKER_STATE['seed']
+    start_counts = stamp_cache_counts(seed.psf_stamp_cache)
+    sources = WORKER_STATE['sources'][source_indices]
+    psf_x_dims = WORKER_STATE['psf_x_dims'][source_indices]
+    if WORKER_STATE['segment_numbers'] is None:
+        segment_numbers = None
+    else:
+        segment_numbers = WORKER_STATE['segment_numbers'][source_indices]
+
+    segmentation = segmap.SegMap()
+    segmentation.ydim, segmentation.xdim = WORKER_STATE['image'].shape
+    segmentation.segmap = WORKER_STATE['segmap']
+
+    core_stamps = seed.psf_core_stamps(sources['pixelx'], sources['pixely'], segment_number=segment_numbers)
+    if segment_numbers is None:
+        segment_numbers = itertools.repeat(None)
+    for entry, psf_x_dim, core_stamp, segment_number in zip(sources, psf_x_dims, core_stamps, segment_numbers):
+        seed.add_point_source(WORKER_STATE['image'], segmentation, entry, psf_x_dim,
+                              segment_number=segment_number, core_stamp=core_stamp, tile=tile)
+
+    # Paint the recorded source footprints into the shared segmentation map
+    segmentation.rasterize()
+    cache_counts = tuple(end - start for start, end in zip(start_counts, stamp_cache_counts(seed.psf_stamp_cache)))
+    return len(source_indices), cache_counts
+
+
+def stamp_cache_counts(cache):
+    """Return the usage counters of a PSF stamp cache
+
+    Parameters
+    ----------
+    cache : mirage.psf.stamp_cache.PSFStampCache
+        PSF stamp cache. May be None.
+
+    Returns
+    -------
+    counts : tuple
+        Number of cache hits, misses and evictions. All zero if there
+        is no cache.
+    """
+    if cache is None:
+        return (0, 0, 0)
+    return (cache.hits, cache.misses, cache.evictions)
+
+
+def render_point_sources(seed, sources, psf_x_dims, segmentation_map, nproc, segment_numbers=None):
+    """Add point sources to a seed image using a pool of worker processes
+
+    Parameters
+    ----------
+    seed : mirage.seed_image.catalog_seed_image.Catalog_seed
+        Instance used to create the PSF stamps
+
+    sources : astropy.table.Table
+        Table of point sources
+
+    psf_x_dims : numpy.ndarray
+        1D array of PSF stamp sizes for the sources
+
+    segmentation_map : numpy.ndarray
+        2D segmentation map to which the sources are added
+
+    nproc : int
+        Number of worker processes
+
+    segment_numbers : numpy.ndarray, optional
+        1D array of the number of the mirror segment whose PSF library is
+        used for each source. If None, the single PSF library is used.
+
+    Returns
+    -------
+    psfimage : numpy.ndarray
+        2D array containing the seed image with point sources
+
+    segmentation_map : numpy.ndarray
+        2D segmentation map including the point sources
+    """
+    dims = tuple(segmentation_map.shape)
+    x_locations = np.asarray(sources['pixelx'], dtype=np.float64) + seed.coord_adjust['xoffset']
+    y_locations = np.asarray(sources['pixely'], dtype=np.float64) + seed.coord_adjust['yoffset']
+    psf_x_dims = np.asarray(psf_x_dims)
+
+    tiles = define_tiles(dims, nproc)
+    tile_sources = sources_in_tiles(x_locations, y_locations, psf_x_dims, tiles)
+    tasks = [(tile, indices) for tile, indices in zip(tiles, tile_sources) if len(indices) > 0]
+
+    # Start with the most crowded tiles, to help balance the load
+    tasks.sort(key=lambda task: len(task[1]), reverse=True)
+
+    # Create the PSF library splines before forking, so that they are
+    # shared by all workers
+    if segment_numbers is None:
+        library_segments = [None]
+    else:
+        library_segments = np.unique(segment_numbers)
+    for segment_number in library_segments:
+        renderer = seed.psf_renderer(segment_number=segment_number)
+        if renderer is not None:
+            renderer.build_splines()
+
+    # Shared arrays created before forking are inherited by the workers
+    image = shared_array(dims, np.float64)
+    shared_segmap = shared_array(dims, segmentation_map.dtype)
+    shared_segmap[:] = segmentation_map
+    try:
+
+        WORKER_STATE.update({'seed': seed, 'sources': sources, 'psf_x_dims': psf_x_dims,
+                             'segment_numbers': segment_numbers, 'image': image,
+                             'segmap': shared_segmap})
+
+        print('{}: Adding {} point sources in {} tiles using {} processes'
+              .format(str(datetime.datetime.now()), len(sources), len(tasks), nproc))
+        context = multiprocessing.get_context('fork')
+        num_rendered = 0
+        cache_counts = np.zeros(3, dtype=int)
+        with context.Pool(processes=nproc) as pool:
+            for num_sources, tile_cache_counts in pool.imap_unordered(render_tile, tasks):
+                num_rendered += num_sources
+                cache_counts += tile_cache_counts
+
+        # The workers' PSF stamp caches are discarded with the workers, so
+        # add their usage to the cache of the parent process
+        if seed.psf_stamp_cache is not None:
+            seed.psf_stamp_cache.hits += int(cache_counts[0])
+            seed.psf_stamp_cache.misses += int(cache_counts[1])
+            seed.psf_stamp_cache.evictions += int(cache_counts[2])
+        print('{}: Done. {} source stamps rendered across all tiles'.format(str(datetime.datetime.now()),
+                                                                           num_rendered))
+
+        psfimage = np.array(image)
+        segmentation_map = np.array(shared_segmap)
+    finally:
+        WORKER_STATE.clear()
+
+    return psfimage, segmentation_map
+
+
+def define_chunks(num_sources, nproc):
+    """Split a list of sources into chunks of consecutive sources. About
+    four times as many chunks as processes are created, in order to help
+    balance the load between workers.
+
+    Parameters
+    ----------
+    num_sources : int
+        Number of sources
+
+    nproc : int
+        Number of worker processes
+
+    Returns
+    -------
+    chunks : list
+        List of (start, end) indices of the sources in each chunk
+    """
+    chunk_size = max(int(math.ceil(num_sources / (4. * nproc))), 1)
+    return [(start, min(start + chunk_size, num_sources)) for start in range(0, num_sources, chunk_size)]
+
+
+def build_psf_splines(seed):
+    """Create the PSF library splines before forking, so that they are
+    shared by all workers
+
+    Parameters
+    ----------
+    seed : mirage.seed_image.catalog_seed_image.Catalog_seed
+        Instance used to create the PSF stamps
+    """
+    renderer = seed.psf_renderer()
+    if renderer is not None:
+        renderer.build_splines()
+
+
+def render_galaxy_chunk(chunk):
+    """Create and convolve the stamps for a chunk of galaxies. This is run
+    in the worker processes.
+
+    Parameters
+    ----------
+    chunk : tuple
+        (start, end) indices of the galaxies in the chunk
+
+    Returns
+    -------
+    placements : list
+        List of (j1, i1, stamp, index) tuples, as returned by
+        ``Catalog_seed.convolve_galaxy_stamps``
+
+    stats : tuple
+        Process ID of the worker, number of galaxies processed, and time
+        spent, in seconds
+    """
+    start_time = time.time()
+    start, end = chunk
+    seed = WORKER_STATE['seed']
+    galaxies = WORKER_STATE['sources'][start:end]
+    batch_size = seed.stamp_convolver.batch_size if seed.stamp_convolver is not None else 1
+
+    placements = []
+    pending = []
+    core_stamps = seed.psf_core_stamps(galaxies['pixelx'], galaxies['pixely'])
+    for entry, core_stamp in zip(galaxies, core_stamps):
+        galaxy = seed.create_galaxy_stamp(entry, core_stamp)
+        if galaxy is not None:
+            pending.append(galaxy)
+            if len(pending) >= batch_size:
+                placements.extend(seed.convolve_galaxy_stamps(pending))
+                pending = []
+    placements.extend(seed.convolve_galaxy_stamps(pending))
+    return placements, (os.getpid(), end - start, time.time() - start_time)
+
+
+def render_moving_target_chunk(chunk):
+    """Create the signal in each frame for a chunk of moving targets. This
+    is run in the worker processes.
+
+    Parameters
+    ----------
+    chunk : tuple
+        (start, end) indices of the sources in the chunk
+
+    Returns
+    -------
+    contributions : list
+        List of (index, integration, y_start, x_start, signal) tuples,
+        where ``signal`` is the 3D array containing the signal of the
+        source in each frame of the integration, covering the area
+        crossed by the source, and (``y_start``, ``x_start``) is the
+        location of its lower left corner in the seed image
+
+    stats : tuple
+        Process ID of the worker, number of sources processed, and time
+        spent, in seconds
+    """
+    start_time = time.time()
+    start, end = chunk
+    seed = WORKER_STATE['seed']
+    sources = WORKER_STATE['sources']
+
+    contributions = []
+    core_stamps = seed.psf_core_stamps(sources['pixelx'][start:end], sources['pixely'][start:end])
+    for i, core_stamp in zip(range(start, end), core_stamps):
+        integrations = seed.create_moving_target(WORKER_STATE['input_type'], sources['entry'][i],
+                                                 sources['rate'][i], sources['psf_x_dim'][i],
+                                                 sources['pixelx'][i], sources['pixely'][i],
+                                                 sources['ra'][i], sources['dec'][i],
+                                                 WORKER_STATE['frame_info'], core_stamp=core_stamp,
+                                                 x_frames=sources['x_frames'][i],
+                                                 y_frames=sources['y_frames'][i])
+        if integrations is None:
+            continue
+
+        for integ, mt_source, y_start, x_start in integrations:
+            contributions.append((sources['index'][i], integ, y_start, x_start, mt_source))
+    return contributions, (os.getpid(), end - start, time.time() - start_time)
+
+
+def run_chunks(seed, worker_function, chunks, nproc, description):
+    """Run a worker function on chunks of sources using a pool of worker
+    processes, yielding the results in chunk order. The throughput of each
+    worker is reported once all chunks are complete.
+
+    Parameters
+    ----------
+    seed : mirage.seed_image.catalog_seed_image.Catalog_seed
+        Instance used to render the sources
+
+    worker_function : func
+        Function run on each chunk, returning a list of results and a
+        tuple of worker statistics
+
+    chunks : list
+        List of (start, end) indices of the sources in each chunk
+
+    nproc : int
+        Number of worker processes
+
+    description : str
+        Description of the sources, used in the printed messages
+
+    Yields
+    ------
+    result : tuple
+        Results for each chunk, in the order of ``chunks``
+    """
+    num_sources = chunks[-1][1] if len(chunks) > 0 else 0
+    print('{}: Adding {} {} in {} chunks using {} processes'
+          .format(str(datetime.datetime.now()), num_sources, description, len(chunks), nproc))
+    build_psf_splines(seed)
+
+    worker_stats = {}
+    context = multiprocessing.get_context('fork')
+    with context.Pool(processes=nproc) as pool:
+        # Results are returned in chunk order regardless of which chunk
+        # finishes first, so that the output is reproducible
+        for results, (pid, num_done, seconds) in pool.imap(worker_function, chunks):
+            stats = worker_stats.setdefault(pid, [0, 0, 0.])
+            stats[0] += 1
+            stats[1] += num_done
+            stats[2] += seconds
+            for result in results:
+                yield result
+
+    print('{}: Done.'.format(str(datetime.datetime.now())))
+    for worker, (pid, (num_chunks, num_done, seconds)) in enumerate(sorted(worker_stats.items())):
+        rate = num_done / seconds if seconds > 0 else 0.
+        print('    Worker {} (process {}): {} {} in {} chunks, {:.2f} seconds ({:.1f} per second)'
+              .format(worker + 1, pid, num_done, description, num_chunks, seconds, rate))
+
+
+def render_galaxies(seed, galaxies, nproc):
+    """Create and convolve galaxy stamps using a pool of worker processes
+
+    Parameters
+    ----------
+    seed : mirage.seed_image.catalog_seed_image.Catalog_seed
+        Instance used to create the galaxy stamps
+
+    galaxies : astropy.table.Table
+        Table of galaxies, as returned by ``Catalog_seed.filterGalaxyList``
+
+    nproc : int
+        Number of worker processes
+
+    Returns
+    -------
+    placements : generator
+        Generator yielding a (j1, i1, stamp, index) tuple for each galaxy
+        that lands on the aperture, in the order of ``galaxies``. This
+        should be passed to ``Catalog_seed.place_galaxy_stamps``.
+    """
+    WORKER_STATE.update({'seed': seed, 'sources': galaxies})
+    try:
+        for placement in run_chunks(seed, render_galaxy_chunk, define_chunks(len(galaxies), nproc),
+                                    nproc, 'galaxies'):
+            yield placement
+    finally:
+        WORKER_STATE.clear()
+
+
+def render_moving_targets(seed, input_type, sources, frame_info, nproc):
+    """Create the signal in each frame for a list of moving targets using
+    a pool of worker processes
+
+    Parameters
+    ----------
+    seed : mirage.seed_image.catalog_seed_image.Catalog_seed
+        Instance used to create the moving targets
+
+    input_type : str
+        Specifies type of sources. Can be 'pointSource','galaxies', or 'extended'
+
+    sources : dict
+        Dictionary of equal-length sequences describing the sources, with
+        keys ``index``, ``entry`` (catalog rows), ``rate``, ``psf_x_dim``,
+        ``pixelx``, ``pixely``, ``ra``, ``dec``, and ``x_frames`` and
+        ``y_frames`` (positions in each frame)
+
+    frame_info : dict
+        Frame timing and output dimensions, as used by
+        ``Catalog_seed.create_moving_target``
+
+    nproc : int
+        Number of worker processes
+
+    Returns
+    -------
+    contributions : generator
+        Generator yielding an (index, integration, y_start, x_start,
+        signal) tuple for each integration of each source that lands on
+        the aperture, in source order. These should be passed to
+        ``Catalog_seed.add_moving_target``.
+    """
+    WORKER_STATE.update({'seed': seed, 'sources': sources, 'input_type': input_type,
+                         'frame_info': frame_info})
+    try:
+        for contribution in run_chunks(seed, render_moving_target_chunk,
+                                       define_chunks(len(sources['index']), nproc), nproc,
+                                       'moving {}'.format(input_type)):
+            yield contribution
+    finally:
+        WORKER_STATE.clear()
@@ -4,9 +4,26 @@
 Segmentation map creation. Developed in conjunction with
 the seed image generator code for catalogs
 catalog_seed_image.py
+
+Objects are not painted into the map as they are added. Instead, the
+footprint of each object is recorded as the location of its bounding box
+and a boolean mask, and the footprints are painted into the map in a
+single vectorized step when the map is accessed through ``segmap``, or
+when the recorded footprints cover more than a given number of pixels,
+which bounds the memory they use. Objects added later overwrite earlier
+ones, exactly as if they had been painted one at a time. Labels are
+stored as 32-bit integers.
 '''
 
 import numpy as np
+from scipy import ndimage
+
+# Data type of the segmentation map labels
+LABEL_DTYPE = np.int32
+
+# Total number of pixels in the recorded footprints above which the
+# footprints are painted into the map
+MAX_FOOTPRINT_PIXELS = 4000000
 
 
 class SegMap():
@@ -14,30 +31,97 @@ class SegMap():
         self.xdim = 2048
         self.ydim = 2048
         self.zdim = None
+        self.dense = None
+
+        # Recorded (ystart, xstart, mask, number) footprints that have not
+        # yet been painted into the map, and the number of pixels they cover
+        self.footprints = []
+        self.footprint_pixels = 0
+        self.max_footprint_pixels = MAX_FOOTPRINT_PIXELS
 
     def initialize_map(self):
         if self.zdim is None:
-            self.segmap = np.zeros((self.ydim, self.xdim), dtype=np.int64)
+            self.dense = np.zeros((self.ydim, self.xdim), dtype=LABEL_DTYPE)
         else:
-            self.segmap = np.zeros((self.zdim, self.ydim, self.xdim), dtype=np.int64)
+            self.dense = np.zeros((self.zdim, self.ydim, self.xdim), dtype=LABEL_DTYPE)
+        self.footprints = []
+        self.footprint_pixels = 0
+
+    @property
+    def segmap(self):
+        # The map, including all objects added so far
+        self.rasterize()
+        return self.dense
+
+    @segmap.setter
+    def segmap(self, value):
+        self.dense = value
+        self.footprints = []
+        self.footprint_pixels = 0
+
+    def add_footprint(self, mask, ystart, xstart, number):
+        # Record the footprint of an object, cropped to the
+        # bounding box of the flagged pixels
+        rows = np.where(np.any(mask, axis=1))[0]
+        if len(rows) == 0:
+            return
+        columns = np.where(np.any(mask, axis=0))[0]
+        mask = mask[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+        self.footprints.append((ystart + rows[0], xstart + columns[0], mask, number))
+
+        # Paint the footprints once they use too much memory
+        self.footprint_pixels += mask.size
+        if self.footprint_pixels > self.max_footprint_pixels:
+            self.rasterize()
+
+    def rasterize(self):
+        # Paint all recorded footprints into the map, in the
+        # order in which they were added
+        if len(self.footprints) == 0:
+            return
+        if self.dense is None:
+            footprints = self.footprints
+            self.initialize_map()
+            self.footprints = footprints
+
+        ydim, xdim = self.dense.shape[-2:]
+        all_pixels = []
+        all_labels = []
+        for ystart, xstart, mask, number in self.footprints:
+            y, x = np.nonzero(mask)
+            y += ystart
+            x += xstart
+            on_map = (y >= 0) & (y < ydim) & (x >= 0) & (x < xdim)
+            all_pixels.append(y[on_map] * xdim + x[on_map])
+            all_labels.append(np.full(np.sum(on_map), number, dtype=LABEL_DTYPE))
+        self.footprints = []
+        self.footprint_pixels = 0
+
+        # When a pixel is flagged by more than one object, keep the
+        # label of the most recently added object. A stable sort keeps
+        # the labels of each pixel in the order in which they were added.
+        pixels = np.concatenate(all_pixels)
+        labels = np.concatenate(all_labels)
+        order = np.argsort(pixels, kind='stable')
+        pixels = pixels[order]
+        last = np.append(pixels[1:] != pixels[:-1], True)
+        self.dense[pixels[last] // xdim, pixels[last] % xdim] = labels[order][last]
 
     def add_object_basic(self, ystart, yend, xstart, xend, number):
         # Add an object to the segmentation map
         # in simplest way possible. All pixels
         # in the box are set to the index number
         # regardless of signal
-        self.segmap[ystart:yend, xstart:xend] = number
+        mask = np.ones((max(yend - ystart, 0), max(xend - xstart, 0)), dtype=bool)
+        self.add_footprint(mask, ystart, xstart, number)
 
     def add_object_perccut(self, image, ystart, xstart, number, perc):
         # Add an object to the segmentation map
         # In this case, only flag pixels whose
         # signal is higher than the given cutoff
-        yd, xd = image.shape
-        stamp = self.segmap[ystart:ystart+yd, xstart:xstart+xd]
         maxsig = np.max(image)
         cutoff = maxsig * perc
-        flag = image >= cutoff
-        stamp[flag] = number
+        self.add_footprint(image >= cutoff, ystart, xstart, number)
 
     def add_object_noise(self, image, ystart, xstart, number, noise):
         # Add an object to the segmentation map
@@ -45,7 +129,17 @@ class SegMap():
         # signal is higher than a calculated cutoff
         # that is based on average noise/background
         # values for NIRCam
-        yd, xd = image.shape
-        stamp = self.segmap[ystart:ystart+yd, xstart:xstart+xd]
-        flag = image >= noise
-        stamp[flag] = number
+        self.add_footprint(image >= noise, ystart, xstart, number)
+
+    def add_object_threshold(self, image, ystart, xstart, number, threshold, min_pixels=8):
+        # Add an object to the segmentation map
+        # In this case, flag groups of at least min_pixels
+        # connected (including diagonally) pixels whose
+        # signal is above the threshold
+        above = image > threshold
+        regions, num_regions = ndimage.label(above, structure=np.ones((3, 3)))
+        if num_regions == 0:
+            return
+        sizes = np.bincount(regions.ravel())
+        sizes[0] = 0
+        self.add_footprint((sizes >= min_pixels)[regions], ystart, xstart, number)
@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+
+"""This module contains a cache of normalized Sersic profile stamps used
+when creating galaxies. Deep extragalactic fields contain many galaxies
+with similar half-light radii, Sersic indexes, ellipticities and position
+angles. By quantizing these parameters, galaxies with nearly identical
+shapes can share a single stamp, which is created once and then scaled to
+the total signal of each galaxy.
+
+Radii and Sersic indexes are quantized on logarithmic grids with a
+relative step equal to the tolerance, while ellipticities and position
+angles (in radians) are quantized on linear grids with a step equal to
+the tolerance. Quantized ellipticities are kept below 1. Since each cached stamp is normalized, quantization
+changes only the shape of a galaxy and not its total signal.
+
+Stamps are kept in a least-recently-used cache whose total size is
+limited to a given amount of memory.
+
+Use
+---
+
+    This module can be imported and called as such:
+    ::
+        from mirage.seed_image.sersic_stamp_cache import SersicStampCache
+        cache = SersicStampCache(tolerance=0.02, max_memory_mb=512.)
+        stamp = cache.get_stamp(2.3, 0.4, 1.5, 0.7, make_stamp)
+        print(cache.summary())
+"""
+
+from collections import OrderedDict
+import math
+
+
+class SersicStampCache():
+    def __init__(self, tolerance=0.02, max_memory_mb=512.):
+        """Instantiate the Sersic stamp cache
+
+        Parameters
+        ----------
+        tolerance : float
+            Quantization step. Relative step for the radius and Sersic
+            index, and absolute step for the ellipticity and the position
+            angle (in radians). Must be between 0 and 1.
+
+        max_memory_mb : float
+            Maximum amount of memory, in MB, used to store stamps. When
+            this is exceeded, the least recently used stamps are removed
+            from the cache.
+        """
+        if tolerance <= 0. or tolerance >= 1.:
+            raise ValueError(("Sersic stamp cache tolerance must be between 0 and 1. "
+                              "Value given was {}.".format(tolerance)))
+        self.tolerance = tolerance
+        self.log_step = math.log1p(tolerance)
+        self.max_bytes = max_memory_mb * 1024. * 1024.
+        self.stamps = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize(self, radius, ellipticity, sersic, posang):
+        """Quantize the parameters of a Sersic profile
+
+        Parameters
+        ----------
+        radius : float
+            Half light radius, in pixels
+
+        ellipticity : float
+            Ellipticity
+
+        sersic : float
+            Sersic index
+
+        posang : float
+            Position angle, in radians
+
+        Returns
+        -------
+        key : tuple
+            Integer indexes of the quantized parameters
+
+        values : tuple
+            Quantized (radius, ellipticity, sersic, posang)
+        """
+        radius_index = int(round(math.log(radius) / self.log_step))
+        sersic_index = int(round(math.log(sersic) / self.log_step))
+        ellipticity_index = int(round(ellipticity / self.tolerance))
+
+        # Ellipticities must stay below 1, since a profile with an
+        # ellipticity of 1 is a line with no signal in its stamp
+        max_ellipticity_index = int(math.ceil(1. / self.tolerance)) - 1
+        if max_ellipticity_index * self.tolerance >= 1.:
+            max_ellipticity_index -= 1
+        ellipticity_index = min(ellipticity_index, max_ellipticity_index)
+
+        # Sersic profiles are symmetric under a rotation by pi, and the
+        # position angle of a circular profile has no effect
+        num_angles = max(int(round(math.pi / self.tolerance)), 1)
+        if ellipticity_index == 0:
+            angle_index = 0
+        else:
+            angle_index = int(round((posang % math.pi) / math.pi * num_angles)) % num_angles
+
+        key = (radius_index, ellipticity_index, sersic_index, angle_index)
+        values = (math.exp(radius_index * self.log_step), ellipticity_index * self.tolerance,
+                  math.exp(sersic_index * self.log_step), angle_index * math.pi / num_angles)
+        return key, values
+
+    def get_stamp(self, radius, ellipticity, sersic, posang, make_stamp):
+        """Return the normalized stamp for a Sersic profile, creating it
+        from the quantized parameters if it is not in the cache
+
+        Parameters
+        ----------
+        radius : float
+            Half light radius, in pixels
+
+        ellipticity : float
+            Ellipticity
+
+        sersic : float
+            Sersic index
+
+        posang : float
+            Position angle, in radians
+
+        make_stamp : func
+            Function called as ``make_stamp(radius, ellipticity, sersic,
+            posang)`` to create a normalized stamp for the quantized
+            parameters
+
+        Returns
+        -------
+        stamp : numpy.ndarray
+            2D array containing the stamp. This is the cached array, so
+            it should not be modified by the caller.
+        """
+        # Parameters that cannot be quantized on a logarithmic grid are
+        # not cached
+        if radius <= 0. or sersic <= 0.:
+            return make_stamp(radius, ellipticity, sersic, posang)
+
+        key, values = self.quantize(radius, ellipticity, sersic, posang)
+        if key in self.stamps:
+            self.hits += 1
+            self.stamps.move_to_end(key)
+            return self.stamps[key]
+
+        self.misses += 1
+        stamp = make_stamp(*values)
+        stamp.setflags(write=False)
+        self.stamps[key] = stamp
+        self.nbytes += stamp.nbytes
+
+        # Remove the least recently used stamps if the cache is too large
+        while self.nbytes > self.max_bytes and len(self.stamps) > 1:
+            removed_key, removed_stamp = self.stamps.popitem(last=False)
+            self.nbytes -= removed_stamp.nbytes
+            self.evictions += 1
+        return stamp
+
+    def summary(self):
+        """Create a summary of the cache usage
+
+        Returns
+        -------
+        summary : str
+            Description of the number of cache hits, misses and evictions
+        """
+        total = self.hits + self.misses
+        hit_rate = 100. * self.hits / total if total > 0 else 0.
+        return ("Sersic stamp cache: {} hits, {} misses ({:.1f}% hit rate), {} evictions. "
+                "{} stamps cached, using {:.1f} MB.".format(self.hits, self.misses, hit_rate,
+                                                             self.evictions, len(self.stamps),
+                                                             self.nbytes / 1024. / 1024.))
@@ -0,0 +1,263 @@
+#! /usr/bin/env python
+
+"""This module contains a simple profiler used to record the time and
+memory used by the named stages of a simulation (e.g. reading the source
+catalogs, evaluating PSFs, adding Poisson noise or cosmic rays). For each
+stage, the profiler records the number of times the stage was run, the
+total time spent in it, the peak memory allocated while it ran (as traced
+by ``tracemalloc``), and the resident set size (RSS) of the process. It
+can also keep counters, such as the number of sources added.
+
+Profiling is turned on by setting ``Output:profile`` to True in the input
+yaml file, or by setting the ``MIRAGE_PROFILE`` environment variable to
+1. The results are saved as a JSON file next to the simulation outputs.
+When profiling is off, the profiler does nothing.
+
+Note that tracing memory allocations with ``tracemalloc`` slows down
+code that creates many small objects, so the time spent in such stages
+will be somewhat longer when profiling.
+
+Use
+---
+
+    This module can be imported and used as such:
+
+    ::
+
+        from mirage.utils.profiling import StageProfiler
+        profiler = StageProfiler(enabled=True)
+        with profiler.stage('poisson'):
+            ...
+        profiler.count('cosmic_rays', 12)
+        profiler.write_report('my_simulation_profile.json')
+        profiler.stop_tracing()
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+ENV_VAR = 'MIRAGE_PROFILE'
+
+
+def profiling_requested(params):
+    """Determine whether profiling has been requested, either in the
+    input yaml file or through the ``MIRAGE_PROFILE`` environment variable
+
+    Parameters
+    ----------
+    params : dict
+        Nested dictionary of input yaml file parameters
+
+    Returns
+    -------
+    requested : bool
+        True if profiling should be done
+    """
+    env_value = os.environ.get(ENV_VAR, '').strip().lower()
+    if env_value in ['1', 'true', 'yes']:
+        return True
+    return bool(params.get('Output', {}).get('profile', False))
+
+
+def current_rss_mb():
+    """Return the current resident set size of the process
+
+    Returns
+    -------
+    rss : float
+        Resident set size in MB. None if it cannot be determined.
+    """
+    try:
+        with open('/proc/self/statm') as file_obj:
+            pages = int(file_obj.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024. / 1024.
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of the process so far
+
+    Returns
+    -------
+    rss : float
+        Peak resident set size in MB. None if it cannot be determined.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return max_rss / 1024. / 1024.
+    return max_rss / 1024.
+
+
+class StageProfiler():
+    def __init__(self, enabled=False):
+        """Instantiate the profiler
+
+        Parameters
+        ----------
+        enabled : bool
+            If False, the profiler does nothing
+        """
+        self.enabled = enabled
+        self.stages = OrderedDict()
+        self.counters = OrderedDict()
+
+        # Stages currently running, innermost last
+        self.active = []
+
+        # Peak traced memory over all stages, in bytes
+        self.max_traced = 0
+
+        self.started_tracing = False
+        self.start_time = time.perf_counter()
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def start_stage(self, name):
+        """Start timing a stage
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage
+        """
+        if not self.enabled:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+
+        # The peak memory of the enclosing stage so far must be saved
+        # before the peak is reset for this stage. Before Python 3.9 the
+        # peak cannot be reset, and the peak of each stage is the peak
+        # since tracing started.
+        self.max_traced = max(self.max_traced, peak)
+        if len(self.active) > 0:
+            self.active[-1]['peak'] = max(self.active[-1]['peak'], peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+            peak = current
+        self.active.append({'name': name, 'start': time.perf_counter(), 'start_memory': current,
+                            'peak': peak})
+
+    def end_stage(self, name):
+        """Stop timing a stage, and record its time and memory use
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage. Must be the most recently started stage.
+        """
+        if not self.enabled:
+            return
+        if len(self.active) == 0 or self.active[-1]['name'] != name:
+            raise ValueError("Profiler stage {} ended without being started.".format(name))
+        frame = self.active.pop()
+        elapsed = time.perf_counter() - frame['start']
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, frame['peak'])
+        self.max_traced = max(self.max_traced, peak)
+        if len(self.active) > 0:
+            self.active[-1]['peak'] = max(self.active[-1]['peak'], peak)
+
+        record = self.stages.setdefault(name, {'calls': 0, 'seconds': 0., 'peak_traced_mb': 0.,
+                                               'net_traced_mb': 0., 'rss_mb': None, 'peak_rss_mb': None})
+        record['calls'] += 1
+        record['seconds'] += elapsed
+        record['peak_traced_mb'] = max(record['peak_traced_mb'],
+                                       (peak - frame['start_memory']) / 1024. / 1024.)
+        record['net_traced_mb'] += (current - frame['start_memory']) / 1024. / 1024.
+        record['rss_mb'] = current_rss_mb()
+        record['peak_rss_mb'] = peak_rss_mb()
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager timing the code it contains as a stage
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage
+        """
+        self.start_stage(name)
+        try:
+            yield
+        finally:
+            self.end_stage(name)
+
+    def count(self, name, value=1):
+        """Add to a counter
+
+        Parameters
+        ----------
+        name : str
+            Name of the counter
+
+        value : int or float
+            Amount to add to the counter
+        """
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        """Create a summary of the stages and counters
+
+        Returns
+        -------
+        report : dict
+            Dictionary containing the total run time, the peak memory use,
+            and the records of the stages and counters
+        """
+        traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        stages = [dict(name=name, **record) for name, record in self.stages.items()]
+        return {'total_seconds': time.perf_counter() - self.start_time,
+                'peak_traced_mb': max(self.max_traced, traced[1]) / 1024. / 1024.,
+                'rss_mb': current_rss_mb(),
+                'peak_rss_mb': peak_rss_mb(),
+                'stages': stages,
+                'counters': dict(self.counters)}
+
+    def write_report(self, filename, **metadata):
+        """Save the profiling results to a JSON file. If tracing of memory
+        allocations was started by this profiler, it is stopped.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the output JSON file
+
+        metadata : dict
+            Additional entries to include in the file (e.g. the name of the
+            input yaml file)
+        """
+        if not self.enabled:
+            return
+        report = dict(metadata)
+        report.update(self.report())
+        with open(filename, 'w') as file_obj:
+            json.dump(report, file_obj, indent=2)
+        print('Profiling results saved to {}'.format(filename))
+        self.stop_tracing()
+
+    def stop_tracing(self):
+        """Stop tracing memory allocations, if tracing was started by this
+        profiler. This should be called when the simulation ends, whether
+        or not it succeeded.
+        """
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
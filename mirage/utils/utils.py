@@ -24,6 +24,7 @@ import os
 import re
 
 from astropy.io import ascii as asc
+import numpy as np
 
 from mirage.utils.constants import CRDS_FILE_TYPES, NIRISS_FILTER_WHEEL_FILTERS, NIRISS_PUPIL_WHEEL_FILTERS
 
@@ -477,8 +478,9 @@ def magnitude_to_countrate(observation_mode, magsys, mag, photfnu=None, photflam
         Magnitude system of the input magnitudes. Allowed values are:
         'abmag', 'stmag', 'vegamag'
 
-    mag : float or list
-        Magnitude value(s) to transform
+    mag : float, list, or numpy.ndarray
+        Magnitude value(s) to transform. Lists and arrays are converted
+        in a single vectorized operation.
 
     photfnu : float
         Photfnu value that relates count rate and flux density. Only used
@@ -495,10 +497,13 @@ def magnitude_to_countrate(observation_mode, magsys, mag, photfnu=None, photflam
 
     Returns
     -------
-    count_rate : float or list
+    count_rate : float or numpy.ndarray
         Count rate (e/s) corresponding to the input magnutude(s)
 
     """
+    if not np.isscalar(mag):
+        mag = np.asarray(mag, dtype=np.float64)
+
     # For NIRISS AMI mode, the count rate values calculated need to be
     # scaled by a factor 0.15/0.84 = 0.17857.  The 0.15 value is the
     # throughput of the NRM, while the 0.84 value is the throughput of the
@@ -1895,6 +1895,7 @@ class SimInput:
                 f.write('  suffix: IPC_FGS_{}    # Suffix of library file names\n'.format(
                     detector_string))
             f.write('  seed: {}                 # Seed for random number generator\n'.format(np.random.randint(1, 2**32-2)))
+            f.write('  memmap_dir: None  # Directory for the memory mapped copy of the CR library. None uses the library directory\n')
             f.write('\n')
             f.write('simSignals:\n')
             if instrument.lower() in ['nircam', 'wfsc']:
@@ -1927,6 +1928,18 @@ class SimInput:
             f.write('  gridded_psf_library_row_padding: 4  # Number of outer rows and columns to avoid when evaluating library. RECOMMEND 4.\n')
             f.write('  psf_wing_threshold_file: {}   # File defining PSF sizes versus magnitude\n'.format(input['psf_wing_threshold_file']))
             f.write('  add_psf_wings: {}  # Whether or not to place the core of the psf from the gridded library into an image of the wings before adding.\n'.format(self.add_psf_wings))
+            f.write('  psf_stamp_cache: False  # Re-use evaluated PSF stamps for sources with the same library grid cell and sub-pixel phase\n')
+            f.write('  psf_stamp_cache_subpixel_step: 0.1  # Step size (pixels) used to quantize source sub-pixel phases for the PSF stamp cache\n')
+            f.write('  psf_stamp_cache_max_mb: 512  # Maximum memory (MB) used by the PSF stamp cache\n')
+            f.write('  psf_batch_size: 1000  # Number of sources whose PSFs are evaluated together. Set to 0 to evaluate the PSF library one source at a time.\n')
+            f.write('  nproc: 1  # Number of processes to use when adding point sources and galaxies to the seed image\n')
+            f.write('  catalog_spatial_index: False  # Use a spatial index, saved next to each catalog, to read only the sources near the aperture\n')
+            f.write('  catalog_chunk_size: 0  # Number of rows to read at a time from point source and galaxy catalogs. Set to 0 to read each catalog at once.\n')
+            f.write('  sersic_stamp_cache: False  # Re-use galaxy Sersic profile stamps for galaxies with the same quantized shape parameters\n')
+            f.write('  sersic_stamp_cache_tolerance: 0.02  # Quantization step for galaxy radius, Sersic index, ellipticity and position angle in the Sersic stamp cache\n')
+            f.write('  sersic_stamp_cache_max_mb: 512  # Maximum memory (MB) used by the Sersic stamp cache\n')
+            f.write('  convolution_batch_size: 16  # Number of galaxy and extended source stamps convolved with their PSFs together. Set to 0 to convolve one stamp at a time.\n')
+            f.write('  fft_workers: 1  # Number of threads used for the FFTs when convolving galaxy and extended source stamps. Set to -1 to use all CPUs.\n')
             f.write('  psfpath: {}   #Path to PSF library\n'.format(input['psfpath']))
             f.write('  psfwfe: {}   #PSF WFE value (predicted or requirements)\n'.format(self.psfwfe))
             f.write('  psfwfegroup: {}      #WFE realization group (0 to 4)\n'.format(self.psfwfegroup))
@@ -1957,6 +1970,8 @@ class SimInput:
                      '"high","medium","low" similar to what is used in the ETC\n'.format(BackgroundRate)))
             f.write(('  poissonseed: {}                  #Random number generator seed for Poisson simulation)\n'
                      .format(np.random.randint(1, 2**32-2))))
+            f.write('  poisson_workers: 1  # Number of threads used to add Poisson noise to each frame\n')
+            f.write('  group_noise_synthesis: False  # Draw noisy groups directly rather than creating each frame\n')
             f.write('  photonyield: True                         #Apply photon yield in simulation\n')
             f.write('  pymethod: True                            #Use double Poisson simulation for photon yield\n')
             f.write('  expand_catalog_for_segments: {}                     # Expand catalog for 18 segments and use distinct PSFs\n'
@@ -1988,6 +2003,7 @@ class SimInput:
                      "raw' for both\n".format(self.datatype)))
             f.write('  format: DMS          # Output file format Options: DMS, SSR(not yet implemented)\n')
             f.write('  save_intermediates: False   # Save intermediate products separately (point source image, etc)\n')
+            f.write('  profile: False   # Save the time and memory used by each step of the simulation to a JSON file\n')
             f.write('  grism_source_image: {}   # grism\n'.format(input['grism_source_image']))
             f.write('  unsigned: True   # Output unsigned integers? (0-65535 if true. -32768 to 32768 if false)\n')
             f.write('  dmsOrient: True    # Output in DMS orientation (vs. fitswriter orientation).\n')
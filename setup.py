@@ -118,10 +118,10 @@ setup(
         'jwst-backgrounds>=1.1.1',
         'lxml>=3.6.4',
         'matplotlib>=1.4.3',
-        'numpy',
+        'numpy>=1.17',
         'photutils>=0.4.0',
-        'pysiaf>=0.1.11'
-        'scipy>=0.17',
+        'pysiaf>=0.1.11',
+        'scipy>=1.4',
     ],
     include_package_data=True,
     cmdclass={
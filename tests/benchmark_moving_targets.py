@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+
+"""Benchmark the rebinning of oversampled frames in
+``MovingTarget.create``, comparing the vectorized
+``MovingTarget.resample`` with the original loop over output pixels.
+
+The default case is a trailed source crossing the whole of a 2048x2048
+detector in an integration with 100 frames, using the default 3x3
+subsampling. Each frame of the integration requires rebinning a
+6144x6144 oversampled frame. Running the loop over all of these frames
+takes hours, so the loop is timed on a strip of rows of one frame and the
+total time is extrapolated.
+
+This is not collected by pytest, since it takes a minute or more to run.
+
+Use
+---
+    ::
+
+        python benchmark_moving_targets.py
+        python benchmark_moving_targets.py --size 1024 --frames 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+from mirage.seed_image.moving_targets import MovingTarget
+from test_moving_targets import loop_resample
+
+
+def run_benchmark(size=2048, frames=100, subsample=3, loop_rows=32):
+    """Time the rebinning of the oversampled frames of an integration
+
+    Parameters
+    ----------
+    size : int
+        Size of the (square) detector, in pixels
+
+    frames : int
+        Number of frames in the integration
+
+    subsample : int
+        Subsampling factor along each axis
+
+    loop_rows : int
+        Number of output rows used to time the loop
+
+    Returns
+    -------
+    loop_seconds : float
+        Extrapolated time, in seconds, to rebin all frames with the loop
+
+    vectorized_seconds : float
+        Time, in seconds, to rebin all frames with
+        ``MovingTarget.resample``
+    """
+    mt = MovingTarget()
+    frame = np.random.random((size * subsample, size * subsample))
+
+    strip = frame[0:loop_rows * subsample, :]
+    start = time.perf_counter()
+    expected = loop_resample(strip, subsample, subsample)
+    loop_seconds = (time.perf_counter() - start) * size / loop_rows * frames
+
+    start = time.perf_counter()
+    for i in range(frames):
+        resampled = mt.resample(frame, subsample, subsample)
+    vectorized_seconds = time.perf_counter() - start
+
+    if not np.allclose(resampled[0:loop_rows, :], expected, rtol=1e-14, atol=0.):
+        raise ValueError("Vectorized and loop rebinning do not agree.")
+    return loop_seconds, vectorized_seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=2048, help='Detector size, in pixels')
+    parser.add_argument('--frames', type=int, default=100, help='Number of frames in the integration')
+    parser.add_argument('--subsample', type=int, default=3, help='Subsampling factor')
+    args = parser.parse_args()
+
+    loop_seconds, vectorized_seconds = run_benchmark(args.size, args.frames, args.subsample)
+    print("Rebinning {} frames of a {}x{} trailed source integration ({}x subsampling):"
+          .format(args.frames, args.size, args.size, args.subsample))
+    print("    Loop (extrapolated): {:.1f} s".format(loop_seconds))
+    print("    Vectorized:          {:.1f} s".format(vectorized_seconds))
+    print("    Speedup:             {:.0f}x".format(loop_seconds / vectorized_seconds))
@@ -16,12 +16,17 @@ Use
 
         pytest -s test_catalog_seed_generator.py
 """
+from astropy.io import fits
 from astropy.table import Table
 import numpy as np
 import os
 import webbpsf
 
+from .utils import gaussian_psf_library
+from mirage.psf.stamp_cache import PSFStampCache
 from mirage.seed_image import catalog_seed_image
+from mirage.seed_image.lazy_ramp import LazyRamp
+from mirage.utils import siaf_interface, utils
 
 # Determine if tests are being run on Travis
 ON_TRAVIS = 'travis' in os.path.expanduser('~')
@@ -205,3 +210,587 @@ def test_overlap_coordinates_subarray():
                                                     updated_psf_dimensions, stamp_x_loc, stamp_y_loc,
                                                     coord_sys='aperture')
         assert (i1, i2, j1, j2, k1, k2, l1, l2) == expected_k1l1[index]
+
+
+def create_niriss_seed(output_dir):
+    """Create a Catalog_seed instance set up for the NIRISS NIS_CEN
+    aperture, without reading in any reference files
+
+    Parameters
+    ----------
+    output_dir : str
+        Directory for output files
+
+    Returns
+    -------
+    seed : mirage.seed_image.catalog_seed_image.Catalog_seed
+        Catalog_seed instance
+    """
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    siaf = siaf_interface.get_instance('niriss')
+    seed.ra = 12.0
+    seed.dec = 12.0
+    seed.local_roll, seed.attitude_matrix, seed.ffsize, \
+        seed.subarray_bounds = siaf_interface.get_siaf_information(siaf, 'NIS_CEN', seed.ra, seed.dec, 0.)
+    seed.siaf = siaf['NIS_CEN']
+    seed.coord_transform = None
+    seed.output_dims = [2048, 2048]
+    seed.nominal_dims = [2048, 2048]
+    seed.frametime = 10.737
+    seed.photfnu = 1.2e-30
+    seed.photflam = 2.0e-20
+    seed.vegazeropoint = 25.0
+    seed.add_psf_wings = False
+    seed.psf_library_core_x_dim = 51
+    seed.params = {'Inst': {'instrument': 'niriss', 'mode': 'imaging'},
+                   'Readout': {'filter': 'F150W', 'pupil': 'CLEARP'},
+                   'Telescope': {'rotation': 0.},
+                   'Output': {'file': os.path.join(output_dir, 'seed_test.fits'),
+                              'grism_source_image': False},
+                   'simSignals': {'psfpath': output_dir, 'psf_batch_size': 1000, 'nproc': 1,
+                                  'catalog_spatial_index': False, 'catalog_chunk_size': 0}}
+    return seed
+
+
+def test_get_point_source_list(tmp_path):
+    """Test that the point source list and output file are constructed
+    correctly from the input catalog
+    """
+    seed = create_niriss_seed(str(tmp_path))
+
+    ra_offsets = np.array([0., 10., 40., -30., 2000.]) * 0.065 / 3600.
+    catalog = Table()
+    catalog['index'] = np.arange(1, 6)
+    catalog['x_or_RA'] = seed.ra + ra_offsets
+    catalog['y_or_Dec'] = seed.dec + ra_offsets / 2.
+    catalog['magnitude'] = [17., 18., 19., 20., 21.]
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog.meta['comments'] = ['position_RA_Dec', 'abmag']
+    catalog.write(catalog_file, format='ascii.commented_header', overwrite=True)
+
+    ptsrc = seed.get_point_source_list(catalog_file)
+
+    # The last source is off of the detector
+    assert list(ptsrc['index']) == [1, 2, 3, 4]
+    assert ptsrc['RA'].dtype == np.dtype('S14')
+    x, y = seed.RADecToXY_astrometric(catalog['x_or_RA'][1], catalog['y_or_Dec'][1])
+    assert np.isclose(ptsrc['pixelx'][1], x, atol=1e-3)
+    assert np.isclose(ptsrc['pixely'][1], y, atol=1e-3)
+    countrate = 10**((18. + 48.599934378) / -2.5) / seed.photfnu
+    assert np.isclose(ptsrc['countrate_e/s'][1], countrate, rtol=1e-6)
+    assert np.isclose(ptsrc['counts_per_frame_e'][1], countrate * seed.frametime, rtol=1e-6)
+
+    # Check the format of the output source list file
+    with open(os.path.join(str(tmp_path), 'seed_test_pointsources.list')) as list_file:
+        list_lines = list_file.readlines()
+    assert len(list_lines) == 3 + 4
+    assert list_lines[0].startswith('# Field center (degrees):')
+    ra_str, dec_str = seed.makePos(catalog['x_or_RA'][1], catalog['y_or_Dec'][1])
+    expected = "%i %s %s %14.8f %14.8f %9.3f %9.3f  %9.3f  %13.6e   %13.6e\n" % \
+        (2, ra_str, dec_str, catalog['x_or_RA'][1], catalog['y_or_Dec'][1], x, y, 18., countrate,
+         countrate * seed.frametime)
+    assert list_lines[4] == expected
+
+
+def test_find_psf_size(tmp_path):
+    """Test that the vectorized PSF size lookup matches a
+    source-by-source search of the PSF size table
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.add_psf_wings = True
+    seed.psf_wing_sizes = Table()
+    seed.psf_wing_sizes['abmag'] = [18., 12., 14., 16.]
+    seed.psf_wing_sizes['number_of_pixels'] = [101, 1001, 501, 201]
+    seed.translate_psf_table('abmag')
+
+    magnitudes = np.array([10., 12., 13.5, 14., 15., 17.9, 18., 25.])
+    countrates = utils.magnitude_to_countrate('imaging', 'abmag', list(magnitudes), photfnu=seed.photfnu)
+    sizes = seed.find_psf_size(countrates)
+    assert list(sizes) == [1001, 1001, 501, 501, 201, 101, 101, 51]
+
+    # Scalar inputs return scalar outputs
+    for countrate, size in zip(countrates, sizes):
+        assert seed.find_psf_size(countrate) == size
+
+    seed.add_psf_wings = False
+    assert list(seed.find_psf_size(countrates)) == [51] * len(countrates)
+
+
+def test_batched_point_source_image(tmp_path):
+    """Point source images made with the batched PSF renderer should
+    match those made by evaluating the PSF library source by source
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.psf_library = gaussian_psf_library()
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.params['Inst']['mode'] = 'imaging'
+    seed.params['simSignals']['bkgdrate'] = 0.
+    seed.params['simSignals']['psf_batch_size'] = 3
+
+    sources = Table()
+    sources['index'] = np.arange(1, 8)
+    sources['pixelx'] = [10.2, 500.7, 1023.5, 2040.9, -3.3, 1500.1, 700.45]
+    sources['pixely'] = [15.6, 300.1, 1023.5, 5.5, 1000.2, 2045.8, 1800.55]
+    sources['countrate_e/s'] = [100., 2000., 5., 300., 1000., 50., 10000.]
+
+    batched_image, batched_segmap = seed.make_point_source_image(sources)
+
+    seed.params['simSignals']['psf_batch_size'] = 0
+    image, segmentation = seed.make_point_source_image(sources)
+
+    assert np.allclose(batched_image, image, rtol=1e-10, atol=1e-12)
+    assert np.all(batched_segmap.segmap == segmentation.segmap)
+    assert np.sum(image) > 0.
+
+
+def test_parallel_point_source_image(tmp_path):
+    """Point source images rendered in parallel tiles should be identical
+    to those rendered serially
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.psf_library = gaussian_psf_library()
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.params['simSignals']['bkgdrate'] = 0.
+    seed.params['simSignals']['psf_batch_size'] = 50
+
+    np.random.seed(42)
+    num_sources = 300
+    sources = Table()
+    sources['index'] = np.arange(1, num_sources + 1)
+    sources['pixelx'] = np.random.uniform(-10, 2058, num_sources)
+    sources['pixely'] = np.random.uniform(-10, 2058, num_sources)
+    sources['countrate_e/s'] = 10**np.random.uniform(0, 5, num_sources)
+
+    seed.params['simSignals']['nproc'] = 1
+    image, segmentation = seed.make_point_source_image(sources)
+
+    seed.params['simSignals']['nproc'] = 3
+    parallel_image, parallel_segmap = seed.make_point_source_image(sources)
+
+    assert np.array_equal(parallel_image, image)
+    assert np.array_equal(parallel_segmap.segmap, segmentation.segmap)
+
+
+def test_parallel_point_source_image_with_stamp_cache(tmp_path):
+    """Point source images rendered in parallel tiles using the PSF stamp
+    cache should be identical to those rendered serially
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.psf_library = gaussian_psf_library()
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.params['simSignals']['bkgdrate'] = 0.
+
+    np.random.seed(43)
+    num_sources = 300
+    sources = Table()
+    sources['index'] = np.arange(1, num_sources + 1)
+    sources['pixelx'] = np.random.uniform(-10, 2058, num_sources)
+    sources['pixely'] = np.random.uniform(-10, 2058, num_sources)
+    sources['countrate_e/s'] = 10**np.random.uniform(0, 5, num_sources)
+
+    seed.psf_stamp_cache = PSFStampCache(subpixel_step=0.25)
+    seed.params['simSignals']['nproc'] = 1
+    image, segmentation = seed.make_point_source_image(sources)
+    assert seed.psf_stamp_cache.hits > 0
+    num_lookups = seed.psf_stamp_cache.hits + seed.psf_stamp_cache.misses
+
+    seed.psf_stamp_cache = PSFStampCache(subpixel_step=0.25)
+    seed.params['simSignals']['nproc'] = 3
+    parallel_image, parallel_segmap = seed.make_point_source_image(sources)
+
+    # Cache usage in the worker processes is added to the parent's cache.
+    # Sources straddling tile boundaries are looked up once per tile.
+    assert seed.psf_stamp_cache.hits > 0
+    assert seed.psf_stamp_cache.hits + seed.psf_stamp_cache.misses >= num_lookups
+
+    assert np.array_equal(parallel_image, image)
+    assert np.array_equal(parallel_segmap.segmap, segmentation.segmap)
+
+
+def test_segment_point_source_list(tmp_path):
+    """The single-pass segment point source list should match the lists
+    created separately for each segment, and segment images rendered in a
+    single pass should match the sum of the per-segment images
+    """
+    seed = create_niriss_seed(str(tmp_path))
+
+    ra_offsets = np.array([0., 10., 40., -30., 2000.]) * 0.065 / 3600.
+    catalog = Table()
+    catalog['index'] = np.arange(1, 6)
+    catalog['x_or_RA'] = seed.ra + ra_offsets
+    catalog['y_or_Dec'] = seed.dec + ra_offsets / 2.
+    catalog['magnitude'] = [17., 18., 19., 20., 21.]
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog.meta['comments'] = ['position_RA_Dec', 'abmag']
+    catalog.write(catalog_file, format='ascii.commented_header', overwrite=True)
+
+    segment_offsets = np.array([[0., 0.], [1.5, -2.], [-10., 4.]])
+    ptsrc = seed.get_segment_point_source_list(catalog_file, segment_offsets)
+    assert list(ptsrc['segment']) == [1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3]
+
+    # The catalog is read once, so all segments share the catalog's index
+    # numbers, rather than each segment being numbered after the previous one
+    assert list(ptsrc['index']) == [1, 2, 3, 4, 1, 2, 3, 4, 1, 2, 3, 4]
+    assert seed.maxindex == 5
+
+    for i_segment, offset in enumerate(segment_offsets, start=1):
+        # Compare against each segment read on its own, with the index
+        # numbers starting from the catalog's
+        seed.maxindex = 0
+        single = seed.get_point_source_list(catalog_file, segment_offset=offset)
+        expanded = ptsrc[ptsrc['segment'] == i_segment]
+        assert np.array_equal(expanded['index'], single['index'])
+        assert np.allclose(expanded['pixelx'], single['pixelx'], atol=1e-6)
+        assert np.allclose(expanded['pixely'], single['pixely'], atol=1e-6)
+        assert np.allclose(expanded['countrate_e/s'], single['countrate_e/s'])
+
+    # Render with a different library for each segment
+    seed.psf_library = [gaussian_psf_library(), gaussian_psf_library(oversample=3), gaussian_psf_library()]
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.params['simSignals']['bkgdrate'] = 0.
+    image, segmentation = seed.make_point_source_image(ptsrc)
+
+    summed = np.zeros(seed.output_dims)
+    for i_segment in range(1, 4):
+        segment_image, segment_map = seed.make_point_source_image(ptsrc[ptsrc['segment'] == i_segment],
+                                                                  segment_number=i_segment)
+        summed += segment_image
+    assert np.allclose(image, summed, rtol=1e-12, atol=1e-12)
+
+    seed.params['simSignals']['nproc'] = 2
+    parallel_image, parallel_segmap = seed.make_point_source_image(ptsrc)
+    assert np.array_equal(parallel_image, image)
+    assert np.array_equal(parallel_segmap.segmap, segmentation.segmap)
+
+
+def test_point_source_list_spatial_index(tmp_path):
+    """Point source lists created using the catalog spatial index should
+    match those created from the full catalog
+    """
+    seed = create_niriss_seed(str(tmp_path))
+
+    np.random.seed(3)
+    num_sources = 500
+    catalog = Table()
+    catalog['x_or_RA'] = seed.ra + np.random.uniform(-0.5, 0.5, num_sources)
+    catalog['y_or_Dec'] = seed.dec + np.random.uniform(-0.5, 0.5, num_sources)
+    catalog['magnitude'] = np.random.uniform(15., 25., num_sources)
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog.meta['comments'] = ['position_RA_Dec', 'abmag']
+    catalog.write(catalog_file, format='ascii.commented_header', overwrite=True)
+
+    full = seed.get_point_source_list(catalog_file)
+
+    seed.maxindex = 0
+    seed.params['simSignals']['catalog_spatial_index'] = True
+    indexed = seed.get_point_source_list(catalog_file)
+
+    assert len(full) > 0
+    assert list(indexed['index']) == list(full['index'])
+    assert np.allclose(indexed['pixelx'], full['pixelx'])
+    assert np.allclose(indexed['countrate_e/s'], full['countrate_e/s'])
+
+
+def test_point_source_list_chunked_reader(tmp_path):
+    """Point source lists created from a catalog read in chunks should
+    match those created from the full catalog
+    """
+    seed = create_niriss_seed(str(tmp_path))
+
+    np.random.seed(4)
+    num_sources = 500
+    catalog = Table()
+    catalog['x_or_RA'] = seed.ra + np.random.uniform(-0.15, 0.15, num_sources)
+    catalog['y_or_Dec'] = seed.dec + np.random.uniform(-0.15, 0.15, num_sources)
+    catalog['magnitude'] = np.random.uniform(15., 25., num_sources)
+    catalog['nircam_f200w_magnitude'] = np.random.uniform(15., 25., num_sources)
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog.meta['comments'] = ['position_RA_Dec', 'abmag']
+    catalog.write(catalog_file, format='ascii', overwrite=True)
+
+    full = seed.get_point_source_list(catalog_file)
+
+    seed.maxindex = 0
+    seed.params['simSignals']['catalog_chunk_size'] = 37
+    chunked_catalog = seed.read_source_catalog(catalog_file)
+    chunked = seed.get_point_source_list(catalog_file)
+
+    assert 'nircam_f200w_magnitude' not in chunked_catalog.colnames
+    assert chunked_catalog.meta['comments'] == ['position_RA_Dec', 'abmag']
+    assert len(chunked_catalog) < num_sources
+    assert len(full) > 0
+    assert list(chunked['index']) == list(full['index'])
+    assert np.allclose(chunked['pixelx'], full['pixelx'])
+    assert np.allclose(chunked['countrate_e/s'], full['countrate_e/s'])
+
+
+def test_batched_extended_source_convolution(tmp_path):
+    """Extended source images convolved with the PSF in batches should
+    match those convolved one stamp at a time
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.psf_library = gaussian_psf_library()
+    seed.psf_library_oversamp = 2
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.single_ron = 6.
+    seed.params['simSignals'].update({'bkgdrate': 0., 'PSFConvolveExtended': True,
+                                      'gridded_psf_library_row_padding': 4})
+
+    np.random.seed(7)
+    num_sources = 20
+    sources = Table()
+    sources['index'] = np.arange(1, num_sources + 1)
+    sources['pixelx'] = np.random.uniform(-5, 2053, num_sources)
+    sources['pixely'] = np.random.uniform(-5, 2053, num_sources)
+    sources['countrate_e/s'] = 10**np.random.uniform(2, 4, num_sources)
+    stamps = [np.random.random((np.random.randint(5, 20), np.random.randint(5, 20))) for i in range(num_sources)]
+
+    image, segmap = seed.make_extended_source_image(sources, [stamp.copy() for stamp in stamps])
+
+    seed.stamp_convolver = catalog_seed_image.StampConvolver(batch_size=3)
+    batched_image, batched_segmap = seed.make_extended_source_image(sources, [stamp.copy() for stamp in stamps])
+
+    assert np.allclose(batched_image, image, rtol=1e-10, atol=1e-12)
+    assert np.array_equal(batched_segmap, segmap)
+    assert np.sum(image) > 0.
+
+
+def galaxy_catalog(seed, catalog_file, num_sources, pixel_positions=False):
+    """Write a catalog of random galaxies near the center of the aperture
+
+    Parameters
+    ----------
+    seed : mirage.seed_image.catalog_seed_image.Catalog_seed
+        Catalog_seed instance, giving the pointing
+
+    catalog_file : str
+        Name of the catalog file to create
+
+    num_sources : int
+        Number of galaxies
+
+    pixel_positions : bool
+        If True, positions and radii are given in pixels, and velocities
+        in pixels/hour are added
+    """
+    catalog = Table()
+    if pixel_positions:
+        catalog['x_or_RA'] = np.random.uniform(0, 2048, num_sources)
+        catalog['y_or_Dec'] = np.random.uniform(0, 2048, num_sources)
+        catalog['radius'] = np.random.uniform(1., 3., num_sources)
+        catalog.meta['comments'] = ['position_pixels', 'radius_pixels', 'velocity_pixels', 'abmag']
+    else:
+        catalog['x_or_RA'] = seed.ra + np.random.uniform(-0.02, 0.02, num_sources)
+        catalog['y_or_Dec'] = seed.dec + np.random.uniform(-0.02, 0.02, num_sources)
+        catalog['radius'] = np.random.uniform(0.05, 0.5, num_sources)
+        catalog.meta['comments'] = ['position_RA_Dec', 'radius_arcsec', 'abmag']
+    catalog['ellipticity'] = np.random.uniform(0., 0.7, num_sources)
+    catalog['pos_angle'] = np.random.uniform(0., 360., num_sources)
+    catalog['sersic_index'] = np.random.uniform(0.5, 4., num_sources)
+    catalog['magnitude'] = np.random.uniform(18., 24., num_sources)
+    if pixel_positions:
+        catalog['x_or_RA_velocity'] = np.random.uniform(-200., 200., num_sources)
+        catalog['y_or_Dec_velocity'] = np.random.uniform(-200., 200., num_sources)
+    catalog.write(catalog_file, format='ascii', overwrite=True)
+
+
+def test_parallel_galaxy_image(tmp_path):
+    """Galaxy images rendered in chunks by worker processes should be
+    identical to those rendered serially
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.psf_library = gaussian_psf_library()
+    seed.psf_library_oversamp = 2
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.basename = os.path.join(str(tmp_path), 'seed_test')
+    seed.params['Readout']['array_name'] = 'NIS_CEN'
+    seed.params['simSignals'].update({'bkgdrate': 0., 'gridded_psf_library_row_padding': 4})
+
+    np.random.seed(8)
+    catalog_file = os.path.join(str(tmp_path), 'galaxies.cat')
+    galaxy_catalog(seed, catalog_file, 40)
+
+    image, segmentation = seed.make_galaxy_image(catalog_file)
+
+    seed.maxindex = 0
+    seed.params['simSignals']['nproc'] = 3
+    parallel_image, parallel_segmap = seed.make_galaxy_image(catalog_file)
+
+    assert np.sum(image) > 0.
+    assert np.array_equal(parallel_image, image)
+    assert np.array_equal(parallel_segmap, segmentation)
+
+
+def test_parallel_moving_galaxies(tmp_path):
+    """Moving galaxies rendered in chunks by worker processes should be
+    identical to those rendered serially
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.psf_library = gaussian_psf_library()
+    seed.psf_library_oversamp = 2
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.coord_adjust = {'x': 1., 'y': 1., 'xoffset': 0, 'yoffset': 0}
+    seed.params['Readout'].update({'nint': 2, 'ngroup': 2, 'nframe': 1, 'nskip': 0, 'resets_bet_ints': 1})
+    seed.params['simSignals'].update({'bkgdrate': 0., 'gridded_psf_library_row_padding': 4})
+
+    np.random.seed(9)
+    catalog_file = os.path.join(str(tmp_path), 'moving_galaxies.cat')
+    galaxy_catalog(seed, catalog_file, 4, pixel_positions=True)
+
+    image, segmentation = seed.movingTargetInputs(catalog_file, 'galaxies')
+
+    seed.maxindex = 0
+    seed.params['simSignals']['nproc'] = 2
+    parallel_image, parallel_segmap = seed.movingTargetInputs(catalog_file, 'galaxies')
+
+    assert np.sum(image) > 0.
+    assert np.array_equal(parallel_image, image)
+    assert np.array_equal(parallel_segmap, segmentation)
+
+
+def test_lazy_moving_targets(tmp_path):
+    """Moving targets added to a lazy exposure should match those added to
+    a full array, including when saved to a seed image file
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.psf_library = gaussian_psf_library()
+    seed.psf_library_oversamp = 2
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.coord_adjust = {'x': 1., 'y': 1., 'xoffset': 0, 'yoffset': 0}
+    seed.params['Readout'].update({'nint': 2, 'ngroup': 2, 'nframe': 1, 'nskip': 0, 'resets_bet_ints': 1})
+    seed.params['simSignals'].update({'bkgdrate': 0., 'gridded_psf_library_row_padding': 4})
+
+    np.random.seed(9)
+    catalog_file = os.path.join(str(tmp_path), 'moving_galaxies.cat')
+    galaxy_catalog(seed, catalog_file, 4, pixel_positions=True)
+
+    image, segmentation = seed.movingTargetInputs(catalog_file, 'galaxies')
+
+    seed.maxindex = 0
+    lazy_image, lazy_segmap = seed.movingTargetInputs(catalog_file, 'galaxies', lazy=True)
+    assert isinstance(lazy_image, LazyRamp)
+    assert len(lazy_image.subarrays) > 0
+    assert np.allclose(np.asarray(lazy_image), image, rtol=1e-14, atol=0.)
+    assert np.array_equal(lazy_segmap, segmentation)
+
+    seed_file = os.path.join(str(tmp_path), 'lazy_seed.fits')
+    seed.saveSingleFits(lazy_image, seed_file, key_dict={'units': 'ADU', 'PTSRCCAT': None},
+                        image2=lazy_segmap, image2type='SEGMAP')
+    with fits.open(seed_file) as hdulist:
+        assert hdulist[0].header['UNITS'] == 'ADU'
+        assert hdulist[1].header['UNITS'] == 'ADU'
+        assert np.allclose(hdulist[1].data, image, rtol=1e-14, atol=0.)
+        assert np.array_equal(hdulist['SEGMAP'].data, segmentation)
+
+
+def test_lazy_trailed_ramp(tmp_path):
+    """When tracking a non-sidereal target, the trailed sources should be
+    added to a lazy exposure, matching the full array"""
+    seed = create_niriss_seed(str(tmp_path))
+    seed.psf_library = gaussian_psf_library()
+    seed.psf_library_oversamp = 2
+    seed.psf_library_core_x_dim = 21
+    seed.psf_library_core_y_dim = 21
+    seed.coord_adjust = {'x': 1., 'y': 1., 'xoffset': 0, 'yoffset': 0}
+    seed.params['Readout'].update({'nint': 2, 'ngroup': 2, 'nframe': 1, 'nskip': 0, 'resets_bet_ints': 1})
+    seed.params['simSignals'].update({'bkgdrate': 0., 'gridded_psf_library_row_padding': 4})
+
+    np.random.seed(9)
+    catalog_file = os.path.join(str(tmp_path), 'moving_galaxies.cat')
+    galaxy_catalog(seed, catalog_file, 4, pixel_positions=True)
+    image, segmentation = seed.movingTargetInputs(catalog_file, 'galaxies', MT_tracking=True,
+                                                  tracking_ra_vel=0., tracking_dec_vel=0.)
+
+    seed.maxindex = 0
+    seed.params['Telescope']['tracking'] = 'non-sidereal'
+    seed.params['simSignals']['movingTargetSersic'] = catalog_file
+    seed.runStep = {'movingTargets': False, 'movingTargetsSersic': True, 'movingTargetsExtended': False}
+    seed.ra_vel = 0.
+    seed.dec_vel = 0.
+    seed.pam = np.ones(image.shape[-2:])
+    trailed_ramp, trailed_segmap = seed.make_trailed_ramp()
+    assert isinstance(trailed_ramp, LazyRamp)
+    assert len(trailed_ramp.dense) == 0
+    assert np.allclose(np.asarray(trailed_ramp), image, rtol=1e-14, atol=0.)
+    assert np.array_equal(trailed_segmap, segmentation)
+
+    stationary = LazyRamp(np.zeros(image.shape[-2:]), trailed_ramp.frame_times, nint=2)
+    combined = seed.combineSimulatedDataSources('ramp', stationary, trailed_ramp)
+    assert isinstance(combined, LazyRamp)
+    assert len(combined.dense) == 0
+
+
+def test_frame_positions(tmp_path):
+    """Positions of moving sources in all frames, calculated in a single
+    transform, should match those calculated one frame at a time
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    frame_times = seed.frametime * np.arange(-1, 30)
+    ra = np.array([12.0, 12.005, 11.998])
+    dec = np.array([12.0, 11.997, 12.004])
+    ra_velocity = np.array([20., -35., 0.])
+    dec_velocity = np.array([-10., 5., 60.])
+    pixelx, pixely = seed.RADecToXY_astrometric(ra, dec)
+
+    x_frames, y_frames = seed.frame_positions(pixelx, pixely, ra, dec, ra_velocity, dec_velocity,
+                                              frame_times, False)
+    assert x_frames.shape == (3, 31)
+    for i in range(3):
+        ra_frames = ra[i] + (ra_velocity[i] / 3600. / 3600.) * frame_times
+        dec_frames = dec[i] + (dec_velocity[i] / 3600. / 3600.) * frame_times
+        for j, (in_ra, in_dec) in enumerate(zip(ra_frames, dec_frames)):
+            px, py, pra, pdec, pra_str, pdec_str = seed.get_positions(in_ra, in_dec, False, 4096)
+            assert np.isclose(x_frames[i, j], px, rtol=0., atol=1e-9)
+            assert np.isclose(y_frames[i, j], py, rtol=0., atol=1e-9)
+
+    # Velocities in pixels/hour
+    x_frames, y_frames = seed.frame_positions(pixelx, pixely, ra, dec, ra_velocity, dec_velocity,
+                                              frame_times, True)
+    assert np.allclose(x_frames[1], pixelx[1] + ra_velocity[1] / 3600. * frame_times)
+    assert np.allclose(y_frames[2], pixely[2] + dec_velocity[2] / 3600. * frame_times)
+
+
+def test_extended_source_list_shares_stamps(tmp_path):
+    """Extended sources using the same stamp file should share a single
+    normalized, read-only stamp, and the extended source image should be
+    unaffected by the sharing
+    """
+    seed = create_niriss_seed(str(tmp_path))
+    seed.coord_adjust = {'x': 1., 'y': 1., 'xoffset': 0, 'yoffset': 0}
+    seed.params['simSignals'].update({'bkgdrate': 0., 'PSFConvolveExtended': False, 'extendedscale': 1.})
+
+    stamp_files = []
+    for i, width in enumerate([3., 5.]):
+        yy, xx = np.mgrid[0:15, 0:15]
+        data = np.exp(-0.5 * ((xx - 7.)**2 + (yy - 7.)**2) / width**2)
+        stamp_files.append(os.path.join(str(tmp_path), 'stamp{}.fits'.format(i)))
+        fits.PrimaryHDU(data).writeto(stamp_files[-1], overwrite=True)
+
+    catalog = Table()
+    catalog['x_or_RA'] = [100., 500., 900., 1300.]
+    catalog['y_or_Dec'] = [200., 600., 1000., 1400.]
+    catalog['filename'] = [stamp_files[0], stamp_files[1], stamp_files[0], stamp_files[0]]
+    catalog['magnitude'] = [18., 19., 20., 21.]
+    catalog.meta['comments'] = ['position_pixels', 'abmag']
+    catalog_file = os.path.join(str(tmp_path), 'extended.cat')
+    catalog.write(catalog_file, format='ascii', overwrite=True)
+
+    sources, stamps = seed.getExtendedSourceList(catalog_file)
+    assert len(stamps) == 4
+    assert stamps[0] is stamps[2] and stamps[0] is stamps[3]
+    assert not stamps[0].flags.writeable
+    assert np.isclose(np.sum(stamps[1]), 1.)
+    assert len(seed.extended_stamp_store.images) == 2
+
+    image, segmentation = seed.make_extended_source_image(sources, stamps)
+    assert np.isclose(np.sum(image), np.sum(sources['countrate_e/s']))
+    assert np.isclose(np.sum(image[190:211, 90:111]), sources['countrate_e/s'][0])
+    seed.extended_stamp_store.close()
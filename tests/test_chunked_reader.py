@@ -0,0 +1,98 @@
+"""Test the reader returning the rows of a source catalog in chunks
+
+Use
+---
+    >>> pytest test_chunked_reader.py
+"""
+import os
+
+from astropy.io import ascii
+from astropy.table import Table, vstack
+import numpy as np
+import pytest
+
+from mirage.catalogs import chunked_reader
+from mirage.seed_image import catalog_seed_image
+
+
+def write_catalog(filename, num_sources=103, output_format='ascii.commented_header', index_column=False):
+    """Write a point source catalog with randomly located sources"""
+    np.random.seed(5)
+    catalog = Table()
+    if index_column:
+        catalog['index'] = np.arange(10, num_sources + 10)
+    catalog['x_or_RA'] = np.random.uniform(0., 2048., num_sources)
+    catalog['y_or_Dec'] = np.random.uniform(0., 2048., num_sources)
+    catalog['magnitude'] = np.random.uniform(15., 25., num_sources)
+    catalog.meta['comments'] = ['position_pixels', 'vegamag']
+    catalog.write(filename, format=output_format, overwrite=True)
+    return catalog
+
+
+@pytest.mark.parametrize('output_format', ['ascii.commented_header', 'ascii', 'ascii.csv'])
+def test_chunks_match_full_catalog(tmp_path, output_format):
+    """Combining the chunks should give back the full catalog"""
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog = write_catalog(catalog_file, output_format=output_format)
+
+    chunks = list(chunked_reader.iter_catalog_chunks(catalog_file, 10))
+    assert len(chunks) == 11
+    assert all(len(chunk) <= 11 for chunk in chunks)
+
+    combined = vstack(chunks, metadata_conflicts='silent')
+    assert list(combined['index']) == list(range(1, len(catalog) + 1))
+    assert np.allclose(combined['x_or_RA'], catalog['x_or_RA'])
+    assert np.allclose(combined['magnitude'], catalog['magnitude'])
+    if output_format != 'ascii.csv':
+        assert all(chunk.meta['comments'] == ascii.read(catalog_file).meta['comments'] for chunk in chunks)
+
+
+def test_existing_index_column(tmp_path):
+    """An index column in the catalog should be kept"""
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog = write_catalog(catalog_file, index_column=True)
+    combined = vstack(list(chunked_reader.iter_catalog_chunks(catalog_file, 50)))
+    assert combined.colnames == catalog.colnames
+    assert list(combined['index']) == list(catalog['index'])
+
+
+def test_empty_field(tmp_path):
+    """Reading a catalog with no sources near the aperture in chunks should
+    give an empty catalog and no index numbers"""
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog = write_catalog(catalog_file)
+    catalog['x_or_RA'] += 1.e5
+    catalog.write(catalog_file, format='ascii.commented_header', overwrite=True)
+
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    seed.params = {'Inst': {'instrument': 'NIRCam'}, 'Readout': {'filter': 'F200W', 'pupil': 'CLEAR'}}
+    seed.output_dims = (2048, 2048)
+    seed.maxindex = 0
+    kept = seed.read_catalog_in_chunks(catalog_file, 10)
+    assert len(kept) == 0
+    assert len(seed.get_index_numbers(kept)) == 0
+
+
+@pytest.mark.parametrize('index_column', [False, True])
+def test_index_numbers_match_full_catalog(tmp_path, index_column):
+    """Sources kept when reading in chunks should get the same index
+    numbers as when reading the full catalog"""
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog = write_catalog(catalog_file, index_column=index_column)
+    catalog['x_or_RA'][0:60] += 1.e5
+    catalog.write(catalog_file, format='ascii.commented_header', overwrite=True)
+
+    full_seed = catalog_seed_image.Catalog_seed(offline=True)
+    full_seed.maxindex = 50
+    full = ascii.read(catalog_file)
+    full_indexes = np.array(full_seed.get_index_numbers(full))
+
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    seed.params = {'Inst': {'instrument': 'NIRCam'}, 'Readout': {'filter': 'F200W', 'pupil': 'CLEAR'}}
+    seed.output_dims = (2048, 2048)
+    seed.maxindex = 50
+    kept = seed.read_catalog_in_chunks(catalog_file, 10)
+    indexes = seed.get_index_numbers(kept)
+    assert len(kept) == len(catalog) - 60
+    assert list(indexes) == list(full_indexes[60:])
+    assert seed.maxindex == full_seed.maxindex
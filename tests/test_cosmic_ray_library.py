@@ -0,0 +1,86 @@
+"""Test the process-wide cache of the cosmic ray library, which memory
+maps converted copies of the library files
+
+Use
+---
+    >>> pytest test_cosmic_ray_library.py
+"""
+import os
+import time
+
+from astropy.io import fits
+import numpy as np
+
+from mirage.ramp_generator.cosmic_ray_library import CosmicRayLibraryCache
+
+
+def create_library(directory, value=1.):
+    """Write a small fake cosmic ray library with big-endian data, as
+    read from fits files"""
+    crfile = os.path.join(directory, 'CRs_MCD1.7_SUNMIN')
+    for i in range(10):
+        stamps = (np.arange(5 * 21 * 21, dtype='>f4').reshape(5, 21, 21) + i) * value
+        hdulist = fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(stamps)])
+        hdulist[0].header['FILENUM'] = i
+        hdulist.writeto('{}_{:02d}_IPC_NIRCam_B5.fits'.format(crfile, i), overwrite=True)
+    return crfile
+
+
+def test_memmap_library(tmp_path):
+    """Converted files must be memory mapped read-only, match the fits
+    files, and be reused by later exposures and other caches"""
+    crfile = create_library(str(tmp_path))
+    cache = CosmicRayLibraryCache()
+    images, headers = cache.get(crfile, 'IPC_NIRCam_B5')
+    assert len(images) == 10
+    assert cache.conversions == 10
+    for i, (image, header) in enumerate(zip(images, headers)):
+        assert isinstance(image, np.memmap)
+        assert not image.flags.writeable
+        assert image.dtype.isnative
+        assert np.array_equal(image, (np.arange(5 * 21 * 21).reshape(5, 21, 21) + i))
+        assert header['FILENUM'] == i
+        assert os.path.isfile('{}_{:02d}_IPC_NIRCam_B5.npy'.format(crfile, i))
+
+    # A second exposure in the same process uses the cache
+    again, again_headers = cache.get(crfile, 'IPC_NIRCam_B5')
+    assert again is images
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Another process maps the converted files without converting them
+    other_process = CosmicRayLibraryCache()
+    other_images, other_headers = other_process.get(crfile, 'IPC_NIRCam_B5')
+    assert other_process.conversions == 0
+    assert np.array_equal(other_images[3], images[3])
+
+
+def test_updated_library(tmp_path):
+    """Converted files older than their fits files must be recreated"""
+    crfile = create_library(str(tmp_path))
+    CosmicRayLibraryCache().get(crfile, 'IPC_NIRCam_B5')
+    create_library(str(tmp_path), value=2.)
+    now = time.time() + 10.
+    for i in range(10):
+        os.utime('{}_{:02d}_IPC_NIRCam_B5.fits'.format(crfile, i), (now, now))
+
+    cache = CosmicRayLibraryCache()
+    images, headers = cache.get(crfile, 'IPC_NIRCam_B5')
+    assert cache.conversions == 10
+    assert np.array_equal(images[0], np.arange(5 * 21 * 21).reshape(5, 21, 21) * 2.)
+
+
+def test_unwritable_directory(tmp_path):
+    """If the converted files cannot be written, the fits files must be
+    read into memory instead"""
+    crfile = create_library(str(tmp_path))
+    blocked = os.path.join(str(tmp_path), 'blocked')
+    with open(blocked, 'w') as blocked_file:
+        blocked_file.write('Not a directory')
+
+    cache = CosmicRayLibraryCache()
+    images, headers = cache.get(crfile, 'IPC_NIRCam_B5', memmap_dir=blocked)
+    assert cache.conversions == 0
+    assert not isinstance(images[0], np.memmap)
+    assert not images[0].flags.writeable
+    assert np.array_equal(images[1], np.arange(5 * 21 * 21).reshape(5, 21, 21) + 1)
+    assert not any(name.endswith('.tmp') for name in os.listdir(str(tmp_path)))
@@ -0,0 +1,84 @@
+"""Test the addition of cosmic rays from the cosmic ray library to a
+frame
+
+Use
+---
+    >>> pytest test_cosmic_rays.py
+"""
+import numpy as np
+
+from mirage.ramp_generator.cosmic_rays import add_cosmic_rays
+
+
+def create_library():
+    """Create a small cosmic ray library with random stamps"""
+    np.random.seed(3)
+    return [np.random.random((1000, 21, 21)).astype(np.float32) * 100. for i in range(10)]
+
+
+def loop_cosmic_rays(image, library, gain, ncr, seed):
+    """Add cosmic rays one at a time, drawing the same hits as
+    add_cosmic_rays. Return the frame and the maximum signal of each
+    clipped stamp."""
+    ydim, xdim = image.shape
+    max_signal = []
+    draws = np.random.default_rng(seed).random((ncr, 4))
+    for y_draw, x_draw, n_draw, m_draw in draws:
+        j = int(y_draw * ydim)
+        k = int(x_draw * xdim)
+        n = int(n_draw * 10)
+        m = int(m_draw * 1000)
+        i1, i2 = max(j - 10, 0), min(j + 11, ydim)
+        j1, j2 = max(k - 10, 0), min(k + 11, xdim)
+        k1, k2 = 10 - (j - i1), 10 + (i2 - j)
+        l1, l2 = 10 - (k - j1), 10 + (j2 - k)
+        image[i1:i2, j1:j2] += library[n][m, k1:k2, l1:l2] / gain[i1:i2, j1:j2]
+        max_signal.append(np.max(library[n][m, k1:k2, l1:l2]))
+    return image, max_signal
+
+
+def test_matches_loop():
+    """Vectorized insertion must match inserting each stamp in turn,
+    including stamps overlapping each other and the edges of the frame"""
+    library = create_library()
+    gain = np.random.random((40, 50)) + 1.5
+    image, hits = add_cosmic_rays(np.zeros((40, 50)), library, gain, 60, seed=1234)
+    expected, max_signal = loop_cosmic_rays(np.zeros((40, 50)), library, gain, 60, 1234)
+    assert np.allclose(image, expected, rtol=1e-12, atol=0.)
+    assert np.array_equal(hits['max_signal'], max_signal)
+    assert len(hits['x']) == 60
+
+    # The same seed gives the same cosmic rays
+    again, again_hits = add_cosmic_rays(np.zeros((40, 50)), library, gain, 60, seed=1234)
+    other, other_hits = add_cosmic_rays(np.zeros((40, 50)), library, gain, 60, seed=1235)
+    assert np.array_equal(image, again)
+    assert not np.array_equal(image, other)
+
+
+def test_small_frame():
+    """Stamps must be clipped correctly in frames smaller than the stamps"""
+    library = create_library()
+    gain = np.random.random((8, 12)) + 1.5
+    image, hits = add_cosmic_rays(np.zeros((8, 12)), library, gain, 5, seed=77)
+    expected, max_signal = loop_cosmic_rays(np.zeros((8, 12)), library, gain, 5, 77)
+    assert np.allclose(image, expected, rtol=1e-12, atol=0.)
+    assert np.array_equal(hits['max_signal'], max_signal)
+
+
+def test_no_hits():
+    """Frames with no cosmic rays must be unchanged"""
+    image = np.ones((10, 10))
+    image, hits = add_cosmic_rays(image, create_library(), 2., 0, seed=5)
+    assert np.array_equal(image, np.ones((10, 10)))
+    assert len(hits['max_signal']) == 0
+
+
+def test_batches():
+    """Cosmic rays added in batches must match those added at once"""
+    library = create_library()
+    gain = np.random.random((40, 50)) + 1.5
+    image, hits = add_cosmic_rays(np.zeros((40, 50)), library, gain, 60, seed=99)
+    batched, batched_hits = add_cosmic_rays(np.zeros((40, 50)), library, gain, 60, seed=99, batch_size=7)
+    assert np.allclose(batched, image, rtol=1e-12, atol=0.)
+    for key in hits:
+        assert np.array_equal(batched_hits[key], hits[key])
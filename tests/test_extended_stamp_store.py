@@ -0,0 +1,92 @@
+"""Test the store of extended source stamp images
+
+Use
+---
+    >>> pytest test_extended_stamp_store.py
+"""
+import os
+
+from astropy.io import fits
+import numpy as np
+import pytest
+
+from mirage.seed_image.extended_stamp_store import ExtendedStampStore
+
+
+def write_stamp(filename, data, in_extension=False):
+    """Save a stamp image to a fits file, either in the primary extension
+    or in extension 1"""
+    if in_extension:
+        hdulist = fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(data)])
+    else:
+        hdulist = fits.HDUList([fits.PrimaryHDU(data)])
+    hdulist.writeto(filename, overwrite=True)
+
+
+def test_images_are_shared_and_read_only(tmp_path):
+    """Each file should be read once, and the same read-only array returned
+    for every request"""
+    data = np.arange(35, dtype=np.float64).reshape(5, 7)
+    primary_file = os.path.join(str(tmp_path), 'primary.fits')
+    extension_file = os.path.join(str(tmp_path), 'extension.fits')
+    write_stamp(primary_file, data)
+    write_stamp(extension_file, data * 2., in_extension=True)
+
+    store = ExtendedStampStore()
+    image, header = store.get_image(primary_file)
+    assert np.array_equal(image, data)
+    assert not image.flags.writeable
+    with pytest.raises(ValueError):
+        image[0, 0] = 1.
+
+    again, header = store.get_image(os.path.join(str(tmp_path), '.', 'primary.fits'))
+    assert again is image
+    assert store.hits == 1
+
+    image, header = store.get_image(extension_file)
+    assert np.array_equal(image, data * 2.)
+    assert len(store.images) == 2
+    store.close()
+
+
+def test_normalized_stamps(tmp_path):
+    """Normalized stamps should be cached for each file and angle"""
+    data = np.zeros((9, 9))
+    data[4, 2:7] = [1., 2., 4., 2., 1.]
+    stamp_file = os.path.join(str(tmp_path), 'stamp.fits')
+    write_stamp(stamp_file, data)
+
+    store = ExtendedStampStore()
+    normalized, total = store.get_normalized(stamp_file)
+    assert total == 10.
+    assert np.allclose(normalized, data / 10.)
+    assert not normalized.flags.writeable
+    assert store.get_normalized(stamp_file)[0] is normalized
+
+    rotated, rotated_total = store.get_normalized(stamp_file, angle=90.)
+    assert np.isclose(rotated_total, 10.)
+    assert np.allclose(rotated, data.T / 10.)
+    assert len(store.normalized) == 2
+    assert store.hits == 1
+    store.close()
+
+
+def test_open_file_limit(tmp_path):
+    """Only the most recently used files should be kept open, with closed
+    files opened again when needed"""
+    filenames = []
+    for i in range(5):
+        filenames.append(os.path.join(str(tmp_path), 'stamp_{}.fits'.format(i)))
+        write_stamp(filenames[-1], np.full((4, 4), i + 1.))
+
+    store = ExtendedStampStore(max_open_files=2)
+    for filename in filenames:
+        store.get_image(filename)
+    assert list(store.hdulists) == [os.path.abspath(filename) for filename in filenames[3:]]
+    assert store.files_opened == 5
+
+    image, header = store.get_image(filenames[0])
+    assert np.all(image == 1.)
+    assert len(store.hdulists) == 2
+    assert store.files_opened == 6
+    store.close()
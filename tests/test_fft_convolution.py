@@ -0,0 +1,66 @@
+"""Test the engine used to convolve galaxy and extended source stamps
+with their PSFs in batches
+
+Use
+---
+    >>> pytest test_fft_convolution.py
+"""
+import numpy as np
+import scipy.signal as s1
+
+from mirage.seed_image.fft_convolution import StampConvolver
+
+
+def test_convolution_matches_fftconvolve():
+    """Convolved stamps should match those from scipy.signal.fftconvolve
+    for stamps and kernels of varying, odd and even, shapes"""
+    np.random.seed(3)
+    stamp_shapes = [(5, 7), (40, 40), (41, 33), (10, 60), (40, 40), (8, 8), (40, 40)]
+    kernel_shapes = [(21, 21), (21, 21), (22, 20), (9, 9), (21, 21), (21, 21), (21, 21)]
+    stamps = [np.random.random(shape) for shape in stamp_shapes]
+    kernels = [np.random.random(shape) for shape in kernel_shapes]
+
+    convolver = StampConvolver(batch_size=2)
+    convolved = convolver.convolve(stamps, kernels)
+    for stamp, kernel, result in zip(stamps, kernels, convolved):
+        expected = s1.fftconvolve(stamp, kernel, mode='same')
+        assert result.shape == stamp.shape
+        assert np.allclose(result, expected, rtol=1e-10, atol=1e-12)
+
+    # The three 40x40 stamps are transformed in two batches
+    assert convolver.batches == 6
+
+
+def test_shared_kernel_transforms():
+    """Identical kernels should share a single cached transform, without
+    changing the results"""
+    np.random.seed(4)
+    kernels = [np.random.random((15, 15)) for i in range(3)]
+    stamps = [np.random.random((30, 30)) for i in range(9)]
+    stamp_kernels = [kernels[i % 3].copy() for i in range(9)]
+
+    convolver = StampConvolver(batch_size=4)
+    convolved = convolver.convolve(stamps, stamp_kernels)
+    assert convolver.misses == 3
+    assert convolver.hits == 6
+    for stamp, kernel, result in zip(stamps, stamp_kernels, convolved):
+        assert np.allclose(result, s1.fftconvolve(stamp, kernel, mode='same'), rtol=1e-10, atol=1e-12)
+
+    # Transforms are kept between calls
+    convolver.convolve(stamps[0:1], stamp_kernels[0:1])
+    assert convolver.misses == 3
+
+
+def test_kernel_transform_cache_limit():
+    """The least recently used transforms should be removed when the cache
+    exceeds its memory limit"""
+    np.random.seed(5)
+    stamps = [np.random.random((30, 30)) for i in range(5)]
+    kernels = [np.random.random((15, 15)) for i in range(5)]
+
+    # Each transform is 45 x 23 complex values, or 16560 bytes
+    convolver = StampConvolver(batch_size=1, max_memory_mb=2.5 * 16560 / 1024. / 1024.)
+    convolver.convolve(stamps, kernels)
+    assert len(convolver.kernel_transforms) == 2
+    assert convolver.evictions == 3
+    assert convolver.nbytes <= convolver.max_bytes
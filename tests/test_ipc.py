@@ -0,0 +1,78 @@
+"""Test the engine used to add interpixel capacitance effects to an
+exposure
+
+Use
+---
+    >>> pytest test_ipc.py
+"""
+import numpy as np
+
+from mirage.ramp_generator.ipc import IPCConvolver
+
+
+def loop_ipc(data, kernel):
+    """Convolve one group at a time, looping over kernel elements, as
+    done in the JWST calibration pipeline"""
+    output = np.zeros(data.shape)
+    ky, kx = kernel.shape[0:2]
+    ny, nx = data.shape[2:]
+    b_b = ky // 2
+    l_b = kx // 2
+    for integration in range(data.shape[0]):
+        for group in range(data.shape[1]):
+            temp = np.zeros((ny + ky - 1, nx + kx - 1))
+            temp[b_b:b_b + ny, l_b:l_b + nx] = data[integration, group]
+            for j in range(ky):
+                for i in range(kx):
+                    jstart = ky - j - 1
+                    istart = kx - i - 1
+                    output[integration, group] += kernel[j, i] * temp[jstart:jstart + ny, istart:istart + nx]
+    return output
+
+
+def create_kernel():
+    """Create a 3x3 IPC kernel with a dominant central element"""
+    kernel = np.array([[0.001, 0.006, 0.0005],
+                       [0.005, 0.97, 0.007],
+                       [0.0008, 0.004, 0.001]])
+    return kernel
+
+
+def test_2d_kernel():
+    """Chunked convolution must match convolving one group at a time, and
+    change only the given portion of the exposure"""
+    np.random.seed(4)
+    exposure = np.random.random((2, 5, 40, 30)) * 1000.
+    kernel = create_kernel()
+    expected = loop_ipc(exposure[:, :, 4:36, 4:26], kernel)
+
+    # A small memory limit forces chunks of a few groups
+    convolver = IPCConvolver(kernel, max_memory_mb=2.5 * 32 * 22 * 8 / 1024. ** 2)
+    assert convolver.chunk_size((32, 22)) == 2
+    original = exposure.copy()
+    convolver.convolve(exposure[:, :, 4:36, 4:26])
+    assert np.allclose(exposure[:, :, 4:36, 4:26], expected, rtol=1e-13, atol=0.)
+    exposure[:, :, 4:36, 4:26] = original[:, :, 4:36, 4:26]
+    assert np.array_equal(exposure, original)
+
+
+def test_4d_kernel():
+    """A 4D kernel with the same kernel at every pixel must match the 2D
+    kernel, and a varying kernel must be applied pixel by pixel"""
+    np.random.seed(5)
+    exposure = np.random.random((1, 3, 20, 24)) * 1000.
+    kernel = create_kernel()
+    kernel_4d = np.tile(kernel[:, :, np.newaxis, np.newaxis], (1, 1, 20, 24)).astype(np.float32)
+    expected = loop_ipc(exposure, kernel_4d[:, :, 0, 0])
+
+    convolved = exposure.copy()
+    IPCConvolver(kernel_4d, max_memory_mb=0.001).convolve(convolved)
+    assert np.allclose(convolved, expected, rtol=1e-13, atol=0.)
+
+    # Kernel varying across the detector
+    kernel_4d[1, 1, 10:, :] = 0.5
+    convolved = exposure.copy()
+    IPCConvolver(kernel_4d).convolve(convolved)
+    assert np.allclose(convolved[:, :, 0:9], expected[:, :, 0:9], rtol=1e-13, atol=0.)
+    difference = (0.5 - np.float32(0.97)) * exposure[:, :, 10:]
+    assert np.allclose(convolved[:, :, 10:], expected[:, :, 10:] + difference, rtol=1e-12, atol=0.)
@@ -0,0 +1,85 @@
+"""Test the lazy representation of seed exposures, which creates frames
+from a signal rate image and the trails of moving sources on demand
+
+Use
+---
+    >>> pytest test_lazy_ramp.py
+"""
+import os
+
+from astropy.io import fits
+import numpy as np
+
+from mirage.seed_image.lazy_ramp import LazyRamp
+
+
+def create_ramp():
+    """Create a lazy exposure and the equivalent full array"""
+    np.random.seed(12)
+    rate = np.random.random((20, 30))
+    frame_times = 10.737 * np.arange(1, 6)
+    ramp = LazyRamp(rate, frame_times, nint=2)
+    expected = np.zeros((2, 5, 20, 30))
+    for integ in range(2):
+        for i, frame_time in enumerate(frame_times):
+            expected[integ, i] = rate * frame_time
+
+    for integ, y_start, x_start, shape in [(0, 2, 3, (5, 4, 6)), (1, 10, 20, (5, 10, 10)),
+                                           (0, 0, 0, (5, 3, 3))]:
+        cube = np.random.random(shape)
+        ramp.add_subarray(integ, y_start, x_start, cube)
+        expected[integ, :, y_start:y_start + shape[1], x_start:x_start + shape[2]] += cube
+    return ramp, expected
+
+
+def test_frames():
+    """Frames created on demand must match the full exposure"""
+    ramp, expected = create_ramp()
+    assert ramp.shape == expected.shape
+    assert np.allclose(np.asarray(ramp), expected, rtol=1e-14, atol=0.)
+    for integ in range(2):
+        integration = ramp[integ, :, :, :]
+        assert integration.shape == (5, 20, 30)
+        for i in range(5):
+            assert np.allclose(integration[i], expected[integ, i], rtol=1e-14, atol=0.)
+        assert np.allclose(integration[2, 5:8, :], expected[integ, 2, 5:8, :], rtol=1e-14, atol=0.)
+    assert np.allclose(ramp[-1][4], expected[1, 4], rtol=1e-14, atol=0.)
+    assert np.allclose(ramp[:, 1], expected[:, 1], rtol=1e-14, atol=0.)
+
+
+def test_arithmetic():
+    """Scaling by images and adding exposures or arrays must match the
+    same operations on the full exposure"""
+    ramp, expected = create_ramp()
+    pam = np.random.random((20, 30)) + 0.5
+    ramp *= pam
+    expected *= pam
+    ramp /= 2.
+    expected /= 2.
+    assert np.allclose(np.asarray(ramp), expected, rtol=1e-14, atol=0.)
+
+    other, other_expected = create_ramp()
+    ramp += other
+    expected += other_expected
+    dense = np.random.random(expected.shape)
+    combined = dense + ramp
+    assert isinstance(combined, LazyRamp)
+    assert np.allclose(np.asarray(combined), expected + dense, rtol=1e-14, atol=0.)
+
+    # The original exposure is unchanged by the addition
+    assert np.allclose(np.asarray(ramp), expected, rtol=1e-14, atol=0.)
+
+
+def test_write(tmp_path):
+    """Exposures written one frame at a time must match the full array"""
+    ramp, expected = create_ramp()
+    filename = os.path.join(str(tmp_path), 'lazy_seed.fits')
+    fits.HDUList([fits.PrimaryHDU()]).writeto(filename)
+    ramp.write(filename, header={'UNITS': 'ADU'})
+    fits.append(filename, np.ones((20, 30), dtype=np.int32), header=fits.Header([('EXTNAME', 'SEGMAP')]))
+
+    with fits.open(filename) as hdulist:
+        assert hdulist[1].header['EXTNAME'] == 'DATA'
+        assert hdulist[1].header['UNITS'] == 'ADU'
+        assert np.allclose(hdulist[1].data, expected, rtol=1e-14, atol=0.)
+        assert hdulist['SEGMAP'].data.shape == (20, 30)
@@ -0,0 +1,92 @@
+"""Test the creation of integrations containing sources moving across
+the detector
+
+Use
+---
+    >>> pytest test_moving_targets.py
+"""
+import numpy as np
+
+from mirage.seed_image.moving_targets import MovingTarget
+
+
+def loop_resample(frame, sampx, sampy):
+    """Rebin an oversampled frame one output pixel at a time"""
+    framey, framex = frame.shape
+    newframe = np.zeros((int(framey / sampy), int(framex / sampx)))
+    for j in range(newframe.shape[0]):
+        for i in range(newframe.shape[1]):
+            newframe[j, i] = np.sum(frame[sampy*j:sampy*(j+1), sampx*i:sampx*(i+1)])
+    return newframe
+
+
+def loop_subsample(image, factorx, factory):
+    """Subsample an image one input pixel at a time"""
+    ydim, xdim = image.shape
+    substamp = np.zeros((ydim*factory, xdim*factorx))
+    for i in range(xdim):
+        for j in range(ydim):
+            substamp[factory*j:factory*(j+1), factorx*i:factorx*(i+1)] = image[j, i]
+    return substamp
+
+
+def test_resample():
+    """Rebinning must match summing each block of subpixels, including
+    frames whose size is not a multiple of the subsampling factor"""
+    np.random.seed(3)
+    mt = MovingTarget()
+    for shape, sampx, sampy in [((30, 45), 3, 3), ((31, 47), 3, 2), ((8, 9), 1, 1)]:
+        frame = np.random.random(shape)
+        resampled = mt.resample(frame, sampx, sampy)
+        expected = loop_resample(frame, sampx, sampy)
+        assert resampled.shape == expected.shape
+        assert np.allclose(resampled, expected, rtol=1e-14, atol=0.)
+
+
+def test_subsample():
+    """Subsampling must repeat each pixel, and resampling the result must
+    recover the original image scaled by the number of subpixels"""
+    np.random.seed(4)
+    mt = MovingTarget()
+    image = np.random.random((7, 10))
+    substamp = mt.subsample(image, 3, 2)
+    assert substamp.dtype == np.float64
+    assert np.array_equal(substamp, loop_subsample(image, 3, 2))
+    assert np.allclose(mt.resample(substamp, 3, 2), image * 6)
+
+    integer_image = np.arange(6).reshape(2, 3)
+    assert np.array_equal(mt.subsample(integer_image, 2, 2), loop_subsample(integer_image, 2, 2))
+
+
+def test_create_conserves_signal():
+    """A source moving across the detector should add its full signal per
+    second of motion to each frame in which it is fully on the detector"""
+    y, x = np.mgrid[0:15, 0:15]
+    stamp = np.exp(-((x - 7.) ** 2 + (y - 7.) ** 2) / 4.)
+    stamp /= np.sum(stamp)
+
+    frametime = 10.
+    xframes = np.linspace(30., 40., 6)
+    yframes = np.linspace(50., 45., 6)
+    mt = MovingTarget()
+    integration = mt.create(stamp, xframes, yframes, frametime, 100, 120)
+    assert integration.shape == (5, 120, 100)
+    assert np.all(np.diff(np.sum(integration, axis=(1, 2))) > 0)
+
+
+def test_create_subarray():
+    """The sub-cube covering the trail must match the corresponding area
+    of the full-aperture frames, which must be empty elsewhere, including
+    when the trail runs off the edge of the aperture"""
+    y, x = np.mgrid[0:15, 0:15]
+    stamp = np.exp(-((x - 7.) ** 2 + (y - 7.) ** 2) / 4.)
+    mt = MovingTarget()
+    for xframes, yframes in [(np.linspace(30., 40., 6), np.linspace(50., 45., 6)),
+                             (np.linspace(90., 110., 8), np.linspace(110., 125., 8))]:
+        full = mt.create(stamp, xframes, yframes, 10., 100, 120)
+        subframes, ystart, xstart = mt.create_subarray(stamp, xframes, yframes, 10., 100, 120)
+        numframes, suby, subx = subframes.shape
+        assert numframes == full.shape[0]
+        assert suby < 120 and subx < 100
+        assert np.array_equal(full[:, ystart:ystart+suby, xstart:xstart+subx], subframes)
+        assert np.isclose(np.sum(full), np.sum(subframes), rtol=1e-14, atol=0.)
@@ -0,0 +1,136 @@
+"""Test the engine used to add Poisson noise to the frames of an
+integration
+
+Use
+---
+    >>> pytest test_poisson_noise.py
+"""
+import numpy as np
+import pytest
+
+from mirage.ramp_generator.poisson_noise import PoissonNoiseEngine
+
+
+def noisy_integration(engine, signal, integration, frames=3):
+    """Add noise to several frames of an integration"""
+    engine.start_integration(integration)
+    return [engine.add_noise(signal) for i in range(frames)]
+
+
+def test_reproducible_with_workers():
+    """The noise must depend only on the seed, integration and strip, and
+    not on the number of workers"""
+    signal = np.random.random((300, 40)) * 100.
+    gain = np.random.random((300, 40)) + 1.5
+
+    serial = PoissonNoiseEngine(12345, gain=gain, strip_rows=64)
+    threaded = PoissonNoiseEngine(12345, gain=gain, strip_rows=64, workers=3)
+    for integration in [0, 1]:
+        for serial_frame, threaded_frame in zip(noisy_integration(serial, signal, integration),
+                                                noisy_integration(threaded, signal, integration)):
+            assert np.array_equal(serial_frame, threaded_frame)
+    threaded.close()
+
+    # Restarting an integration repeats its noise, while different frames,
+    # integrations and seeds have different noise
+    first = noisy_integration(serial, signal, 0)
+    again = noisy_integration(serial, signal, 0)
+    second = noisy_integration(serial, signal, 1)
+    other_seed = noisy_integration(PoissonNoiseEngine(54321, gain=gain, strip_rows=64), signal, 0)
+    assert np.array_equal(first[2], again[2])
+    assert not np.array_equal(first[0], first[1])
+    assert not np.array_equal(first[0], second[0])
+    assert not np.array_equal(first[0], other_seed[0])
+
+
+def test_noise_statistics():
+    """Noisy frames must be integer electrons divided by the gain, with
+    the mean and variance of a Poisson distribution, and negative pixels
+    must be left unchanged"""
+    engine = PoissonNoiseEngine(7, gain=2., strip_rows=50)
+    signal = np.full((400, 500), 50.)
+    signal[0, 0:3] = -4.
+    noisy = engine.add_noise(signal)
+
+    electrons = noisy * 2.
+    assert np.array_equal(noisy[0, 0:3], signal[0, 0:3])
+    assert np.array_equal(electrons[1:], np.round(electrons[1:]))
+    assert np.isclose(np.mean(electrons[1:]), 100., rtol=0.005)
+    assert np.isclose(np.var(electrons[1:]), 100., rtol=0.02)
+
+
+def test_strip_count_mismatch():
+    """Frames of different sizes cannot share the streams of an
+    integration"""
+    engine = PoissonNoiseEngine(7, strip_rows=10)
+    engine.start_integration(0)
+    engine.add_noise(np.ones((20, 5)))
+    with pytest.raises(ValueError):
+        engine.add_noise(np.ones((30, 5)))
+
+
+def synthesized_groups(engine, rate, nframe, nskip, ngroup):
+    """Draw groups of a constant signal rate image with the group noise
+    engine, returning the zeroth frame and groups"""
+    engine.start_integration(0)
+    frames_per_group = nframe + nskip
+    weights = (nframe - np.arange(1, nframe)) / nframe
+    previous_signal = np.zeros(rate.shape)
+    previous_expected = np.zeros(rate.shape)
+    reads = []
+    for i in range(ngroup):
+        first = rate * (i * frames_per_group + 1)
+        start, total, weighted = engine.add_group_noise(first - previous_expected, rate * (nframe - 1),
+                                                        rate * np.sum(weights), rate * np.sum(weights ** 2))
+        first_signal = previous_signal + start
+        if i == 0:
+            reads.append(first_signal)
+        reads.append(first_signal + weighted)
+        previous_signal = first_signal + total
+        previous_expected = first + rate * (nframe - 1)
+    return np.array(reads)
+
+
+def frame_by_frame_groups(rate, nframe, nskip, ngroup, seed):
+    """Create every frame of a constant signal rate image with its own
+    Poisson noise and average them into groups, returning the zeroth frame
+    and groups"""
+    generator = np.random.default_rng(seed)
+    frames = np.cumsum(generator.poisson(rate, ((nframe + nskip) * ngroup,) + rate.shape), axis=0)
+    reads = [frames[0]]
+    for i in range(ngroup):
+        first = i * (nframe + nskip)
+        reads.append(np.mean(frames[first:first + nframe], axis=0))
+    return np.array(reads)
+
+
+def test_group_noise_statistics():
+    """Groups drawn directly must have the same mean, variance and
+    covariances with the other groups and the zeroth frame as groups
+    averaged from individual noisy frames"""
+    rate = np.full((200, 200), 6.)
+    nframe, nskip, ngroup = 4, 3, 3
+    engine = PoissonNoiseEngine(99, strip_rows=50)
+    synthesized = synthesized_groups(engine, rate, nframe, nskip, ngroup).reshape(ngroup + 1, -1)
+    frame_by_frame = frame_by_frame_groups(rate, nframe, nskip, ngroup, 99).reshape(ngroup + 1, -1)
+
+    # Analytic means, and the covariance of the frame-by-frame simulation
+    expected_means = [6.] + [6. * (i * (nframe + nskip) + (nframe + 1) / 2.) for i in range(ngroup)]
+    assert np.allclose(np.mean(synthesized, axis=1), expected_means, rtol=0.01)
+    assert np.allclose(np.cov(synthesized), np.cov(frame_by_frame), rtol=0.05)
+
+    # Negative pixels have no noise added, and a single frame per group
+    # has no noise within the group
+    engine.start_integration(1)
+    start, total, weighted = engine.add_group_noise(np.full((3, 3), -2.), np.full((3, 3), -1.),
+                                                    np.full((3, 3), -0.5), np.full((3, 3), -0.25))
+    assert np.all(start == -2.) and np.all(total == -1.) and np.all(weighted == -0.5)
+    start, total, weighted = engine.add_group_noise(np.full((3, 3), 2.), np.zeros((3, 3)),
+                                                    np.zeros((3, 3)), np.zeros((3, 3)))
+    assert np.all(total == 0.) and np.all(weighted == 0.)
+
+    # The draws do not depend on the number of workers
+    threaded = PoissonNoiseEngine(99, strip_rows=50, workers=3)
+    assert np.array_equal(synthesized.reshape(ngroup + 1, 200, 200),
+                          synthesized_groups(threaded, rate, nframe, nskip, ngroup))
+    threaded.close()
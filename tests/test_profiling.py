@@ -0,0 +1,80 @@
+"""Test the profiler recording the time and memory used by simulation
+stages
+
+Use
+---
+    >>> pytest test_profiling.py
+"""
+import json
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from mirage.utils import profiling
+
+
+def test_stage_records(tmp_path):
+    """Stages should record their calls, time and memory use, including
+    the memory used by nested stages"""
+    profiler = profiling.StageProfiler(enabled=True)
+    for i in range(2):
+        with profiler.stage('outer'):
+            with profiler.stage('inner'):
+                data = np.ones((1000, 1000))
+                del data
+    profiler.count('sources', 5)
+    profiler.count('sources')
+
+    report_file = os.path.join(str(tmp_path), 'profile.json')
+    profiler.write_report(report_file, entry_point='test')
+    with open(report_file) as file_obj:
+        report = json.load(file_obj)
+
+    assert report['entry_point'] == 'test'
+    assert [stage['name'] for stage in report['stages']] == ['inner', 'outer']
+    inner, outer = report['stages']
+    assert inner['calls'] == 2
+    assert outer['seconds'] >= inner['seconds']
+    assert inner['peak_traced_mb'] >= 7.5
+    assert outer['peak_traced_mb'] >= 7.5
+    assert abs(inner['net_traced_mb']) < 1.
+    assert report['counters'] == {'sources': 6}
+
+
+def test_failed_stage():
+    """Stages should be recorded, and tracing stopped, when the code being
+    profiled raises an exception"""
+    profiler = profiling.StageProfiler(enabled=True)
+    assert tracemalloc.is_tracing()
+    with pytest.raises(RuntimeError):
+        try:
+            with profiler.stage('outer'):
+                with profiler.stage('inner'):
+                    raise RuntimeError('Simulation failed')
+        finally:
+            profiler.stop_tracing()
+    assert list(profiler.stages) == ['inner', 'outer']
+    assert len(profiler.active) == 0
+    assert not tracemalloc.is_tracing()
+
+
+def test_disabled_profiler(tmp_path):
+    """A disabled profiler should record nothing"""
+    profiler = profiling.StageProfiler(enabled=False)
+    with profiler.stage('outer'):
+        profiler.count('sources')
+    report_file = os.path.join(str(tmp_path), 'profile.json')
+    profiler.write_report(report_file)
+    assert len(profiler.stages) == 0
+    assert not os.path.isfile(report_file)
+
+
+def test_profiling_requested(monkeypatch):
+    """Profiling can be requested in the yaml file or the environment"""
+    monkeypatch.delenv(profiling.ENV_VAR, raising=False)
+    assert not profiling.profiling_requested({'Output': {}})
+    assert profiling.profiling_requested({'Output': {'profile': True}})
+    monkeypatch.setenv(profiling.ENV_VAR, '1')
+    assert profiling.profiling_requested({'Output': {'profile': False}})
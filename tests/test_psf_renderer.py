@@ -0,0 +1,46 @@
+"""Test the batched evaluation of gridded PSF libraries
+
+Use
+---
+    >>> pytest test_psf_renderer.py
+"""
+import numpy as np
+
+from .utils import gaussian_psf_library
+from mirage.psf.psf_renderer import BatchedPSFRenderer
+
+
+def test_render_matches_library():
+    """Batched stamps should match evaluating the library source by
+    source, both inside and outside of the library grid"""
+    library = gaussian_psf_library()
+    renderer = BatchedPSFRenderer(library, chunk_size=4)
+    x_locations = np.array([10.3, 1023.7, 2047., 0., -20.2, 2100.9, 512.5, 1500.1, 300.])
+    y_locations = np.array([20.8, 1500.2, 0., 2047., 1000.4, 2080.6, 2047., -5.5, 1800.3])
+    dims = (17, 15)
+
+    stamps = list(renderer.iter_stamps(x_locations, y_locations, dims))
+    assert len(stamps) == len(x_locations)
+
+    for x_loc, y_loc, stamp in zip(x_locations, y_locations, stamps):
+        x_points = np.floor(x_loc) - dims[1] // 2 + np.arange(dims[1])
+        y_points = np.floor(y_loc) - dims[0] // 2 + np.arange(dims[0])
+        x_grid, y_grid = np.meshgrid(x_points, y_points)
+        direct = library.evaluate(x=x_grid, y=y_grid, flux=1., x_0=x_loc, y_0=y_loc)
+        assert stamp.shape == dims
+        assert np.allclose(stamp, direct, rtol=1e-10, atol=1e-14)
+
+
+def test_interpolation_weights():
+    """Weights should sum to one and select the surrounding library PSFs"""
+    library = gaussian_psf_library()
+    renderer = BatchedPSFRenderer(library)
+    indices, weights = renderer.interpolation_weights(np.array([0., 1023.5, 3000.]),
+                                                      np.array([0., 1023.5, 1000.]))
+    assert np.allclose(np.sum(weights, axis=1), 1.)
+    assert np.allclose(weights[1], 0.25)
+    assert sorted(indices[1]) == [0, 1, 2, 3]
+
+    # Outside of the grid, the closest PSF is used
+    assert indices[2, 0] in [2, 3]
+    assert np.all(weights[2] == [1., 0., 0., 0.])
@@ -0,0 +1,83 @@
+"""Test the PSF stamp cache used when adding point sources to seed images
+
+Authors
+-------
+    - Mirage contributors
+
+Use
+---
+    >>> pytest test_psf_stamp_cache.py
+"""
+import numpy as np
+
+from .utils import gaussian_psf_library
+from mirage.psf.stamp_cache import PSFStampCache
+
+
+def test_stamp_cache_hits_and_accuracy():
+    """Sources sharing a grid cell and quantized sub-pixel phase should
+    re-use the same stamp, which should match a direct evaluation"""
+    library = gaussian_psf_library()
+    cache = PSFStampCache(subpixel_step=0.1)
+    dims = (15, 15)
+
+    stamp = cache.get_stamp(library, 500.3, 700.6, dims)
+    assert not stamp.flags.writeable
+
+    # The stamp is evaluated at the pixel containing the center of the
+    # grid cell, with the same sub-pixel phase
+    x_grid, y_grid = np.meshgrid(np.arange(1016, 1031), np.arange(1016, 1031))
+    reference = library.evaluate(x=x_grid, y=y_grid, flux=1., x_0=1023.3, y_0=1023.6)
+    assert np.allclose(stamp, reference, rtol=1e-10, atol=1e-14)
+
+    x_grid, y_grid = np.meshgrid(np.arange(493, 508), np.arange(693, 708))
+    direct = library.evaluate(x=x_grid, y=y_grid, flux=1., x_0=500.3, y_0=700.6)
+    assert np.argmax(stamp) == np.argmax(direct)
+    assert np.isclose(np.sum(stamp), np.sum(direct), rtol=1e-3)
+
+    # Same phase, same grid cell, different integer location
+    cache.get_stamp(library, 510.31, 720.58, dims)
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+    # Different phase
+    cache.get_stamp(library, 510.5, 720.58, dims)
+    assert cache.misses == 2
+
+
+def test_stamp_cache_order_independence():
+    """Stamps should depend only on the grid cell and quantized phase, and
+    not on the location of the first source to use them"""
+    library = gaussian_psf_library()
+    dims = (15, 15)
+    first = PSFStampCache(subpixel_step=0.1)
+    second = PSFStampCache(subpixel_step=0.1)
+
+    stamp = first.get_stamp(library, 500.3, 700.6, dims)
+    other_stamp = second.get_stamp(library, 1510.31, 1320.58, dims)
+    assert np.array_equal(other_stamp, stamp)
+
+    # Sources beyond the edges of the library grid
+    stamp = first.get_stamp(library, -3.2, 2049.9, dims)
+    other_stamp = second.get_stamp(library, -0.2, 2048.9, dims)
+    assert np.array_equal(other_stamp, stamp)
+
+
+def test_stamp_cache_eviction():
+    """The least recently used stamps should be removed when the memory
+    limit is exceeded"""
+    library = gaussian_psf_library()
+    dims = (15, 15)
+    stamp_mb = 15 * 15 * 8 / 1024. / 1024.
+    cache = PSFStampCache(subpixel_step=0.1, max_memory_mb=2.5 * stamp_mb)
+
+    cache.get_stamp(library, 100.0, 100.0, dims)
+    cache.get_stamp(library, 100.2, 100.0, dims)
+    cache.get_stamp(library, 100.0, 100.0, dims)
+    cache.get_stamp(library, 100.4, 100.0, dims)
+    assert cache.evictions == 1
+    assert len(cache.stamps) == 2
+
+    # The stamp at phase 0.2 was least recently used and should be gone
+    cache.get_stamp(library, 100.2, 100.0, dims)
+    assert cache.misses == 4
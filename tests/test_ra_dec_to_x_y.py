@@ -343,3 +343,60 @@ def test_locations():
             # differences hopefully won't be caught
             assert np.allclose(xvals_from_siaf, reference_file_values['{}_{}'.format(instrument, aperture)][0], atol=0.5)
             assert np.allclose(yvals_from_siaf, reference_file_values['{}_{}'.format(instrument, aperture)][1], atol=0.5)
+
+
+def test_get_positions_array():
+    """Test that the vectorized position calculation for a full catalog
+    matches the source-by-source calculation
+    """
+    c = catalog_seed_image.Catalog_seed(offline=True)
+
+    pointing_ra = 12.0
+    pointing_dec = 12.0
+    rotation = 0.0
+
+    siaf = siaf_interface.get_instance('niriss')
+    aperture = 'NIS_CEN'
+    c.local_roll, c.attitude_matrix, c.ffsize, \
+        c.subarray_bounds = siaf_interface.get_siaf_information(siaf, aperture, pointing_ra,
+                                                                pointing_dec, rotation)
+    c.coord_transform = None
+    c.siaf = siaf[aperture]
+
+    delta_deg = np.array([-500, -75, 0, 10, 40, 180, 500, 1000]) * 0.065 / 3600.
+    ra_list = pointing_ra + delta_deg
+    dec_list = pointing_dec - delta_deg
+
+    # RA, Dec inputs in decimal degrees
+    x, y, ra, dec, ra_str, dec_str = c.get_positions_array(ra_list, dec_list, False, 4096)
+    for i, (in_ra, in_dec) in enumerate(zip(ra_list, dec_list)):
+        x_check, y_check = c.RADecToXY_astrometric(in_ra, in_dec)
+        assert np.isclose(x[i], x_check, rtol=0, atol=1e-8)
+        assert np.isclose(y[i], y_check, rtol=0, atol=1e-8)
+        assert (ra_str[i], dec_str[i]) == c.makePos(in_ra, in_dec)
+
+    # RA, Dec inputs given as strings
+    x_str_input, y_str_input, ra_check, dec_check, ra_str_out, dec_str_out = c.get_positions_array(
+        ra_str, dec_str, False, 4096)
+    assert np.allclose(ra_check, ra, rtol=0, atol=1e-6)
+    assert np.allclose(dec_check, dec, rtol=0, atol=1e-6)
+    assert np.all(ra_str_out == ra_str)
+    assert np.allclose(x_str_input, x, rtol=0, atol=0.05)
+
+    # Pixel inputs
+    x_pix, y_pix, ra_pix, dec_pix, ra_str_pix, dec_str_pix = c.get_positions_array(x, y, True, 4096)
+    assert np.allclose(ra_pix, ra_list, rtol=0, atol=8e-6)
+    assert np.allclose(dec_pix, dec_list, rtol=0, atol=8e-6)
+    for i in range(len(x)):
+        ra_check, dec_check = c.get_positions(x[i], y[i], True, 4096)[2:4]
+        assert np.isclose(ra_check, ra_pix[i], rtol=0, atol=1e-10)
+        assert np.isclose(dec_check, dec_pix[i], rtol=0, atol=1e-10)
+
+
+def test_make_pos():
+    """Test the conversion of RA, Dec values to strings"""
+    c = catalog_seed_image.Catalog_seed(offline=True)
+    assert c.makePos(12.0, -0.5) == ('00:48:00.0000', '-00:30:00.0000')
+    ra_str, dec_str = c.makePos(np.array([-15., 187.5]), np.array([45.25, -1.]))
+    assert list(ra_str) == ['23:00:00.0000', '12:30:00.0000']
+    assert list(dec_str) == ['+45:15:00.0000', '-01:00:00.0000']
@@ -0,0 +1,111 @@
+"""Test the segmentation map, which records object footprints and
+paints them into the map in a single step
+
+Use
+---
+    >>> pytest test_segmentation_map.py
+"""
+import numpy as np
+
+from mirage.seed_image import segmentation_map as segmap
+
+
+def create_map(ydim=50, xdim=60):
+    """Create an empty segmentation map"""
+    segmentation = segmap.SegMap()
+    segmentation.ydim = ydim
+    segmentation.xdim = xdim
+    segmentation.initialize_map()
+    return segmentation
+
+
+def test_label_dtype():
+    """Make sure the map contains 32-bit integer labels"""
+    segmentation = create_map()
+    segmentation.add_object_basic(5, 10, 5, 10, 3)
+    assert segmentation.segmap.dtype == np.int32
+    assert np.all(segmentation.segmap[5:10, 5:10] == 3)
+    assert np.sum(segmentation.segmap > 0) == 25
+
+
+def test_deferred_painting_matches_direct_painting():
+    """Objects painted in a single step must give the same map as painting
+    each object in turn, including where later objects overlap earlier ones
+    and where objects extend off of the map
+    """
+    np.random.seed(42)
+    segmentation = create_map()
+    expected = np.zeros((50, 60), dtype=np.int32)
+    for number in range(1, 40):
+        image = np.random.random((9, 11))
+        ystart = np.random.randint(-5, 48)
+        xstart = np.random.randint(-5, 58)
+        segmentation.add_object_noise(image, ystart, xstart, number, 0.6)
+
+        # Paint the same object directly, clipped to the map
+        flagged = image >= 0.6
+        for (y, x) in zip(*np.nonzero(flagged)):
+            if 0 <= y + ystart < 50 and 0 <= x + xstart < 60:
+                expected[y + ystart, x + xstart] = number
+
+    assert len(segmentation.footprints) > 0
+    assert np.all(segmentation.segmap == expected)
+    assert len(segmentation.footprints) == 0
+
+
+def test_later_objects_overwrite():
+    """Objects added after the map has been accessed are painted on top
+    of the existing labels
+    """
+    segmentation = create_map()
+    segmentation.add_object_basic(0, 10, 0, 10, 1)
+    assert np.all(segmentation.segmap[0:10, 0:10] == 1)
+    segmentation.add_object_basic(5, 15, 5, 15, 2)
+    segmentation.add_object_perccut(np.ones((2, 2)), 0, 0, 3, 0.5)
+    result = segmentation.segmap
+    assert np.all(result[0:2, 0:2] == 3)
+    assert np.all(result[5:15, 5:15] == 2)
+    assert result[4, 4] == 1
+
+
+def test_threshold_minimum_size():
+    """Only connected regions with at least min_pixels pixels above the
+    threshold are added
+    """
+    image = np.zeros((20, 20))
+    image[2:5, 2:5] = 10.    # 9 pixels
+    image[10, 10] = 10.      # single pixel
+    image[15, 15] = 10.      # two diagonally connected pixels
+    image[16, 16] = 10.
+    segmentation = create_map()
+    segmentation.add_object_threshold(image, 10, 20, 7, 1., min_pixels=2)
+    result = segmentation.segmap
+    assert np.all(result[12:15, 22:25] == 7)
+    assert result[20, 30] == 0
+    assert result[25, 35] == 7 and result[26, 36] == 7
+    assert np.sum(result == 7) == 11
+
+    segmentation = create_map()
+    segmentation.add_object_threshold(image, 0, 0, 7, 1.)
+    assert np.sum(segmentation.segmap == 7) == 9
+
+
+def test_bounded_footprint_memory():
+    """Footprints should be painted into the map once they cover too many
+    pixels, giving the same map as painting them all at once
+    """
+    np.random.seed(3)
+    objects = []
+    for number in range(1, 60):
+        objects.append((np.random.random((12, 10)), np.random.randint(-5, 48),
+                        np.random.randint(-5, 58), number))
+
+    segmentation = create_map()
+    bounded = create_map()
+    bounded.max_footprint_pixels = 300
+    for image, ystart, xstart, number in objects:
+        segmentation.add_object_noise(image, ystart, xstart, number, 0.5)
+        bounded.add_object_noise(image, ystart, xstart, number, 0.5)
+        assert bounded.footprint_pixels <= 300
+    assert len(bounded.footprints) < len(segmentation.footprints)
+    assert np.array_equal(bounded.segmap, segmentation.segmap)
@@ -0,0 +1,100 @@
+"""Test the cache of normalized Sersic profile stamps used when creating
+galaxies
+
+Use
+---
+    >>> pytest test_sersic_stamp_cache.py
+"""
+from astropy.modeling.models import Sersic2D
+import numpy as np
+
+from mirage.seed_image import catalog_seed_image
+from mirage.seed_image.sersic_stamp_cache import SersicStampCache
+
+
+def galaxy_seed():
+    """Create a Catalog_seed instance able to create galaxies"""
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    seed.ffsize = 2048
+    return seed
+
+
+def test_cached_galaxy_flux_and_shape():
+    """Galaxies created from cached stamps should have the requested total
+    signal, and shapes close to those created directly"""
+    seed = galaxy_seed()
+    direct = seed.create_galaxy(2.5, 0.3, 1.7, 0.6, 1000.)
+
+    seed.sersic_stamp_cache = SersicStampCache(tolerance=0.01)
+    cached = seed.create_galaxy(2.5, 0.3, 1.7, 0.6, 1000.)
+    assert cached.flags.writeable
+    assert np.isclose(np.sum(cached), 1000., rtol=5e-4)
+    assert cached.shape == direct.shape
+    assert np.max(np.abs(cached - direct)) < 0.02 * np.max(direct)
+
+    # Nearby parameters share the stamp. Position angles differing by pi
+    # are equivalent.
+    other = seed.create_galaxy(2.505, 0.301, 1.701, 0.6 + np.pi, 10.)
+    assert seed.sersic_stamp_cache.hits == 1
+    assert seed.sersic_stamp_cache.misses == 1
+    assert np.allclose(other * 100., cached)
+
+    # Position angle does not matter for circular galaxies
+    seed.create_galaxy(2.5, 0., 1.7, 0.1, 10.)
+    seed.create_galaxy(2.5, 0., 1.7, 1.3, 10.)
+    assert seed.sersic_stamp_cache.hits == 2
+
+
+def test_sersic_cache_eviction():
+    """The least recently used stamps should be removed when the memory
+    limit is exceeded"""
+    seed = galaxy_seed()
+    stamp_mb = seed.sersic_stamp(2., 0., 1., 0.).nbytes / 1024. / 1024.
+    cache = SersicStampCache(tolerance=0.02, max_memory_mb=1.5 * stamp_mb)
+    cache.get_stamp(2., 0., 1., 0., seed.sersic_stamp)
+    cache.get_stamp(2., 0., 1.5, 0., seed.sersic_stamp)
+    assert cache.evictions == 1
+    assert len(cache.stamps) == 1
+
+
+def test_galaxy_truncation_radius():
+    """The square stamp found from the closed form should contain the
+    requested fraction of the signal of a well-sampled profile"""
+    seed = galaxy_seed()
+    for radius, ellipticity, sersic, posang in [(8., 0., 1., 0.), (6., 0.5, 2.5, 0.7), (10., 0.3, 0.6, 2.)]:
+        half_width = seed.galaxy_truncation_radius(radius, ellipticity, sersic, posang, 0.999)
+        size = 2 * int(radius * 50) + 1
+        center = size // 2
+        y, x = np.meshgrid(np.arange(size), np.arange(size))
+        img = Sersic2D.evaluate(x, y, 1., radius, sersic, center, center, ellipticity, posang)
+        enclosed = np.sum(img[center - half_width:center + half_width + 1,
+                              center - half_width:center + half_width + 1]) / np.sum(img)
+        assert enclosed >= 0.999
+        smaller = np.sum(img[center - half_width // 2:center + half_width // 2 + 1,
+                             center - half_width // 2:center + half_width // 2 + 1]) / np.sum(img)
+        assert smaller < 0.999
+
+    # Galaxy stamps are cropped to contain 99.95% of the signal
+    stamp = seed.sersic_stamp(3., 0.2, 1.5, 0.4)
+    assert stamp.shape[0] == stamp.shape[1]
+    assert stamp.shape[0] % 2 == 1
+    assert 0.9995 <= np.sum(stamp) <= 1.
+    assert np.sum(stamp[1:-1, 1:-1]) < 0.9995
+
+
+def test_high_ellipticity():
+    """Ellipticities close to 1 should not be quantized to 1, which would
+    give a degenerate stamp"""
+    seed = galaxy_seed()
+    direct = seed.create_galaxy(3., 0.992, 1.5, 0.3, 100.)
+
+    seed.sersic_stamp_cache = SersicStampCache(tolerance=0.02)
+    cached = seed.create_galaxy(3., 0.992, 1.5, 0.3, 100.)
+    assert np.all(np.isfinite(cached))
+    assert cached.shape[0] > 1
+    assert np.isclose(np.sum(cached), np.sum(direct), rtol=5e-3)
+
+    for tolerance in [0.02, 0.1, 0.3, 0.7]:
+        cache = SersicStampCache(tolerance=tolerance)
+        key, values = cache.quantize(3., 0.9999, 1.5, 0.3)
+        assert values[1] < 1.
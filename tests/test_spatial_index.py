@@ -0,0 +1,101 @@
+"""Test the spatial index used to read only the nearby rows of large
+source catalogs
+
+Use
+---
+    >>> pytest test_spatial_index.py
+"""
+import os
+
+from astropy.coordinates import SkyCoord
+from astropy.io import ascii
+from astropy.table import Table
+import astropy.units as u
+import numpy as np
+
+from mirage.catalogs import spatial_index
+from mirage.seed_image import catalog_seed_image
+
+
+def write_catalog(filename, num_sources=2000, seed=1, pixels=False, index_column=True):
+    """Write a point source catalog with sources scattered around
+    RA, Dec = (10, -20)"""
+    np.random.seed(seed)
+    catalog = Table()
+    if index_column:
+        catalog['index'] = np.arange(1, num_sources + 1)
+    catalog['x_or_RA'] = 10. + np.random.uniform(-0.5, 0.5, num_sources)
+    catalog['y_or_Dec'] = -20. + np.random.uniform(-0.5, 0.5, num_sources)
+    catalog['magnitude'] = np.random.uniform(15., 25., num_sources)
+    position_comment = 'position_pixels' if pixels else 'position_RA_Dec'
+    catalog.meta['comments'] = [position_comment, 'abmag']
+    catalog.write(filename, format='ascii.commented_header', overwrite=True)
+    return catalog
+
+
+def test_read_catalog_near(tmp_path):
+    """Rows read using the index should be those within the search radius"""
+    spatial_index.LOADED_INDEXES.clear()
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    catalog = write_catalog(catalog_file, index_column=False)
+
+    subset = spatial_index.read_catalog_near(catalog_file, 10.1, -20.05, 0.2)
+    assert os.path.isfile(spatial_index.index_filename(catalog_file))
+
+    center = SkyCoord(10.1 * u.deg, -20.05 * u.deg)
+    separation = center.separation(SkyCoord(catalog['x_or_RA'] * u.deg, catalog['y_or_Dec'] * u.deg))
+    expected = np.where(separation < 0.2 * u.deg)[0]
+    assert list(subset['index']) == list(expected + 1)
+    assert np.allclose(subset['x_or_RA'], catalog['x_or_RA'][expected])
+    assert np.allclose(subset['magnitude'], catalog['magnitude'][expected])
+    assert subset.meta['comments'] == ascii.read(catalog_file).meta['comments']
+
+    # No sources in the search area
+    empty = spatial_index.read_catalog_near(catalog_file, 100., 20., 0.1)
+    assert len(empty) == 0
+    assert 'magnitude' in empty.colnames
+
+
+def test_index_invalidation(tmp_path):
+    """The index should be re-used until the catalog contents change"""
+    spatial_index.LOADED_INDEXES.clear()
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    write_catalog(catalog_file)
+    spatial_index.read_catalog_near(catalog_file, 10., -20., 0.1)
+    saved = spatial_index.load_index(catalog_file)
+    assert saved is not None
+
+    # Changing the modification time alone keeps the index valid
+    os.utime(catalog_file, (saved['mtime'] + 100., saved['mtime'] + 100.))
+    assert spatial_index.load_index(catalog_file) is not None
+
+    # Changing the contents invalidates it
+    catalog = write_catalog(catalog_file, seed=2)
+    assert spatial_index.load_index(catalog_file) is None
+    subset = spatial_index.read_catalog_near(catalog_file, 10., -20., 0.1)
+    center = SkyCoord(10. * u.deg, -20. * u.deg)
+    separation = center.separation(SkyCoord(catalog['x_or_RA'] * u.deg, catalog['y_or_Dec'] * u.deg))
+    assert list(subset['index']) == list(catalog['index'][separation < 0.1 * u.deg])
+
+
+def test_pixel_catalog_not_indexed(tmp_path):
+    """Catalogs with positions in pixels cannot be indexed"""
+    spatial_index.LOADED_INDEXES.clear()
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc_pix.cat')
+    write_catalog(catalog_file, pixels=True)
+    assert spatial_index.read_catalog_near(catalog_file, 10., -20., 0.1) is None
+
+
+def test_empty_field(tmp_path):
+    """Catalogs with no sources near the pointing should give no index
+    numbers, and the same maximum index number as the full catalog"""
+    spatial_index.LOADED_INDEXES.clear()
+    catalog_file = os.path.join(str(tmp_path), 'ptsrc.cat')
+    write_catalog(catalog_file, index_column=False)
+    empty = spatial_index.read_catalog_near(catalog_file, 100., 20., 0.1)
+
+    seed = catalog_seed_image.Catalog_seed(offline=True)
+    seed.maxindex = 7
+    indexes = seed.get_index_numbers(empty)
+    assert len(indexes) == 0
+    assert seed.maxindex == 2007
@@ -7,6 +7,10 @@ Authors
 """
 
 import os
+
+from astropy.nddata import NDData
+import numpy as np
+from photutils.psf import GriddedPSFModel
 import yaml
 
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
@@ -23,4 +27,33 @@ def parametrized_data():
     with open(parametrized_data_file) as f:
         test_data = yaml.safe_load(f.read())
 
-    return test_data
\ No newline at end of file
+    return test_data
+
+
+def gaussian_psf_library(fov_pixels=25, oversample=2):
+    """Create a small gridded PSF library containing 2D Gaussians whose
+    width changes across the detector.
+
+    Parameters
+    ----------
+    fov_pixels : int
+        Size of each PSF, in detector pixels
+
+    oversample : int
+        Oversampling factor of the library
+
+    Returns
+    -------
+    library : photutils.griddedPSFModel
+        Gridded PSF library with PSFs at the four corners of the detector
+    """
+    dim = fov_pixels * oversample
+    coords = (np.arange(dim) - (dim - 1) / 2.) / oversample
+    xg, yg = np.meshgrid(coords, coords)
+    grid_xypos = [(0, 0), (0, 2047), (2047, 0), (2047, 2047)]
+    data = np.zeros((len(grid_xypos), dim, dim))
+    for i, sigma in enumerate([1.0, 1.2, 1.4, 1.6]):
+        psf = np.exp(-0.5 * (xg**2 + yg**2) / sigma**2)
+        data[i, :, :] = psf / psf.sum() * oversample**2
+    meta = {'grid_xypos': grid_xypos, 'oversampling': oversample}
+    return GriddedPSFModel(NDData(data, meta=meta))